@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+SQL Analysis CLI
+
+Renders each experiment's templates, flags predicates and joins that defeat
+partition pruning, and optionally rewrites local-time filters onto the raw
+UTC columns in the rendered copies the runner executes.
+"""
+
+import argparse
+import os
+import sys
+
+import yaml
+
+from experiment_runner.experiment_config import load_experiment_config
+from experiment_runner.sql_analyzer import SQLGLOT_AVAILABLE, analyze_experiment, print_report
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Partition-pruning analyzer for rendered experiment SQL')
+    parser.add_argument('--experiment', action='append', dest='experiments',
+                        help='Experiment key from manual_experiments.yaml (repeatable, default: all active)')
+    parser.add_argument('--rewrite', action='store_true',
+                        help='Write timezone-filter rewrites back to the rendered queries')
+    parser.add_argument('--explain', action='store_true',
+                        help='Compare EXPLAIN partition counts before and after the rewrite (needs Snowflake)')
+    args = parser.parse_args(argv)
+
+    if not SQLGLOT_AVAILABLE:
+        print("❌ sqlglot is not installed (pip install sqlglot)")
+        return 1
+
+    experiment_keys = args.experiments
+    if not experiment_keys:
+        yaml_path = os.path.join(os.path.dirname(__file__), 'data_models', 'manual_experiments.yaml')
+        with open(yaml_path, 'r') as f:
+            experiments = yaml.safe_load(f)['experiments']
+        experiment_keys = [k for k, v in experiments.items() if not v.get('expired', False)]
+
+    rewritten = 0
+    for exp_key in experiment_keys:
+        config = load_experiment_config(exp_key)
+        reports = analyze_experiment(config, rewrite=args.rewrite, explain=args.explain)
+        print_report(config['experiment_name'], reports)
+        rewritten += sum(report.rewrites for report in reports)
+
+    action = 'rewritten' if args.rewrite else 'rewritable (run with --rewrite to apply)'
+    print(f"\n✓ {rewritten} timezone filter(s) {action} across {len(experiment_keys)} experiment(s)")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -34,6 +34,17 @@ SNOWFLAKE_CONFIG = {
 # Database Configuration
 DATABASE_URL = os.getenv('DATABASE_URL')
 
+# Local results mirror read by the bot (see services/results_mirror.py)
+RESULTS_MIRROR_PATH = os.getenv(
+    'RESULTS_MIRROR_PATH', os.path.join(os.path.expanduser('~'), '.nux_slack_bot', 'results_mirror.sqlite')
+)
+RESULTS_MIRROR_MAX_AGE_SECONDS = int(os.getenv('RESULTS_MIRROR_MAX_AGE_SECONDS', '900'))
+
+# Local snapshot of synced Coda tables (see services/coda_sync.py)
+CODA_SNAPSHOT_PATH = os.getenv(
+    'CODA_SNAPSHOT_PATH', os.path.join(os.path.expanduser('~'), '.nux_slack_bot', 'coda_snapshot.sqlite')
+)
+
 # Application Configuration
 ENVIRONMENT = os.getenv('ENVIRONMENT', 'development')
 LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
@@ -198,6 +198,13 @@ def main():
             
         logger.info("Combined experiment metrics table creation completed successfully!")
         
+        # Pull the new rows into the bot's local mirror (incremental, so this is cheap)
+        try:
+            from services.results_mirror import ResultsMirror
+            ResultsMirror().sync()
+        except Exception as e:
+            logger.warning(f"Could not refresh the local results mirror: {e}")
+        
     except Exception as e:
         logger.error(f"Error creating combined experiment metrics table: {e}")
         raise
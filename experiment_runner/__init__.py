@@ -1,15 +1,41 @@
 """Experiment runner modules."""
 
 from . import analysis
+from . import bootstrap
+from . import chart_renderer
 from . import experiment_config
+from . import metric_compiler
 from . import metrics_storage
+from . import power_planner
+from . import preflight
+from . import preview
 from . import query_renderer
+from . import recompute
+from . import result_cache
 from . import results_parser
+from . import selection
+from . import sketches
+from . import sql_analyzer
+from . import sql_stats
+from . import sufficient_stats
 
 __all__ = [
     "analysis",
+    "bootstrap",
+    "chart_renderer",
     "experiment_config", 
+    "metric_compiler",
     "metrics_storage",
+    "power_planner",
+    "preflight",
+    "preview",
     "query_renderer",
+    "recompute",
+    "result_cache",
     "results_parser",
+    "selection",
+    "sketches",
+    "sql_analyzer",
+    "sql_stats",
+    "sufficient_stats",
 ]
\ No newline at end of file
@@ -6,7 +6,12 @@ import numpy as np
 import yaml
 import os
 from scipy import stats
-from .results_parser import ExperimentMetric
+from .results_parser import SUM_METRICS, ExperimentMetric
+from .exact_tests import exact_rate_pvalue
+
+# Rate metrics below these counts use the exact mid-p test instead of the z-test
+EXACT_TEST_MAX_EVENTS = 5  # treatment + control events
+EXACT_TEST_MIN_SAMPLE_SIZE = 10  # smaller arm
 
 class ExperimentAnalysis:
     """Statistical analysis for experiment metrics"""
@@ -78,6 +83,34 @@ class ExperimentAnalysis:
         
         # Calculate statistical power
         self.calculate_statistical_power(metric)
+        
+        # Preview readouts: tests above ran on the sampled units, so their standard errors
+        # already carry the ~1/sqrt(rate) widening; only the reported counts and totals are scaled up
+        if metric.sampling_rate:
+            self._scale_sampled_counts(metric)
+    
+    @staticmethod
+    def _scale_sampled_counts(metric: ExperimentMetric):
+        """
+        Scale sampled numerators, denominators and sample sizes to full-population estimates
+        
+        Totals (SUM_METRICS such as vp and gov) also scale their values, difference and
+        interval; rates and per-unit means are already population estimates.
+        """
+        factor = 1.0 / float(metric.sampling_rate)
+        scaled_fields = ['treatment_numerator', 'treatment_denominator',
+                         'control_numerator', 'control_denominator']
+        if metric.metric_type == 'continuous' and metric.metric_name.lower() in SUM_METRICS:
+            scaled_fields += ['treatment_value', 'control_value', 'absolute_difference',
+                              'confidence_interval_lower', 'confidence_interval_upper']
+        for field_name in scaled_fields:
+            value = getattr(metric, field_name)
+            if value is not None:
+                setattr(metric, field_name, float(value) * factor)
+        for field_name in ('treatment_sample_size', 'control_sample_size'):
+            value = getattr(metric, field_name)
+            if value is not None:
+                setattr(metric, field_name, int(round(float(value) * factor)))
     
     def _calculate_rate_statistics(self, metric: ExperimentMetric):
         """Two-proportion z-test for rate metrics"""
@@ -110,10 +143,9 @@ class ExperimentAnalysis:
             metric.treatment_value = 0.0
             metric.control_value = 0.0
             return
-        elif total_events < 5 or min_sample_size < 10:
-            # Too few events for reliable normal approximation - use more conservative approach
-            # For very low counts, still calculate but be more conservative
-            pass  # Continue with normal calculation but results should be interpreted carefully
+        
+        # Too few events for a reliable normal approximation - use an exact mid-p test instead
+        use_exact_test = total_events < EXACT_TEST_MAX_EVENTS or min_sample_size < EXACT_TEST_MIN_SAMPLE_SIZE
         
         # Calculate proportions
         p1 = x1 / n1
@@ -138,8 +170,11 @@ class ExperimentAnalysis:
             return
         
         # Z-statistic and p-value (two-tailed test)
-        z_stat = (p1 - p2) / se
-        metric.p_value = 2 * (1 - stats.norm.cdf(abs(z_stat)))
+        if use_exact_test:
+            metric.p_value = exact_rate_pvalue(x1, n1, x2, n2, mid_p=True)
+        else:
+            z_stat = (p1 - p2) / se
+            metric.p_value = 2 * (1 - stats.norm.cdf(abs(z_stat)))
         
         # 95% Confidence interval for difference in proportions
         se_diff = np.sqrt(p1*(1-p1)/n1 + p2*(1-p2)/n2)
@@ -150,6 +185,11 @@ class ExperimentAnalysis:
     def _calculate_continuous_statistics(self, metric: ExperimentMetric):
         """Two-sample t-test for continuous metrics"""
         
+        # Ratio metrics with unit-level moments get delta-method variances
+        if metric.treatment_moments and metric.control_moments:
+            if self._calculate_ratio_statistics(metric):
+                return
+        
         # Ensure we have required data
         if not all([metric.treatment_value, metric.control_value,
                    metric.treatment_std, metric.control_std,
@@ -191,6 +231,73 @@ class ExperimentAnalysis:
         metric.confidence_interval_lower = (mean1 - mean2) - margin
         metric.confidence_interval_upper = (mean1 - mean2) + margin
     
+    @staticmethod
+    def _delta_method_ratio(moments: dict):
+        """
+        Ratio sum_x / sum_y and its delta-method variance from unit-level moments
+        
+        Returns:
+            (ratio, variance of the ratio, number of units) or None if undefined
+        """
+        try:
+            n = float(moments['n'])
+            sum_x, sum_y = float(moments['sum_x']), float(moments['sum_y'])
+            sum_xx, sum_yy, sum_xy = float(moments['sum_xx']), float(moments['sum_yy']), float(moments['sum_xy'])
+        except (KeyError, ValueError, TypeError):
+            return None
+        
+        if n < 2 or sum_y == 0:
+            return None
+        
+        mean_x = sum_x / n
+        mean_y = sum_y / n
+        var_x = (sum_xx - n * mean_x ** 2) / (n - 1)
+        var_y = (sum_yy - n * mean_y ** 2) / (n - 1)
+        cov_xy = (sum_xy - n * mean_x * mean_y) / (n - 1)
+        
+        ratio = sum_x / sum_y
+        variance = (var_x - 2 * ratio * cov_xy + ratio ** 2 * var_y) / (n * mean_y ** 2)
+        return ratio, max(variance, 0.0), n
+    
+    def _calculate_ratio_statistics(self, metric: ExperimentMetric) -> bool:
+        """Welch-style test for ratio metrics using delta-method variances"""
+        
+        treatment = self._delta_method_ratio(metric.treatment_moments)
+        control = self._delta_method_ratio(metric.control_moments)
+        if treatment is None or control is None:
+            return False
+        
+        ratio1, var1, n1 = treatment
+        ratio2, var2, n2 = control
+        
+        # Store unit-level equivalents so std / sqrt(n) is the standard error of the ratio
+        metric.treatment_std = np.sqrt(var1 * n1)
+        metric.treatment_sample_size = int(n1)
+        metric.control_std = np.sqrt(var2 * n2)
+        metric.control_sample_size = int(n2)
+        if metric.treatment_value is None:
+            metric.treatment_value = ratio1
+        if metric.control_value is None:
+            metric.control_value = ratio2
+        
+        diff = ratio1 - ratio2
+        se = np.sqrt(var1 + var2)
+        
+        if se == 0:
+            metric.p_value = 1.0 if diff == 0 else 0.0
+            metric.confidence_interval_lower = diff
+            metric.confidence_interval_upper = diff
+            return True
+        
+        t_stat = diff / se
+        df = (var1 + var2) ** 2 / (var1 ** 2 / (n1 - 1) + var2 ** 2 / (n2 - 1))
+        
+        metric.p_value = 2 * (1 - stats.t.cdf(abs(t_stat), df))
+        margin = stats.t.ppf(0.975, df) * se
+        metric.confidence_interval_lower = diff - margin
+        metric.confidence_interval_upper = diff + margin
+        return True
+    
     def apply_statsig_classification(self, metric: ExperimentMetric):
         """Apply Curie-style statistical significance classification"""
         
@@ -386,3 +493,34 @@ class ExperimentAnalysis:
             
         except (ValueError, TypeError, ZeroDivisionError):
             return None
+
+def test_scale_sampled_sum_metric():
+    """Preview vp totals scale to population estimates; per-device means and rates do not"""
+    common = dict(experiment_name='preview_test', start_date='2025-09-01', end_date='2025-09-30',
+                  granularity='device_id', template_name='onboarding_topline', treatment_arm='treatment',
+                  sampling_rate=0.05)
+    vp = ExperimentMetric(metric_name='vp', metric_type='continuous', treatment_value=5_250.0, control_value=5_000.0,
+                          treatment_std=12.0, control_std=11.5, treatment_sample_size=600, control_sample_size=580,
+                          **common)
+    vp_per_device = ExperimentMetric(metric_name='vp_per_device', metric_type='continuous', treatment_value=1.05,
+                                     control_value=1.0, treatment_std=12.0, control_std=11.5,
+                                     treatment_sample_size=600, control_sample_size=580, **common)
+    order_rate = ExperimentMetric(metric_name='order_rate', metric_type='rate', treatment_numerator=520,
+                                  treatment_denominator=5_000, control_numerator=480, control_denominator=5_000,
+                                  **common)
+
+    analyzer = ExperimentAnalysis()
+    for metric in (vp, vp_per_device, order_rate):
+        analyzer.calculate_statistics(metric)
+
+    assert vp.treatment_value == 105_000.0 and vp.control_value == 100_000.0
+    assert abs(vp.absolute_difference - 5_000.0) < 1e-6
+    assert vp.confidence_interval_lower < 5_000.0 < vp.confidence_interval_upper
+    assert vp.treatment_sample_size == 12_000
+    assert vp_per_device.treatment_value == 1.05 and abs(vp_per_device.absolute_difference - 0.05) < 1e-12
+    assert abs(order_rate.treatment_value - 0.104) < 1e-12 and order_rate.treatment_denominator == 100_000.0
+    print(f"✓ Preview vp total scaled to {vp.treatment_value:,.0f} (diff {vp.absolute_difference:,.0f}); "
+          f"vp_per_device and order_rate left as sampled estimates")
+
+if __name__ == "__main__":
+    test_scale_sampled_sum_metric()
@@ -0,0 +1,291 @@
+"""
+Chart Renderer - Lift/CI forest plots and lift-over-time charts from
+experiment_metrics_results rows, rendered in a process pool and cached under a
+hash of the plotted data so unchanged charts are never redrawn
+"""
+
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Tuple
+
+try:
+    import matplotlib
+    matplotlib.use('Agg')
+    MATPLOTLIB_AVAILABLE = True
+except ImportError:
+    MATPLOTLIB_AVAILABLE = False
+
+CHART_DIR = os.path.join(os.path.dirname(__file__), 'rendered_charts')
+
+# Bump when the drawing code changes so every cached image is redrawn once
+CHART_STYLE_VERSION = 1
+
+FOREST = 'forest'
+TIMESERIES = 'timeseries'
+
+STATSIG_COLORS = {
+    'significant positive': '#1a9850',
+    'significant negative': '#d73027',
+    'directional positive': '#91cf60',
+    'directional negative': '#fc8d59',
+}
+
+@dataclass
+class ChartSpec:
+    """Everything one chart draws; its hash is the cache key"""
+
+    chart_type: str  # 'forest' or 'timeseries'
+    experiment_name: str
+    name: str  # file stem, e.g. 'overall' or 'order_rate_treatment_ios'
+    title: str
+    points: List[dict] = field(default_factory=list)
+
+    @property
+    def content_hash(self) -> str:
+        payload = json.dumps([CHART_STYLE_VERSION, self.chart_type, self.title, self.points],
+                             sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode()).hexdigest()[:16]
+
+    def path(self, output_dir: str = CHART_DIR) -> str:
+        return os.path.join(output_dir, self.experiment_name, f"{self.chart_type}_{self.name}_{self.content_hash}.png")
+
+def _float(value) -> Optional[float]:
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return None if value != value else value
+
+def relative_ci(row: dict) -> Tuple[Optional[float], Optional[float]]:
+    """CI on relative lift: bootstrap bounds when stored, else the difference CI over the control value"""
+    lower, upper = _float(row.get('lift_ci_lower')), _float(row.get('lift_ci_upper'))
+    if lower is not None and upper is not None:
+        return lower, upper
+    control = _float(row.get('control_value'))
+    lower, upper = _float(row.get('confidence_interval_lower')), _float(row.get('confidence_interval_upper'))
+    if not control or lower is None or upper is None:
+        return None, None
+    return lower / control, upper / control
+
+def _scope(row: dict) -> str:
+    return ' / '.join(str(row[k]) for k in ('treatment_arm', 'dimension', 'segments') if row.get(k))
+
+def _is_full(row: dict) -> bool:
+    return (row.get('readout_type') or 'full') == 'full'
+
+def build_forest_specs(rows: Iterable[dict]) -> List[ChartSpec]:
+    """One forest plot per experiment from the latest full readout of each metric"""
+    latest = {}
+    for row in rows:
+        if not _is_full(row) or _float(row.get('lift')) is None:
+            continue
+        key = (row['experiment_name'], row.get('template_name'), row['metric_name'],
+               row.get('treatment_arm'), row.get('dimension'), row.get('segments'))
+        if key not in latest or str(row.get('insert_timestamp')) > str(latest[key].get('insert_timestamp')):
+            latest[key] = row
+
+    by_experiment: Dict[str, List[dict]] = {}
+    for row in sorted(latest.values(), key=lambda r: (r.get('template_rank') or 99, r.get('metric_rank') or 99,
+                                                      r['metric_name'], _scope(r))):
+        lower, upper = relative_ci(row)
+        by_experiment.setdefault(row['experiment_name'], []).append({
+            'label': f"{row['metric_name']} ({_scope(row)})" if _scope(row) else row['metric_name'],
+            'lift': _float(row['lift']), 'lower': lower, 'upper': upper,
+            'statsig': row.get('statsig_string')
+        })
+    return [ChartSpec(FOREST, experiment, 'overall', f"{experiment}: relative lift with 95% CI", points)
+            for experiment, points in by_experiment.items()]
+
+def build_timeseries_specs(rows: Iterable[dict], min_points: int = 2) -> List[ChartSpec]:
+    """One lift-over-time chart per experiment, metric, arm and segment (one point per stored run)"""
+    series: Dict[tuple, Dict[str, dict]] = {}
+    for row in rows:
+        if not _is_full(row) or _float(row.get('lift')) is None or row.get('insert_timestamp') is None:
+            continue
+        key = (row['experiment_name'], row['metric_name'], row.get('treatment_arm'),
+               row.get('dimension'), row.get('segments'))
+        day = str(row['insert_timestamp'])[:10]
+        current = series.setdefault(key, {}).get(day)
+        if current is None or str(row['insert_timestamp']) > str(current['insert_timestamp']):
+            series[key][day] = row  # last run of each day
+
+    specs = []
+    for (experiment, metric, *scope), by_day in series.items():
+        if len(by_day) < min_points:
+            continue
+        points = []
+        for day in sorted(by_day):
+            lower, upper = relative_ci(by_day[day])
+            points.append({'date': day, 'lift': _float(by_day[day]['lift']), 'lower': lower, 'upper': upper})
+        suffix = '_'.join(str(s) for s in scope if s)
+        name = f"{metric}_{suffix}" if suffix else metric
+        specs.append(ChartSpec(TIMESERIES, experiment, name.replace('/', '-'),
+                               f"{experiment}: {metric}{f' ({suffix})' if suffix else ''} lift over time", points))
+    return specs
+
+def render_chart(spec: ChartSpec, path: str) -> Tuple[str, float]:
+    """
+    Draw one chart to a PNG (runs inside a worker process)
+
+    Returns:
+        (chart_type, seconds spent rendering)
+    """
+    import matplotlib.pyplot as plt
+
+    start = time.time()
+    if spec.chart_type == FOREST:
+        fig, ax = plt.subplots(figsize=(8, 0.35 * len(spec.points) + 1.2))
+        for y, point in enumerate(reversed(spec.points)):
+            color = STATSIG_COLORS.get(point['statsig'], '#878787')
+            if point['lower'] is not None and point['upper'] is not None:
+                ax.plot([point['lower'] * 100, point['upper'] * 100], [y, y], color=color, linewidth=2)
+            ax.plot(point['lift'] * 100, y, 'o', color=color)
+        ax.set_yticks(range(len(spec.points)))
+        ax.set_yticklabels([p['label'] for p in reversed(spec.points)], fontsize=8)
+        ax.axvline(0, color='#444444', linewidth=0.8)
+        ax.set_xlabel('Relative lift (%)')
+    else:
+        from datetime import datetime
+        fig, ax = plt.subplots(figsize=(8, 3.5))
+        dates = [datetime.strptime(p['date'], '%Y-%m-%d') for p in spec.points]
+        ax.plot(dates, [p['lift'] * 100 for p in spec.points], marker='o', color='#2166ac')
+        bounded = [(d, p) for d, p in zip(dates, spec.points) if p['lower'] is not None and p['upper'] is not None]
+        if bounded:
+            ax.fill_between([d for d, _ in bounded], [p['lower'] * 100 for _, p in bounded],
+                            [p['upper'] * 100 for _, p in bounded], color='#2166ac', alpha=0.15)
+        ax.axhline(0, color='#444444', linewidth=0.8)
+        ax.set_ylabel('Relative lift (%)')
+        fig.autofmt_xdate()
+    ax.set_title(spec.title, fontsize=10)
+    fig.tight_layout()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fig.savefig(path, dpi=120)
+    plt.close(fig)
+    return spec.chart_type, time.time() - start
+
+@dataclass
+class RenderReport:
+    """Outcome of one render_charts call"""
+
+    paths: Dict[Tuple[str, str, str], str] = field(default_factory=dict)  # (experiment, type, name) -> png
+    rendered: int = 0
+    cached: int = 0
+    failed: Dict[str, str] = field(default_factory=dict)
+    timings: Dict[str, List[float]] = field(default_factory=dict)  # chart_type -> render seconds
+    wall_seconds: float = 0.0
+
+    def timing_stats(self) -> Dict[str, dict]:
+        return {chart_type: {'count': len(times), 'total': sum(times), 'mean': sum(times) / len(times),
+                             'max': max(times)}
+                for chart_type, times in self.timings.items() if times}
+
+def _remove_stale(spec: ChartSpec, keep: str):
+    """Drop earlier renders of the same chart (same name, older data hash)"""
+    directory = os.path.dirname(keep)
+    prefix = f"{spec.chart_type}_{spec.name}_"
+    for filename in os.listdir(directory):
+        stem = filename[len(prefix):-len('.png')] if filename.endswith('.png') else ''
+        if filename.startswith(prefix) and len(stem) == 16 and os.path.join(directory, filename) != keep:
+            os.remove(os.path.join(directory, filename))
+
+def render_charts(specs: List[ChartSpec], output_dir: str = CHART_DIR, max_workers: int = None) -> RenderReport:
+    """
+    Render charts whose data changed since their last render, in parallel
+
+    Args:
+        specs: Charts to produce
+        output_dir: Root of the image cache (one folder per experiment)
+        max_workers: Worker processes (default: CPU count)
+
+    Returns:
+        RenderReport with image paths, cache hits and per-type render timings
+    """
+    start = time.time()
+    report = RenderReport()
+    pending = []
+    for spec in specs:
+        path = spec.path(output_dir)
+        report.paths[(spec.experiment_name, spec.chart_type, spec.name)] = path
+        if os.path.exists(path):
+            report.cached += 1
+        else:
+            pending.append((spec, path))
+
+    if pending and not MATPLOTLIB_AVAILABLE:
+        raise ImportError("matplotlib is required to render charts (pip install matplotlib)")
+
+    if pending:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            futures = {executor.submit(render_chart, spec, path): (spec, path) for spec, path in pending}
+            for future in as_completed(futures):
+                spec, path = futures[future]
+                try:
+                    chart_type, seconds = future.result()
+                    report.timings.setdefault(chart_type, []).append(seconds)
+                    report.rendered += 1
+                    _remove_stale(spec, path)
+                except Exception as e:
+                    report.failed[path] = str(e)
+                    report.paths.pop((spec.experiment_name, spec.chart_type, spec.name), None)
+
+    report.wall_seconds = time.time() - start
+    return report
+
+def print_render_report(report: RenderReport):
+    print(f"   🖼️  Charts: {report.rendered} rendered, {report.cached} cached, {len(report.failed)} failed "
+          f"in {report.wall_seconds:.2f}s")
+    for chart_type, stats in sorted(report.timing_stats().items()):
+        print(f"      {chart_type}: {stats['count']} charts, mean {stats['mean']:.2f}s, max {stats['max']:.2f}s, "
+              f"total {stats['total']:.1f}s")
+    for path, error in report.failed.items():
+        print(f"      ✗ {os.path.basename(path)}: {error}")
+
+def render_experiment_charts(rows: List[dict], output_dir: str = CHART_DIR, max_workers: int = None) -> RenderReport:
+    """Forest plot per experiment plus a lift-over-time chart per metric from result rows"""
+    specs = build_forest_specs(rows) + build_timeseries_specs(rows)
+    report = render_charts(specs, output_dir, max_workers)
+    print_render_report(report)
+    return report
+
+def test_chart_cache_keys():
+    """Check spec building and that the cache key follows the plotted data only"""
+    import tempfile
+
+    def row(day, metric, lift, **extra):
+        return dict({'experiment_name': 'exp', 'template_name': 'onboarding_topline', 'metric_name': metric,
+                     'treatment_arm': 'treatment', 'segments': None, 'lift': lift, 'control_value': 0.1,
+                     'confidence_interval_lower': lift * 0.1 - 0.002, 'confidence_interval_upper': lift * 0.1 + 0.002,
+                     'statsig_string': 'flat', 'insert_timestamp': f'2025-10-{day:02d} 08:00:00'}, **extra)
+
+    rows = [row(1, 'order_rate', 0.010), row(2, 'order_rate', 0.012), row(2, 'mau_rate', 0.02),
+            row(2, 'mau_rate', 0.5, readout_type='preview')]
+    forest = build_forest_specs(rows)
+    series = build_timeseries_specs(rows)
+    assert len(forest) == 1 and [p['lift'] for p in forest[0].points] == [0.02, 0.012]  # latest full rows
+    assert [s.name for s in series] == ['order_rate_treatment']  # mau_rate has one full point
+
+    same = build_forest_specs(list(reversed(rows)))[0]
+    assert same.content_hash == forest[0].content_hash
+    changed = build_forest_specs(rows + [row(3, 'order_rate', 0.013)])[0]
+    assert changed.content_hash != forest[0].content_hash
+
+    # Charts already on disk are served from the cache without a renderer
+    output_dir = tempfile.mkdtemp()
+    for spec in forest + series:
+        os.makedirs(os.path.dirname(spec.path(output_dir)), exist_ok=True)
+        open(spec.path(output_dir), 'wb').close()
+    report = render_charts(forest + series, output_dir)
+    assert report.cached == 2 and report.rendered == 0
+
+    if MATPLOTLIB_AVAILABLE:
+        report = render_charts([changed], output_dir, max_workers=2)
+        assert report.rendered == 1 and not os.path.exists(forest[0].path(output_dir))
+        print_render_report(report)
+    print(f"✓ Chart specs: forest {forest[0].content_hash}, cache hits served without rendering")
+
+if __name__ == "__main__":
+    test_chart_cache_keys()
@@ -0,0 +1,416 @@
+"""
+Metric Compiler - Generate one fused SQL query per experiment from the declarative
+specs in data_models/metric_specs.yaml
+
+Each fact table needed by the requested metrics is scanned once, aggregated per
+exposed unit, then per arm. The result uses a fixed column contract that
+results_parser recognises without name heuristics:
+
+    <metric>, lift_<metric>, <metric>__num, <metric>__den, <metric>__n
+    <metric>__num_sumsq, <metric>__den_sumsq, <metric>__cross   (ratio metrics)
+
+plus control_-prefixed copies of every column.
+"""
+
+import os
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import jinja2
+import yaml
+
+from .metrics_storage import sql_literal
+
+COMPILED_TEMPLATE_NAME = 'compiled'
+UNITS = 'units'  # Denominator meaning "one per exposed unit"
+CUMULATIVE_HORIZON = 'cumulative'  # Horizon label of the full-window readout
+EXCLUDED_TAGS = ('internal_test', 'reserved', 'overridden')
+
+@dataclass(frozen=True)
+class MetricSpec:
+    """One metric as numerator / denominator measures"""
+
+    name: str
+    kind: str  # 'rate' or 'ratio'
+    numerator: str
+    denominator: str  # Measure name or 'units'
+
+def _specs_path() -> str:
+    return os.path.join(os.path.dirname(__file__), '..', 'data_models', 'metric_specs.yaml')
+
+def load_metric_specs(path: str = None) -> dict:
+    """Load and validate metric_specs.yaml"""
+    with open(path or _specs_path(), 'r') as f:
+        specs = yaml.safe_load(f)
+
+    for name, measure in specs['measures'].items():
+        if measure['fact'] not in specs['facts']:
+            raise ValueError(f"Measure '{name}' uses unknown fact '{measure['fact']}'")
+    for name, metric in specs['metrics'].items():
+        if metric['kind'] not in ('rate', 'ratio'):
+            raise ValueError(f"Metric '{name}' has unknown kind '{metric['kind']}'")
+        for role in ('numerator', 'denominator'):
+            measure = metric[role]
+            if measure != UNITS and measure not in specs['measures']:
+                raise ValueError(f"Metric '{name}' {role} uses unknown measure '{measure}'")
+    return specs
+
+def resolve_metrics(specs: dict, metric_names: Iterable[str] = None) -> List[MetricSpec]:
+    """Requested metrics (all when metric_names is empty) in spec order"""
+    wanted = list(metric_names or specs['metrics'].keys())
+    unknown = [name for name in wanted if name not in specs['metrics']]
+    if unknown:
+        raise ValueError(f"Unknown metrics: {', '.join(unknown)}")
+    return [MetricSpec(name, specs['metrics'][name]['kind'], specs['metrics'][name]['numerator'],
+                       specs['metrics'][name]['denominator']) for name in wanted]
+
+def plan_facts(specs: dict, metrics: List[MetricSpec]) -> Dict[str, List[str]]:
+    """
+    Minimal set of fact scans covering the metrics
+
+    Returns:
+        Ordered mapping fact name -> measures computed from it
+    """
+    needed = []
+    for metric in metrics:
+        for measure in (metric.numerator, metric.denominator):
+            if measure != UNITS and measure not in needed:
+                needed.append(measure)
+
+    facts = {}
+    for fact_name in specs['facts']:
+        measures = [m for m in needed if specs['measures'][m]['fact'] == fact_name]
+        if measures:
+            facts[fact_name] = measures
+    return facts
+
+def resolve_horizons(config: dict) -> List[Tuple[str, Optional[int]]]:
+    """
+    (label, days since exposure) readout horizons requested by a config
+
+    horizons: [7, 14, 28] gives fixed windows, horizons: daily gives every day of the
+    experiment (cumulative-by-day). The full-window readout is always included.
+    """
+    requested = config.get('horizons')
+    if not requested:
+        return []
+    if requested == 'daily':
+        from datetime import datetime
+        start = datetime.strptime(str(config['start_date'])[:10], '%Y-%m-%d').date()
+        end = datetime.strptime(str(config['end_date'])[:10], '%Y-%m-%d').date()
+        days = range(1, (end - start).days + 1)
+    else:
+        days = sorted({int(day) for day in requested})
+    return [(f"d{day}", day) for day in days] + [(CUMULATIVE_HORIZON, None)]
+
+def _render(snippet: str, config: dict) -> str:
+    return jinja2.Template(snippet).render(start_date=config['start_date'], end_date=config['end_date']).strip()
+
+def _local_time(column: str) -> str:
+    return f"convert_timezone('UTC','America/Los_Angeles',{column})"
+
+def _exposure_cte(config: dict, unit_spec: dict) -> str:
+    dimensions = ''.join(f"\n        , {expression} AS {name}" for name, expression in unit_spec['dimensions'].items())
+    filters = [f"ee.experiment_name = {sql_literal(config['experiment_name'])}"]
+    if config.get('version') is not None:
+        filters.append(f"ee.experiment_version::INT = {int(config['version'])}")
+    if config.get('segments'):
+        filters.append(f"ee.segment IN ({', '.join(sql_literal(s) for s in config['segments'])})")
+    filters.append(f"ee.tag NOT IN ({', '.join(sql_literal(t) for t in EXCLUDED_TAGS)})")
+    filters.append(f"{_local_time('ee.EXPOSURE_TIME')} BETWEEN '{config['start_date']}' AND '{config['end_date']}'")
+    if config.get('sample_rate'):
+        # Same hash sample as macros/sampling.sql so preview units match across templates
+        filters.append(f"MOD(ABS(HASH(ee.bucket_key)), 10000) < {round(config['sample_rate'] * 10000)}")
+
+    return f"""exposure AS
+(SELECT  ee.tag{dimensions}
+        , {unit_spec['exposure_key']} AS unit_id
+        , MIN({_local_time('ee.EXPOSURE_TIME')}::date) AS day
+FROM proddb.public.fact_dedup_experiment_exposure ee
+WHERE {(chr(10) + 'AND ').join(filters)}
+GROUP BY all
+)"""
+
+def _fact_ctes(fact_name: str, fact: dict, measures: List[str], specs: dict, config: dict,
+               dimension_names: List[str], with_horizons: bool = False) -> str:
+    columns = ''.join(f"\n        , {expression} AS {name}" for name, expression in (fact.get('columns') or {}).items())
+    unit_key = fact['unit_key'][config['bucket_key']]
+    measure_columns = ''.join(
+        f"\n        , {specs['measures'][m]['expression']} AS {m}" for m in measures
+    )
+    group_dimensions = ''.join(f", e.{name}" for name in dimension_names)
+    days_since = "\n        , DATEDIFF('day', e.day, f.day) AS days_since" if with_horizons else ''
+
+    horizon_cte = ''
+    if with_horizons:
+        # Roll per-day unit aggregates up to each horizon (distinct counts are per day, so they add)
+        rollups = ''.join(
+            f"\n        , {specs['measures'][m].get('rollup', 'sum').upper()}(u.{m}) AS {m}" for m in measures
+        )
+        horizon_cte = f"""
+
+, unit_{fact_name}_horizon AS
+(SELECT  u.tag{''.join(f", u.{name}" for name in dimension_names)}
+        , u.unit_id
+        , h.horizon{rollups}
+FROM unit_{fact_name} u
+JOIN horizons h
+    ON h.horizon_days IS NULL OR u.days_since < h.horizon_days
+GROUP BY all
+)"""
+
+    return f"""fact_{fact_name} AS
+(SELECT DISTINCT {unit_key} AS unit_id
+        , {_local_time(fact['time'])}::date AS day{columns}
+FROM {_render(fact['from'], config)}
+WHERE {_local_time(fact['time'])} BETWEEN '{config['start_date']}' AND '{config['end_date']}'
+)
+
+, unit_{fact_name} AS
+(SELECT  e.tag{group_dimensions}
+        , e.unit_id{days_since}{measure_columns}
+FROM exposure e
+JOIN fact_{fact_name} f
+    ON f.unit_id = e.unit_id
+    AND e.day <= f.day
+GROUP BY all
+){horizon_cte}"""
+
+def _denominator(metric: MetricSpec, alias: str) -> str:
+    return f"{alias}.n_units" if metric.denominator == UNITS else f"{alias}.{metric.denominator}"
+
+def _value(metric: MetricSpec, alias: str) -> str:
+    return f"{alias}.{metric.numerator} / NULLIF({_denominator(metric, alias)}, 0)"
+
+def _metric_columns(metric: MetricSpec, alias: str, prefix: str) -> List[str]:
+    """Contract columns for one metric from one arm alias"""
+    numerator = f"{alias}.{metric.numerator}"
+    denominator = _denominator(metric, alias)
+    if metric.denominator == UNITS:
+        denominator_sumsq = denominator
+        cross = numerator
+    else:
+        denominator_sumsq = f"{alias}.{metric.denominator}__sumsq"
+        cross = f"{alias}.{metric.numerator}__x__{metric.denominator}"
+
+    columns = [
+        f"{_value(metric, alias)} AS {prefix}{metric.name}",
+        f"{numerator} AS {prefix}{metric.name}__num",
+        f"{denominator} AS {prefix}{metric.name}__den",
+        f"{alias}.n_units AS {prefix}{metric.name}__n",
+    ]
+    if metric.kind == 'ratio':
+        columns += [
+            f"{alias}.{metric.numerator}__sumsq AS {prefix}{metric.name}__num_sumsq",
+            f"{denominator_sumsq} AS {prefix}{metric.name}__den_sumsq",
+            f"{cross} AS {prefix}{metric.name}__cross",
+        ]
+    return columns
+
+def compile_experiment_query(config: dict, metric_names: Iterable[str] = None, specs: dict = None) -> str:
+    """
+    Fused query computing every requested metric for one experiment
+
+    Args:
+        config: Experiment configuration dictionary
+        metric_names: Metrics from metric_specs.yaml (default: all)
+        specs: Pre-loaded specs (default: load metric_specs.yaml)
+
+    Returns:
+        Rendered SQL string
+    """
+    specs = specs or load_metric_specs()
+    metrics = resolve_metrics(specs, metric_names)
+    facts = plan_facts(specs, metrics)
+    unit_spec = specs['units'][config['bucket_key']]
+    dimension_names = list(unit_spec['dimensions'].keys())
+    measures = [m for fact_measures in facts.values() for m in fact_measures]
+    horizons = resolve_horizons(config)
+
+    ctes = [_exposure_cte(config, unit_spec)]
+    if horizons:
+        values = ', '.join(f"('{label}', {'NULL' if days is None else days})" for label, days in horizons)
+        ctes.append(f"""horizons AS
+(SELECT column1 AS horizon, column2 AS horizon_days
+FROM VALUES {values}
+)""")
+    ctes += [_fact_ctes(name, specs['facts'][name], fact_measures, specs, config, dimension_names, bool(horizons))
+             for name, fact_measures in facts.items()]
+
+    # One row per exposed unit (and horizon) with every measure (0 when the unit has no events)
+    unit_source = 'unit_{fact}_horizon' if horizons else 'unit_{fact}'
+    join_dimensions = ''.join(f" AND u_{{fact}}.{name} = e.{name}" for name in dimension_names)
+    if horizons:
+        join_dimensions += " AND u_{fact}.horizon = h.horizon"
+    unit_joins = ''.join(
+        f"\nLEFT JOIN {unit_source.format(fact=fact)} u_{fact}\n    ON u_{fact}.unit_id = e.unit_id AND u_{fact}.tag = e.tag"
+        + join_dimensions.format(fact=fact)
+        for fact in facts
+    )
+    unit_measures = ''.join(
+        f"\n        , COALESCE(u_{specs['measures'][m]['fact']}.{m}, 0) AS {m}" for m in measures
+    )
+    select_dimensions = ''.join(f"\n        , e.{name}" for name in dimension_names)
+    horizon_join = ''
+    if horizons:
+        # Only units whose horizon window has fully elapsed by end_date
+        select_dimensions += "\n        , h.horizon"
+        horizon_join = (f"\nJOIN horizons h\n    ON h.horizon_days IS NULL"
+                        f"\n    OR e.day <= DATEADD('day', -h.horizon_days, '{config['end_date']}'::date)")
+    ctes.append(f"""units AS
+(SELECT  e.tag{select_dimensions}
+        , e.unit_id{unit_measures}
+FROM exposure e{horizon_join}{unit_joins}
+)""")
+    group_names = dimension_names + (['horizon'] if horizons else [])
+
+    # Arm-level sums, sums of squares and the cross products ratio metrics need
+    arm_columns = ["COUNT(*) AS n_units"]
+    for m in measures:
+        arm_columns += [f"SUM({m}) AS {m}", f"SUM({m} * {m}) AS {m}__sumsq"]
+    for metric in metrics:
+        if metric.kind == 'ratio' and metric.denominator != UNITS:
+            arm_columns.append(f"SUM({metric.numerator} * {metric.denominator}) "
+                               f"AS {metric.numerator}__x__{metric.denominator}")
+    arm_dimensions = ''.join(f", {name}" for name in group_names)
+    ctes.append(f"""arms AS
+(SELECT  tag{arm_dimensions}
+        , {(chr(10) + '        , ').join(arm_columns)}
+FROM units
+GROUP BY all
+)""")
+
+    select_columns = ['r1.tag'] + [f"r1.{name}" for name in group_names]
+    for metric in metrics:
+        select_columns += _metric_columns(metric, 'r1', '')
+        select_columns.append(f"({_value(metric, 'r1')}) / NULLIF({_value(metric, 'r2')}, 0) - 1 AS lift_{metric.name}")
+        select_columns += _metric_columns(metric, 'r2', 'control_')
+
+    join_on = ''.join(f"\n    AND r1.{name} = r2.{name}" for name in group_names)
+    header = (f"-- Compiled from data_models/metric_specs.yaml for {config['experiment_name']}\n"
+              f"-- Metrics: {', '.join(metric.name for metric in metrics)}\n"
+              f"-- Fact scans: {', '.join(facts)}\n")
+    if horizons:
+        header += f"-- Horizons: {', '.join(label for label, _ in horizons)}\n"
+    return f"""{header}WITH {(chr(10) + chr(10) + ', ').join(ctes)}
+
+SELECT {(chr(10) + '        , ').join(select_columns)}
+FROM arms r1
+LEFT JOIN arms r2
+    ON r1.tag != r2.tag
+    AND r2.tag = 'control'{join_on}
+ORDER BY {', '.join(str(i + 1) for i in range(1 + len(group_names)))}"""
+
+def compiled_metric_names(config: dict) -> Optional[List[str]]:
+    """Metrics an experiment asks the compiler for (None when compiled_metrics is not set)"""
+    requested = config.get('compiled_metrics')
+    if not requested:
+        return None
+    return [] if requested is True else list(requested)
+
+# ---------------------------------------------------------------------------
+# Self-checks
+# ---------------------------------------------------------------------------
+
+def _contract_rows(seed: int = 11) -> Tuple[List[dict], Dict[str, dict]]:
+    """Arm rows following the column contract, built from simulated unit data"""
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    units = {}
+    for tag in ('control', 'treatment'):
+        n = 5000
+        orders = rng.poisson(0.4 if tag == 'control' else 0.43, n).astype(float)
+        gov = orders * rng.lognormal(3.0, 0.7, n)
+        units[tag] = {'orders': orders, 'gov': gov}
+
+    specs = {'metrics': {
+        'order_rate': {'kind': 'rate', 'numerator': 'orders', 'denominator': UNITS},
+        'gov_per_device': {'kind': 'ratio', 'numerator': 'gov', 'denominator': UNITS},
+        'gov_per_order': {'kind': 'ratio', 'numerator': 'gov', 'denominator': 'orders'},
+    }}
+    arms = {}
+    for tag, data in units.items():
+        arm = {'n_units': len(data['orders'])}
+        for m, values in data.items():
+            arm[m] = values.sum()
+            arm[f"{m}__sumsq"] = (values ** 2).sum()
+        arm['gov__x__orders'] = (data['gov'] * data['orders']).sum()
+        arms[tag] = arm
+
+    rows = []
+    for tag in ('treatment', 'control'):
+        row = {'tag': tag}
+        for prefix, arm in (('', arms[tag]), ('control_', arms['control'])):
+            for name, metric in specs['metrics'].items():
+                num = arm[metric['numerator']]
+                if metric['denominator'] == UNITS:
+                    den = den_sumsq = arm['n_units']
+                    cross = num
+                else:
+                    den = arm[metric['denominator']]
+                    den_sumsq = arm[f"{metric['denominator']}__sumsq"]
+                    cross = arm[f"{metric['numerator']}__x__{metric['denominator']}"]
+                row[f"{prefix}{name}"] = num / den
+                row[f"{prefix}{name}__num"] = num
+                row[f"{prefix}{name}__den"] = den
+                row[f"{prefix}{name}__n"] = arm['n_units']
+                if metric['kind'] == 'ratio':
+                    row[f"{prefix}{name}__num_sumsq"] = arm[f"{metric['numerator']}__sumsq"]
+                    row[f"{prefix}{name}__den_sumsq"] = den_sumsq
+                    row[f"{prefix}{name}__cross"] = cross
+        for name in specs['metrics']:
+            row[f"lift_{name}"] = row[name] / row[f"control_{name}"] - 1
+        rows.append(row)
+    return rows, units
+
+def test_compiled_contract():
+    """Compile queries for both granularities and check the parser reads the contract natively"""
+    import numpy as np
+    from scipy import stats
+
+    from .analysis import ExperimentAnalysis
+    from .results_parser import parse_results
+
+    specs = load_metric_specs()
+    for bucket_key in ('device_id', 'consumer_id'):
+        config = {'experiment_name': 'compiler_check', 'start_date': '2025-09-01', 'end_date': '2025-09-28',
+                  'bucket_key': bucket_key, 'version': 1, 'segments': ['iOS']}
+        query = compile_experiment_query(config, specs=specs)
+        facts = plan_facts(specs, resolve_metrics(specs))
+        for fact in facts:
+            assert query.count(f"FROM {_render(specs['facts'][fact]['from'], config)}") == 1, f"{fact} scanned twice"
+        try:
+            import sqlglot
+            sqlglot.parse_one(query, read='snowflake')
+        except ImportError:
+            pass
+        print(f"✓ {bucket_key}: {len(specs['metrics'])} metrics from {len(facts)} fact scans")
+
+    rows, units = _contract_rows()
+    config = {'experiment_name': 'compiler_check', 'start_date': '2025-09-01', 'end_date': '2025-09-28',
+              'bucket_key': 'device_id'}
+    metrics = {m.metric_name: m for m in parse_results(rows, COMPILED_TEMPLATE_NAME, config)}
+    analysis = ExperimentAnalysis()
+    for metric in metrics.values():
+        analysis.calculate_statistics(metric)
+
+    assert metrics['order_rate'].metric_type == 'rate'
+    assert metrics['order_rate'].treatment_numerator == units['treatment']['orders'].sum()
+    assert metrics['gov_per_device'].metric_type == 'continuous'
+
+    # Per-unit ratio: the delta method reduces to Welch on unit values
+    expected = stats.ttest_ind(units['treatment']['gov'], units['control']['gov'], equal_var=False).pvalue
+    assert abs(metrics['gov_per_device'].p_value - expected) < 1e-9, (metrics['gov_per_device'].p_value, expected)
+    assert metrics['gov_per_order'].p_value is not None
+
+    # Horizon rows become their own dimension, each compared with the same-horizon control
+    horizon_rows = [dict(row, horizon=label) for label in ('d7', CUMULATIVE_HORIZON) for row in rows]
+    horizon_metrics = parse_results(horizon_rows, COMPILED_TEMPLATE_NAME, config)
+    assert {m.dimension for m in horizon_metrics} == {'d7', CUMULATIVE_HORIZON}
+    assert len(horizon_metrics) == 2 * len(metrics)
+    print(f"✓ Contract parsed: gov_per_device p={metrics['gov_per_device'].p_value:.6f} (scipy {expected:.6f}), "
+          f"gov_per_order p={metrics['gov_per_order'].p_value:.6f}")
+
+if __name__ == "__main__":
+    test_compiled_contract()
@@ -6,6 +6,33 @@ from typing import List
 from datetime import datetime
 from .results_parser import ExperimentMetric
 
+def sql_literal(val) -> str:
+    """Render a Python value as a SQL literal, handling None and NaN values as NULL"""
+    import pandas as pd
+    import numpy as np
+    
+    if val is None or pd.isna(val) or (isinstance(val, float) and np.isnan(val)):
+        return 'NULL'
+    elif isinstance(val, str):
+        # Escape single quotes for SQL
+        escaped_val = val.replace("'", "''")
+        return f"'{escaped_val}'"
+    else:
+        return str(val)
+
+# Columns added after the table was first created, applied with ALTER TABLE
+ADDED_COLUMNS = [
+    ('lift_ci_lower', 'FLOAT'),
+    ('lift_ci_upper', 'FLOAT'),
+    ('readout_type', 'VARCHAR(20)'),
+    ('sampling_rate', 'FLOAT'),
+    ('srm_p_value', 'FLOAT'),
+]
+
+def readout_type(metric: ExperimentMetric) -> str:
+    """'preview' for sampled runs, 'full' otherwise (NULL in older rows means full)"""
+    return 'preview' if metric.sampling_rate else 'full'
+
 def store_metrics(metrics: List[ExperimentMetric]):
     """
     Store a batch of experiment metrics to the experiment_metrics_results table
@@ -27,7 +54,8 @@ def store_metrics(metrics: List[ExperimentMetric]):
         treatment_numerator, treatment_denominator, treatment_value, treatment_sample_size, treatment_std,
         control_numerator, control_denominator, control_value, control_sample_size, control_std,
         lift, absolute_difference, p_value, confidence_interval_lower, confidence_interval_upper,
-        statsig_string, statistical_power, query_execution_timestamp, query_runtime_seconds
+        statsig_string, statistical_power, lift_ci_lower, lift_ci_upper,
+        query_execution_timestamp, query_runtime_seconds, readout_type, sampling_rate, srm_p_value
     )
     VALUES {}
     """
@@ -35,20 +63,7 @@ def store_metrics(metrics: List[ExperimentMetric]):
     # Build values for batch insert
     values = []
     current_timestamp = datetime.now().isoformat()
-    
-    # Handle None and NaN values appropriately for SQL
-    def safe_value(val):
-        import pandas as pd
-        import numpy as np
-        
-        if val is None or pd.isna(val) or (isinstance(val, float) and np.isnan(val)):
-            return 'NULL'
-        elif isinstance(val, str):
-            # Escape single quotes for SQL
-            escaped_val = val.replace("'", "''")
-            return f"'{escaped_val}'"
-        else:
-            return str(val)
+    safe_value = sql_literal
     
     for metric in metrics:
         
@@ -84,8 +99,13 @@ def store_metrics(metrics: List[ExperimentMetric]):
             {safe_value(metric.confidence_interval_upper)},
             {safe_value(metric.statsig_string)},
             {safe_value(metric.statistical_power)},
+            {safe_value(metric.lift_ci_lower)},
+            {safe_value(metric.lift_ci_upper)},
             {safe_value(current_timestamp)},
-            {safe_value(metric.query_runtime_seconds)}
+            {safe_value(metric.query_runtime_seconds)},
+            {safe_value(readout_type(metric))},
+            {safe_value(metric.sampling_rate)},
+            {safe_value(metric.srm_p_value)}
         )"""
         
         values.append(value_tuple)
@@ -170,11 +190,16 @@ def create_metrics_table():
         confidence_interval_upper FLOAT,
         statsig_string VARCHAR(50),
         statistical_power FLOAT,
+        lift_ci_lower FLOAT, -- Bootstrap CI on relative lift
+        lift_ci_upper FLOAT,
         
         -- Execution Metadata
         insert_timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
         query_execution_timestamp TIMESTAMP,
         query_runtime_seconds FLOAT,
+        readout_type VARCHAR(20), -- 'full' or 'preview' (sampled units); NULL in older rows = full
+        sampling_rate FLOAT, -- Preview runs only
+        srm_p_value FLOAT, -- Pre-flight SRM chi-square p-value for the run
         
         -- Note: Using composite primary key without dimension due to SQL constraints
         -- Unique constraint will handle dimension separately
@@ -185,6 +210,11 @@ def create_metrics_table():
     try:
         with SnowflakeHook() as hook:
             hook.query_without_result(create_table_sql)
+            # Tables created before a column was introduced get it added in place
+            for column, column_type in ADDED_COLUMNS:
+                hook.query_without_result(
+                    f"ALTER TABLE proddb.fionafan.experiment_metrics_results ADD COLUMN IF NOT EXISTS {column} {column_type}"
+                )
             # Grant SELECT permissions to PUBLIC for read-only access
             grant_sql = "GRANT SELECT ON TABLE proddb.fionafan.experiment_metrics_results TO ROLE PUBLIC;"
             hook.query_without_result(grant_sql)
@@ -0,0 +1,250 @@
+"""
+Power Planner - Vectorized power curves and minimum detectable effects for
+running experiments, using stored control baselines
+"""
+
+from dataclasses import dataclass
+from datetime import date, datetime
+from typing import Iterable, List, Optional, Sequence
+
+import numpy as np
+from scipy import stats
+
+from .metrics_storage import sql_literal
+
+DEFAULT_EFFECTS = (0.01, 0.02, 0.05, 0.10)  # Relative lifts
+DEFAULT_ALPHA = 0.05
+DEFAULT_POWER = 0.8
+
+@dataclass(frozen=True)
+class Baseline:
+    """Control-arm baseline for one metric of one experiment"""
+
+    experiment_name: str
+    metric_name: str
+    metric_type: str  # 'rate' or 'continuous'
+    treatment_arm: str
+    segments: Optional[str]
+    mean: float
+    variance: float  # Per-unit variance (p(1-p) for rates)
+    sample_size: float  # Current units per arm
+    days_elapsed: int
+
+    @property
+    def daily_units(self) -> float:
+        return self.sample_size / self.days_elapsed if self.days_elapsed > 0 else 0.0
+
+def power_surface(means: np.ndarray, variances: np.ndarray, sample_sizes: np.ndarray,
+                  relative_effects: np.ndarray, alpha: float = DEFAULT_ALPHA) -> np.ndarray:
+    """
+    Two-sided power for every (baseline, sample size, effect) combination
+
+    Uses the normal approximation with equal allocation and the control
+    variance for both arms, matching the z-test in ExperimentAnalysis.
+
+    Args:
+        means: (B,) baseline means
+        variances: (B,) per-unit variances
+        sample_sizes: (N,) units per arm
+        relative_effects: (E,) relative lifts
+        alpha: Two-sided significance level
+
+    Returns:
+        Array of shape (B, N, E)
+    """
+    means = np.asarray(means, dtype=np.float64)[:, None, None]
+    variances = np.asarray(variances, dtype=np.float64)[:, None, None]
+    sample_sizes = np.asarray(sample_sizes, dtype=np.float64)[None, :, None]
+    relative_effects = np.asarray(relative_effects, dtype=np.float64)[None, None, :]
+
+    z_critical = stats.norm.ppf(1 - alpha / 2)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        se = np.sqrt(2 * variances / sample_sizes)
+        shift = np.abs(means * relative_effects) / se
+    power = stats.norm.cdf(shift - z_critical) + stats.norm.cdf(-shift - z_critical)
+    return np.where(np.isfinite(power), power, np.nan)
+
+def mde_surface(means: np.ndarray, variances: np.ndarray, sample_sizes: np.ndarray,
+                alpha: float = DEFAULT_ALPHA, power: float = DEFAULT_POWER) -> np.ndarray:
+    """
+    Relative minimum detectable effect for every (baseline, sample size)
+
+    Returns:
+        Array of shape (B, N)
+    """
+    means = np.asarray(means, dtype=np.float64)[:, None]
+    variances = np.asarray(variances, dtype=np.float64)[:, None]
+    sample_sizes = np.asarray(sample_sizes, dtype=np.float64)[None, :]
+
+    multiplier = stats.norm.ppf(1 - alpha / 2) + stats.norm.ppf(power)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mde = multiplier * np.sqrt(2 * variances / sample_sizes) / np.abs(means)
+    return np.where(np.isfinite(mde), mde, np.nan)
+
+def required_sample_size(means: np.ndarray, variances: np.ndarray, relative_effects: np.ndarray,
+                         alpha: float = DEFAULT_ALPHA, power: float = DEFAULT_POWER) -> np.ndarray:
+    """Units per arm needed to detect each relative effect, shape (B, E)"""
+    means = np.asarray(means, dtype=np.float64)[:, None]
+    variances = np.asarray(variances, dtype=np.float64)[:, None]
+    relative_effects = np.asarray(relative_effects, dtype=np.float64)[None, :]
+
+    multiplier = stats.norm.ppf(1 - alpha / 2) + stats.norm.ppf(power)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        n = 2 * variances * multiplier ** 2 / (means * relative_effects) ** 2
+    return np.where(np.isfinite(n), n, np.nan)
+
+def power_curve(baseline: Baseline, sample_sizes: Sequence[float], relative_effects: Sequence[float],
+                alpha: float = DEFAULT_ALPHA) -> np.ndarray:
+    """Power curve (N x E) for a single baseline"""
+    return power_surface(np.array([baseline.mean]), np.array([baseline.variance]),
+                         np.asarray(sample_sizes, dtype=np.float64),
+                         np.asarray(relative_effects, dtype=np.float64), alpha)[0]
+
+def _days_elapsed(start_date, end_date, today: date = None) -> int:
+    today = today or date.today()
+    start = datetime.strptime(str(start_date)[:10], '%Y-%m-%d').date()
+    end = min(datetime.strptime(str(end_date)[:10], '%Y-%m-%d').date(), today)
+    return max((end - start).days + 1, 0)
+
+def baseline_from_row(row: dict, today: date = None) -> Optional[Baseline]:
+    """Turn a stored experiment_metrics_results row into a Baseline (None if unusable)"""
+    row = {k.lower(): v for k, v in row.items()}
+    try:
+        mean = float(row['control_value'])
+    except (TypeError, ValueError, KeyError):
+        return None
+
+    if row.get('metric_type') == 'rate':
+        sample_size = row.get('control_denominator') or row.get('control_sample_size')
+        variance = mean * (1 - mean)
+    else:
+        sample_size = row.get('control_sample_size')
+        std = row.get('control_std')
+        if std is None:
+            return None
+        variance = float(std) ** 2
+
+    if not sample_size or variance is None or variance <= 0 or mean == 0:
+        return None
+
+    segments = row.get('segments') if isinstance(row.get('segments'), str) else None
+    return Baseline(
+        experiment_name=row['experiment_name'],
+        metric_name=row['metric_name'],
+        metric_type=row.get('metric_type'),
+        treatment_arm=row.get('treatment_arm'),
+        segments=segments,
+        mean=mean,
+        variance=variance,
+        sample_size=float(sample_size),
+        days_elapsed=_days_elapsed(row['start_date'], row['end_date'], today)
+    )
+
+def load_baselines(experiments: Iterable[str] = None, metrics: Iterable[str] = None) -> List[Baseline]:
+    """
+    Latest control baselines per (experiment, template, metric, arm, dimension, segments)
+    from experiment_metrics_results
+    """
+
+    from utils.snowflake_connection import execute_snowflake_query
+
+    filters = ["control_value IS NOT NULL", "COALESCE(readout_type, 'full') = 'full'"]
+    if experiments:
+        filters.append(f"experiment_name IN ({', '.join(sql_literal(e) for e in experiments)})")
+    if metrics:
+        filters.append(f"metric_name IN ({', '.join(sql_literal(m) for m in metrics)})")
+
+    query = f"""
+    SELECT experiment_name, start_date, end_date, metric_name, metric_type, treatment_arm, segments,
+           control_value, control_std, control_sample_size, control_denominator
+    FROM proddb.fionafan.experiment_metrics_results
+    WHERE {' AND '.join(filters)}
+    QUALIFY ROW_NUMBER() OVER (
+        PARTITION BY experiment_name, template_name, metric_name, treatment_arm, dimension, segments
+        ORDER BY insert_timestamp DESC
+    ) = 1
+    """
+    baselines = []
+    for row in execute_snowflake_query(query, method='pandas') or []:
+        baseline = baseline_from_row(row)
+        if baseline is not None:
+            baselines.append(baseline)
+    return baselines
+
+def plan(baselines: List[Baseline], relative_effects: Sequence[float] = DEFAULT_EFFECTS,
+         alpha: float = DEFAULT_ALPHA, power: float = DEFAULT_POWER):
+    """
+    Current power, current MDE and additional days needed for every baseline in one pass
+
+    Returns:
+        DataFrame with one row per baseline
+    """
+
+    import pandas as pd
+
+    if not baselines:
+        return pd.DataFrame()
+
+    means = np.array([b.mean for b in baselines])
+    variances = np.array([b.variance for b in baselines])
+    current_n = np.array([b.sample_size for b in baselines])
+    daily_units = np.array([b.daily_units for b in baselines])
+    days_elapsed = np.array([b.days_elapsed for b in baselines])
+    effects = np.asarray(relative_effects, dtype=np.float64)
+
+    # Each baseline evaluated at its own current sample size
+    z_critical = stats.norm.ppf(1 - alpha / 2)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        current_se = np.sqrt(2 * variances / current_n)
+        shift = np.abs(means[:, None] * effects[None, :]) / current_se[:, None]
+        current_mde = (z_critical + stats.norm.ppf(power)) * current_se / np.abs(means)
+    current_power = stats.norm.cdf(shift - z_critical) + stats.norm.cdf(-shift - z_critical)
+
+    needed_n = required_sample_size(means, variances, effects, alpha, power)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        total_days = np.ceil(needed_n / daily_units[:, None])
+    extra_days = np.maximum(total_days - days_elapsed[:, None], 0)
+
+    frame = pd.DataFrame({
+        'experiment_name': [b.experiment_name for b in baselines],
+        'metric_name': [b.metric_name for b in baselines],
+        'treatment_arm': [b.treatment_arm for b in baselines],
+        'segments': [b.segments for b in baselines],
+        'baseline': means,
+        'units_per_arm': current_n,
+        'days_elapsed': days_elapsed,
+        'current_mde': current_mde
+    })
+    for i, effect in enumerate(effects):
+        label = f"{effect * 100:g}pct"
+        frame[f"power_at_{label}"] = current_power[:, i]
+        frame[f"extra_days_for_{label}"] = extra_days[:, i]
+    return frame
+
+def test_against_analysis():
+    """Cross-check the vectorized surface against a scalar normal-approximation power"""
+    means = np.array([0.05, 0.2, 35.0])
+    variances = np.array([0.05 * 0.95, 0.2 * 0.8, 40.0 ** 2])
+    sizes = np.array([1_000, 10_000, 100_000])
+    effects = np.array([0.02, 0.05])
+
+    surface = power_surface(means, variances, sizes, effects)
+    for b in range(len(means)):
+        for n_index, n in enumerate(sizes):
+            for e_index, effect in enumerate(effects):
+                se = np.sqrt(2 * variances[b] / n)
+                z = abs(means[b] * effect) / se
+                expected = stats.norm.cdf(z - 1.959963984540054) + stats.norm.cdf(-z - 1.959963984540054)
+                assert abs(surface[b, n_index, e_index] - expected) < 1e-9
+
+    # MDE at the required sample size should equal the target effect
+    needed = required_sample_size(means, variances, effects)
+    for b in range(len(means)):
+        for e_index, effect in enumerate(effects):
+            mde = mde_surface(means[b:b + 1], variances[b:b + 1], needed[b:b + 1, e_index])[0, 0]
+            assert abs(mde - effect) < 1e-9
+
+    print(f"✓ Power surface {surface.shape} and MDE/sample-size inverses agree")
+
+if __name__ == "__main__":
+    test_against_analysis()
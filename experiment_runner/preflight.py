@@ -0,0 +1,304 @@
+"""
+Pre-flight - One cheap exposure probe for all experiments before the heavy templates run:
+skip experiments with no exposures, defer closed windows whose exposures haven't changed
+since the last successful run, and flag sample-ratio mismatch (SRM)
+
+A probe is only stored once its experiment's templates have all succeeded and the
+metrics are stored, so a failed or interrupted run is retried rather than deferred.
+"""
+
+import os
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from typing import Dict, Iterable, List, Optional
+
+from scipy import stats
+
+from .experiment_config import get_templates_for_experiment
+from .metrics_storage import sql_literal
+from .query_renderer import render_batch_template
+
+PREFLIGHT_TABLE = "proddb.fionafan.experiment_preflight_results"
+
+PROBE_TEMPLATE = os.path.join(os.path.dirname(__file__), '..', 'sql_scripts', 'preflight', 'exposure_probe.sql')
+
+# Chi-square p-value below which the arm split is treated as broken
+SRM_ALPHA = 0.001
+
+RUN = 'run'
+SKIP_EMPTY = 'skip_empty'
+DEFER_UNCHANGED = 'defer_unchanged'
+FLAG_SRM = 'flag_srm'
+
+@dataclass
+class PreflightResult:
+    """Exposure probe outcome and gating decision for one experiment"""
+
+    experiment_name: str
+    version: Optional[int]
+    arm_counts: Dict[str, int] = field(default_factory=dict)
+    max_exposure_time: Optional[datetime] = None
+    srm_chi2: Optional[float] = None
+    srm_p_value: Optional[float] = None
+    decision: str = RUN
+    reason: str = ''
+    probed: bool = True  # False for experiments whose templates don't read the probed table
+
+    @property
+    def should_run(self) -> bool:
+        return self.decision in (RUN, FLAG_SRM)
+
+def srm_test(arm_counts: Dict[str, int], expected_split: Dict[str, float] = None):
+    """
+    Chi-square goodness-of-fit of the observed arm sizes against the intended split
+
+    Args:
+        arm_counts: tag -> exposed units
+        expected_split: tag -> weight (normalized); equal weights when omitted
+
+    Returns:
+        (chi2, p_value), or (None, None) with fewer than two arms
+    """
+    arms = sorted(arm_counts)
+    if len(arms) < 2:
+        return None, None
+    weights = [float((expected_split or {}).get(arm, 1.0)) for arm in arms]
+    observed = [arm_counts[arm] for arm in arms]
+    total = sum(observed)
+    expected = [total * w / sum(weights) for w in weights]
+    chi2, p_value = stats.chisquare(observed, expected)
+    return float(chi2), float(p_value)
+
+def reads_exposure_table(config: dict) -> bool:
+    """Whether the experiment's templates read fact_dedup_experiment_exposure (the table probed)"""
+    for template_info in get_templates_for_experiment(config):
+        with open(template_info['path'], 'r') as f:
+            if 'fact_dedup_experiment_exposure' in f.read():
+                return True
+    return False
+
+def _to_date(value) -> Optional[date]:
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return datetime.strptime(str(value)[:10], '%Y-%m-%d').date()
+
+def decide(result: PreflightResult, config: dict, previous: Optional[dict]) -> PreflightResult:
+    """
+    Gate one experiment
+
+    Exposures alone don't settle staleness: orders keep accruing for already-exposed
+    units until end_date. An unchanged probe is only deferred when the previous
+    successful run (the only kind whose probe is stored) already happened after the
+    window closed, so nothing inside it could have moved.
+    """
+    if not result.arm_counts or sum(result.arm_counts.values()) == 0:
+        result.decision = SKIP_EMPTY
+        result.reason = f"no exposures between {config['start_date']} and {config['end_date']}"
+        return result
+
+    result.srm_chi2, result.srm_p_value = srm_test(result.arm_counts, config.get('expected_split'))
+
+    if (previous is not None and previous['arm_counts'] == result.arm_counts
+            and previous['max_exposure_time'] == result.max_exposure_time
+            and _to_date(previous['run_timestamp']) > _to_date(config['end_date'])):
+        result.decision = DEFER_UNCHANGED
+        result.reason = f"exposures unchanged since {previous['run_timestamp']} and window closed"
+    elif result.srm_p_value is not None and result.srm_p_value < SRM_ALPHA:
+        result.decision = FLAG_SRM
+        result.reason = f"sample ratio mismatch (chi2={result.srm_chi2:.1f}, p={result.srm_p_value:.2e})"
+    return result
+
+def create_preflight_table():
+    """
+    Create the experiment_preflight_results table if it doesn't exist
+    """
+
+    from utils.snowflake_connection import SnowflakeHook
+
+    create_table_sql = f"""
+    CREATE TABLE IF NOT EXISTS {PREFLIGHT_TABLE} (
+        experiment_name VARCHAR(255),
+        version INT,
+        tag VARCHAR(50), -- one row per arm
+        exposures INT,
+        max_exposure_time TIMESTAMP,
+        srm_chi2 FLOAT,
+        srm_p_value FLOAT,
+        decision VARCHAR(20), -- 'run', 'skip_empty', 'defer_unchanged' or 'flag_srm'
+        run_timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """
+
+    try:
+        with SnowflakeHook() as hook:
+            hook.query_without_result(create_table_sql)
+            hook.query_without_result(f"GRANT SELECT ON TABLE {PREFLIGHT_TABLE} TO ROLE PUBLIC;")
+        print("✓ Created/verified experiment_preflight_results table with PUBLIC read access")
+    except Exception as e:
+        print(f"✗ Error creating preflight table: {e}")
+        raise
+
+def load_previous_probes(experiment_names: List[str]) -> Dict[str, dict]:
+    """Arm counts and max exposure time of each experiment's latest stored probe"""
+
+    from utils.snowflake_connection import execute_snowflake_query
+
+    query = f"""
+    SELECT experiment_name, tag, exposures, max_exposure_time, run_timestamp
+    FROM {PREFLIGHT_TABLE}
+    WHERE experiment_name IN ({', '.join(sql_literal(name) for name in experiment_names)})
+    QUALIFY run_timestamp = MAX(run_timestamp) OVER (PARTITION BY experiment_name)
+    """
+    previous = {}
+    for row in execute_snowflake_query(query, method='pandas') or []:
+        probe = previous.setdefault(row['experiment_name'], {
+            'arm_counts': {}, 'max_exposure_time': None, 'run_timestamp': row['run_timestamp']
+        })
+        if row['tag'] is not None:
+            probe['arm_counts'][row['tag']] = int(row['exposures'])
+        probe['max_exposure_time'] = max(
+            filter(None, [probe['max_exposure_time'], row['max_exposure_time']]), default=None
+        )
+    return previous
+
+def store_preflight(results: List[PreflightResult]):
+    """Insert one row per arm (or one empty row) for each probed experiment"""
+
+    if not results:
+        return
+
+    from utils.snowflake_connection import SnowflakeHook
+
+    values = []
+    for result in results:
+        common = (sql_literal(result.experiment_name), sql_literal(result.version))
+        tail = (sql_literal(result.srm_chi2), sql_literal(result.srm_p_value), sql_literal(result.decision))
+        max_time = sql_literal(str(result.max_exposure_time) if result.max_exposure_time is not None else None)
+        arms = sorted(result.arm_counts.items()) or [(None, None)]
+        for tag, exposures in arms:
+            values.append(f"({', '.join(common)}, {sql_literal(tag)}, {sql_literal(exposures)}, "
+                          f"{max_time}, {', '.join(tail)})")
+
+    with SnowflakeHook() as hook:
+        hook.query_without_result(f"""
+        INSERT INTO {PREFLIGHT_TABLE} (
+            experiment_name, version, tag, exposures, max_exposure_time, srm_chi2, srm_p_value, decision
+        )
+        VALUES {','.join(values)}
+        """)
+
+def record_completed_runs(results: Dict[str, PreflightResult], completed: Iterable[str]):
+    """
+    Store the probes of experiments that ran every template successfully
+
+    Args:
+        results: run_preflight output
+        completed: exp_keys whose results were computed and stored
+    """
+    store_preflight([results[k] for k in completed
+                     if k in results and results[k].probed and results[k].should_run])
+
+def run_preflight(configs: Dict[str, dict], store: bool = False) -> Dict[str, PreflightResult]:
+    """
+    Probe every experiment's exposures in one query and decide which ones to run
+
+    Experiments whose templates don't read the probed exposure table always run.
+
+    Args:
+        configs: exp_key -> experiment configuration
+        store: Persist the probes right away; callers that go on to run the templates
+            leave this off and call record_completed_runs once the results are stored
+
+    Returns:
+        exp_key -> PreflightResult
+    """
+    from utils.snowflake_connection import execute_snowflake_query
+
+    probed = {k: c for k, c in configs.items() if reads_exposure_table(c)}
+    results = {k: PreflightResult(c['experiment_name'], c.get('version'), reason='not probed', probed=False)
+               for k, c in configs.items() if k not in probed}
+    if not probed:
+        return results
+
+    rows = execute_snowflake_query(render_batch_template(PROBE_TEMPLATE, list(probed.values())), method='pandas')
+    by_experiment = {}
+    for row in rows or []:
+        by_experiment.setdefault(row['experiment_name'], []).append(row)
+
+    previous = {}
+    try:
+        previous = load_previous_probes([c['experiment_name'] for c in probed.values()])
+    except Exception as e:
+        print(f"   ⚠️  No previous probes available ({e}); staleness check skipped")
+
+    for exp_key, config in probed.items():
+        arm_rows = by_experiment.get(config['experiment_name'], [])
+        result = PreflightResult(
+            experiment_name=config['experiment_name'],
+            version=config.get('version'),
+            arm_counts={row['tag']: int(row['exposures']) for row in arm_rows},
+            max_exposure_time=max((row['max_exposure_time'] for row in arm_rows), default=None)
+        )
+        results[exp_key] = decide(result, config, previous.get(config['experiment_name']))
+
+    if store:
+        try:
+            store_preflight([results[k] for k in probed])
+        except Exception as e:
+            print(f"   ⚠️  Could not store preflight results: {e}")
+    return results
+
+def print_preflight(results: Dict[str, PreflightResult]):
+    icons = {RUN: '✅', SKIP_EMPTY: '⏭️ ', DEFER_UNCHANGED: '💤', FLAG_SRM: '🚩'}
+    for exp_key, result in results.items():
+        arms = ', '.join(f"{tag}={count:,}" for tag, count in sorted(result.arm_counts.items()))
+        srm = f" | SRM p={result.srm_p_value:.3g}" if result.srm_p_value is not None else ''
+        detail = f" - {result.reason}" if result.reason else ''
+        print(f"   {icons[result.decision]} {exp_key}: {arms or 'no arms'}{srm}{detail}")
+
+def test_preflight_decisions():
+    """Check the gating rules on synthetic probes"""
+    config = {'experiment_name': 'exp', 'start_date': '2025-09-01', 'end_date': '2025-09-30'}
+    last_seen = datetime(2025, 9, 20, 12, 0)
+
+    empty = decide(PreflightResult('exp', 1), config, None)
+    assert empty.decision == SKIP_EMPTY and not empty.should_run
+
+    balanced = decide(PreflightResult('exp', 1, {'control': 50_120, 'treatment': 49_880}, last_seen), config, None)
+    assert balanced.decision == RUN and balanced.srm_p_value > 0.4
+
+    skewed = decide(PreflightResult('exp', 1, {'control': 50_800, 'treatment': 49_200}, last_seen), config, None)
+    assert skewed.decision == FLAG_SRM and skewed.should_run
+
+    weighted = dict(config, expected_split={'control': 1, 'treatment': 3})
+    uneven = decide(PreflightResult('exp', 1, {'control': 25_050, 'treatment': 74_950}, last_seen), weighted, None)
+    assert uneven.decision == RUN
+
+    previous = {'arm_counts': {'control': 50_120, 'treatment': 49_880}, 'max_exposure_time': last_seen}
+    still_open = decide(PreflightResult('exp', 1, dict(previous['arm_counts']), last_seen), config,
+                        dict(previous, run_timestamp=datetime(2025, 9, 25, 8, 0)))
+    assert still_open.decision == RUN  # orders can still accrue inside the window
+    closed = decide(PreflightResult('exp', 1, dict(previous['arm_counts']), last_seen), config,
+                    dict(previous, run_timestamp=datetime(2025, 10, 2, 8, 0)))
+    assert closed.decision == DEFER_UNCHANGED and not closed.should_run
+
+    # Only experiments that finished get their probe stored; a failed run is retried next time
+    stored = []
+    global store_preflight
+    original, store_preflight = store_preflight, stored.extend
+    try:
+        results = {'ok': balanced, 'failed': skewed, 'deferred': closed,
+                   'unprobed': PreflightResult('exp', 1, reason='not probed', probed=False)}
+        record_completed_runs(results, ['ok', 'deferred', 'unprobed'])
+    finally:
+        store_preflight = original
+    assert stored == [balanced]
+    print(f"✓ Preflight gating: empty skipped, SRM flagged (p={skewed.srm_p_value:.1e}), "
+          f"closed unchanged window deferred")
+
+if __name__ == "__main__":
+    test_preflight_decisions()
@@ -0,0 +1,259 @@
+"""
+Preview - Fast interim readouts on a deterministic hash sample of exposed units,
+with an accuracy harness that compares previews against full runs
+"""
+
+import os
+import time
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .experiment_config import get_templates_for_experiment
+from .metric_compiler import COMPILED_TEMPLATE_NAME, compile_experiment_query, compiled_metric_names
+from .metrics_storage import sql_literal
+from .query_renderer import has_manual_override, render_template_file, supports_sampling
+from .results_parser import ExperimentMetric
+
+DEFAULT_SAMPLE_RATE = 0.05
+
+PREVIEW_DIR = os.path.join(os.path.dirname(__file__), 'rendered_queries', '_preview')
+
+# (template_name, metric_name, treatment_arm, dimension, segments)
+MetricKey = Tuple[str, str, str, Optional[str], Optional[str]]
+
+def metric_key(metric: ExperimentMetric) -> MetricKey:
+    segments = metric.segments.lower() if metric.segments else None
+    return (metric.template_name, metric.metric_name, metric.treatment_arm, metric.dimension, segments)
+
+def render_preview(config: dict, sample_rate: float = DEFAULT_SAMPLE_RATE) -> Dict[str, str]:
+    """
+    Render the sampled version of every template that supports it
+
+    Templates without the sampling macro, and hand-edited rendered copies, are
+    skipped: running them in full would defeat the preview.
+
+    Returns:
+        Dictionary mapping template_name -> preview query path
+    """
+    if not 0 < sample_rate < 1:
+        raise ValueError(f"sample_rate must be between 0 and 1, got {sample_rate}")
+
+    experiment_name = config['experiment_name']
+    sampled_config = dict(config, sample_rate=sample_rate)
+    rendered_dir = os.path.join(PREVIEW_DIR, experiment_name)
+    os.makedirs(rendered_dir, exist_ok=True)
+
+    queries = {}
+    skipped = []
+    for template_info in get_templates_for_experiment(config):
+        if not supports_sampling(template_info['path']) or has_manual_override(config, template_info):
+            skipped.append(template_info['name'])
+            continue
+        queries[template_info['name']] = render_template_file(template_info['path'], sampled_config)
+
+    metric_names = compiled_metric_names(config)
+    if metric_names is not None:
+        queries[COMPILED_TEMPLATE_NAME] = compile_experiment_query(sampled_config, metric_names)
+
+    rendered_queries = {}
+    for template_name, query in queries.items():
+        rendered_path = os.path.join(rendered_dir, f"{experiment_name}_{template_name}.sql")
+        with open(rendered_path, 'w') as f:
+            f.write(query)
+        rendered_queries[template_name] = rendered_path
+
+    print(f"      🔬 Rendered {len(rendered_queries)} preview queries on a {sample_rate:.0%} unit sample"
+          f"{f' (skipped {len(skipped)}: ' + ', '.join(skipped) + ')' if skipped else ''}")
+    return rendered_queries
+
+@dataclass
+class Comparison:
+    """Preview vs full readout of one metric"""
+
+    key: MetricKey
+    preview_lift: Optional[float]
+    full_lift: Optional[float]
+    preview_diff_ci: Tuple[Optional[float], Optional[float]]
+    full_diff: Optional[float]
+    preview_statsig: Optional[str]
+    full_statsig: Optional[str]
+
+    @property
+    def lift_error(self) -> Optional[float]:
+        if self.preview_lift is None or self.full_lift is None:
+            return None
+        return abs(self.preview_lift - self.full_lift)
+
+    @property
+    def covered(self) -> Optional[bool]:
+        """Whether the full-run difference falls inside the preview's 95% CI"""
+        lower, upper = self.preview_diff_ci
+        if lower is None or upper is None or self.full_diff is None:
+            return None
+        return lower <= self.full_diff <= upper
+
+    @property
+    def same_direction(self) -> Optional[bool]:
+        if self.preview_lift is None or self.full_lift is None:
+            return None
+        return (self.preview_lift >= 0) == (self.full_lift >= 0)
+
+def compare_readouts(preview: Iterable[ExperimentMetric], full: Iterable[ExperimentMetric]) -> List[Comparison]:
+    """Pair preview and full metrics by (template, metric, arm, dimension, segments)"""
+    full_by_key = {metric_key(m): m for m in full}
+    comparisons = []
+    for metric in preview:
+        reference = full_by_key.get(metric_key(metric))
+        if reference is None:
+            continue
+        comparisons.append(Comparison(
+            key=metric_key(metric),
+            preview_lift=metric.lift,
+            full_lift=reference.lift,
+            preview_diff_ci=(metric.confidence_interval_lower, metric.confidence_interval_upper),
+            full_diff=reference.absolute_difference,
+            preview_statsig=metric.statsig_string,
+            full_statsig=reference.statsig_string
+        ))
+    return comparisons
+
+def summarize_accuracy(comparisons: List[Comparison]) -> dict:
+    """Median lift error, CI coverage of the full estimate, direction and statsig agreement"""
+    import numpy as np
+
+    def rate(values):
+        values = [v for v in values if v is not None]
+        return sum(values) / len(values) if values else None
+
+    errors = [c.lift_error for c in comparisons if c.lift_error is not None]
+    return {
+        'metrics_compared': len(comparisons),
+        'median_abs_lift_error': float(np.median(errors)) if errors else None,
+        'ci_coverage': rate(c.covered for c in comparisons),
+        'direction_agreement': rate(c.same_direction for c in comparisons),
+        'statsig_agreement': rate(c.preview_statsig == c.full_statsig for c in comparisons
+                                  if c.full_statsig is not None)
+    }
+
+def print_accuracy(summary: dict, speedup: Optional[float] = None):
+    def pct(value):
+        return f"{value:.0%}" if value is not None else 'n/a'
+
+    error = summary['median_abs_lift_error']
+    print(f"   🎯 Preview vs full on {summary['metrics_compared']} metrics: "
+          f"median |lift error| {f'{error * 100:.2f}pp' if error is not None else 'n/a'}, "
+          f"CI coverage {pct(summary['ci_coverage'])}, "
+          f"direction agreement {pct(summary['direction_agreement'])}, "
+          f"statsig agreement {pct(summary['statsig_agreement'])}")
+    if speedup is not None:
+        print(f"   ⚡ Preview speedup: {speedup:.1f}x")
+
+def load_full_runtimes(experiment_names: Iterable[str]) -> Dict[Tuple[str, str], float]:
+    """Runtime of the latest full readout per (experiment, template) from experiment_metrics_results"""
+
+    from utils.snowflake_connection import execute_snowflake_query
+
+    query = f"""
+    SELECT experiment_name, template_name, MAX_BY(query_runtime_seconds, insert_timestamp) AS runtime
+    FROM proddb.fionafan.experiment_metrics_results
+    WHERE COALESCE(readout_type, 'full') = 'full'
+    AND query_runtime_seconds IS NOT NULL
+    AND experiment_name IN ({', '.join(sql_literal(name) for name in experiment_names)})
+    GROUP BY 1, 2
+    """
+    results = execute_snowflake_query(query, method='pandas')
+    return {(row['experiment_name'], row['template_name']): float(row['runtime'])
+            for row in (results or [])}
+
+def observed_speedup(preview_runtimes: Dict[Tuple[str, str], float],
+                     full_runtimes: Dict[Tuple[str, str], float]) -> Optional[float]:
+    """Total full runtime over total preview runtime for the templates both have"""
+    shared = [key for key in preview_runtimes if key in full_runtimes and preview_runtimes[key] > 0]
+    if not shared:
+        return None
+    return sum(full_runtimes[k] for k in shared) / sum(preview_runtimes[k] for k in shared)
+
+def run_accuracy_comparison(config: dict, sample_rate: float = DEFAULT_SAMPLE_RATE) -> dict:
+    """
+    Run every sampled template both in full and as a preview, then compare
+
+    Returns:
+        summarize_accuracy() output plus 'speedup' (full over preview wall time)
+    """
+    from utils.snowflake_connection import execute_snowflake_query
+    from .analysis import ExperimentAnalysis
+    from .query_renderer import render_templates_for_experiment
+    from .results_parser import parse_results
+
+    analyzer = ExperimentAnalysis()
+    full_paths = render_templates_for_experiment(config)
+    preview_paths = render_preview(config, sample_rate)
+
+    def run(path, template_name, run_config, rate):
+        with open(path, 'r') as f:
+            query = f.read()
+        start = time.time()
+        results = execute_snowflake_query(query, method='pandas')
+        elapsed = time.time() - start
+        metrics = parse_results(results, template_name, run_config)
+        for metric in metrics:
+            metric.sampling_rate = rate
+            analyzer.calculate_statistics(metric)
+            analyzer.apply_statsig_classification(metric)
+        return metrics, elapsed
+
+    comparisons = []
+    full_time = preview_time = 0.0
+    for template_name, preview_path in preview_paths.items():
+        if template_name not in full_paths:
+            continue
+        preview_metrics, elapsed = run(preview_path, template_name, config, sample_rate)
+        preview_time += elapsed
+        full_metrics, elapsed = run(full_paths[template_name], template_name, config, None)
+        full_time += elapsed
+        comparisons.extend(compare_readouts(preview_metrics, full_metrics))
+        print(f"      ✓ {template_name}: full vs preview compared")
+
+    summary = summarize_accuracy(comparisons)
+    summary['speedup'] = full_time / preview_time if preview_time > 0 else None
+    print_accuracy(summary, summary['speedup'])
+    return summary
+
+def test_sampled_rate_ci_coverage():
+    """Check that preview CIs cover the full-population difference at the nominal rate"""
+    import numpy as np
+    from .analysis import ExperimentAnalysis
+
+    rng = np.random.default_rng(41)
+    analyzer = ExperimentAnalysis()
+    n_treatment, n_control = 400_000, 400_000
+    x_treatment = rng.binomial(n_treatment, 0.105)
+    x_control = rng.binomial(n_control, 0.100)
+    full_diff = x_treatment / n_treatment - x_control / n_control
+
+    rate, replicates, covered, scale_errors = 0.05, 500, 0, []
+    for _ in range(replicates):
+        # A unit hash sample is a without-replacement draw of units from each arm
+        n1, n2 = rng.binomial(n_treatment, rate), rng.binomial(n_control, rate)
+        metric = ExperimentMetric(
+            experiment_name='sim', start_date='2025-01-01', end_date='2025-01-31',
+            granularity='device_id', template_name='onboarding_topline', metric_name='order_rate',
+            treatment_arm='treatment', metric_type='rate',
+            treatment_numerator=rng.hypergeometric(x_treatment, n_treatment - x_treatment, n1),
+            treatment_denominator=n1,
+            control_numerator=rng.hypergeometric(x_control, n_control - x_control, n2),
+            control_denominator=n2,
+            sampling_rate=rate
+        )
+        analyzer.calculate_statistics(metric)
+        covered += metric.confidence_interval_lower <= full_diff <= metric.confidence_interval_upper
+        scale_errors.append(abs(metric.treatment_denominator / n_treatment - 1))
+
+    coverage = covered / replicates
+    assert 0.92 <= coverage <= 0.98, coverage
+    assert max(scale_errors) < 0.05, max(scale_errors)
+    print(f"✓ {rate:.0%} preview CIs cover the full-run difference in {coverage:.1%} of {replicates} samples; "
+          f"scaled denominators within {max(scale_errors):.1%} of full counts")
+
+if __name__ == "__main__":
+    test_sampled_rate_ci_coverage()
@@ -2,14 +2,33 @@
 Query Renderer - Render Jinja2 SQL templates with experiment parameters
 """
 
-import jinja2
+import hashlib
+import json
 import os
+
+import jinja2
+
 from .experiment_config import get_templates_for_experiment
+from .metric_compiler import COMPILED_TEMPLATE_NAME, compile_experiment_query, compiled_metric_names
+
+# Templates can import shared macros (e.g. 'macros/segment_cube.sql') relative to sql_scripts/
+SQL_SCRIPTS_DIR = os.path.join(os.path.dirname(__file__), '..', 'sql_scripts')
+_environment = jinja2.Environment(loader=jinja2.FileSystemLoader(SQL_SCRIPTS_DIR))
+
+# Per-experiment record of what the renderer wrote, to tell stale renders from hand edits
+MANIFEST_FILENAME = '.render_manifest.json'
+# Manifest entry listing rendered files that get the timezone-filter rewrite (analyze_sql.py --rewrite)
+REWRITES_KEY = 'timezone_rewrites'
 
 def render_templates_for_experiment(config: dict) -> dict:
     """
     Render all SQL templates for an experiment with its configuration.
-    Skip rendering files that already exist to preserve manual overrides.
+    
+    Rendered files are refreshed when the configuration (e.g. segment_cube) or
+    the templates/macros change, but files edited by hand are preserved: each
+    file the renderer writes is recorded in a manifest, and a file whose content
+    no longer matches its record is treated as a manual override. Files marked by
+    record_rewrite are re-rendered with the timezone-filter rewrite applied.
     
     Args:
         config: Experiment configuration dictionary
@@ -23,8 +42,9 @@ def render_templates_for_experiment(config: dict) -> dict:
     
     # Create rendered queries directory for this experiment
     experiment_name = config['experiment_name']
-    rendered_dir = os.path.join(os.path.dirname(__file__), 'rendered_queries', experiment_name)
+    rendered_dir = _rendered_dir(experiment_name)
     os.makedirs(rendered_dir, exist_ok=True)
+    manifest = _load_manifest(rendered_dir)
     
     rendered_queries = {}
     skipped_count = 0
@@ -34,37 +54,114 @@ def render_templates_for_experiment(config: dict) -> dict:
         # Determine output path
         rendered_filename = f"{experiment_name}_{template_info['name']}.sql"
         rendered_path = os.path.join(rendered_dir, rendered_filename)
+        rendered_sql = _apply_rewrites(render_template_file(template_info['path'], config), rendered_filename, manifest)
         
-        # Check if file already exists
         if os.path.exists(rendered_path):
-            print(f"      ⏭️  Skipping {template_info['name']} (file exists - preserving manual override)")
-            skipped_count += 1
-        else:
-            # Render the template
-            rendered_sql = render_template_file(template_info['path'], config)
-            
-            # Save rendered query
-            with open(rendered_path, 'w') as f:
-                f.write(rendered_sql)
-            
-            print(f"      ✨ Rendered {template_info['name']}")
-            rendered_count += 1
+            with open(rendered_path, 'r') as f:
+                existing_sql = f.read()
+            if existing_sql == rendered_sql:
+                manifest[rendered_filename] = _content_hash(rendered_sql)
+                rendered_queries[template_info['name']] = rendered_path
+                continue
+            if not _renderer_output(existing_sql, manifest.get(rendered_filename), template_info, config):
+                print(f"      ⏭️  Skipping {template_info['name']} (edited by hand - preserving manual override; "
+                      f"delete the file to re-render)")
+                skipped_count += 1
+                rendered_queries[template_info['name']] = rendered_path
+                continue
+        
+        # Save rendered query
+        with open(rendered_path, 'w') as f:
+            f.write(rendered_sql)
+        manifest[rendered_filename] = _content_hash(rendered_sql)
         
-        # Add to results regardless of whether it was rendered or skipped
+        print(f"      ✨ Rendered {template_info['name']}")
+        rendered_count += 1
         rendered_queries[template_info['name']] = rendered_path
     
+    _save_manifest(rendered_dir, manifest)
+    
+    # Fused query from metric_specs.yaml; regenerated every run so spec changes apply
+    metric_names = compiled_metric_names(config)
+    if metric_names is not None:
+        rendered_filename = f"{experiment_name}_{COMPILED_TEMPLATE_NAME}.sql"
+        rendered_path = os.path.join(rendered_dir, rendered_filename)
+        with open(rendered_path, 'w') as f:
+            f.write(_apply_rewrites(compile_experiment_query(config, metric_names), rendered_filename, manifest))
+        print(f"      🧮 Compiled {len(metric_names) or 'all'} spec metrics into one query")
+        rendered_queries[COMPILED_TEMPLATE_NAME] = rendered_path
+    
     if skipped_count > 0 or rendered_count > 0:
-        print(f"      📊 Summary: {rendered_count} rendered, {skipped_count} skipped (existing files)")
+        print(f"      📊 Summary: {rendered_count} rendered, {skipped_count} skipped (manual overrides)")
         
     return rendered_queries
 
-def render_template_file(template_path: str, config: dict) -> str:
+def _rendered_dir(experiment_name: str) -> str:
+    return os.path.join(os.path.dirname(__file__), 'rendered_queries', experiment_name)
+
+def _content_hash(sql: str) -> str:
+    return hashlib.sha256(sql.encode('utf-8')).hexdigest()
+
+def _load_manifest(rendered_dir: str) -> dict:
+    """Rendered filename -> hash of the content the renderer last wrote"""
+    path = os.path.join(rendered_dir, MANIFEST_FILENAME)
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r') as f:
+        return json.load(f)
+
+def _save_manifest(rendered_dir: str, manifest: dict):
+    with open(os.path.join(rendered_dir, MANIFEST_FILENAME), 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+        f.write('\n')
+
+def _apply_rewrites(rendered_sql: str, rendered_filename: str, manifest: dict) -> str:
+    """Apply the timezone-filter rewrite to a fresh render if the file was marked by record_rewrite"""
+    if rendered_filename not in manifest.get(REWRITES_KEY, []):
+        return rendered_sql
+    from .sql_analyzer import SQLGLOT_AVAILABLE, rewrite_timezone_filters
+    if not SQLGLOT_AVAILABLE:
+        print(f"      ⚠️  sqlglot unavailable; rendering {rendered_filename} without its timezone rewrite")
+        return rendered_sql
+    try:
+        return rewrite_timezone_filters(rendered_sql)[0]
+    except Exception as e:
+        print(f"      ⚠️  Timezone rewrite failed for {rendered_filename}, using the plain render: {e}")
+        return rendered_sql
+
+def record_rewrite(config: dict, template_name: str, rewritten_sql: str):
+    """
+    Save the timezone-filter rewrite of a rendered query and mark it in the manifest
+
+    The file stays renderer output, so later config or template changes still reach
+    it: it is re-rendered and rewritten again rather than kept as a manual override.
+    """
+    experiment_name = config['experiment_name']
+    rendered_dir = _rendered_dir(experiment_name)
+    rendered_filename = f"{experiment_name}_{template_name}.sql"
+    manifest = _load_manifest(rendered_dir)
+    with open(os.path.join(rendered_dir, rendered_filename), 'w') as f:
+        f.write(rewritten_sql)
+    manifest[rendered_filename] = _content_hash(rewritten_sql)
+    manifest[REWRITES_KEY] = sorted(set(manifest.get(REWRITES_KEY, [])) | {rendered_filename})
+    _save_manifest(rendered_dir, manifest)
+
+def _renderer_output(existing_sql: str, recorded_hash: str, template_info: dict, config: dict) -> bool:
+    """Whether a saved file is untouched renderer output (safe to re-render) rather than a hand edit"""
+    if recorded_hash is not None:
+        return _content_hash(existing_sql) == recorded_hash
+    # Rendered before the manifest existed: only a plain render without the segment cube is known to be untouched
+    return bool(config.get('segment_cube')) and existing_sql == render_template_file(
+        template_info['path'], dict(config, segment_cube=False))
+
+def render_template_file(template_path: str, config: dict, extra_params: dict = None) -> str:
     """
     Render a single SQL template file with experiment parameters
     
     Args:
         template_path: Path to the SQL template file
         config: Experiment configuration dictionary
+        extra_params: Additional template variables (e.g. stats_start_date for incremental templates)
     
     Returns:
         Rendered SQL string
@@ -74,7 +171,7 @@ def render_template_file(template_path: str, config: dict) -> str:
         template_content = f.read()
     
     # Create Jinja2 template
-    template = jinja2.Template(template_content)
+    template = _environment.from_string(template_content)
     
     # Render with experiment parameters
     rendered = template.render(
@@ -83,7 +180,121 @@ def render_template_file(template_path: str, config: dict) -> str:
         end_date=config['end_date'],
         version=config.get('version'),  # Optional version
         bucket_key=config['bucket_key'],
-        segments=config.get('segments', [])  # Pass segments array, default to empty list
+        segments=config.get('segments', []),  # Pass segments array, default to empty list
+        segment_cube=config.get('segment_cube', False),  # Overall + per-segment rows in one scan
+        batch_experiments=config.get('batch_experiments'),  # Set by render_batch_template
+        today=today_sql(config),  # Relative-date anchor (MAU / past-28-day windows)
+        sample_rate=config.get('sample_rate'),  # Hash sample of exposed units for preview runs
+        **(extra_params or {})
     )
     
     return rendered
+
+def today_sql(config: dict) -> str:
+    """SQL for "today": current_date, or a date literal when the config pins as_of_date"""
+    as_of_date = config.get('as_of_date')
+    return f"'{as_of_date}'::date" if as_of_date else 'current_date'
+
+def has_manual_override(config: dict, template_info: dict) -> bool:
+    """Whether the saved rendered query was edited by hand (differs from a fresh render and from what the renderer wrote)"""
+    experiment_name = config['experiment_name']
+    rendered_dir = _rendered_dir(experiment_name)
+    rendered_filename = f"{experiment_name}_{template_info['name']}.sql"
+    rendered_path = os.path.join(rendered_dir, rendered_filename)
+    if not os.path.exists(rendered_path):
+        return False
+    with open(rendered_path, 'r') as f:
+        existing_sql = f.read()
+    manifest = _load_manifest(rendered_dir)
+    if existing_sql == _apply_rewrites(render_template_file(template_info['path'], config), rendered_filename, manifest):
+        return False
+    return not _renderer_output(existing_sql, manifest.get(rendered_filename), template_info, config)
+
+def supports_batching(template_path: str) -> bool:
+    """Whether a template imports the batch macros and can run several experiments in one scan"""
+    with open(template_path, 'r') as f:
+        return "macros/batch.sql" in f.read()
+
+def supports_sampling(template_path: str) -> bool:
+    """Whether a template imports the sampling macro and can render a preview"""
+    with open(template_path, 'r') as f:
+        return "macros/sampling.sql" in f.read()
+
+def render_batch_template(template_path: str, configs: list) -> str:
+    """
+    Render one template for several experiments sharing its template and bucket_key
+    
+    Exposure is filtered per experiment (name, version, segments, dates); fact
+    tables are scanned once over the union of the date windows, and result rows
+    carry experiment_name so parse_batch_results can split them back.
+    
+    Args:
+        template_path: Path to a template that imports macros/batch.sql
+        configs: Experiment configuration dictionaries
+    
+    Returns:
+        Rendered SQL string
+    """
+    
+    batch_config = {
+        'experiment_name': ', '.join(config['experiment_name'] for config in configs),
+        'start_date': min(str(config['start_date']) for config in configs),
+        'end_date': max(str(config['end_date']) for config in configs),
+        'version': None,
+        'bucket_key': configs[0]['bucket_key'],
+        'segments': [],
+        'segment_cube': configs[0].get('segment_cube', False),
+        'as_of_date': configs[0].get('as_of_date'),
+        'batch_experiments': [{
+            'experiment_name': config['experiment_name'],
+            'version': config.get('version'),
+            'start_date': config['start_date'],
+            'end_date': config['end_date'],
+            'segments': config.get('segments', [])
+        } for config in configs]
+    }
+    return render_template_file(template_path, batch_config)
+
+def test_rerender_preserves_manual_overrides():
+    """Stale renders are refreshed when segment_cube changes; hand-edited files are kept"""
+    import tempfile
+
+    global _rendered_dir
+    original_rendered_dir = _rendered_dir
+    config = {'experiment_name': 'render_test', 'start_date': '2025-09-01', 'end_date': '2025-09-30',
+              'bucket_key': 'device_id', 'template': 'onboarding', 'segments': ['ios', 'android']}
+    with tempfile.TemporaryDirectory() as tmp:
+        _rendered_dir = lambda experiment_name: os.path.join(tmp, experiment_name)
+        try:
+            paths = render_templates_for_experiment(config)
+            topline, funnel = paths['onboarding_topline'], paths['onboarding_overall_funnel']
+            with open(funnel, 'a') as f:
+                f.write('\n-- tuned by hand\n')
+
+            config['segment_cube'] = True
+            render_templates_for_experiment(config)
+            with open(topline) as f:
+                assert 'GROUPING SETS' in f.read()
+            with open(funnel) as f:
+                funnel_sql = f.read()
+            assert funnel_sql.endswith('-- tuned by hand\n') and 'GROUPING SETS' not in funnel_sql
+            templates = {info['name']: info for info in get_templates_for_experiment(config)}
+            assert has_manual_override(config, templates['onboarding_overall_funnel'])
+            assert not has_manual_override(config, templates['onboarding_topline'])
+
+            # Files rendered before the manifest existed: only a plain render is refreshed
+            manifest_path = os.path.join(tmp, 'render_test', MANIFEST_FILENAME)
+            with open(topline, 'w') as f:
+                f.write(render_template_file(templates['onboarding_topline']['path'], dict(config, segment_cube=False)))
+            os.remove(manifest_path)
+            render_templates_for_experiment(config)
+            with open(topline) as f:
+                assert 'GROUPING SETS' in f.read()
+            with open(funnel) as f:
+                assert f.read() == funnel_sql
+        finally:
+            _rendered_dir = original_rendered_dir
+    print("✓ segment_cube change re-rendered untouched files and kept the hand-edited one")
+
+if __name__ == "__main__":
+    test_rerender_preserves_manual_overrides()
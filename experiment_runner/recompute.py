@@ -0,0 +1,293 @@
+"""
+Recompute - Re-derive statistics and significance labels from the raw arm values
+stored in experiment_metrics_results (or a local snapshot of them), so methodology
+changes apply across history without re-running any template
+"""
+
+import math
+from dataclasses import fields
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .analysis import ExperimentAnalysis
+from .metrics_storage import sql_literal
+from .results_parser import SUM_METRICS, ExperimentMetric, _get_metric_metadata, _load_metrics_metadata
+
+METRICS_TABLE = "proddb.fionafan.experiment_metrics_results"
+
+# Identifies one stored row; insert_timestamp is shared by every row of one store
+ROW_KEY = ('experiment_name', 'version', 'granularity', 'template_name', 'metric_name',
+           'treatment_arm', 'dimension', 'segments', 'insert_timestamp')
+
+# Columns rewritten by a recompute: metadata-driven labels and everything analysis derives
+RECOMPUTED_COLUMNS = ('template_rank', 'metric_rank', 'desired_direction', 'absolute_difference',
+                      'p_value', 'confidence_interval_lower', 'confidence_interval_upper',
+                      'statsig_string', 'statistical_power')
+
+_STAT_COLUMNS = RECOMPUTED_COLUMNS[3:]
+_METRIC_FIELDS = {f.name for f in fields(ExperimentMetric)}
+_SCALED_COUNTS = ('treatment_numerator', 'treatment_denominator', 'control_numerator', 'control_denominator')
+_SCALED_SIZES = ('treatment_sample_size', 'control_sample_size')
+_SCALED_TOTALS = ('treatment_value', 'control_value')  # SUM_METRICS only
+
+def _clean(value):
+    """pandas NaN/NaT -> None, numpy scalars -> Python"""
+    if value is None:
+        return None
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    if hasattr(value, 'item'):
+        value = value.item()
+    try:
+        import pandas as pd
+        if pd.isna(value):
+            return None
+    except (ImportError, TypeError, ValueError):
+        pass
+    return value
+
+def load_stored_rows(experiments: Iterable[str] = None) -> List[dict]:
+    """
+    Stored metric rows, with the raw arm values needed to recompute them
+
+    Args:
+        experiments: Experiment names to load (default: all)
+    """
+
+    from utils.snowflake_connection import execute_snowflake_query
+
+    where = ''
+    if experiments:
+        where = f"WHERE experiment_name IN ({', '.join(sql_literal(e) for e in experiments)})"
+    query = f"SELECT * FROM {METRICS_TABLE} {where}"
+    results = execute_snowflake_query(query, method='pandas')
+    return [{k.lower(): _clean(v) for k, v in row.items()} for row in (results or [])]
+
+def load_snapshot(path: str) -> List[dict]:
+    """Rows from a local snapshot (.parquet, or CSV for anything else)"""
+    import pandas as pd
+
+    frame = pd.read_parquet(path) if path.endswith('.parquet') else pd.read_csv(path)
+    return [{k.lower(): _clean(v) for k, v in row.items()} for row in frame.to_dict('records')]
+
+def save_snapshot(rows: List[dict], path: str):
+    """Write rows to a local snapshot (.parquet, or CSV for anything else)"""
+    import pandas as pd
+
+    frame = pd.DataFrame(rows)
+    if path.endswith('.parquet'):
+        frame.to_parquet(path, index=False)
+    else:
+        frame.to_csv(path, index=False)
+
+def metric_from_row(row: dict) -> ExperimentMetric:
+    """
+    Rebuild the metric a stored row came from, with derived statistics cleared
+
+    Preview rows were stored with counts (and the values of SUM_METRICS totals) scaled
+    up by 1/sampling_rate; they are scaled back to the sampled values the tests
+    originally ran on.
+    """
+    values = {k: v for k, v in row.items() if k in _METRIC_FIELDS}
+    for key in ('start_date', 'end_date'):
+        if values.get(key) is not None:
+            values[key] = str(values[key])[:10]
+    for key in ('version', 'template_rank', 'metric_rank'):
+        if values.get(key) is not None:
+            values[key] = int(values[key])
+    metric = ExperimentMetric(**values)
+
+    for column in _STAT_COLUMNS:
+        setattr(metric, column, None)
+
+    if metric.sampling_rate:
+        rate = float(metric.sampling_rate)
+        scaled_counts = _SCALED_COUNTS
+        if metric.metric_type == 'continuous' and metric.metric_name.lower() in SUM_METRICS:
+            scaled_counts += _SCALED_TOTALS
+        for column in scaled_counts:
+            value = getattr(metric, column)
+            if value is not None:
+                setattr(metric, column, float(value) * rate)
+        for column in _SCALED_SIZES:
+            value = getattr(metric, column)
+            if value is not None:
+                setattr(metric, column, int(round(float(value) * rate)))
+    return metric
+
+def _differs(old, new) -> bool:
+    if old is None or new is None:
+        return (old is None) != (new is None)
+    if isinstance(old, (int, float)) and isinstance(new, (int, float)):
+        return not math.isclose(float(old), float(new), rel_tol=1e-9, abs_tol=1e-12)
+    return str(old) != str(new)
+
+def recompute_rows(rows: List[dict], analyzer: ExperimentAnalysis = None) -> Tuple[List[dict], List[dict]]:
+    """
+    Recompute statistics and classification for stored rows
+
+    Returns:
+        (all rows with recomputed columns, only the rows where something changed)
+    """
+    analyzer = analyzer or ExperimentAnalysis()
+    metadata = _load_metrics_metadata()
+
+    recomputed, changed = [], []
+    for row in rows:
+        metric = metric_from_row(row)
+        metric.template_rank, metric.metric_rank, metric.desired_direction = _get_metric_metadata(
+            metric.template_name, metric.metric_name, metadata
+        )
+        analyzer.calculate_statistics(metric)
+        analyzer.apply_statsig_classification(metric)
+
+        updated = dict(row)
+        for column in RECOMPUTED_COLUMNS:
+            value = getattr(metric, column)
+            updated[column] = float(value) if hasattr(value, 'dtype') else value
+        recomputed.append(updated)
+        if any(_differs(row.get(column), updated[column]) for column in RECOMPUTED_COLUMNS):
+            changed.append(updated)
+    return recomputed, changed
+
+def write_back(rows: List[dict], chunk_size: int = 5000):
+    """
+    Update the recomputed columns of stored rows in place
+
+    Rows go to a session temp table first so the whole recompute is one UPDATE.
+    """
+    if not rows:
+        return
+
+    from utils.snowflake_connection import SnowflakeHook
+
+    columns = ROW_KEY + RECOMPUTED_COLUMNS
+    join = ' AND '.join(f"EQUAL_NULL(t.{key}, s.{key})" for key in ROW_KEY)
+    assignments = ', '.join(f"{column} = s.{column}" for column in RECOMPUTED_COLUMNS)
+
+    with SnowflakeHook() as hook:
+        # The session outlives this call (shared connection), so replace any earlier copy
+        hook.query_without_result(
+            f"CREATE OR REPLACE TEMPORARY TABLE experiment_metrics_recompute LIKE {METRICS_TABLE}"
+        )
+        try:
+            for start in range(0, len(rows), chunk_size):
+                values = [f"({', '.join(sql_literal(_key_value(row, c)) for c in columns)})"
+                          for row in rows[start:start + chunk_size]]
+                hook.query_without_result(
+                    f"INSERT INTO experiment_metrics_recompute ({', '.join(columns)}) VALUES {','.join(values)}"
+                )
+            hook.query_without_result(
+                f"UPDATE {METRICS_TABLE} t SET {assignments} FROM experiment_metrics_recompute s WHERE {join}"
+            )
+        finally:
+            hook.query_without_result("DROP TABLE IF EXISTS experiment_metrics_recompute")
+
+def _key_value(row: dict, column: str):
+    value = row.get(column)
+    return str(value) if column == 'insert_timestamp' and value is not None else value
+
+def summarize_changes(before: List[dict], after: List[dict]) -> Dict[Tuple[Optional[str], Optional[str]], int]:
+    """(old statsig_string, new statsig_string) -> rows whose label moved"""
+    moves = {}
+    for old, new in zip(before, after):
+        if old.get('statsig_string') != new['statsig_string']:
+            key = (old.get('statsig_string'), new['statsig_string'])
+            moves[key] = moves.get(key, 0) + 1
+    return moves
+
+def run_recompute(experiments: Iterable[str] = None, snapshot: str = None, output: str = None,
+                  save_to: str = None, dry_run: bool = False) -> dict:
+    """
+    Recompute stored statistics in bulk
+
+    Args:
+        experiments: Experiment names to recompute (default: all)
+        snapshot: Read rows from this local snapshot instead of Snowflake
+        output: Snapshot mode: file to write the recomputed rows to (default: the snapshot)
+        save_to: Save the rows as loaded to a local snapshot before recomputing
+        dry_run: Only report what would change
+
+    Returns:
+        Dictionary with 'rows', 'changed' and 'label_moves' counts
+    """
+    import time
+
+    start = time.time()
+    if snapshot:
+        rows = load_snapshot(snapshot)
+        if experiments:
+            wanted = set(experiments)
+            rows = [row for row in rows if row.get('experiment_name') in wanted]
+    else:
+        rows = load_stored_rows(experiments)
+    print(f"   📥 Loaded {len(rows):,} stored rows from {snapshot or METRICS_TABLE} "
+          f"in {time.time() - start:.1f}s")
+    if save_to:
+        save_snapshot(rows, save_to)
+        print(f"   💾 Saved snapshot to {save_to}")
+
+    start = time.time()
+    recomputed, changed = recompute_rows(rows)
+    moves = summarize_changes(rows, recomputed)
+    print(f"   🧮 Recomputed {len(rows):,} rows in {time.time() - start:.1f}s: {len(changed):,} changed")
+    for (old, new), count in sorted(moves.items(), key=lambda item: -item[1]):
+        print(f"      {old or 'none'} → {new}: {count:,}")
+
+    if dry_run:
+        print("   ⏭️  Dry run: nothing written")
+    elif snapshot:
+        save_snapshot(recomputed, output or snapshot)
+        print(f"   ✅ Wrote recomputed rows to {output or snapshot}")
+    elif changed:
+        write_back(changed)
+        print(f"   ✅ Updated {len(changed):,} rows in {METRICS_TABLE}")
+    return {'rows': len(rows), 'changed': len(changed), 'label_moves': sum(moves.values())}
+
+def test_recompute_matches_pipeline():
+    """Check that recomputing stored rows reproduces the pipeline's statistics, previews included"""
+    from dataclasses import asdict
+    from .metrics_storage import readout_type
+
+    analyzer = ExperimentAnalysis()
+    base = dict(experiment_name='sim', start_date='2025-09-01', end_date='2025-09-30', version=1,
+                granularity='device_id', treatment_arm='treatment')
+    metrics = [
+        ExperimentMetric(**base, template_name='onboarding_topline', metric_name='order_rate', metric_type='rate',
+                         treatment_numerator=5_300, treatment_denominator=50_000,
+                         control_numerator=5_000, control_denominator=50_000),
+        ExperimentMetric(**base, template_name='onboarding_topline', metric_name='vp', metric_type='continuous',
+                         treatment_value=1.31, treatment_std=4.2, treatment_sample_size=50_000,
+                         control_value=1.25, control_std=4.1, control_sample_size=50_000),
+        ExperimentMetric(**base, template_name='onboarding_topline', metric_name='new_cx_rate', metric_type='rate',
+                         treatment_numerator=3, treatment_denominator=400,
+                         control_numerator=1, control_denominator=410),
+        ExperimentMetric(**base, template_name='onboarding_topline', metric_name='mau_rate', metric_type='rate',
+                         treatment_numerator=260, treatment_denominator=2_500,
+                         control_numerator=250, control_denominator=2_500, sampling_rate=0.05)
+    ]
+    metadata = _load_metrics_metadata()
+    stored = []
+    for metric in metrics:
+        metric.template_rank, metric.metric_rank, metric.desired_direction = _get_metric_metadata(
+            metric.template_name, metric.metric_name, metadata
+        )
+        analyzer.calculate_statistics(metric)
+        analyzer.apply_statsig_classification(metric)
+        stored.append(dict(asdict(metric), readout_type=readout_type(metric),
+                           insert_timestamp='2025-10-01 08:00:00.000'))
+
+    recomputed, changed = recompute_rows(stored, analyzer)
+    assert not changed, [(row['metric_name'], row['p_value']) for row in changed]
+    assert recomputed[3]['treatment_denominator'] == 50_000  # preview counts kept at full scale
+
+    # A different classification rule changes only the affected labels
+    flipped = [dict(row, statsig_string='flat') for row in stored]
+    _, changed = recompute_rows(flipped, analyzer)
+    assert {row['metric_name'] for row in changed} == {
+        row['metric_name'] for row in stored if row['statsig_string'] != 'flat'
+    }
+    print(f"✓ Recompute reproduces stored statistics for {len(stored)} rows "
+          f"(order_rate p={stored[0]['p_value']:.2e}, preview p={stored[3]['p_value']:.3f})")
+
+if __name__ == "__main__":
+    test_recompute_matches_pipeline()
@@ -320,7 +320,7 @@ ON e.dd_device_ID_filtered = ac.dd_device_ID_filtered
         ,CASE WHEN o.dd_device_ID_filtered IS NOT NULL THEN 1 ELSE 0 END AS app_is_mau
     FROM 
       exposure_with_both_ids e
-      LEFT JOIN app_orders o ON e.app_device_id = o.dd_device_ID_filtered AND (o.day BETWEEN DATEADD('day',-28,least('2025-10-30',current_date())) AND DATEADD('day',-1,least('2025-10-30',current_date()))) -- past 28 days orders
+      LEFT JOIN app_orders o ON e.app_device_id = o.dd_device_ID_filtered AND (o.day BETWEEN DATEADD('day',-28,least('2025-10-30',current_date)) AND DATEADD('day',-1,least('2025-10-30',current_date))) -- past 28 days orders
     )p 
   GROUP BY 1,2,3
 )
@@ -341,7 +341,7 @@ ON e.dd_device_ID_filtered = ac.dd_device_ID_filtered
         ,CASE WHEN o.dd_device_ID_filtered IS NOT NULL THEN 1 ELSE 0 END AS mweb_is_mau
     FROM 
        exposure_with_both_ids e
-       LEFT JOIN mweb_orders o ON e.dd_device_ID_filtered = o.dd_device_ID_filtered AND o.day BETWEEN DATEADD('day',-28,least('2025-10-30',current_date())) AND DATEADD('day',-1,least('2025-10-30',current_date()))
+       LEFT JOIN mweb_orders o ON e.dd_device_ID_filtered = o.dd_device_ID_filtered AND o.day BETWEEN DATEADD('day',-28,least('2025-10-30',current_date)) AND DATEADD('day',-1,least('2025-10-30',current_date))
     )p 
   GROUP BY 1,2,3
 )
@@ -30,38 +30,60 @@ WHERE convert_timezone('UTC','America/Los_Angeles',a.timestamp) BETWEEN '2025-09
 )
 
 
-, checkout AS
+, unit_totals AS
 (SELECT  e.tag
-        , COUNT(distinct e.bucket_key) as exposure_onboard
-        , COUNT(DISTINCT CASE WHEN is_filtered_core = 1 THEN o.delivery_ID ELSE NULL END) orders
-        , COUNT(DISTINCT CASE WHEN is_first_ordercart_DD = 1 AND is_filtered_core = 1 THEN o.delivery_ID ELSE NULL END) new_Cx
-        , COUNT(DISTINCT CASE WHEN is_filtered_core = 1 THEN o.delivery_ID ELSE NULL END) /  COUNT(DISTINCT e.bucket_key) order_rate
-        , COUNT(DISTINCT CASE WHEN is_first_ordercart_DD = 1 AND is_filtered_core = 1 THEN o.delivery_ID ELSE NULL END) /  COUNT(DISTINCT e.bucket_key) new_cx_rate
+        , e.bucket_key
+        , COUNT(DISTINCT CASE WHEN is_filtered_core = 1 THEN o.delivery_ID ELSE NULL END) AS orders
+        , COUNT(DISTINCT CASE WHEN is_first_ordercart_DD = 1 AND is_filtered_core = 1 THEN o.delivery_ID ELSE NULL END) AS new_cx
         , SUM(variable_profit) AS variable_profit
-        , SUM(variable_profit) / COUNT(DISTINCT e.bucket_key) AS VP_per_device
         , SUM(gov) AS gov
-        , SUM(gov) / COUNT(DISTINCT e.bucket_key) AS gov_per_device
+        -- Order-level moments, merged per arm into the STDDEV_SAMP of order values
+        , COUNT(CASE WHEN is_filtered_core = 1 THEN o.delivery_ID END) AS order_rows
+        , COUNT(variable_profit) AS n_order_variable_profit
+        , COUNT(gov) AS n_order_gov
+        , SUM(variable_profit * variable_profit) AS order_sumsq_variable_profit
+        , SUM(gov * gov) AS order_sumsq_gov
+FROM exposure e
+LEFT JOIN orders o
+    ON e.bucket_key = o.consumer_id 
+    AND e.day <= o.day
+WHERE TAG NOT IN ('internal_test','reserved')
+GROUP BY all)
+
+-- Arm aggregates from the per-consumer totals, so exposure and orders are joined once
+, checkout AS
+(SELECT  tag
+        , COUNT(distinct bucket_key) as exposure_onboard
+        , SUM(orders) AS orders
+        , SUM(new_cx) AS new_Cx
+        , SUM(orders) /  COUNT(DISTINCT bucket_key) order_rate
+        , SUM(new_cx) /  COUNT(DISTINCT bucket_key) new_cx_rate
+        , SUM(variable_profit) AS variable_profit
+        , SUM(variable_profit) / COUNT(DISTINCT bucket_key) AS VP_per_device
+        , SUM(gov) AS gov
+        , SUM(gov) / COUNT(DISTINCT bucket_key) AS gov_per_device
         
         -- Statistical variables for p-value calculation
-        -- For continuous variables: need std dev and sample size
-        , STDDEV_SAMP(variable_profit) AS std_variable_profit
-        , STDDEV_SAMP(gov) AS std_gov
-        , COUNT(CASE WHEN is_filtered_core = 1 THEN o.delivery_ID END) AS n_orders_for_stats  -- sample size for continuous vars
+        -- For continuous variables: need std dev and sample size (STDDEV_SAMP over order rows)
+        , SQRT(GREATEST((SUM(order_sumsq_variable_profit)
+                         - SUM(variable_profit) * SUM(variable_profit) / NULLIF(SUM(n_order_variable_profit), 0))
+                        / NULLIF(SUM(n_order_variable_profit) - 1, 0), 0)) AS std_variable_profit
+        , SQRT(GREATEST((SUM(order_sumsq_gov) - SUM(gov) * SUM(gov) / NULLIF(SUM(n_order_gov), 0))
+                        / NULLIF(SUM(n_order_gov) - 1, 0), 0)) AS std_gov
+        , SUM(order_rows) AS n_orders_for_stats  -- sample size for continuous vars
         
         -- Rate variables already have numerator/denominator:
         -- order_rate: orders/exposure_onboard
         -- new_cx_rate: new_cx/exposure_onboard
         
-FROM exposure e
-LEFT JOIN orders o
-    ON e.bucket_key = o.consumer_id 
-    AND e.day <= o.day
-WHERE TAG NOT IN ('internal_test','reserved')
+        -- Unit-level sufficient statistics for the per-consumer ratio metrics (delta method)
+        , COUNT(*) AS n_units
+        , SUM(variable_profit * variable_profit) AS sumsq_variable_profit
+        , SUM(gov * gov) AS sumsq_gov
+FROM unit_totals
 GROUP BY all
 ORDER BY 1)
 
-
-
 ,  MAU AS (
 SELECT  e.tag
         , COUNT(DISTINCT o.consumer_id) as MAU
@@ -111,6 +133,9 @@ SELECT r1.tag
         -- Treatment group statistics (r1)
         , r1.std_variable_profit AS std_variable_profit
         , r1.std_gov AS std_gov
+        , r1.n_units
+        , r1.sumsq_variable_profit
+        , r1.sumsq_gov
         -- Control group statistics (r2) for rate variables
         , r2.order_rate AS control_order_rate
         , r2.new_cx_rate AS control_new_cx_rate
@@ -127,6 +152,9 @@ SELECT r1.tag
         , r2.orders AS control_orders
         , r2.new_cx AS control_new_cx
         , r2.mau AS control_mau
+        , r2.n_units AS control_n_units
+        , r2.sumsq_variable_profit AS control_sumsq_variable_profit
+        , r2.sumsq_gov AS control_sumsq_gov
         
 FROM res r1
 LEFT JOIN res r2
@@ -0,0 +1,189 @@
+"""
+Result Cache - Deterministic query text so same-day re-runs are served from
+Snowflake's 24-hour result cache, and per-query reporting of cache reuse
+
+Snowflake only reuses a result when the SQL text is identical and contains no
+functions evaluated at run time (CURRENT_DATE, CURRENT_TIMESTAMP, ...). A
+deterministic render pins "today" to an explicit as_of_date and canonicalizes
+the text so comments and whitespace can't change between renders.
+"""
+
+import os
+import re
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+from .experiment_config import get_templates_for_experiment
+from .metric_compiler import COMPILED_TEMPLATE_NAME, compile_experiment_query, compiled_metric_names
+from .query_renderer import has_manual_override, render_template_file
+
+# Day boundary used by every template (convert_timezone to America/Los_Angeles)
+REPORTING_TIMEZONE = 'America/Los_Angeles'
+
+DETERMINISTIC_DIR = os.path.join(os.path.dirname(__file__), 'rendered_queries', '_deterministic')
+
+_TOKENS = re.compile(r"""
+      (?P<string>'(?:[^'\\]|\\.|'')*')
+    | (?P<identifier>"(?:[^"]|"")*")
+    | (?P<comment>--[^\n]*|/\*.*?\*/|\{\#.*?\#\})
+    | (?P<space>\s+)
+    | (?P<code>[^'"\s\-/{]+|.)
+""", re.S | re.X)
+
+_CURRENT_DATE = re.compile(r"\bcurrent_date\b(\s*\(\s*\))?", re.I)
+
+# Run-time functions that have no date-only equivalent and always bypass the cache
+_VOLATILE = re.compile(r"\b(current_timestamp|getdate|sysdate|localtimestamp|random|uuid_string)\b", re.I)
+
+def default_as_of_date() -> str:
+    """Today's date on the reporting calendar"""
+    return datetime.now(ZoneInfo(REPORTING_TIMEZONE)).date().isoformat()
+
+def _split(query: str) -> List[Tuple[str, str]]:
+    """(kind, text) tokens; string literals and quoted identifiers are never touched"""
+    return [(match.lastgroup, match.group()) for match in _TOKENS.finditer(query)]
+
+def _map_code(query: str, function) -> str:
+    """Apply a text function to the SQL outside string literals and quoted identifiers"""
+    pieces, code = [], []
+    for kind, text in _split(query):
+        if kind in ('string', 'identifier'):
+            pieces.append(function(''.join(code)))
+            pieces.append(text)
+            code = []
+        else:
+            code.append(text)
+    pieces.append(function(''.join(code)))
+    return ''.join(pieces)
+
+def canonicalize_sql(query: str) -> str:
+    """Strip SQL and leftover Jinja comments, collapse whitespace and trailing semicolons"""
+    pieces = []
+    for kind, text in _split(query):
+        if kind in ('comment', 'space'):
+            if pieces and pieces[-1] != ' ':
+                pieces.append(' ')
+        else:
+            pieces.append(text)
+    return ''.join(pieces).strip().rstrip(';').rstrip()
+
+def pin_relative_dates(query: str, as_of_date: str) -> str:
+    """Replace CURRENT_DATE / CURRENT_DATE() with the as_of_date literal"""
+    return _map_code(query, lambda code: _CURRENT_DATE.sub(f"'{as_of_date}'::date", code))
+
+def volatile_functions(query: str) -> List[str]:
+    """Run-time functions left in a query that will still prevent result reuse"""
+    return sorted({match.group(1).lower()
+                   for kind, text in _split(query) if kind == 'code'
+                   for match in _VOLATILE.finditer(text)})
+
+def deterministic_sql(query: str, as_of_date: str) -> str:
+    """Pinned and canonical query text: identical inputs give byte-identical SQL"""
+    return canonicalize_sql(pin_relative_dates(query, as_of_date))
+
+def render_deterministic(config: dict, as_of_date: str) -> Dict[str, str]:
+    """
+    Render an experiment's templates with "today" pinned to as_of_date
+
+    Unlike render_templates_for_experiment this always renders fresh (existing copies
+    are anchored to current_date) except for hand-edited copies, which are kept and
+    pinned textually. Output goes to rendered_queries/_deterministic/<experiment>/.
+
+    Args:
+        config: Experiment configuration dictionary
+        as_of_date: 'YYYY-MM-DD' date substituted for current_date
+
+    Returns:
+        Dictionary mapping template_name -> deterministic query path
+    """
+    experiment_name = config['experiment_name']
+    pinned_config = dict(config, as_of_date=as_of_date)
+    rendered_dir = os.path.join(DETERMINISTIC_DIR, experiment_name)
+    os.makedirs(rendered_dir, exist_ok=True)
+
+    queries = {}
+    for template_info in get_templates_for_experiment(config):
+        if has_manual_override(config, template_info):
+            saved_path = os.path.join(os.path.dirname(__file__), 'rendered_queries', experiment_name,
+                                      f"{experiment_name}_{template_info['name']}.sql")
+            with open(saved_path, 'r') as f:
+                queries[template_info['name']] = f.read()
+        else:
+            queries[template_info['name']] = render_template_file(template_info['path'], pinned_config)
+
+    metric_names = compiled_metric_names(config)
+    if metric_names is not None:
+        queries[COMPILED_TEMPLATE_NAME] = compile_experiment_query(pinned_config, metric_names)
+
+    rendered_queries = {}
+    for template_name, query in queries.items():
+        query = deterministic_sql(query, as_of_date)
+        volatile = volatile_functions(query)
+        if volatile:
+            print(f"      ⚠️  {template_name} still calls {', '.join(volatile)}; it cannot hit the result cache")
+        rendered_path = os.path.join(rendered_dir, f"{experiment_name}_{template_name}.sql")
+        with open(rendered_path, 'w') as f:
+            f.write(query)
+        rendered_queries[template_name] = rendered_path
+
+    print(f"      📌 Rendered {len(rendered_queries)} deterministic queries as of {as_of_date}")
+    return rendered_queries
+
+def execute_with_cache_status(query: str) -> Tuple[list, Optional[bool]]:
+    """
+    Execute a query and report whether Snowflake answered it from the result cache
+
+    A reused result runs no warehouse scan, so the session's query history records
+    zero bytes scanned for it.
+
+    Returns:
+        (rows as list of dictionaries, True/False for cache reuse or None if unknown)
+    """
+
+    from utils.snowflake_connection import SnowflakeHook
+
+    with SnowflakeHook(create_local_spark=False, use_persistent_spark=False) as hook:
+        results = hook.query_snowflake(query, method='pandas')
+        query_id = hook.cursor.sfqid
+        cursor = hook.conn.cursor()
+        try:
+            cursor.execute(
+                "SELECT bytes_scanned FROM TABLE(information_schema.query_history_by_session(result_limit => 1000)) "
+                "WHERE query_id = %s",
+                (query_id,)
+            )
+            row = cursor.fetchone()
+        except Exception as e:
+            print(f"   ⚠️  Could not read query history for {query_id}: {e}")
+            row = None
+        finally:
+            cursor.close()
+
+    cache_hit = None if row is None else int(row[0] or 0) == 0
+    return results.to_dict('records'), cache_hit
+
+def test_deterministic_text():
+    """Check that formatting-only differences vanish and literals are left alone"""
+    first = """
+    -- past 28 days orders
+    SELECT tag, COUNT(*) /* all rows */ AS n
+    FROM orders o
+    WHERE o.day BETWEEN DATEADD('day', -28, current_date) AND DATEADD('day',-1,CURRENT_DATE())
+      AND note = 'keep -- this  current_date'
+    GROUP BY 1;
+    """
+    second = "SELECT tag, COUNT(*) AS n FROM orders o\n\tWHERE o.day BETWEEN DATEADD('day', -28, current_date) " \
+             "AND DATEADD('day',-1,CURRENT_DATE())   AND note = 'keep -- this  current_date' GROUP BY 1"
+
+    pinned = deterministic_sql(first, '2025-10-19')
+    assert pinned == deterministic_sql(second, '2025-10-19'), pinned
+    assert "DATEADD('day', -28, '2025-10-19'::date)" in pinned
+    assert "DATEADD('day',-1,'2025-10-19'::date)" in pinned
+    assert "'keep -- this  current_date'" in pinned
+    assert deterministic_sql(first, '2025-10-20') != pinned
+    assert volatile_functions("SELECT current_timestamp(), 'getdate()'") == ['current_timestamp']
+    print(f"✓ Canonical text is stable across formatting: {pinned}")
+
+if __name__ == "__main__":
+    test_deterministic_text()
@@ -3,10 +3,17 @@ Results Parser - Parse SQL query results into experiment metrics
 """
 
 from dataclasses import dataclass
-from typing import List, Optional, Any
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Any, Tuple
+import math
 import yaml
 import os
 
+try:
+    import pandas as pd
+except ImportError:
+    pd = None
+
 @dataclass
 class ExperimentMetric:
     """Data class for individual experiment metric"""
@@ -52,19 +59,34 @@ class ExperimentMetric:
     confidence_interval_upper: Optional[float] = None
     statsig_string: Optional[str] = None
     statistical_power: Optional[float] = None
+    lift_ci_lower: Optional[float] = None  # Bootstrap CI on relative lift
+    lift_ci_upper: Optional[float] = None
     
     # Execution metadata
     query_execution_timestamp: Optional[str] = None
     query_runtime_seconds: Optional[float] = None
+    sampling_rate: Optional[float] = None  # Preview runs: fraction of exposed units sampled
+    srm_p_value: Optional[float] = None  # Pre-flight sample-ratio-mismatch chi-square p-value
+    
+    # Unit-level sufficient statistics for ratio metrics (n, sum_x, sum_y, sum_xx, sum_yy, sum_xy)
+    treatment_moments: Optional[dict] = None
+    control_moments: Optional[dict] = None
+
+def _metrics_metadata_path() -> str:
+    project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    return os.path.join(project_root, 'data_models', 'metrics_metadata.yaml')
+
+def _metrics_metadata_mtime() -> Optional[int]:
+    """Modification time of metrics_metadata.yaml, so cached plans notice edits"""
+    try:
+        return os.stat(_metrics_metadata_path()).st_mtime_ns
+    except OSError:
+        return None
 
 def _load_metrics_metadata():
     """Load metrics metadata from YAML file"""
     try:
-        current_dir = os.path.dirname(os.path.abspath(__file__))
-        project_root = os.path.dirname(current_dir)
-        metadata_path = os.path.join(project_root, 'data_models', 'metrics_metadata.yaml')
-        
-        with open(metadata_path, 'r') as f:
+        with open(_metrics_metadata_path(), 'r') as f:
             return yaml.safe_load(f)
     except Exception as e:
         print(f"Warning: Could not load metrics metadata: {e}")
@@ -123,10 +145,102 @@ def _get_metric_metadata(template_name: str, metric_name: str, metadata: dict) -
         print(f"Warning: Error getting metric metadata for {template_name}/{metric_name}: {e}")
         return None, None, None
 
+# Columns that identify the experiment arm of a result row, in lookup order
+ARM_COLUMNS = ('tag', 'bucket')
+
+# Result columns that split a readout into sub-populations (e.g. appclip_order_platform_split -> platform).
+# Any of these present in a result schema become dimensions; configs can add more via 'dimensions'.
+# horizon comes from compiled queries with readout horizons (d7, d14, ..., cumulative).
+DIMENSION_COLUMNS = ('platform', 'horizon')
+
+# segments label of the rolled-up row when a config sets segment_cube (see sql_scripts/macros/segment_cube.sql)
+OVERALL_SEGMENT = 'overall'
+
+# Map metric names to the SQL column holding their value
+VALUE_COLUMN_MAPPING = {
+    'vp': 'variable_profit',
+    'vp_per_device': 'VP_per_device',  # Note: SQL uses uppercase VP_per_device
+    'gov': 'gov',
+    'gov_per_device': 'gov_per_device'
+}
+
+# Continuous metrics whose value is a total over units (SUM), not a per-unit mean;
+# preview readouts scale their values to full-population estimates
+SUM_METRICS = ('vp', 'gov')
+
+# Map metric names to the base name of their std column
+STD_COLUMN_MAPPING = {
+    'vp': 'variable_profit',
+    'vp_per_device': 'variable_profit',  # Both vp metrics use same std
+    'gov': 'gov',
+    'gov_per_device': 'gov'  # Both gov metrics use same std
+}
+
+# Ratio metrics with unit-level moments in the result: metric -> (numerator base, denominator base)
+# A denominator of None means one per unit (per-device / per-consumer metrics)
+RATIO_MOMENT_SOURCES = {
+    'vp_per_device': ('variable_profit', None),
+    'gov_per_device': ('gov', None)
+}
+
+# Column suffixes of the fixed contract emitted by metric_compiler (<metric>__num, control_<metric>__num, ...)
+CONTRACT_NUMERATOR = '__num'
+CONTRACT_RATIO_SUFFIXES = ('__num_sumsq', '__den_sumsq', '__cross')
+
+@dataclass(frozen=True)
+class ArmColumns:
+    """Source columns for one arm of one metric, resolved against a result schema"""
+    
+    value: Optional[str] = None
+    numerator: Optional[str] = None
+    denominator: Optional[str] = None
+    denominator_fallback: Optional[str] = None  # Used when the denominator value is NULL
+    completion_denominators: Tuple[str, ...] = ()  # First non-NULL value wins
+    derive_numerator: bool = False  # Completion metrics: numerator = value * denominator
+    sample_size: Optional[str] = None
+    std: Optional[str] = None
+    moments: Tuple[Tuple[str, str], ...] = ()  # (moment key, column) pairs for ratio metrics
+
+@dataclass(frozen=True)
+class MetricPlan:
+    """Column roles and metadata for one lift_ metric of a template"""
+    
+    metric_name: str
+    lift_column: str
+    metric_type: str
+    template_rank: Optional[int]
+    metric_rank: Optional[int]
+    desired_direction: Optional[str]
+    treatment: ArmColumns
+    control: ArmColumns
+
+@dataclass(frozen=True)
+class ColumnPlan:
+    """Compiled mapping from a template's result schema to ExperimentMetric fields"""
+    
+    template_name: str
+    arm_column: Optional[str]
+    dimension_columns: Tuple[str, ...]
+    metrics: Tuple[MetricPlan, ...]
+    
+    def dimension_value(self, row: dict) -> Optional[str]:
+        """Dimension label stored on ExperimentMetric.dimension"""
+        if not self.dimension_columns:
+            return None
+        if len(self.dimension_columns) == 1:
+            return row.get(self.dimension_columns[0])
+        values = [str(row.get(col)) for col in self.dimension_columns if row.get(col) is not None]
+        return ' | '.join(values) if values else None
+
 def parse_results(results: List[dict], template_name: str, config: dict) -> List[ExperimentMetric]:
     """
     Parse SQL query results into ExperimentMetric objects
     
+    The column roles of each metric are compiled once per (template, result schema)
+    and then applied to every row; control rows are looked up through a hash index
+    keyed on segments and dimension columns. With segment_cube, the rolled-up
+    rows produce metrics labelled segments='overall' next to the per-segment ones.
+    
     Args:
         results: List of result row dictionaries from SQL query
         template_name: Name of the template that was executed
@@ -139,68 +253,43 @@ def parse_results(results: List[dict], template_name: str, config: dict) -> List
     if not results:
         return []
     
-    # Load metrics metadata for ranking information
-    metadata = _load_metrics_metadata()
+    columns = tuple(results[0].keys())
+    extra_dimensions = tuple(config.get('dimensions') or ())
+    dimension_columns = _resolve_dimension_columns(columns, extra_dimensions)
+    arm_column = next((col for col in ARM_COLUMNS if col in columns), None)
     
-    metrics = []
+    if arm_column is None:
+        print(f"Warning: No treatment arm column found in row: {list(columns)}")
+        return []
     
-    # Check if this template has dimensions (e.g., appclip_order_platform_split has 'platform')
-    has_dimension = template_name == 'appclip_order_platform_split'
-    dimension_column = 'platform' if has_dimension else None
+    # Index control rows by dimension tuple (first control row per key wins)
+    control_rows = index_control_rows(results, arm_column, dimension_columns)
+    plans = {}
+    
+    metrics = []
     
-    # Process each result row
     for row in results:
-        # Determine the treatment arm column (could be 'tag' or 'bucket')
-        treatment_arm_col = None
-        treatment_arm_value = None
-        
-        if 'tag' in row:
-            treatment_arm_col = 'tag'
-            treatment_arm_value = row['tag']
-        elif 'bucket' in row:
-            treatment_arm_col = 'bucket'
-            treatment_arm_value = row['bucket']
-        else:
-            print(f"Warning: No treatment arm column found in row: {list(row.keys())}")
-            continue
+        treatment_arm_value = row[arm_column]
         
         # Skip control rows - we extract control data as columns
         if treatment_arm_value == 'control':
             continue
         
-        # Get dimension value if applicable
-        dimension_value = row.get(dimension_column) if has_dimension else None
+        has_control = (_dimension_key(row, dimension_columns) in control_rows)
+        plan = plans.get(has_control)
+        if plan is None:
+            plan = plans[has_control] = compile_column_plan(template_name, columns, has_control, extra_dimensions)
         
-        # Get segments value from SQL results
+        dimension_value = plan.dimension_value(row)
         segments_value = row.get('segments')
+        if segments_value is None and config.get('segment_cube'):
+            segments_value = OVERALL_SEGMENT
         
-        # Find matching control row for this dimension
-        control_row = find_control_row(results, dimension_value, has_dimension, dimension_column)
-        
-        # Extract all lift columns and create metrics (check both uppercase and lowercase)
-        lift_columns = [col for col in row.keys() if col.lower().startswith('lift_')]
-        
-        for lift_col in lift_columns:
-            # Handle both uppercase and lowercase lift column prefixes
-            if lift_col.startswith('Lift_'):
-                metric_name = lift_col.replace('Lift_', '')
-            elif lift_col.startswith('lift_'):
-                metric_name = lift_col.replace('lift_', '')
-            else:
-                metric_name = lift_col.lower().replace('lift_', '')
-            
-            # Determine metric type
-            metric_type = determine_metric_type(metric_name, row, control_row)
-            
-            # Get template and metric metadata from YAML
-            template_rank, metric_rank, desired_direction = _get_metric_metadata(template_name, metric_name, metadata)
-            
-            # Extract treatment values
-            treatment_data = extract_metric_data(row, metric_name, 'treatment')
-            
-            # Extract control data from control columns in the same treatment row
+        for metric_plan in plan.metrics:
+            # Control data comes from the control columns of the same treatment row
             # (not from a separate control row, since we structured SQL to include control columns)
-            control_data = extract_metric_data(row, metric_name, 'control')
+            treatment_data = apply_arm_columns(row, metric_plan.treatment)
+            control_data = apply_arm_columns(row, metric_plan.control)
             
             metric = ExperimentMetric(
                 # Experiment identifiers
@@ -212,14 +301,14 @@ def parse_results(results: List[dict], template_name: str, config: dict) -> List
                 # Metric details
                 granularity=config['bucket_key'],
                 template_name=template_name,
-                metric_name=metric_name,
+                metric_name=metric_plan.metric_name,
                 treatment_arm=treatment_arm_value,  # treatment, variant_1, etc.
-                metric_type=metric_type,
+                metric_type=metric_plan.metric_type,
                 dimension=dimension_value,
                 segments=segments_value,
-                template_rank=template_rank,
-                metric_rank=metric_rank,
-                desired_direction=desired_direction,
+                template_rank=metric_plan.template_rank,
+                metric_rank=metric_plan.metric_rank,
+                desired_direction=metric_plan.desired_direction,
                 
                 # Treatment data
                 treatment_numerator=treatment_data.get('numerator'),
@@ -235,42 +324,136 @@ def parse_results(results: List[dict], template_name: str, config: dict) -> List
                 control_sample_size=control_data.get('sample_size'),
                 control_std=control_data.get('std'),
                 
+                # Unit-level moments for ratio metrics (delta method)
+                treatment_moments=treatment_data.get('moments'),
+                control_moments=control_data.get('moments'),
+                
                 # Lift (calculated in SQL)
-                lift=row.get(lift_col)
+                lift=row.get(metric_plan.lift_column)
             )
             
             metrics.append(metric)
     
     return metrics
 
-def find_control_row(results: List[dict], dimension_value: Optional[str], 
-                    has_dimension: bool, dimension_column: Optional[str]) -> Optional[dict]:
-    """Find the matching control row for a given treatment row"""
+def split_batch_results(results: List[dict], experiment_names: Iterable[str]) -> Dict[str, List[dict]]:
+    """
+    Split rows of a batched template run (see render_batch_template) per experiment
+    
+    The experiment_name column is dropped so each group has the regular result schema.
+    """
+    
+    groups = {name: [] for name in experiment_names}
+    for row in results or []:
+        name = row.get('experiment_name')
+        if name not in groups:
+            continue
+        groups[name].append({k: v for k, v in row.items() if k != 'experiment_name'})
+    return groups
+
+def parse_batch_results(results: List[dict], template_name: str,
+                        configs: Dict[str, dict]) -> Dict[str, List[ExperimentMetric]]:
+    """
+    Parse a batched result set into metrics per experiment
+    
+    Args:
+        results: Rows of a batched query, keyed by an experiment_name column
+        template_name: Name of the template that was executed
+        configs: experiment_name -> experiment configuration
+    
+    Returns:
+        Dictionary mapping experiment_name -> list of ExperimentMetric objects
+    """
+    
+    groups = split_batch_results(results, configs.keys())
+    return {name: parse_results(rows, template_name, configs[name]) for name, rows in groups.items()}
+
+def _resolve_dimension_columns(columns: Iterable[str], extra_dimensions: Tuple[str, ...] = ()) -> Tuple[str, ...]:
+    """Dimension columns present in a result schema, in schema order"""
+    wanted = {col.lower() for col in DIMENSION_COLUMNS + tuple(extra_dimensions)}
+    return tuple(col for col in columns if col.lower() in wanted)
+
+def _dimension_key(row: dict, dimension_columns: Tuple[str, ...]) -> tuple:
+    return (row.get('segments'),) + tuple(row.get(col) for col in dimension_columns)
+
+def index_control_rows(results: List[dict], arm_column: str,
+                       dimension_columns: Tuple[str, ...]) -> Dict[tuple, dict]:
+    """Map (segments, *dimension values) -> first control row with those values"""
     
+    control_rows = {}
     for row in results:
-        # Check if this is a control row (could be in 'tag' or 'bucket' column)
-        is_control = False
-        if 'tag' in row and row['tag'] == 'control':
-            is_control = True
-        elif 'bucket' in row and row['bucket'] == 'control':
-            is_control = True
-        
-        if not is_control:
+        if row.get(arm_column) != 'control':
             continue
-            
-        if has_dimension and dimension_column:
-            # Match on dimension (e.g., same platform)
-            if row.get(dimension_column) == dimension_value:
-                return row
-        else:
-            # No dimension - return first control row
-            return row
+        control_rows.setdefault(_dimension_key(row, dimension_columns), row)
+    return control_rows
+
+def compile_column_plan(template_name: str, columns: Tuple[str, ...], has_control: bool = True,
+                        extra_dimensions: Tuple[str, ...] = ()) -> ColumnPlan:
+    """
+    Compile the column roles of every lift_ metric for one result schema
+    
+    Plans are cached per schema and per version of metrics_metadata.yaml, so a
+    long-running process picks up edited ranks and desired directions.
+    
+    Args:
+        template_name: Name of the template that produced the results
+        columns: Result column names, in result order
+        has_control: Whether a matching control row exists (affects metric type detection)
+        extra_dimensions: Additional dimension columns declared by the experiment config
+    
+    Returns:
+        ColumnPlan shared by every row with this schema
+    """
     
-    return None
+    return _compile_column_plan(template_name, columns, has_control, extra_dimensions, _metrics_metadata_mtime())
+
+@lru_cache(maxsize=256)
+def _compile_column_plan(template_name: str, columns: Tuple[str, ...], has_control: bool,
+                         extra_dimensions: Tuple[str, ...], metadata_mtime: Optional[int]) -> ColumnPlan:
+    metadata = _load_metrics_metadata()
+    available = frozenset(columns)
+    
+    metric_plans = []
+    for lift_col in columns:
+        if not lift_col.lower().startswith('lift_'):
+            continue
+        
+        metric_name = _metric_name_from_lift_column(lift_col)
+        template_rank, metric_rank, desired_direction = _get_metric_metadata(template_name, metric_name, metadata)
+        
+        metric_plans.append(MetricPlan(
+            metric_name=metric_name,
+            lift_column=lift_col,
+            metric_type=determine_metric_type(metric_name, available, available if has_control else None),
+            template_rank=template_rank,
+            metric_rank=metric_rank,
+            desired_direction=desired_direction,
+            treatment=compile_arm_columns(metric_name, '', available),
+            control=compile_arm_columns(metric_name, 'control_', available)
+        ))
+    
+    return ColumnPlan(
+        template_name=template_name,
+        arm_column=next((col for col in ARM_COLUMNS if col in available), None),
+        dimension_columns=_resolve_dimension_columns(columns, extra_dimensions),
+        metrics=tuple(metric_plans)
+    )
+
+def _metric_name_from_lift_column(lift_col: str) -> str:
+    # Handle both uppercase and lowercase lift column prefixes
+    if lift_col.startswith('Lift_'):
+        return lift_col.replace('Lift_', '')
+    elif lift_col.startswith('lift_'):
+        return lift_col.replace('lift_', '')
+    return lift_col.lower().replace('lift_', '')
 
 def determine_metric_type(metric_name: str, treatment_row: dict, control_row: Optional[dict]) -> str:
     """Determine if metric is 'rate' or 'continuous'"""
     
+    # Compiled metrics declare their kind through the column contract
+    if treatment_row and f"{metric_name}{CONTRACT_NUMERATOR}" in treatment_row:
+        return 'continuous' if f"{metric_name}__num_sumsq" in treatment_row else 'rate'
+    
     # Explicit continuous variables (have std values, are monetary/count metrics)
     continuous_vars = ['vp', 'vp_per_device', 'gov', 'gov_per_device', 'variable_profit', 'subtotal']
     if metric_name.lower() in continuous_vars:
@@ -302,67 +485,57 @@ def determine_metric_type(metric_name: str, treatment_row: dict, control_row: Op
         
     return 'rate'  # Default assumption
 
-def extract_metric_data(row: Optional[dict], metric_name: str, arm_type: str) -> dict:
-    """Extract numerator, denominator, value, sample_size, std for a metric"""
+def _first_present(candidates: Iterable[str], available) -> Optional[str]:
+    return next((candidate for candidate in candidates if candidate in available), None)
+
+def _contract_arm_columns(metric_name: str, prefix: str, available) -> ArmColumns:
+    """Arm columns of a metric_compiler query, where every role has a fixed column name"""
+    base = f"{prefix}{metric_name}"
+    moments = ()
+    if all(f"{base}{suffix}" in available for suffix in CONTRACT_RATIO_SUFFIXES):
+        moments = (
+            ('n', f"{base}__n"),
+            ('sum_x', f"{base}__num"),
+            ('sum_xx', f"{base}__num_sumsq"),
+            ('sum_y', f"{base}__den"),
+            ('sum_yy', f"{base}__den_sumsq"),
+            ('sum_xy', f"{base}__cross")
+        )
+    return ArmColumns(
+        value=base if base in available else None,
+        numerator=f"{base}__num",
+        denominator=_first_present([f"{base}__den"], available),
+        sample_size=_first_present([f"{base}__n"], available),
+        moments=moments
+    )
+
+def compile_arm_columns(metric_name: str, prefix: str, available) -> ArmColumns:
+    """
+    Resolve which columns hold value, numerator, denominator, sample_size and std for one arm
     
-    if not row:
-        return {}
+    Args:
+        metric_name: Metric name (from the lift_ column)
+        prefix: '' for treatment, 'control_' for control
+        available: Collection of result column names
+    """
     
-    data = {}
-    prefix = 'control_' if arm_type == 'control' else ''
+    if f"{prefix}{metric_name}{CONTRACT_NUMERATOR}" in available:
+        return _contract_arm_columns(metric_name, prefix, available)
     
     # Try to find the base metric value with enhanced mapping
-    # Map metric names to actual SQL column names
-    value_mapping = {
-        'vp': 'variable_profit',
-        'vp_per_device': 'VP_per_device',  # Note: SQL uses uppercase VP_per_device
-        'gov': 'gov',
-        'gov_per_device': 'gov_per_device'
-    }
+    value_column_name = VALUE_COLUMN_MAPPING.get(metric_name, metric_name)
+    value = _first_present([f"{prefix}{value_column_name}", f"{prefix}{metric_name}",
+                            value_column_name, metric_name], available)
     
-    # Import pandas for nan checking
-    try:
-        import pandas as pd
-    except ImportError:
-        import numpy as np
-        pd = np
-    
-    # Get the actual column name for value lookup
-    value_column_name = value_mapping.get(metric_name, metric_name)
-    
-    if f"{prefix}{value_column_name}" in row:
-        value = row[f"{prefix}{value_column_name}"]
-        # Handle nan values
-        if pd.isna(value) or (isinstance(value, str) and value.lower() == 'nan'):
-            data['value'] = None
-        else:
-            data['value'] = value
-    elif f"{prefix}{metric_name}" in row:
-        value = row[f"{prefix}{metric_name}"]
-        if pd.isna(value) or (isinstance(value, str) and value.lower() == 'nan'):
-            data['value'] = None 
-        else:
-            data['value'] = value
-    elif value_column_name in row:
-        value = row[value_column_name]
-        if pd.isna(value) or (isinstance(value, str) and value.lower() == 'nan'):
-            data['value'] = None
-        else:
-            data['value'] = value
-    elif metric_name in row:
-        value = row[metric_name]
-        if pd.isna(value) or (isinstance(value, str) and value.lower() == 'nan'):
-            data['value'] = None
-        else:
-            data['value'] = value
+    numerator = None
+    denominator = None
+    denominator_fallback = None
     
     # For rate metrics, look for numerator/denominator patterns
     if '_rate' in metric_name or '_pct' in metric_name:
         base_metric = metric_name.replace('_rate', '').replace('_pct', '')
         
         # Enhanced numerator candidates for different metric patterns
-        numerator_candidates = []
-        
         if 'system_level_push_opt_out_pct' in metric_name:
             numerator_candidates = [f"{prefix}system_level_push_opt_out"]
         elif 'system_level_push_opt_in_pct' in metric_name:
@@ -373,84 +546,144 @@ def extract_metric_data(row: Optional[dict], metric_name: str, arm_type: str) ->
             numerator_candidates = [f"{prefix}{view_metric}", f"{prefix}{base_metric}"]
         elif 'completion' in metric_name:
             # onboarding_completion → calculate from rate * denominator since count not available
-            # Don't look for numerator - we'll calculate it below
             numerator_candidates = []
         else:
             # Standard patterns: try both singular and plural
             numerator_candidates = [f"{prefix}{base_metric}s", f"{prefix}{base_metric}"]
-            
-        for candidate in numerator_candidates:
-            if candidate in row:
-                data['numerator'] = row[candidate]
-                break
+        numerator = _first_present(numerator_candidates, available)
         
         # Denominator: exposure, total_cx, etc.
-        denominator_candidates = [
-            f"{prefix}exposure_onboard", f"{prefix}exposure", f"{prefix}total_cx", 
+        denominator = _first_present([
+            f"{prefix}exposure_onboard", f"{prefix}exposure", f"{prefix}total_cx",
             f"{prefix}sample_size", f"{prefix}total_devices", f"{prefix}total_users"
+        ], available)
+        
+        # If the denominator is NULL, use the sample_size column instead
+        if f"{prefix}sample_size" in available:
+            denominator_fallback = f"{prefix}sample_size"
+    
+    # Completion metrics find a denominator and derive the numerator from rate * denominator
+    # (applies whether or not the name contains '_rate')
+    derive_numerator = 'completion' in metric_name
+    completion_denominators = ()
+    if derive_numerator:
+        completion_denominators = tuple(
+            candidate for candidate in [f"{prefix}exposure", f"{prefix}sample_size", f"{prefix}total_cx"]
+            if candidate in available
+        )
+    
+    sample_size = _first_present([
+        f"{prefix}sample_size", f"{prefix}exposure", f"{prefix}total_cx",
+        f"{prefix}n_{metric_name.replace('_rate', '')}", f"{prefix}n_orders_for_stats"
+    ], available)
+    
+    # Standard deviation (for continuous metrics)
+    std_column_name = STD_COLUMN_MAPPING.get(metric_name, metric_name)
+    std = _first_present([
+        f"{prefix}std_{std_column_name}",
+        f"{prefix}{std_column_name}_std",
+        f"{prefix}std_{metric_name}",
+        f"{prefix}{metric_name}_std"
+    ], available)
+    
+    # Unit-level moments (only used when every column is present)
+    moments = ()
+    if metric_name.lower() in RATIO_MOMENT_SOURCES:
+        numerator_base, denominator_base = RATIO_MOMENT_SOURCES[metric_name.lower()]
+        moment_columns = [
+            ('n', f"{prefix}n_units"),
+            ('sum_x', f"{prefix}{numerator_base}"),
+            ('sum_xx', f"{prefix}sumsq_{numerator_base}")
         ]
-        for candidate in denominator_candidates:
-            if candidate in row:
-                data['denominator'] = row[candidate]
-                break
-                
-        # If no denominator found, use the sample_size from the metric value itself
-        if 'denominator' not in data or data['denominator'] is None:
-            if f"{prefix}sample_size" in row and row[f"{prefix}sample_size"] is not None:
-                data['denominator'] = row[f"{prefix}sample_size"]
-                
-        # This logic was inside the rate block but needs to be outside
-    
-    # Special handling for completion metrics - find denominator and calculate numerator
-    # This needs to be OUTSIDE the rate block since completion doesn't contain '_rate'  
-    if 'completion' in metric_name:
-        # For completion metrics, denominator is usually exposure/sample_size
-        if 'denominator' not in data or data['denominator'] is None:
-            for denom_candidate in [f"{prefix}exposure", f"{prefix}sample_size", f"{prefix}total_cx"]:
-                if denom_candidate in row and row[denom_candidate] is not None:
-                    data['denominator'] = row[denom_candidate]
+        if denominator_base is not None:
+            moment_columns += [
+                ('sum_y', f"{prefix}{denominator_base}"),
+                ('sum_yy', f"{prefix}sumsq_{denominator_base}"),
+                ('sum_xy', f"{prefix}sum_{numerator_base}_x_{denominator_base}")
+            ]
+        if all(column in available for _, column in moment_columns):
+            moments = tuple(moment_columns)
+    
+    return ArmColumns(
+        value=value,
+        numerator=numerator,
+        denominator=denominator,
+        denominator_fallback=denominator_fallback,
+        completion_denominators=completion_denominators,
+        derive_numerator=derive_numerator,
+        sample_size=sample_size,
+        std=std,
+        moments=moments
+    )
+
+def _clean_value(value):
+    """Convert NaN values (float or string) to None"""
+    if value is None:
+        return None
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    if isinstance(value, str) and value.lower() == 'nan':
+        return None
+    if pd is not None and pd.isna(value):
+        return None
+    return value
+
+def apply_arm_columns(row: dict, arm: ArmColumns) -> dict:
+    """Extract numerator, denominator, value, sample_size, std from a row using compiled columns"""
+    
+    data = {}
+    
+    if arm.value is not None:
+        data['value'] = _clean_value(row[arm.value])
+    
+    if arm.numerator is not None:
+        data['numerator'] = row[arm.numerator]
+    
+    if arm.denominator is not None:
+        data['denominator'] = row[arm.denominator]
+    
+    if data.get('denominator') is None and arm.denominator_fallback is not None:
+        if row[arm.denominator_fallback] is not None:
+            data['denominator'] = row[arm.denominator_fallback]
+    
+    if arm.derive_numerator:
+        if data.get('denominator') is None:
+            for candidate in arm.completion_denominators:
+                if row[candidate] is not None:
+                    data['denominator'] = row[candidate]
                     break
         
         # Calculate numerator from rate * denominator
-        if 'denominator' in data and data['denominator'] is not None:
+        if data.get('denominator') is not None:
             rate_value = data.get('value')
-            if rate_value is not None and rate_value != 'nan':
+            if rate_value is not None:
                 try:
                     data['numerator'] = int(float(rate_value) * float(data['denominator']))
                 except (ValueError, TypeError):
                     pass
-
-    # Sample size
-    sample_size_candidates = [
-        f"{prefix}sample_size", f"{prefix}exposure", f"{prefix}total_cx",
-        f"{prefix}n_{metric_name.replace('_rate', '')}", f"{prefix}n_orders_for_stats"
-    ]
-    for candidate in sample_size_candidates:
-        if candidate in row:
-            data['sample_size'] = row[candidate]
-            break
     
-    # Standard deviation (for continuous metrics)
-    # Map metric names to actual SQL column names for std
-    metric_name_mapping = {
-        'vp': 'variable_profit',
-        'vp_per_device': 'variable_profit',  # Both vp metrics use same std
-        'gov': 'gov',
-        'gov_per_device': 'gov'  # Both gov metrics use same std
-    }
+    if arm.sample_size is not None:
+        data['sample_size'] = row[arm.sample_size]
     
-    # Get the actual column name for std lookup
-    std_column_name = metric_name_mapping.get(metric_name, metric_name)
+    if arm.std is not None:
+        data['std'] = row[arm.std]
     
-    std_candidates = [
-        f"{prefix}std_{std_column_name}", 
-        f"{prefix}{std_column_name}_std",
-        f"{prefix}std_{metric_name}", 
-        f"{prefix}{metric_name}_std"
-    ]
-    for candidate in std_candidates:
-        if candidate in row:
-            data['std'] = row[candidate]
-            break
+    if arm.moments:
+        moments = {key: _clean_value(row[column]) for key, column in arm.moments}
+        if all(value is not None for value in moments.values()):
+            moments = {key: float(value) for key, value in moments.items()}
+            if 'sum_y' not in moments:
+                # Denominator is 1 per unit
+                moments.update(sum_y=moments['n'], sum_yy=moments['n'], sum_xy=moments['sum_x'])
+            data['moments'] = moments
     
     return data
+
+def extract_metric_data(row: Optional[dict], metric_name: str, arm_type: str) -> dict:
+    """Extract numerator, denominator, value, sample_size, std for a metric"""
+    
+    if not row:
+        return {}
+    
+    prefix = 'control_' if arm_type == 'control' else ''
+    return apply_arm_columns(row, compile_arm_columns(metric_name, prefix, row))
@@ -0,0 +1,159 @@
+"""
+Selection - Narrow a pipeline run to the experiments, templates and metrics an
+ad-hoc rerun needs, resolving each requested metric to the templates that produce it
+"""
+
+import re
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from typing import Dict, List, Optional, Set
+
+from .experiment_config import get_templates_for_experiment
+from .metric_compiler import COMPILED_TEMPLATE_NAME, compiled_metric_names, load_metric_specs
+
+# Every template names its metrics through lift_<metric> output columns
+_LIFT_COLUMN = re.compile(r"\blift_(\w+)", re.I)
+
+def template_metrics(path: str) -> Set[str]:
+    """Metric names a template outputs (lowercase, as stored)"""
+    with open(path, 'r') as f:
+        return {name.lower() for name in _LIFT_COLUMN.findall(f.read())}
+
+def metric_templates(config: dict) -> Dict[str, Set[str]]:
+    """
+    Map each metric an experiment produces to the templates producing it
+
+    Compiled metrics map to the compiled query (all spec metrics when
+    compiled_metrics is true).
+    """
+    index = {}
+    for template_info in get_templates_for_experiment(config):
+        for metric_name in template_metrics(template_info['path']):
+            index.setdefault(metric_name, set()).add(template_info['name'])
+
+    compiled = compiled_metric_names(config)
+    if compiled is not None:
+        for metric_name in compiled or load_metric_specs()['metrics']:
+            index.setdefault(metric_name.lower(), set()).add(COMPILED_TEMPLATE_NAME)
+    return index
+
+def _parse_date(value) -> date:
+    if isinstance(value, date):
+        return value
+    return datetime.strptime(str(value)[:10], '%Y-%m-%d').date()
+
+@dataclass
+class Selection:
+    """
+    Filters for a partial run; empty filters select everything
+
+    experiments: exp_keys from manual_experiments.yaml or experiment names. Named
+        experiments run even when marked expired
+    templates: Template names such as 'onboarding_topline' (or 'compiled')
+    metrics: Metric names; only the templates producing them run and only their
+        rows are written
+    since: 'YYYY-MM-DD'; keep experiments whose window reaches this date (end_date >= since)
+    """
+
+    experiments: List[str] = field(default_factory=list)
+    templates: List[str] = field(default_factory=list)
+    metrics: List[str] = field(default_factory=list)
+    since: Optional[str] = None
+
+    def __post_init__(self):
+        if self.since is not None:
+            self.since = _parse_date(self.since).isoformat()
+
+    @property
+    def is_filtered(self) -> bool:
+        return bool(self.experiments or self.templates or self.metrics or self.since)
+
+    @property
+    def metric_names(self) -> Optional[Set[str]]:
+        """Metrics to keep (None keeps all)"""
+        return {m.lower() for m in self.metrics} or None
+
+    def describe(self) -> str:
+        parts = [f"{label}={','.join(values)}" for label, values in
+                 (('experiment', self.experiments), ('template', self.templates), ('metric', self.metrics))
+                 if values]
+        if self.since:
+            parts.append(f"since={self.since}")
+        return ' '.join(parts) or 'all'
+
+    def select_experiments(self, experiments: Dict[str, dict]) -> Dict[str, dict]:
+        """
+        Experiments to run from the manual_experiments.yaml entries
+
+        Args:
+            experiments: exp_key -> YAML entry
+
+        Returns:
+            Filtered exp_key -> YAML entry, in YAML order
+        """
+        if self.experiments:
+            wanted = set(self.experiments)
+            selected = {k: v for k, v in experiments.items()
+                        if k in wanted or v.get('experiment_name') in wanted}
+            found = set(selected) | {v.get('experiment_name') for v in selected.values()}
+            for name in sorted(wanted - found):
+                print(f"   ⚠️  Unknown experiment '{name}'")
+        else:
+            selected = {k: v for k, v in experiments.items() if not v.get('expired', False)}
+
+        if self.since:
+            since = _parse_date(self.since)
+            selected = {k: v for k, v in selected.items() if _parse_date(v['end_date']) >= since}
+        return selected
+
+    def templates_for(self, config: dict) -> Optional[Set[str]]:
+        """
+        Template names to run for one experiment
+
+        Returns:
+            None when templates aren't filtered, otherwise the (possibly empty) set
+            satisfying both the template and the metric filters
+        """
+        if not self.templates and not self.metrics:
+            return None
+
+        available = {t['name'] for t in get_templates_for_experiment(config)}
+        if compiled_metric_names(config) is not None:
+            available.add(COMPILED_TEMPLATE_NAME)
+
+        chosen = set(available)
+        if self.templates:
+            chosen &= {t.lower() for t in self.templates}
+        if self.metrics:
+            index = metric_templates(config)
+            chosen &= set().union(*(index.get(m, set()) for m in self.metric_names))
+        return chosen
+
+def test_metric_resolution():
+    """Check that metrics resolve to the templates producing them on the real experiment configs"""
+    from .experiment_config import load_experiment_config
+
+    config = load_experiment_config('cx_ios_reonboarding')
+    index = metric_templates(config)
+    assert 'onboarding_topline' in index['order_rate'], index['order_rate']
+
+    only_one = Selection(metrics=['onboarding_completion']).templates_for(config)
+    assert only_one and len(only_one) < len(get_templates_for_experiment(config)), only_one
+    assert Selection(templates=['onboarding_topline'], metrics=['order_rate']).templates_for(config) \
+        == {'onboarding_topline'}
+    assert Selection(metrics=['no_such_metric']).templates_for(config) == set()
+    assert Selection().templates_for(config) is None
+
+    experiments = {
+        'live': {'experiment_name': 'live', 'end_date': '2025-10-30'},
+        'old': {'experiment_name': 'old', 'end_date': '2025-09-30', 'expired': True}
+    }
+    assert list(Selection().select_experiments(experiments)) == ['live']
+    assert list(Selection(experiments=['old']).select_experiments(experiments)) == ['old']
+    assert list(Selection(experiments=['old', 'live'], since='2025-10-01').select_experiments(experiments)) \
+        == ['live']
+    print(f"✓ onboarding_completion resolves to {sorted(only_one)}; order_rate is produced by "
+          f"{len(index['order_rate'])} template(s)")
+
+if __name__ == "__main__":
+    test_metric_resolution()
@@ -0,0 +1,344 @@
+"""
+Distinct-count Sketches - Persist per-day HyperLogLog states for exposure and
+ordering units and combine them for any window instead of re-running COUNT(DISTINCT)
+
+A standalone store, refreshed and checked from the command line (--refresh,
+--report) or queried through window_estimates_sql; run_experiments.py does not
+use it, and the templates keep their exact COUNT(DISTINCT) readouts.
+"""
+
+import os
+import json
+import math
+import hashlib
+from datetime import date, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from .metrics_storage import sql_literal
+from .query_renderer import render_template_file
+from .sufficient_stats import _experiment_filter, _to_date, get_stats_watermark, settled_through
+
+SKETCH_TABLE = "proddb.fionafan.experiment_daily_hll_sketches"
+
+# Snowflake's HLL functions use 2^12 registers (~1.6% standard error)
+DEFAULT_PRECISION = 12
+
+SKETCH_METRICS = ('exposure', 'order_units', 'active_units')
+
+# (tag, segments, metric_name) -> sketch
+SketchKey = Tuple[str, Optional[str], str]
+
+class HyperLogLog:
+    """
+    HyperLogLog registers compatible with Snowflake's HLL_EXPORT JSON format
+
+    Sketches exported by the warehouse can be merged and estimated locally.
+    Values added with `add` use a local 64-bit hash, so only merge them with
+    other locally built sketches - the warehouse hash is not reproducible here.
+    """
+
+    def __init__(self, precision: int = DEFAULT_PRECISION, registers: np.ndarray = None):
+        self.precision = precision
+        self.m = 1 << precision
+        if registers is None:
+            registers = np.zeros(self.m, dtype=np.uint8)
+        elif len(registers) != self.m:
+            raise ValueError(f"Expected {self.m} registers for precision {precision}, got {len(registers)}")
+        self.registers = np.asarray(registers, dtype=np.uint8)
+
+    @classmethod
+    def from_export(cls, export) -> 'HyperLogLog':
+        """Build from HLL_EXPORT output (dict or JSON string, dense or sparse)"""
+        if isinstance(export, (str, bytes)):
+            export = json.loads(export)
+        precision = int(export.get('precision', DEFAULT_PRECISION))
+        sketch = cls(precision)
+
+        if 'dense' in export:
+            sketch.registers = np.asarray(export['dense'], dtype=np.uint8)
+        elif 'sparse' in export:
+            sparse = export['sparse']
+            indices = np.asarray(sparse.get('indices', []), dtype=np.int64)
+            counts = np.asarray(sparse.get('maxLzCounts', []), dtype=np.uint8)
+            if len(indices):
+                np.maximum.at(sketch.registers, indices, counts)
+        return sketch
+
+    def to_export(self) -> dict:
+        """Dense HLL_EXPORT-style representation"""
+        return {'version': 4, 'precision': self.precision, 'dense': self.registers.tolist()}
+
+    def add(self, value):
+        """Add one value using a local 64-bit hash"""
+        digest = hashlib.blake2b(str(value).encode('utf-8'), digest_size=8).digest()
+        h = int.from_bytes(digest, 'big')
+        index = h >> (64 - self.precision)
+        remaining_bits = 64 - self.precision
+        w = h & ((1 << remaining_bits) - 1)
+        rank = remaining_bits - w.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def update(self, values: Iterable):
+        for value in values:
+            self.add(value)
+        return self
+
+    def merge(self, other: 'HyperLogLog') -> 'HyperLogLog':
+        """Register-wise max of two sketches (same result as HLL_COMBINE)"""
+        if other.precision != self.precision:
+            raise ValueError(f"Cannot merge sketches with precision {self.precision} and {other.precision}")
+        return HyperLogLog(self.precision, np.maximum(self.registers, other.registers))
+
+    def estimate(self) -> float:
+        """Cardinality estimate with small-range (linear counting) correction"""
+        m = self.m
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / np.sum(np.ldexp(1.0, -self.registers.astype(np.int64)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if raw <= 2.5 * m and zeros > 0:
+            return m * math.log(m / zeros)
+        return float(raw)
+
+    def __len__(self):
+        return int(round(self.estimate()))
+
+def merge_sketches(sketches: Iterable[HyperLogLog]) -> Optional[HyperLogLog]:
+    """Combine any number of sketches; None when the iterable is empty"""
+    combined = None
+    for sketch in sketches:
+        combined = sketch if combined is None else combined.merge(sketch)
+    return combined
+
+def _sketch_template_path(bucket_key: str) -> str:
+    return os.path.join(os.path.dirname(__file__), '..', 'sql_scripts', 'incremental',
+                        f"{bucket_key}_daily_distinct_sketches.sql")
+
+def _render_sketch_query(config: dict, stats_start: date, stats_end: date, exact_window: bool = False) -> str:
+    template_path = _sketch_template_path(config['bucket_key'])
+    if not os.path.exists(template_path):
+        raise FileNotFoundError(f"No sketch template for bucket_key '{config['bucket_key']}'")
+    return render_template_file(template_path, config, {
+        'stats_start_date': stats_start.isoformat(),
+        'stats_end_date': stats_end.isoformat(),
+        'exact_window': exact_window
+    })
+
+def create_sketch_table():
+    """
+    Create the experiment_daily_hll_sketches table if it doesn't exist
+    """
+
+    from utils.snowflake_connection import SnowflakeHook
+
+    create_table_sql = f"""
+    CREATE TABLE IF NOT EXISTS {SKETCH_TABLE} (
+        experiment_name VARCHAR(255),
+        version INT,
+        granularity VARCHAR(20), -- 'consumer_id' or 'device_id'
+        tag VARCHAR(50),
+        segments VARCHAR(50),
+        day DATE,
+        metric_name VARCHAR(100), -- 'exposure', 'order_units', 'active_units'
+        sketch VARIANT, -- HLL_EXPORT output
+        exact_count INT, -- exact distinct count for the day, kept for accuracy checks
+        insert_timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """
+
+    try:
+        with SnowflakeHook() as hook:
+            hook.query_without_result(create_table_sql)
+            hook.query_without_result(f"GRANT SELECT ON TABLE {SKETCH_TABLE} TO ROLE PUBLIC;")
+        print("✓ Created/verified experiment_daily_hll_sketches table with PUBLIC read access")
+    except Exception as e:
+        print(f"✗ Error creating sketch table: {e}")
+        raise
+
+def refresh_sketches(config: dict, today: date = None) -> int:
+    """
+    Sketch the settled days after the stored watermark, entirely in the warehouse
+
+    Only days up to settled_through (today minus settle_days) are stored, so late
+    order rows for recent days are still counted once those days are sketched.
+
+    Args:
+        config: Experiment configuration dictionary
+        today: Override for the current date
+
+    Returns:
+        Number of days sketched
+    """
+
+    from utils.snowflake_connection import SnowflakeHook
+
+    start_day = _to_date(config['start_date'])
+    end_day = min(_to_date(config['end_date']), settled_through(config, today))
+
+    watermark = get_stats_watermark(config, SKETCH_TABLE)
+    stats_start = start_day if watermark is None else max(start_day, watermark + timedelta(days=1))
+    if stats_start > end_day:
+        return 0
+
+    query = _render_sketch_query(config, stats_start, end_day)
+    insert_query = f"""
+    INSERT INTO {SKETCH_TABLE} (
+        experiment_name, version, granularity, tag, segments, day, metric_name, sketch, exact_count
+    )
+    SELECT {sql_literal(config['experiment_name'])}, {sql_literal(config.get('version'))},
+           {sql_literal(config['bucket_key'])}, tag, segments, day, metric_name, sketch, exact_count
+    FROM (
+    {query}
+    )
+    """
+
+    with SnowflakeHook() as hook:
+        hook.query_without_result(insert_query)
+
+    days = (end_day - stats_start).days + 1
+    print(f"   ✓ Sketched {days} day(s) for {config['experiment_name']} from {stats_start}")
+    return days
+
+def load_sketches(config: dict, window_start=None, window_end=None) -> Dict[SketchKey, HyperLogLog]:
+    """
+    Merge stored daily sketches over a window into one sketch per (tag, segments, metric)
+
+    Args:
+        config: Experiment configuration dictionary
+        window_start: First day to include (default: experiment start)
+        window_end: Last day to include (default: experiment end)
+    """
+
+    from utils.snowflake_connection import execute_snowflake_query
+
+    window_start = _to_date(window_start or config['start_date'])
+    window_end = _to_date(window_end or config['end_date'])
+    query = f"""
+    SELECT tag, segments, metric_name, sketch
+    FROM {SKETCH_TABLE}
+    WHERE {_experiment_filter(config)}
+    AND day BETWEEN {sql_literal(str(window_start))} AND {sql_literal(str(window_end))}
+    """
+    combined: Dict[SketchKey, HyperLogLog] = {}
+    for row in execute_snowflake_query(query, method='pandas') or []:
+        row = {k.lower(): v for k, v in row.items()}
+        segments = row.get('segments') if isinstance(row.get('segments'), str) else None
+        key = (row['tag'], segments, row['metric_name'])
+        sketch = HyperLogLog.from_export(row['sketch'])
+        combined[key] = combined[key].merge(sketch) if key in combined else sketch
+    return combined
+
+def window_estimates_sql(config: dict, window_start, window_end) -> str:
+    """SQL that combines stored sketches in the warehouse for one window"""
+    return f"""
+    SELECT tag, segments, metric_name,
+           HLL_ESTIMATE(HLL_COMBINE(HLL_IMPORT(sketch))) AS estimate
+    FROM {SKETCH_TABLE}
+    WHERE {_experiment_filter(config)}
+    AND day BETWEEN {sql_literal(str(_to_date(window_start)))} AND {sql_literal(str(_to_date(window_end)))}
+    GROUP BY 1, 2, 3
+    ORDER BY 1, 2, 3
+    """
+
+def estimate_distinct_counts(config: dict, window_start=None, window_end=None) -> Dict[SketchKey, float]:
+    """Distinct-count estimates for a window from the locally merged daily sketches"""
+    sketches = load_sketches(config, window_start, window_end)
+    return {key: sketch.estimate() for key, sketch in sketches.items()}
+
+def sketch_accuracy_report(config: dict, window_start=None, window_end=None):
+    """
+    Compare sketch estimates against exact COUNT(DISTINCT) on the same window
+
+    Returns:
+        DataFrame with exact_count, local_estimate (merged here),
+        warehouse_estimate (HLL_COMBINE) and relative errors per key
+    """
+
+    import pandas as pd
+    from utils.snowflake_connection import execute_snowflake_query
+
+    window_start = _to_date(window_start or config['start_date'])
+    window_end = _to_date(window_end or min(_to_date(config['end_date']), settled_through(config)))
+
+    exact = execute_snowflake_query(
+        _render_sketch_query(config, window_start, window_end, exact_window=True), method='pandas'
+    )
+    warehouse = execute_snowflake_query(window_estimates_sql(config, window_start, window_end), method='pandas')
+    local = estimate_distinct_counts(config, window_start, window_end)
+
+    def _keyed(rows: Optional[List[dict]], value_column: str) -> Dict[SketchKey, float]:
+        keyed = {}
+        for row in rows or []:
+            row = {k.lower(): v for k, v in row.items()}
+            segments = row.get('segments') if isinstance(row.get('segments'), str) else None
+            keyed[(row['tag'], segments, row['metric_name'])] = row[value_column]
+        return keyed
+
+    exact_counts = _keyed(exact, 'exact_count')
+    warehouse_counts = _keyed(warehouse, 'estimate')
+
+    rows = []
+    for key in sorted(set(exact_counts) | set(local), key=lambda k: tuple(str(part) for part in k)):
+        exact_count = exact_counts.get(key)
+        local_estimate = local.get(key)
+        warehouse_estimate = warehouse_counts.get(key)
+        rows.append({
+            'tag': key[0],
+            'segments': key[1],
+            'metric_name': key[2],
+            'exact_count': exact_count,
+            'local_estimate': local_estimate,
+            'warehouse_estimate': warehouse_estimate,
+            'local_rel_error': (local_estimate / exact_count - 1) if exact_count and local_estimate is not None else None,
+            'warehouse_rel_error': (float(warehouse_estimate) / exact_count - 1) if exact_count and warehouse_estimate is not None else None
+        })
+
+    return pd.DataFrame(rows)
+
+def test_local_accuracy(days: int = 30, daily_units: int = 20000, seed: int = 42):
+    """Merge per-day sketches of overlapping unit ids and compare to the exact window count"""
+    rng = np.random.default_rng(seed)
+    population = 5 * daily_units
+
+    daily_sketches = []
+    all_ids = set()
+    for _ in range(days):
+        ids = rng.integers(0, population, size=daily_units)
+        all_ids.update(ids.tolist())
+        daily_sketches.append(HyperLogLog().update(ids.tolist()))
+
+    combined = merge_sketches(daily_sketches)
+    exact = len(all_ids)
+    estimate = combined.estimate()
+    rel_error = estimate / exact - 1
+
+    # Round-trip through the export format
+    restored = HyperLogLog.from_export(json.dumps(combined.to_export()))
+    assert restored.estimate() == estimate
+
+    standard_error = 1.04 / math.sqrt(combined.m)
+    print(f"✓ exact={exact} estimate={estimate:.0f} rel_error={rel_error:+.4f} (expected ±{standard_error:.4f})")
+    assert abs(rel_error) < 4 * standard_error
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Daily HLL sketches for distinct counts')
+    parser.add_argument('experiment', nargs='?', help='Experiment key from manual_experiments.yaml')
+    parser.add_argument('--refresh', action='store_true', help='Sketch any settled days not stored yet')
+    parser.add_argument('--report', action='store_true', help='Print the sketch vs exact accuracy report')
+    args = parser.parse_args()
+
+    if not args.experiment:
+        test_local_accuracy()
+    else:
+        from .experiment_config import load_experiment_config
+
+        config = load_experiment_config(args.experiment)
+        if args.refresh:
+            create_sketch_table()
+            refresh_sketches(config)
+        if args.report:
+            print(sketch_accuracy_report(config).to_string(index=False))
@@ -0,0 +1,443 @@
+"""
+SQL Analyzer - Flag partition-pruning-hostile predicates in rendered templates and
+rewrite local-time filters into ranges on the raw UTC column
+"""
+
+import json
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+try:
+    import sqlglot
+    from sqlglot import exp
+    SQLGLOT_AVAILABLE = True
+except ImportError:
+    SQLGLOT_AVAILABLE = False
+
+DIALECT = 'snowflake'
+
+# Predicates that can be answered from micro-partition min/max metadata
+_RANGE_OPERATORS = ('GT', 'GTE', 'LT', 'LTE')
+
+@dataclass
+class Finding:
+    """One pruning-hostile construct in a query"""
+
+    kind: str  # 'non_sargable', 'distinct_join' or 'range_join'
+    sql: str
+    table: Optional[str] = None  # base table the filtered column belongs to (None for CTEs)
+    column: Optional[str] = None
+    rewritable: bool = False
+    window_days: Optional[int] = None
+
+@dataclass
+class QueryReport:
+    """Findings for one rendered template, plus its rewritten text"""
+
+    template_name: str
+    path: str
+    findings: List[Finding] = field(default_factory=list)
+    rewritten_sql: Optional[str] = None
+    rewrites: int = 0
+    partitions_before: Optional[dict] = None
+    partitions_after: Optional[dict] = None
+
+    @property
+    def prunable_tables(self) -> List[str]:
+        """Base tables whose only time filter is hidden behind a function"""
+        return sorted({f.table for f in self.findings if f.rewritable and f.table})
+
+def _require_sqlglot():
+    if not SQLGLOT_AVAILABLE:
+        raise ImportError("sqlglot is required for SQL analysis (pip install sqlglot)")
+
+def _cte_names(tree) -> set:
+    return {cte.alias_or_name.lower() for cte in tree.find_all(exp.CTE)}
+
+def _source_tables(select) -> Dict[str, str]:
+    """alias (or bare name) -> table name for the FROM/JOIN sources of one SELECT"""
+    sources = {}
+    # Key is 'from_' in newer sqlglot releases, 'from' in older ones
+    from_clause = select.args.get('from_') or select.args.get('from')
+    tables = [from_clause.this] if from_clause else []
+    tables += [join.this for join in select.args.get('joins') or []]
+    for table in tables:
+        if isinstance(table, exp.Table):
+            sources[table.alias_or_name.lower()] = '.'.join(part.name for part in table.parts).lower()
+    return sources
+
+def _column_table(column, cte_names: set) -> Optional[str]:
+    """Base table a column is read from, or None when it comes from a CTE or subquery"""
+    select = column.find_ancestor(exp.Select)
+    if select is None:
+        return None
+    sources = _source_tables(select)
+    if column.table:
+        table = sources.get(column.table.lower())
+    elif len(sources) == 1:
+        table = next(iter(sources.values()))
+    else:
+        table = None
+    if table is None or table in cte_names:
+        return None
+    return table
+
+def _wrapped_column(expression):
+    """The column inside a function call (e.g. CONVERT_TIMEZONE(..., col)), or None if bare"""
+    if isinstance(expression, (exp.Column, exp.Literal)) or expression.find(exp.Select):
+        return None
+    columns = list(expression.find_all(exp.Column))
+    if len({c.sql() for c in columns}) != 1:
+        return None
+    return columns[0]
+
+def _is_constant(expression) -> bool:
+    return expression.find(exp.Column) is None and expression.find(exp.Select) is None
+
+def _in_filter(node) -> bool:
+    """True when a predicate sits in a WHERE or JOIN ON rather than a SELECT list or CASE"""
+    ancestor = node.find_ancestor(exp.Where, exp.Join, exp.Select, exp.Case, exp.If)
+    return isinstance(ancestor, (exp.Where, exp.Join))
+
+def _predicates(tree):
+    """Range and BETWEEN predicates in filter positions"""
+    kinds = tuple(getattr(exp, name) for name in _RANGE_OPERATORS) + (exp.Between,)
+    return [node for node in tree.find_all(*kinds) if _in_filter(node)]
+
+def _operands(predicate) -> Tuple:
+    """(filtered expression, constant bounds) of a range predicate"""
+    if isinstance(predicate, exp.Between):
+        return predicate.this, [predicate.args['low'], predicate.args['high']]
+    return predicate.this, [predicate.expression]
+
+def _parse_local(value: str) -> Optional[datetime]:
+    for fmt in ('%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M', '%Y-%m-%d'):
+        try:
+            return datetime.strptime(value.strip(), fmt)
+        except ValueError:
+            continue
+    return None
+
+def _local_to_utc(local: datetime, timezone: str) -> Optional[str]:
+    """
+    UTC wall time of a local wall time, or None if it falls in a DST gap or overlap
+    (where the local predicate has no single raw-column equivalent)
+    """
+    zone = ZoneInfo(timezone)
+    early, late = local.replace(tzinfo=zone, fold=0), local.replace(tzinfo=zone, fold=1)
+    if early.utcoffset() != late.utcoffset():
+        return None
+    utc = (local - early.utcoffset())
+    return utc.strftime('%Y-%m-%d %H:%M:%S')
+
+def _timezone_filter(expression):
+    """
+    Match CONVERT_TIMEZONE('UTC', tz, col) optionally cast to DATE
+
+    Returns:
+        (column, target timezone, truncated to date) or None
+    """
+    truncated = False
+    if isinstance(expression, exp.Cast) and expression.to.this == exp.DataType.Type.DATE:
+        expression, truncated = expression.this, True
+    if not isinstance(expression, exp.ConvertTimezone):
+        return None
+    source, target = expression.args.get('source_tz'), expression.args.get('target_tz')
+    column = expression.args.get('timestamp')
+    if not (isinstance(source, exp.Literal) and isinstance(target, exp.Literal)
+            and isinstance(column, exp.Column) and source.this.upper() == 'UTC'):
+        return None
+    return column, target.this, truncated
+
+def _utc_bounds(predicate, timezone: str, truncated: bool) -> Optional[List[Tuple[str, str]]]:
+    """
+    Equivalent (operator, UTC literal) conditions on the raw column
+
+    A DATE-truncated comparison becomes a half-open range on midnight boundaries:
+    date(x) <= d  <=>  x < d + 1 day, date(x) > d  <=>  x >= d + 1 day.
+    """
+    _, bounds = _operands(predicate)
+    if not all(isinstance(b, exp.Literal) and b.is_string for b in bounds):
+        return None
+    locals_ = [_parse_local(b.this) for b in bounds]
+    if any(value is None for value in locals_):
+        return None
+    if truncated and any(value.time() != datetime.min.time() for value in locals_):
+        return None
+
+    if isinstance(predicate, exp.Between):
+        conditions = [('GTE', locals_[0]), ('LT', locals_[1] + timedelta(days=1)) if truncated else ('LTE', locals_[1])]
+    else:
+        operator, local = type(predicate).__name__, locals_[0]
+        if truncated and operator == 'LTE':
+            operator, local = 'LT', local + timedelta(days=1)
+        elif truncated and operator == 'GT':
+            operator, local = 'GTE', local + timedelta(days=1)
+        conditions = [(operator, local)]
+
+    converted = []
+    for operator, local in conditions:
+        utc = _local_to_utc(local, timezone)
+        if utc is None:
+            return None
+        converted.append((operator, utc))
+    return converted
+
+def _window_days(predicate) -> Optional[int]:
+    if not isinstance(predicate, exp.Between):
+        return None
+    low, high = predicate.args['low'], predicate.args['high']
+    if not (isinstance(low, exp.Literal) and isinstance(high, exp.Literal)):
+        return None
+    start, end = _parse_local(low.this), _parse_local(high.this)
+    if start is None or end is None:
+        return None
+    return (end.date() - start.date()).days + 1
+
+def analyze_sql(query: str) -> List[Finding]:
+    """
+    Flag constructs that defeat micro-partition pruning or blow up joins
+
+    - non_sargable: a filter on a function of a column (CONVERT_TIMEZONE, ::date, LOWER, ...)
+      compared with constants; min/max partition metadata is kept for the raw column only
+    - distinct_join: SELECT DISTINCT over a join (dedup after the fan-out)
+    - range_join: JOIN ON with an inequality between two tables (e.g. e.day <= o.day)
+    """
+    _require_sqlglot()
+    tree = sqlglot.parse_one(query, read=DIALECT)
+    ctes = _cte_names(tree)
+    findings = []
+
+    for predicate in _predicates(tree):
+        target, bounds = _operands(predicate)
+        column = _wrapped_column(target)
+        if column is None or not all(_is_constant(b) for b in bounds):
+            continue
+        match = _timezone_filter(target)
+        rewritable = bool(match) and _utc_bounds(predicate, match[1], match[2]) is not None
+        findings.append(Finding(
+            kind='non_sargable',
+            sql=predicate.sql(dialect=DIALECT),
+            table=_column_table(column, ctes),
+            column=column.name,
+            rewritable=rewritable,
+            window_days=_window_days(predicate)
+        ))
+
+    for select in tree.find_all(exp.Select):
+        if select.args.get('distinct') and select.args.get('joins'):
+            tables = ', '.join(_source_tables(select).values())
+            findings.append(Finding(kind='distinct_join', sql=f"SELECT DISTINCT ... FROM {tables}"))
+
+    for join in tree.find_all(exp.Join):
+        condition = join.args.get('on')
+        if condition is None:
+            continue
+        kinds = tuple(getattr(exp, name) for name in _RANGE_OPERATORS) + (exp.Between,)
+        for predicate in condition.find_all(*kinds):
+            qualifiers = {c.table.lower() for c in predicate.find_all(exp.Column) if c.table}
+            if len(qualifiers) > 1:
+                findings.append(Finding(kind='range_join', sql=predicate.sql(dialect=DIALECT)))
+
+    return findings
+
+def rewrite_timezone_filters(query: str, pretty: bool = True) -> Tuple[str, int]:
+    """
+    Rewrite CONVERT_TIMEZONE('UTC', tz, col) [::date] filters into bounds on col
+
+    convert_timezone('UTC','America/Los_Angeles',ts) BETWEEN '2025-08-21' AND '2025-09-30'
+    becomes ts BETWEEN '2025-08-21 07:00:00' AND '2025-09-30 07:00:00'. Bounds are
+    converted with the IANA database, so each side carries its own DST offset; a bound
+    inside a DST gap or overlap is left untouched.
+
+    Returns:
+        (rewritten SQL, number of predicates rewritten)
+    """
+    _require_sqlglot()
+    tree = sqlglot.parse_one(query, read=DIALECT)
+    rewrites = 0
+
+    for predicate in _predicates(tree):
+        target, _ = _operands(predicate)
+        match = _timezone_filter(target)
+        if match is None:
+            continue
+        column, timezone, truncated = match
+        conditions = _utc_bounds(predicate, timezone, truncated)
+        if conditions is None:
+            continue
+
+        if isinstance(predicate, exp.Between) and [op for op, _ in conditions] == ['GTE', 'LTE']:
+            replacement = exp.Between(this=column.copy(),
+                                      low=exp.Literal.string(conditions[0][1]),
+                                      high=exp.Literal.string(conditions[1][1]))
+        else:
+            parts = [getattr(exp, op)(this=column.copy(), expression=exp.Literal.string(utc))
+                     for op, utc in conditions]
+            replacement = parts[0] if len(parts) == 1 else exp.Paren(this=exp.and_(*parts))
+        predicate.replace(replacement)
+        rewrites += 1
+
+    return tree.sql(dialect=DIALECT, pretty=pretty), rewrites
+
+def explain_partitions(query: str) -> Optional[dict]:
+    """Compile-time partition counts from EXPLAIN (nothing is scanned)"""
+
+    from utils.snowflake_connection import SnowflakeHook
+
+    with SnowflakeHook() as hook:
+        if not hook.conn:
+            hook.connect()
+        cursor = hook.conn.cursor()
+        try:
+            cursor.execute(f"EXPLAIN USING JSON {query}")
+            row = cursor.fetchone()
+        finally:
+            cursor.close()
+    if not row:
+        return None
+    stats = json.loads(row[0]).get('GlobalStats', {})
+    return {
+        'partitions_total': stats.get('partitionsTotal'),
+        'partitions_assigned': stats.get('partitionsAssigned'),
+        'bytes_assigned': stats.get('bytesAssigned')
+    }
+
+def analyze_experiment(config: dict, rewrite: bool = False, explain: bool = False) -> List[QueryReport]:
+    """
+    Analyze every rendered template of an experiment
+
+    Args:
+        config: Experiment configuration dictionary
+        rewrite: Write the rewritten SQL back to the rendered copies the runner executes; the
+            render manifest records it, so later renders re-apply it instead of keeping a stale copy
+        explain: Compare EXPLAIN partition counts before and after the rewrite
+
+    Returns:
+        One QueryReport per template
+    """
+    from .query_renderer import record_rewrite, render_templates_for_experiment
+
+    reports = []
+    for template_name, path in render_templates_for_experiment(config).items():
+        with open(path, 'r') as f:
+            query = f.read()
+        report = QueryReport(template_name=template_name, path=path)
+        try:
+            report.findings = analyze_sql(query)
+            if any(f.rewritable for f in report.findings):
+                report.rewritten_sql, report.rewrites = rewrite_timezone_filters(query)
+        except sqlglot.errors.ParseError as e:
+            print(f"      ✗ Could not parse {template_name}: {str(e).splitlines()[0]}")
+            reports.append(report)
+            continue
+
+        if explain and report.rewritten_sql:
+            try:
+                report.partitions_before = explain_partitions(query)
+                report.partitions_after = explain_partitions(report.rewritten_sql)
+            except Exception as e:
+                print(f"      ⚠️  EXPLAIN failed for {template_name}: {e}")
+
+        if rewrite and report.rewritten_sql:
+            record_rewrite(config, template_name, report.rewritten_sql)
+        reports.append(report)
+    return reports
+
+def print_report(experiment_name: str, reports: List[QueryReport]):
+    """Summarize findings and the estimated pruning impact of the rewrite"""
+    findings = [f for report in reports for f in report.findings]
+    print(f"🔎 {experiment_name}: {len(reports)} queries, {len(findings)} findings")
+
+    for report in reports:
+        if not report.findings:
+            continue
+        counts = {}
+        for finding in report.findings:
+            counts[finding.kind] = counts.get(finding.kind, 0) + 1
+        summary = ', '.join(f"{count} {kind}" for kind, count in sorted(counts.items()))
+        print(f"   📄 {report.template_name}: {summary}")
+        for finding in report.findings:
+            marker = '🔧' if finding.rewritable else '⚠️ '
+            where = f" on {finding.table}" if finding.table else ''
+            print(f"      {marker} {finding.kind}{where}: {finding.sql[:120]}")
+
+        if report.prunable_tables:
+            windows = [f.window_days for f in report.findings if f.rewritable and f.window_days]
+            window = f"{max(windows)}-day window" if windows else "bounded window"
+            print(f"      📉 {report.rewrites} filter(s) rewritable; "
+                  f"{len(report.prunable_tables)} table(s) can prune to the {window}: "
+                  f"{', '.join(report.prunable_tables)}")
+        if report.partitions_before and report.partitions_after:
+            before = report.partitions_before['partitions_assigned'] or 0
+            after = report.partitions_after['partitions_assigned'] or 0
+            total = report.partitions_before['partitions_total'] or 0
+            saved = f" ({1 - after / before:.0%} fewer)" if before else ''
+            print(f"      📊 EXPLAIN partitions: {before:,} → {after:,} of {total:,}{saved}")
+
+def test_rewrite_timezone_filters():
+    """Check the rewrite on both sides of the March DST change and the findings it clears"""
+    query = """
+    WITH exposure AS (
+        SELECT DISTINCT ee.tag, ee.bucket_key, o.delivery_id
+        FROM proddb.public.fact_dedup_experiment_exposure ee
+        JOIN dimension_deliveries o ON o.creator_id = ee.bucket_key AND ee.exposure_time <= o.created_at
+        WHERE convert_timezone('UTC','America/Los_Angeles',ee.EXPOSURE_TIME) BETWEEN '2025-03-01' AND '2025-03-20'
+    )
+    SELECT tag, COUNT(*) FROM exposure e
+    JOIN m_store_page_load s ON s.consumer_id = e.bucket_key
+    WHERE convert_timezone('UTC','America/Los_Angeles',s.timestamp)::date <= '2025-03-20'
+    GROUP BY 1
+    """
+    findings = analyze_sql(query)
+    kinds = sorted(f.kind for f in findings)
+    assert kinds == ['distinct_join', 'non_sargable', 'non_sargable', 'range_join'], kinds
+    assert {f.table for f in findings if f.kind == 'non_sargable'} == {
+        'proddb.public.fact_dedup_experiment_exposure', 'm_store_page_load'}
+
+    rewritten, rewrites = rewrite_timezone_filters(query, pretty=False)
+    assert rewrites == 2
+    # PST (UTC-8) before 2025-03-09, PDT (UTC-7) after; the ::date bound becomes exclusive next midnight
+    assert "ee.EXPOSURE_TIME BETWEEN '2025-03-01 08:00:00' AND '2025-03-20 07:00:00'" in rewritten
+    assert "s.timestamp < '2025-03-21 07:00:00'" in rewritten
+    assert not [f for f in analyze_sql(rewritten) if f.kind == 'non_sargable']
+
+    # 02:30 on 2025-03-09 does not exist in Los Angeles: leave it alone
+    gap = "SELECT 1 FROM t WHERE convert_timezone('UTC','America/Los_Angeles',ts) >= '2025-03-09 02:30:00'"
+    assert rewrite_timezone_filters(gap)[1] == 0
+    print(f"✓ {rewrites} timezone filters rewritten to raw UTC bounds; DST gap left untouched")
+
+def test_rewrite_survives_rerender():
+    """A --rewrite copy is renderer output: config changes re-render it with the rewrite re-applied"""
+    import os
+    import tempfile
+    from . import query_renderer
+
+    config = {'experiment_name': 'rewrite_test', 'start_date': '2025-09-01', 'end_date': '2025-09-30',
+              'bucket_key': 'device_id', 'template': 'onboarding', 'segments': []}
+    original_rendered_dir = query_renderer._rendered_dir
+    with tempfile.TemporaryDirectory() as tmp:
+        query_renderer._rendered_dir = lambda experiment_name: os.path.join(tmp, experiment_name)
+        try:
+            reports = analyze_experiment(config, rewrite=True)
+            rewritten = {r.template_name: r.rewritten_sql for r in reports if r.rewrites}
+            assert rewritten, 'expected rewritable filters in the onboarding templates'
+
+            config['start_date'] = '2025-09-05'
+            paths = query_renderer.render_templates_for_experiment(config)
+            templates = {info['name']: info for info in query_renderer.get_templates_for_experiment(config)}
+            for name in rewritten:
+                with open(paths[name]) as f:
+                    sql = f.read()
+                assert sql != rewritten[name], name  # new window, not the stale rewrite
+                assert not [f for f in analyze_sql(sql) if f.rewritable], name
+                assert not query_renderer.has_manual_override(config, templates[name])
+        finally:
+            query_renderer._rendered_dir = original_rendered_dir
+    print(f"✓ {len(rewritten)} rewritten queries re-rendered for a new start_date with the rewrite kept")
+
+if __name__ == "__main__":
+    test_rewrite_timezone_filters()
+    test_rewrite_survives_rerender()
@@ -0,0 +1,544 @@
+"""
+SQL Statistics - Compute p-values, confidence intervals and statsig labels in the
+warehouse and insert them into experiment_metrics_results without a client round trip
+
+The expressions mirror ExperimentAnalysis:
+- rate metrics: pooled two-proportion z-test, Wald 95% CI
+- continuous metrics: Welch t-test (delta-method variances when unit moments exist)
+- statsig_string: same thresholds and desired-direction logic as apply_statsig_classification
+
+Differences: the normal tail uses the Zelen-Severo polynomial (|error| < 7.5e-8),
+Student t is mapped to z with a Wallace-style transform and t critical values use a
+Cornish-Fisher expansion (both negligible at experiment sample sizes) and
+statistical_power is left NULL. Low-count rate metrics, which ExperimentAnalysis
+tests with the exact mid-p test, are read back after the insert and re-tested in
+Python (see retest_low_count_rows).
+"""
+
+from dataclasses import replace
+from typing import Iterable, List, Optional, Tuple
+
+from .analysis import EXACT_TEST_MAX_EVENTS, EXACT_TEST_MIN_SAMPLE_SIZE, ExperimentAnalysis
+from .metrics_storage import sql_literal
+from .recompute import _clean, recompute_rows, write_back
+from .results_parser import ArmColumns, ColumnPlan, MetricPlan, compile_column_plan
+
+METRICS_TABLE = "proddb.fionafan.experiment_metrics_results"
+
+# Zelen & Severo (Abramowitz & Stegun 26.2.17) coefficients for the normal upper tail
+_TAIL_P = 0.2316419
+_TAIL_B = (0.319381530, -0.356563782, 1.781477937, -1.821255978, 1.330274429)
+_INV_SQRT_2PI = 0.3989422804014327
+_Z_975 = 1.959963984540054
+
+# ---------------------------------------------------------------------------
+# Expression library
+# ---------------------------------------------------------------------------
+
+def normal_upper_tail_sql(x: str) -> str:
+    """P(Z > x) for x >= 0"""
+    t = f"(1.0 / (1.0 + {_TAIL_P} * ({x})))"
+    b1, b2, b3, b4, b5 = _TAIL_B
+    polynomial = f"({t} * ({b1} + {t} * ({b2} + {t} * ({b3} + {t} * ({b4} + {t} * {b5})))))"
+    return f"({_INV_SQRT_2PI} * EXP(-0.5 * ({x}) * ({x})) * {polynomial})"
+
+def two_sided_normal_pvalue_sql(z: str) -> str:
+    """2 * (1 - Phi(|z|))"""
+    return f"(2.0 * {normal_upper_tail_sql(f'ABS({z})')})"
+
+def t_to_z_sql(t: str, df: str) -> str:
+    """Map a Student t statistic with df degrees of freedom to an approximately normal z"""
+    return f"(({t}) * (1.0 - 1.0 / (4.0 * ({df}))) / SQRT(1.0 + ({t}) * ({t}) / (2.0 * ({df}))))"
+
+def t_critical_975_sql(df: str) -> str:
+    """Cornish-Fisher approximation of the 97.5% Student t quantile"""
+    z = _Z_975
+    c1 = (z ** 3 + z) / 4
+    c2 = (5 * z ** 5 + 16 * z ** 3 + 3 * z) / 96
+    c3 = (3 * z ** 7 + 19 * z ** 5 + 17 * z ** 3 - 15 * z) / 384
+    return f"({z} + {c1} / ({df}) + {c2} / POWER({df}, 2) + {c3} / POWER({df}, 3))"
+
+def delta_method_variance_sql(prefix: str) -> str:
+    """Variance of sum_x / sum_y from unit moments in columns {prefix}n, {prefix}sum_x, ..."""
+    n, sx, sy = f"{prefix}n", f"{prefix}sum_x", f"{prefix}sum_y"
+    sxx, syy, sxy = f"{prefix}sum_xx", f"{prefix}sum_yy", f"{prefix}sum_xy"
+    mean_x, mean_y, ratio = f"({sx} / {n})", f"({sy} / {n})", f"({sx} / {sy})"
+    var_x = f"(({sxx} - {n} * {mean_x} * {mean_x}) / ({n} - 1))"
+    var_y = f"(({syy} - {n} * {mean_y} * {mean_y}) / ({n} - 1))"
+    cov_xy = f"(({sxy} - {n} * {mean_x} * {mean_y}) / ({n} - 1))"
+    return f"(({var_x} - 2 * {ratio} * {cov_xy} + {ratio} * {ratio} * {var_y}) / ({n} * {mean_y} * {mean_y}))"
+
+def statsig_case_sql(p_value: str, relative_impact: str, desired_direction: str) -> str:
+    """CASE expression equivalent to ExperimentAnalysis.apply_statsig_classification"""
+    positive = (f"(CASE WHEN LOWER(COALESCE({desired_direction}, 'increase')) = 'decrease' "
+                f"THEN {relative_impact} < 0 ELSE {relative_impact} > 0 END)")
+    return f"""CASE
+            WHEN {p_value} IS NULL THEN 'unknown'
+            WHEN {p_value} < 0.05 THEN CASE WHEN {positive} THEN 'significant positive' ELSE 'significant negative' END
+            WHEN {p_value} < 0.25 THEN CASE WHEN {positive} THEN 'directional positive' ELSE 'directional negative' END
+            ELSE 'flat'
+        END"""
+
+# ---------------------------------------------------------------------------
+# Unpivot the template result with the compiled column plan
+# ---------------------------------------------------------------------------
+
+def _num(column: Optional[str]) -> str:
+    return f"CAST({column} AS DOUBLE)" if column else "CAST(NULL AS DOUBLE)"
+
+def _arm_select(arm: ArmColumns, prefix: str) -> List[str]:
+    """Numeric columns for one arm, replicating apply_arm_columns"""
+    denominator = _num(arm.denominator)
+    if arm.denominator_fallback:
+        denominator = f"COALESCE({denominator}, {_num(arm.denominator_fallback)})"
+    if arm.derive_numerator:
+        for candidate in arm.completion_denominators:
+            denominator = f"COALESCE({denominator}, {_num(candidate)})"
+
+    numerator = _num(arm.numerator)
+    if arm.derive_numerator:
+        derived = f"({_num(arm.value)} * {denominator})"
+        truncated = f"(CASE WHEN {derived} >= 0 THEN FLOOR({derived}) ELSE CEIL({derived}) END)"
+        numerator = f"COALESCE({truncated}, {numerator})"
+
+    moments = dict(arm.moments)
+    moment_columns = []
+    for key in ('n', 'sum_x', 'sum_y', 'sum_xx', 'sum_yy', 'sum_xy'):
+        if moments and key in moments:
+            expression = _num(moments[key])
+        elif moments and key in ('sum_y', 'sum_yy'):
+            expression = _num(moments['n'])  # Denominator is 1 per unit
+        elif moments and key == 'sum_xy':
+            expression = _num(moments['sum_x'])
+        else:
+            expression = _num(None)
+        moment_columns.append(f"{expression} AS {prefix}m_{key}")
+
+    return [
+        f"{numerator} AS {prefix}numerator",
+        f"{denominator} AS {prefix}denominator",
+        f"{_num(arm.value)} AS {prefix}value",
+        f"{_num(arm.sample_size)} AS {prefix}sample_size",
+        f"{_num(arm.std)} AS {prefix}std",
+    ] + moment_columns
+
+def _metric_rows_sql(plan: ColumnPlan, metric_plan: MetricPlan, config: dict, source: str,
+                     source_columns: Tuple[str, ...], analysis: ExperimentAnalysis) -> str:
+    arm = plan.arm_column
+    if not plan.dimension_columns:
+        dimension = "CAST(NULL AS VARCHAR)"
+    elif len(plan.dimension_columns) == 1:
+        dimension = f"CAST({plan.dimension_columns[0]} AS VARCHAR)"
+    else:
+        dimension = f"CONCAT_WS(' | ', {', '.join(plan.dimension_columns)})"
+
+    desired_direction = analysis._get_metric_desired_direction(plan.template_name, metric_plan.metric_name)
+    columns = [
+        f"{sql_literal(config['experiment_name'])} AS experiment_name",
+        f"{sql_literal(str(config['start_date']))} AS start_date",
+        f"{sql_literal(str(config['end_date']))} AS end_date",
+        f"{sql_literal(config.get('version'))} AS version",
+        f"{sql_literal(config['bucket_key'])} AS granularity",
+        f"{sql_literal(plan.template_name)} AS template_name",
+        f"{sql_literal(metric_plan.metric_name)} AS metric_name",
+        f"{arm} AS treatment_arm",
+        f"{sql_literal(metric_plan.metric_type)} AS metric_type",
+        f"{dimension} AS dimension",
+        "segments" if 'segments' in source_columns else "CAST(NULL AS VARCHAR) AS segments",
+        f"{sql_literal(metric_plan.template_rank)} AS template_rank",
+        f"{sql_literal(metric_plan.metric_rank)} AS metric_rank",
+        f"{sql_literal(metric_plan.desired_direction)} AS desired_direction",
+        f"{sql_literal(desired_direction)} AS statsig_direction",
+        f"{_num(metric_plan.lift_column)} AS lift",
+    ] + _arm_select(metric_plan.treatment, 't_') + _arm_select(metric_plan.control, 'c_')
+
+    select_list = ',\n        '.join(columns)
+    return f"""SELECT {select_list}
+    FROM {source}
+    WHERE {arm} <> 'control'"""
+
+def select_metrics(plan: ColumnPlan, metric_names: Optional[Iterable[str]]) -> ColumnPlan:
+    """Plan restricted to the selected metrics (run_experiments.py --metric), like finalize_metrics"""
+    if not metric_names:
+        return plan
+    wanted = {name.lower() for name in metric_names}
+    return replace(plan, metrics=tuple(m for m in plan.metrics if m.metric_name.lower() in wanted))
+
+def build_stats_select(plan: ColumnPlan, config: dict, source: str = 'template_result',
+                       source_columns: Tuple[str, ...] = (), srm_p_value: Optional[float] = None) -> str:
+    """
+    SELECT producing experiment_metrics_results rows for every metric in the plan
+
+    Args:
+        plan: Column plan compiled from the template's result schema
+        config: Experiment configuration dictionary
+        source: Table or CTE name holding the template result
+        source_columns: Result column names (to detect the segments column)
+        srm_p_value: Pre-flight SRM p-value stored on every row
+    """
+    analysis = ExperimentAnalysis()
+    metric_rows = '\n    UNION ALL\n    '.join(
+        _metric_rows_sql(plan, metric_plan, config, source, source_columns, analysis) for metric_plan in plan.metrics
+    )
+
+    rate_ok = "metric_type = 'rate' AND t_numerator IS NOT NULL AND t_denominator <> 0 AND c_numerator IS NOT NULL AND c_denominator <> 0"
+    continuous_ok = ("metric_type = 'continuous' AND t_value <> 0 AND c_value <> 0 AND t_std <> 0 AND c_std <> 0 "
+                     "AND t_sample_size <> 0 AND c_sample_size <> 0")
+    ratio_ok = "metric_type = 'continuous' AND t_m_n >= 2 AND c_m_n >= 2 AND t_m_sum_y <> 0 AND c_m_sum_y <> 0"
+
+    return f"""WITH metric_rows AS (
+    {metric_rows}
+)
+
+, prepared AS (
+    SELECT r.*
+        -- Rate inputs
+        , CASE WHEN {rate_ok} THEN t_numerator + c_numerator END AS total_events
+        , CASE WHEN {rate_ok} THEN t_numerator / t_denominator END AS p1
+        , CASE WHEN {rate_ok} THEN c_numerator / c_denominator END AS p2
+        , CASE WHEN {rate_ok} THEN (t_numerator + c_numerator) / (t_denominator + c_denominator) END AS p_pooled
+        -- Continuous inputs: variance of each arm's mean (delta method when unit moments exist)
+        , CASE WHEN {ratio_ok} THEN 1 ELSE 0 END AS use_delta
+        , CASE WHEN {ratio_ok} THEN {delta_method_variance_sql('t_m_')}
+               WHEN {continuous_ok} THEN t_std * t_std / t_sample_size END AS v1
+        , CASE WHEN {ratio_ok} THEN {delta_method_variance_sql('c_m_')}
+               WHEN {continuous_ok} THEN c_std * c_std / c_sample_size END AS v2
+        , CASE WHEN {ratio_ok} THEN t_m_n WHEN {continuous_ok} THEN t_sample_size END AS n1
+        , CASE WHEN {ratio_ok} THEN c_m_n WHEN {continuous_ok} THEN c_sample_size END AS n2
+    FROM metric_rows r
+)
+
+, filled AS (
+    SELECT p.*
+        , CASE
+            WHEN metric_type = 'rate' AND total_events = 0 THEN 0.0
+            WHEN metric_type = 'rate' THEN COALESCE(t_value, p1)
+            WHEN use_delta = 1 THEN COALESCE(t_value, t_m_sum_x / t_m_sum_y)
+            ELSE t_value
+          END AS treatment_value
+        , CASE
+            WHEN metric_type = 'rate' AND total_events = 0 THEN 0.0
+            WHEN metric_type = 'rate' THEN COALESCE(c_value, p2)
+            WHEN use_delta = 1 THEN COALESCE(c_value, c_m_sum_x / c_m_sum_y)
+            ELSE c_value
+          END AS control_value
+        , CASE WHEN total_events > 0 THEN SQRT(p_pooled * (1 - p_pooled) * (1 / t_denominator + 1 / c_denominator)) END AS se_rate
+        , CASE WHEN total_events > 0 THEN SQRT(p1 * (1 - p1) / t_denominator + p2 * (1 - p2) / c_denominator) END AS se_rate_diff
+        , CASE WHEN v1 IS NOT NULL AND v2 IS NOT NULL THEN SQRT(v1 + v2) END AS se_cont
+        , CASE WHEN v1 IS NOT NULL AND v2 IS NOT NULL AND (v1 > 0 OR v2 > 0)
+               THEN (v1 + v2) * (v1 + v2) / (v1 * v1 / (n1 - 1) + v2 * v2 / (n2 - 1)) END AS df
+    FROM prepared p
+)
+
+, tested AS (
+    SELECT f.*
+        , CASE
+            WHEN metric_type = 'rate' AND total_events = 0 THEN 1.0
+            WHEN metric_type = 'rate' AND se_rate = 0 THEN 1.0
+            WHEN metric_type = 'rate' AND se_rate > 0 THEN {two_sided_normal_pvalue_sql('(p1 - p2) / se_rate')}
+            WHEN se_cont = 0 THEN CASE WHEN treatment_value = control_value THEN 1.0 ELSE 0.0 END
+            WHEN se_cont > 0 THEN {two_sided_normal_pvalue_sql(t_to_z_sql('(treatment_value - control_value) / se_cont', 'df'))}
+          END AS p_value
+        , CASE
+            WHEN metric_type = 'rate' AND (total_events = 0 OR se_rate = 0) THEN 0.0
+            WHEN metric_type = 'rate' AND se_rate > 0 THEN (p1 - p2) - 1.96 * se_rate_diff
+            WHEN se_cont = 0 THEN treatment_value - control_value
+            WHEN se_cont > 0 THEN (treatment_value - control_value) - {t_critical_975_sql('df')} * se_cont
+          END AS confidence_interval_lower
+        , CASE
+            WHEN metric_type = 'rate' AND (total_events = 0 OR se_rate = 0) THEN 0.0
+            WHEN metric_type = 'rate' AND se_rate > 0 THEN (p1 - p2) + 1.96 * se_rate_diff
+            WHEN se_cont = 0 THEN treatment_value - control_value
+            WHEN se_cont > 0 THEN (treatment_value - control_value) + {t_critical_975_sql('df')} * se_cont
+          END AS confidence_interval_upper
+        , treatment_value - control_value AS absolute_difference
+    FROM filled f
+)
+
+SELECT experiment_name, start_date, end_date, version,
+        granularity, template_name, metric_name, treatment_arm, metric_type, dimension, segments,
+        template_rank, metric_rank, desired_direction,
+        t_numerator AS treatment_numerator, t_denominator AS treatment_denominator, treatment_value,
+        CASE WHEN use_delta = 1 THEN t_m_n ELSE t_sample_size END AS treatment_sample_size,
+        CASE WHEN use_delta = 1 THEN SQRT(v1 * t_m_n) ELSE t_std END AS treatment_std,
+        c_numerator AS control_numerator, c_denominator AS control_denominator, control_value,
+        CASE WHEN use_delta = 1 THEN c_m_n ELSE c_sample_size END AS control_sample_size,
+        CASE WHEN use_delta = 1 THEN SQRT(v2 * c_m_n) ELSE c_std END AS control_std,
+        lift, absolute_difference, p_value, confidence_interval_lower, confidence_interval_upper,
+        {statsig_case_sql('p_value',
+                          'CASE WHEN control_value IS NOT NULL AND control_value <> 0 '
+                          'THEN (treatment_value - control_value) / control_value '
+                          'ELSE COALESCE(absolute_difference, 0) END',
+                          'statsig_direction')} AS statsig_string,
+        CAST(NULL AS DOUBLE) AS statistical_power,
+        CURRENT_TIMESTAMP AS query_execution_timestamp,
+        CAST(NULL AS DOUBLE) AS query_runtime_seconds,
+        CAST({sql_literal(srm_p_value)} AS DOUBLE) AS srm_p_value
+FROM tested"""
+
+INSERT_COLUMNS = """experiment_name, start_date, end_date, version,
+        granularity, template_name, metric_name, treatment_arm, metric_type, dimension, segments,
+        template_rank, metric_rank, desired_direction,
+        treatment_numerator, treatment_denominator, treatment_value, treatment_sample_size, treatment_std,
+        control_numerator, control_denominator, control_value, control_sample_size, control_std,
+        lift, absolute_difference, p_value, confidence_interval_lower, confidence_interval_upper,
+        statsig_string, statistical_power, query_execution_timestamp, query_runtime_seconds, srm_p_value"""
+
+def build_insert_sql(rendered_query: str, template_name: str, config: dict,
+                     source_columns: Tuple[str, ...], table: str = METRICS_TABLE,
+                     metric_names: Optional[Iterable[str]] = None,
+                     srm_p_value: Optional[float] = None) -> Optional[str]:
+    """
+    INSERT ... SELECT that runs the template and its statistics in one statement
+
+    Returns:
+        The statement, or None when metric_names selects none of the template's metrics
+    """
+    columns = tuple(col.lower() for col in source_columns)
+    plan = compile_column_plan(template_name, columns, True, tuple(config.get('dimensions') or ()))
+    if plan.arm_column is None or not plan.metrics:
+        raise ValueError(f"Template {template_name} has no arm column or lift_ metrics")
+    plan = select_metrics(plan, metric_names)
+    if not plan.metrics:
+        return None
+
+    stats_select = build_stats_select(plan, config, 'template_result', columns, srm_p_value)
+    body = stats_select[len('WITH '):]  # Prepend template_result to the CTE chain
+    return f"""INSERT INTO {table} (
+        {INSERT_COLUMNS}
+)
+WITH template_result AS (
+{rendered_query.strip().rstrip(';')}
+)
+, {body}"""
+
+def low_count_filter_sql() -> str:
+    """Stored rate rows that ExperimentAnalysis tests exactly (the SQL path used the z-test)"""
+    return (f"metric_type = 'rate' AND treatment_numerator IS NOT NULL AND control_numerator IS NOT NULL "
+            f"AND treatment_denominator <> 0 AND control_denominator <> 0 "
+            f"AND (treatment_numerator + control_numerator < {EXACT_TEST_MAX_EVENTS} "
+            f"OR treatment_denominator < {EXACT_TEST_MIN_SAMPLE_SIZE} "
+            f"OR control_denominator < {EXACT_TEST_MIN_SAMPLE_SIZE})")
+
+def retest_low_count_rows(template_name: str, config: dict, table: str = METRICS_TABLE) -> int:
+    """
+    Re-run the exact test in Python for low-count rate rows of the latest insert
+
+    Returns:
+        Number of rows updated
+    """
+
+    from utils.snowflake_connection import execute_snowflake_query
+
+    scope = (f"experiment_name = {sql_literal(config['experiment_name'])} "
+             f"AND template_name = {sql_literal(template_name)}")
+    query = f"""
+    SELECT * FROM {table}
+    WHERE {scope} AND {low_count_filter_sql()}
+    AND insert_timestamp = (SELECT MAX(insert_timestamp) FROM {table} WHERE {scope})
+    """
+    rows = [{k.lower(): _clean(v) for k, v in row.items()}
+            for row in execute_snowflake_query(query, method='pandas') or []]
+    _, changed = recompute_rows(rows)
+    write_back(changed)
+    return len(changed)
+
+def describe_columns(query: str) -> Tuple[str, ...]:
+    """Result column names of a query without executing it"""
+
+    from utils.snowflake_connection import SnowflakeHook
+
+    with SnowflakeHook() as hook:
+        if not hook.conn:
+            hook.connect()
+        cursor = hook.conn.cursor()
+        try:
+            return tuple(column.name.lower() for column in cursor.describe(query))
+        finally:
+            cursor.close()
+
+def store_metrics_in_warehouse(rendered_query: str, template_name: str, config: dict,
+                               metric_names: Optional[Iterable[str]] = None,
+                               srm_p_value: Optional[float] = None) -> Optional[str]:
+    """
+    Compute statistics for one rendered template entirely in Snowflake
+
+    Args:
+        rendered_query: Rendered template SQL
+        template_name: Name of the template
+        config: Experiment configuration dictionary
+        metric_names: Only insert these metrics (run_experiments.py --metric)
+        srm_p_value: Pre-flight SRM p-value stored on every row
+
+    Returns:
+        The executed INSERT statement (None when no selected metric is in the template)
+    """
+
+    from utils.snowflake_connection import SnowflakeHook
+
+    insert_sql = build_insert_sql(rendered_query, template_name, config, describe_columns(rendered_query),
+                                  metric_names=metric_names, srm_p_value=srm_p_value)
+    if insert_sql is None:
+        return None
+    with SnowflakeHook() as hook:
+        hook.query_without_result(insert_sql)
+    retest_low_count_rows(template_name, config)
+    return insert_sql
+
+def backfill_in_warehouse(config: dict, end_dates: List[str]) -> int:
+    """
+    Re-run every template of an experiment for a list of historical end dates,
+    writing results straight to experiment_metrics_results
+
+    Returns:
+        Number of (template, end date) statements executed
+    """
+
+    from .experiment_config import get_templates_for_experiment
+    from .query_renderer import render_template_file
+
+    executed = 0
+    for end_date in end_dates:
+        dated_config = dict(config, end_date=end_date)
+        for template_info in get_templates_for_experiment(dated_config):
+            rendered = render_template_file(template_info['path'], dated_config)
+            try:
+                store_metrics_in_warehouse(rendered, template_info['name'], dated_config)
+                executed += 1
+                print(f"   ✅ {config['experiment_name']} {template_info['name']} through {end_date}")
+            except Exception as e:
+                print(f"   ❌ {config['experiment_name']} {template_info['name']} through {end_date}: {e}")
+    return executed
+
+# ---------------------------------------------------------------------------
+# Parity check against ExperimentAnalysis
+# ---------------------------------------------------------------------------
+
+def _sqlite_connection():
+    """In-memory sqlite with the math functions the generated SQL relies on"""
+    import math
+    import sqlite3
+
+    conn = sqlite3.connect(':memory:')
+    for name, func in (('EXP', math.exp), ('SQRT', math.sqrt), ('FLOOR', math.floor), ('CEIL', math.ceil)):
+        conn.create_function(name, 1, lambda x, f=func: None if x is None else f(x), deterministic=True)
+    conn.create_function('POWER', 2, lambda x, y: None if x is None or y is None else x ** y, deterministic=True)
+    return conn
+
+def _synthetic_topline_rows(seed: int = 3) -> List[dict]:
+    """
+    Device-level topline shaped rows (treatment + control per segment) with unit moments
+
+    The small 'web' segment has a handful of new customers, so its new_cx_rate takes
+    the exact low-count test in ExperimentAnalysis.
+    """
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    rows = []
+    for segment, units in (('ios', (20000, 40000)), ('android', (20000, 40000)), ('web', (300, 500))):
+        arms = {}
+        for tag, gov_scale in (('control', 3.0), ('treatment', 3.02)):
+            n = int(rng.integers(*units))
+            orders = rng.poisson(0.3, n).astype(float)
+            gov = orders * rng.lognormal(gov_scale, 0.8, n)
+            vp = gov * rng.uniform(0.05, 0.15, n)
+            if segment == 'web':
+                new_cx = 1.0 if tag == 'control' else 3.0
+            else:
+                new_cx = float(rng.binomial(n, 0.02 if tag == 'control' else 0.022))
+            arms[tag] = {
+                'tag': tag, 'segments': segment,
+                'exposure': n, 'orders': orders.sum(), 'order_rate': orders.sum() / n,
+                'new_cx': new_cx, 'new_cx_rate': new_cx / n,
+                'variable_profit': vp.sum(), 'vp_per_device': vp.mean(),
+                'gov': gov.sum(), 'gov_per_device': gov.mean(),
+                'std_variable_profit': vp[orders > 0].std(ddof=1), 'std_gov': gov[orders > 0].std(ddof=1),
+                'n_orders_for_stats': orders.sum(),
+                'n_units': n, 'sumsq_variable_profit': (vp ** 2).sum(), 'sumsq_gov': (gov ** 2).sum()
+            }
+        treatment, control = arms['treatment'], arms['control']
+        row = dict(treatment)
+        for metric in ('order_rate', 'new_cx_rate', 'vp_per_device', 'gov_per_device'):
+            row[f"lift_{metric}"] = treatment[metric] / control[metric] - 1
+        for key, value in control.items():
+            if key not in ('tag', 'segments'):
+                row[f"control_{key}"] = value
+        rows.append(row)
+        control_row = dict(control)
+        for key in row:
+            control_row.setdefault(key, None)
+        rows.append(control_row)
+    return rows
+
+def test_parity_with_analysis(tolerance: float = 1e-5):
+    """Run the generated SQL on sqlite and compare to the Python pipeline on the same rows"""
+    from .results_parser import parse_results
+
+    config = {'experiment_name': 'sql_stats_parity', 'start_date': '2025-01-01',
+              'end_date': '2025-01-28', 'bucket_key': 'device_id', 'version': 1}
+    template_name = 'onboarding_topline'
+    rows = _synthetic_topline_rows()
+    columns = tuple(rows[0].keys())
+
+    # Python path
+    analysis = ExperimentAnalysis()
+    expected = {}
+    for metric in parse_results(rows, template_name, config):
+        analysis.calculate_statistics(metric)
+        analysis.apply_statsig_classification(metric)
+        expected[(metric.metric_name, metric.treatment_arm, metric.segments)] = metric
+
+    # SQL path
+    conn = _sqlite_connection()
+    conn.execute(f"CREATE TABLE template_result ({', '.join(columns)})")
+    conn.executemany(f"INSERT INTO template_result VALUES ({', '.join('?' for _ in columns)})",
+                     [tuple(row[col] for col in columns) for row in rows])
+    plan = compile_column_plan(template_name, columns, True, ())
+    cursor = conn.execute(build_stats_select(plan, config, 'template_result', columns, srm_p_value=0.42))
+    names = [d[0] for d in cursor.description]
+    actual = [dict(zip(names, values)) for values in cursor.fetchall()]
+    assert all(row['version'] == 1 and row['srm_p_value'] == 0.42 for row in actual)
+
+    # --metric selection: only the chosen metrics are inserted
+    selected = conn.execute(build_stats_select(select_metrics(plan, ['ORDER_RATE']), config,
+                                               'template_result', columns)).fetchall()
+    assert {row[names.index('metric_name')] for row in selected} == {'order_rate'}
+    assert build_insert_sql('SELECT 1', template_name, config, columns, metric_names=['no_such_metric']) is None
+
+    # Low-count rate rows come back out of the stored table and are re-tested in Python
+    conn.execute(f"CREATE TABLE stored ({', '.join(names)})")
+    conn.executemany(f"INSERT INTO stored VALUES ({', '.join('?' for _ in names)})",
+                     [tuple(row[name] for name in names) for row in actual])
+    cursor = conn.execute(f"SELECT * FROM stored WHERE {low_count_filter_sql()}")
+    low_count = [dict(zip(names, values)) for values in cursor.fetchall()]
+    assert [(row['metric_name'], row['segments']) for row in low_count] == [('new_cx_rate', 'web')]
+    z_test_p_value = low_count[0]['p_value']
+    retested, _ = recompute_rows(low_count)
+    retested = {(row['metric_name'], row['treatment_arm'], row['segments']): row for row in retested}
+    actual = [retested.get((row['metric_name'], row['treatment_arm'], row['segments']), row) for row in actual]
+    exact_p_value = expected[('new_cx_rate', 'treatment', 'web')].p_value
+    assert abs(z_test_p_value - exact_p_value) > 0.01, (z_test_p_value, exact_p_value)
+
+    assert len(actual) == len(expected), f"{len(actual)} SQL rows vs {len(expected)} Python metrics"
+    worst = 0.0
+    for row in actual:
+        metric = expected[(row['metric_name'], row['treatment_arm'], row['segments'])]
+        for field in ('p_value', 'confidence_interval_lower', 'confidence_interval_upper',
+                      'treatment_std', 'absolute_difference'):
+            python_value, sql_value = getattr(metric, field), row[field]
+            if python_value is None or sql_value is None:
+                assert python_value is None and sql_value is None, f"{field} mismatch for {row['metric_name']}"
+                continue
+            scale = max(1.0, abs(float(python_value)))
+            error = abs(float(python_value) - float(sql_value)) / scale
+            worst = max(worst, error)
+            assert error < tolerance, f"{row['metric_name']} {field}: python={python_value} sql={sql_value}"
+        assert row['statsig_string'] == metric.statsig_string, \
+            f"{row['metric_name']} statsig: python={metric.statsig_string} sql={row['statsig_string']}"
+
+    print(f"✓ {len(actual)} metrics match ExperimentAnalysis (max relative error {worst:.2e}); "
+          f"low-count new_cx_rate re-tested exactly (z-test p={z_test_p_value:.3f}, exact p={exact_p_value:.3f})")
+
+if __name__ == "__main__":
+    test_parity_with_analysis()
@@ -0,0 +1,401 @@
+"""
+Sufficient Statistics - Persist per-day (n, sum, sum of squares) aggregates for
+continuous order metrics and merge them for any window without rescanning it
+
+A standalone store, refreshed and read from the command line (or by other
+readers of the table); run_experiments.py does not use it. The topline
+templates need per-unit totals for the delta-method per-device metrics and
+distinct counts for MAU, which per-day aggregates cannot reproduce, so the
+readout still scans the full window.
+"""
+
+import os
+import math
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+from .metrics_storage import sql_literal
+from .query_renderer import render_template_file
+from .result_cache import REPORTING_TIMEZONE
+
+DAILY_STATS_TABLE = "proddb.fionafan.experiment_daily_sufficient_stats"
+
+# Days younger than this can still gain late dimension_deliveries / order_cart_submit_received
+# rows, so they are re-aggregated every run instead of being stored (config: settle_days)
+DEFAULT_SETTLE_DAYS = 2
+
+# (tag, segments, metric_name) -> merged moments
+StatsKey = Tuple[str, Optional[str], str]
+
+@dataclass
+class RunningMoments:
+    """Count, mean and sum of squared deviations for a stream of values (Welford/Chan)"""
+
+    n: int = 0
+    mean: float = 0.0
+    m2: float = 0.0
+
+    @classmethod
+    def from_sums(cls, n, sum_value, sum_sq_value) -> 'RunningMoments':
+        """Build moments from the (COUNT, SUM, SUM of squares) triple produced in SQL"""
+        n = int(n or 0)
+        if n == 0:
+            return cls()
+        sum_value = float(sum_value or 0.0)
+        sum_sq_value = float(sum_sq_value or 0.0)
+        mean = sum_value / n
+        # Clamp tiny negative values caused by floating point cancellation
+        m2 = max(sum_sq_value - n * mean * mean, 0.0)
+        return cls(n, mean, m2)
+
+    def add(self, value: float):
+        """Welford update with a single observation"""
+        self.n += 1
+        delta = value - self.mean
+        self.mean += delta / self.n
+        self.m2 += delta * (value - self.mean)
+
+    def merge(self, other: 'RunningMoments') -> 'RunningMoments':
+        """Chan et al. pairwise combination of two partitions"""
+        if other.n == 0:
+            return RunningMoments(self.n, self.mean, self.m2)
+        if self.n == 0:
+            return RunningMoments(other.n, other.mean, other.m2)
+        n = self.n + other.n
+        delta = other.mean - self.mean
+        mean = self.mean + delta * other.n / n
+        m2 = self.m2 + other.m2 + delta * delta * self.n * other.n / n
+        return RunningMoments(n, mean, m2)
+
+    @property
+    def total(self) -> float:
+        return self.mean * self.n
+
+    @property
+    def variance(self) -> Optional[float]:
+        """Sample variance, matching Snowflake STDDEV_SAMP semantics"""
+        if self.n < 2:
+            return None
+        return self.m2 / (self.n - 1)
+
+    @property
+    def std(self) -> Optional[float]:
+        variance = self.variance
+        return math.sqrt(variance) if variance is not None else None
+
+def _incremental_template_path(bucket_key: str) -> str:
+    """Path of the per-day aggregation template for a granularity"""
+    return os.path.join(os.path.dirname(__file__), '..', 'sql_scripts', 'incremental',
+                        f"{bucket_key}_daily_order_stats.sql")
+
+def create_daily_stats_table():
+    """
+    Create the experiment_daily_sufficient_stats table if it doesn't exist
+    """
+
+    from utils.snowflake_connection import SnowflakeHook
+
+    create_table_sql = f"""
+    CREATE TABLE IF NOT EXISTS {DAILY_STATS_TABLE} (
+        experiment_name VARCHAR(255),
+        version INT,
+        granularity VARCHAR(20), -- 'consumer_id' or 'device_id'
+        tag VARCHAR(50), -- treatment arm, including 'control'
+        segments VARCHAR(50), -- e.g., 'ios', 'android', NULL for consumer templates
+        day DATE, -- order day (America/Los_Angeles)
+        metric_name VARCHAR(100), -- 'variable_profit' or 'gov'
+
+        -- Sufficient statistics over order rows
+        n INT,
+        sum_value FLOAT,
+        sum_sq_value FLOAT,
+
+        insert_timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """
+
+    try:
+        with SnowflakeHook() as hook:
+            hook.query_without_result(create_table_sql)
+            hook.query_without_result(f"GRANT SELECT ON TABLE {DAILY_STATS_TABLE} TO ROLE PUBLIC;")
+        print("✓ Created/verified experiment_daily_sufficient_stats table with PUBLIC read access")
+    except Exception as e:
+        print(f"✗ Error creating daily stats table: {e}")
+        raise
+
+def _experiment_filter(config: dict) -> str:
+    """WHERE clause selecting one experiment's rows in the daily stats table"""
+    version = config.get('version')
+    version_clause = f"version = {sql_literal(version)}" if version is not None else "version IS NULL"
+    return (f"experiment_name = {sql_literal(config['experiment_name'])} "
+            f"AND {version_clause} "
+            f"AND granularity = {sql_literal(config['bucket_key'])}")
+
+def _to_date(value) -> date:
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return datetime.strptime(str(value)[:10], '%Y-%m-%d').date()
+
+def reporting_today() -> date:
+    """Today on the America/Los_Angeles calendar the templates use for day boundaries"""
+    return datetime.now(ZoneInfo(REPORTING_TIMEZONE)).date()
+
+def settled_through(config: dict, today: date = None) -> date:
+    """Last day old enough to be stored as final (today minus the experiment's settle_days)"""
+    today = today or reporting_today()
+    return today - timedelta(days=int(config.get('settle_days', DEFAULT_SETTLE_DAYS)))
+
+def _row_day(row: dict) -> date:
+    return _to_date(row.get('day', row.get('DAY')))
+
+def get_stats_watermark(config: dict, table: str = DAILY_STATS_TABLE) -> Optional[date]:
+    """Last day already stored for this experiment, or None if nothing is stored yet"""
+
+    from utils.snowflake_connection import execute_snowflake_query
+
+    rows = execute_snowflake_query(
+        f"SELECT MAX(day) AS max_day FROM {table} WHERE {_experiment_filter(config)}",
+        method='pandas'
+    ) or []
+    for row in rows:
+        max_day = {k.lower(): v for k, v in row.items()}.get('max_day')
+        if max_day is None or max_day != max_day:  # NULL, NaN or NaT when nothing is stored
+            return None
+        return _to_date(max_day)
+    return None
+
+def _rows_to_moments(rows: Iterable[dict]) -> Dict[StatsKey, RunningMoments]:
+    """Merge per-day rows into one RunningMoments per (tag, segments, metric)"""
+    combined: Dict[StatsKey, RunningMoments] = {}
+    for row in rows:
+        row = {k.lower(): v for k, v in row.items()}
+        segments = row.get('segments')
+        if segments is not None and not isinstance(segments, str):
+            segments = None  # NaN from pandas
+        key = (row['tag'], segments.lower() if segments else None, row['metric_name'])
+        moments = RunningMoments.from_sums(row['n'], row['sum_value'], row['sum_sq_value'])
+        combined[key] = combined.get(key, RunningMoments()).merge(moments)
+    return combined
+
+def _store_daily_rows(config: dict, rows: List[dict]):
+    """Insert complete days into the daily stats table"""
+
+    if not rows:
+        return
+
+    from utils.snowflake_connection import SnowflakeHook
+
+    values = []
+    for row in rows:
+        row = {k.lower(): v for k, v in row.items()}
+        segments = row.get('segments')
+        values.append(
+            f"({sql_literal(config['experiment_name'])}, {sql_literal(config.get('version'))}, "
+            f"{sql_literal(config['bucket_key'])}, {sql_literal(row['tag'])}, "
+            f"{sql_literal(segments if isinstance(segments, str) else None)}, "
+            f"{sql_literal(str(_to_date(row['day'])))}, {sql_literal(row['metric_name'])}, "
+            f"{sql_literal(row['n'])}, {sql_literal(row['sum_value'])}, {sql_literal(row['sum_sq_value'])})"
+        )
+
+    insert_query = f"""
+    INSERT INTO {DAILY_STATS_TABLE} (
+        experiment_name, version, granularity, tag, segments, day, metric_name,
+        n, sum_value, sum_sq_value
+    )
+    VALUES {','.join(values)}
+    """
+
+    with SnowflakeHook() as hook:
+        hook.query_without_result(insert_query)
+
+def refresh_daily_stats(config: dict, today: date = None) -> List[dict]:
+    """
+    Aggregate only the days after the stored watermark and persist the settled ones
+
+    Days up to settled_through (today minus settle_days) are final and are written
+    to the table; younger days may still receive late order rows, so their
+    aggregates are returned for the caller to merge and recomputed on the next run.
+
+    Args:
+        config: Experiment configuration dictionary
+        today: Override for the current date (America/Los_Angeles day boundary)
+
+    Returns:
+        List of row dictionaries for the days that are not settled yet
+    """
+
+    from utils.snowflake_connection import execute_snowflake_query
+
+    template_path = _incremental_template_path(config['bucket_key'])
+    if not os.path.exists(template_path):
+        raise FileNotFoundError(f"No daily stats template for bucket_key '{config['bucket_key']}'")
+
+    today = today or reporting_today()
+    start_day = _to_date(config['start_date'])
+    end_day = min(_to_date(config['end_date']), today)
+
+    watermark = get_stats_watermark(config)
+    stats_start = start_day if watermark is None else max(start_day, watermark + timedelta(days=1))
+    if stats_start > end_day:
+        return []
+
+    query = render_template_file(template_path, config, {
+        'stats_start_date': stats_start.isoformat(),
+        'stats_end_date': end_day.isoformat()
+    })
+    rows = execute_snowflake_query(query, method='pandas') or []
+
+    settled = settled_through(config, today)
+    complete_rows = [row for row in rows if _row_day(row) <= settled]
+    open_rows = [row for row in rows if _row_day(row) > settled]
+    _store_daily_rows(config, complete_rows)
+
+    days = {_row_day(row) for row in complete_rows}
+    print(f"   ✓ Daily stats for {config['experiment_name']}: "
+          f"{len(days)} new day(s) stored from {stats_start}, {len(open_rows)} unsettled-day rows")
+    return open_rows
+
+def load_daily_stats(config: dict, extra_rows: List[dict] = None) -> Dict[StatsKey, RunningMoments]:
+    """
+    Combine all stored days (plus any not-yet-stored rows) into full-window moments
+
+    Args:
+        config: Experiment configuration dictionary
+        extra_rows: Rows returned by refresh_daily_stats for the unsettled days
+
+    Returns:
+        Dictionary mapping (tag, segments, metric_name) -> RunningMoments
+    """
+
+    from utils.snowflake_connection import execute_snowflake_query
+
+    query = f"""
+    SELECT tag, segments, day, metric_name, n, sum_value, sum_sq_value
+    FROM {DAILY_STATS_TABLE}
+    WHERE {_experiment_filter(config)}
+    AND day BETWEEN {sql_literal(str(_to_date(config['start_date'])))} AND {sql_literal(str(_to_date(config['end_date'])))}
+    """
+    rows = execute_snowflake_query(query, method='pandas') or []
+    return _rows_to_moments(list(rows) + list(extra_rows or []))
+
+def prepare_daily_stats(config: dict) -> Dict[StatsKey, RunningMoments]:
+    """Refresh the stored days for an experiment and return its full-window moments"""
+    open_rows = refresh_daily_stats(config)
+    return load_daily_stats(config, open_rows)
+
+def test_merge_matches_full_window():
+    """Check that merging per-day sums reproduces the single-pass std"""
+    import random
+
+    random.seed(7)
+    days = [[random.gauss(12.0, 4.0) for _ in range(random.randint(1, 50))] for _ in range(45)]
+
+    full = RunningMoments()
+    for values in days:
+        for value in values:
+            full.add(value)
+
+    merged = RunningMoments()
+    for values in days:
+        merged = merged.merge(RunningMoments.from_sums(
+            len(values), sum(values), sum(v * v for v in values)
+        ))
+
+    assert full.n == merged.n
+    assert abs(full.mean - merged.mean) < 1e-9
+    assert abs(full.std - merged.std) < 1e-9
+    print(f"✓ n={merged.n} mean={merged.mean:.4f} std={merged.std:.4f} (single pass {full.std:.4f})")
+
+def test_refresh_and_load_with_query_rows():
+    """Run refresh/load against execute_snowflake_query's real return shape (a list of dicts)"""
+    import random
+    import utils.snowflake_connection as snowflake
+
+    random.seed(11)
+    config = {'experiment_name': 'stats_test', 'version': 2, 'bucket_key': 'device_id',
+              'start_date': '2025-09-01', 'end_date': '2025-09-10', 'segments': ['ios']}
+    values = {(tag, day): [random.gauss(20.0, 6.0) for _ in range(random.randint(2, 30))]
+              for tag in ('control', 'treatment') for day in range(1, 5)}
+    rows = [{'tag': tag, 'segments': 'ios', 'day': date(2025, 9, day), 'metric_name': 'variable_profit',
+             'n': len(xs), 'sum_value': sum(xs), 'sum_sq_value': sum(x * x for x in xs)}
+            for (tag, day), xs in values.items()]
+    stored_max_day = [None]
+    queries, inserts = [], []
+
+    def fake_query(query, method='pandas'):
+        queries.append(query)
+        if 'MAX(day)' in query:
+            return [{'max_day': stored_max_day[0]}]
+        if 'order_facts' in query:  # the incremental template, from the day after the watermark
+            return [row for row in rows if stored_max_day[0] is None or row['day'] > stored_max_day[0]]
+        return [row for row in rows if row['day'] <= stored_max_day[0]]
+
+    class FakeHook:
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc):
+            return False
+
+        def query_without_result(self, query):
+            inserts.append(query)
+
+    original = snowflake.execute_snowflake_query, snowflake.SnowflakeHook
+    snowflake.execute_snowflake_query, snowflake.SnowflakeHook = fake_query, FakeHook
+    try:
+        open_rows = refresh_daily_stats(config, today=date(2025, 9, 4))
+        # Days within settle_days of today can still gain late orders: only 9/1-9/2 are stored
+        assert len(inserts) == 1 and inserts[0].count("'stats_test'") == 4  # 2 settled days x 2 arms
+        assert {row['day'] for row in open_rows} == {date(2025, 9, 3), date(2025, 9, 4)}
+        assert "BETWEEN '2025-09-01' AND '2025-09-04'" in queries[1]
+
+        stored_max_day[0] = date(2025, 9, 2)
+        assert get_stats_watermark(config) == date(2025, 9, 2)
+        combined = load_daily_stats(config, open_rows)
+
+        # The next day's run re-aggregates from the watermark, picking up late rows for 9/3
+        queries.clear()
+        refresh_daily_stats(dict(config, settle_days=1), today=date(2025, 9, 5))
+        assert "BETWEEN '2025-09-03' AND '2025-09-05'" in queries[1]
+        assert inserts[1].count("'stats_test'") == 4  # 9/3 and 9/4 now settled
+    finally:
+        snowflake.execute_snowflake_query, snowflake.SnowflakeHook = original
+
+    for tag in ('control', 'treatment'):
+        full = RunningMoments()
+        for day in range(1, 5):
+            for value in values[(tag, day)]:
+                full.add(value)
+        merged = combined[(tag, 'ios', 'variable_profit')]
+        assert merged.n == full.n and abs(merged.std - full.std) < 1e-9
+    print(f"✓ refresh/load over list-of-dict rows: 2 settled days stored, 2 unsettled days merged, "
+          f"n={combined[('treatment', 'ios', 'variable_profit')].n}")
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Daily sufficient statistics for continuous order metrics')
+    parser.add_argument('experiment', nargs='?', help='Experiment key from manual_experiments.yaml')
+    parser.add_argument('--refresh', action='store_true', help='Aggregate any settled days not stored yet')
+    args = parser.parse_args()
+
+    if not args.experiment:
+        test_merge_matches_full_window()
+        test_refresh_and_load_with_query_rows()
+    else:
+        from .experiment_config import load_experiment_config
+
+        config = load_experiment_config(args.experiment)
+        if args.refresh:
+            create_daily_stats_table()
+            combined = prepare_daily_stats(config)
+        else:
+            combined = load_daily_stats(config)
+        for (tag, segments, metric_name), moments in sorted(combined.items(), key=lambda item: str(item[0])):
+            std = f"{moments.std:.4f}" if moments.std is not None else 'n/a'
+            print(f"   {tag:<12} {segments or '-':<10} {metric_name:<16} n={moments.n:<8} "
+                  f"mean={moments.mean:.4f} std={std}")
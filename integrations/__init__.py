@@ -1,6 +1,11 @@
 """Integration modules."""
 
 from . import coda_client
+from . import coda_mock
+from . import mcp_async_client
 from . import mcp_client
+from . import mcp_mock
+from . import slack_client
+from . import slack_mock
 
-__all__ = ["coda_client", "mcp_client"]
+__all__ = ["coda_client", "coda_mock", "mcp_async_client", "mcp_client", "mcp_mock", "slack_client", "slack_mock"]
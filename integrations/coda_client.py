@@ -1,10 +1,21 @@
+import json
 import requests
 import re
+import threading
+import time
 from typing import Dict, List, Optional, Any
+from requests.adapters import HTTPAdapter
 from urllib.parse import urlparse, parse_qs
 from config.api_keys import CODA_API_KEY, CODA_BASE_URL
+from utils.rate_limit import TokenBucket
 from utils.logger import logger
 
+# Coda accepts at most 500 rows and ~2 MB per rows upsert, and about 10 writes per 6 seconds per doc
+MAX_UPSERT_ROWS = 500
+MAX_UPSERT_BYTES = 1_900_000
+WRITES_PER_SECOND = 10 / 6
+WRITE_BURST = 10
+
 
 class CodaClient:
     """
@@ -12,37 +23,97 @@ class CodaClient:
     Based on Coda API v1 documentation: https://coda.io/developers/apis/v1
     """
     
-    def __init__(self, api_key: str = None):
+    def __init__(self, api_key: str = None, base_url: str = None, max_connections: int = 8,
+                 writes_per_second: float = WRITES_PER_SECOND, write_burst: int = WRITE_BURST,
+                 max_retries: int = 5):
+        """
+        Args:
+            api_key: Coda API token (default: CODA_API_KEY)
+            base_url: API root (default: CODA_BASE_URL; tests point this at MockCodaServer)
+            max_connections: Keep-alive connections pooled for concurrent callers
+            writes_per_second: Write requests allowed per doc
+            write_burst: Writes a doc may take at once before pacing kicks in
+            max_retries: Retries of a write rejected with 429
+        """
         self.api_key = api_key or CODA_API_KEY
         print(f"Coda API Key: {self.api_key}")
-        self.base_url = CODA_BASE_URL
+        self.base_url = base_url or CODA_BASE_URL
         self.session = requests.Session()
         self.session.headers.update({
             'Authorization': f'Bearer {self.api_key}',
             'Content-Type': 'application/json'
         })
+        # One shared session; size its pool so concurrent table syncs reuse connections
+        adapter = HTTPAdapter(pool_connections=max_connections, pool_maxsize=max_connections)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.requests_made = 0  # API calls issued, for sync reporting
+        self._counter_lock = threading.Lock()
+        self.writes_per_second = writes_per_second
+        self.write_burst = write_burst
+        self.max_retries = max_retries
+        self.write_retries = 0  # 429s absorbed by writes
+        self._write_buckets: Dict[str, TokenBucket] = {}
         
     def _make_request(self, method: str, endpoint: str, **kwargs) -> Dict[str, Any]:
         """Make a request to the Coda API with error handling."""
         url = f"{self.base_url.rstrip('/')}/{endpoint.lstrip('/')}"
         
+        kwargs.setdefault('timeout', 30)
+        with self._counter_lock:
+            self.requests_made += 1
+        
         try:
             response = self.session.request(method, url, **kwargs)
-            
-            if response.status_code == 401:
-                raise Exception("Coda API token is invalid or expired")
-            elif response.status_code == 429:
-                raise Exception("Coda API rate limit exceeded")
-            elif response.status_code == 404:
-                raise Exception(f"Coda resource not found: {endpoint}")
-            elif response.status_code >= 400:
-                raise Exception(f"Coda API error {response.status_code}: {response.text}")
-                
-            return response.json()
-            
         except requests.exceptions.RequestException as e:
             logger.error(f"Coda API request failed: {e}")
             raise Exception(f"Failed to connect to Coda API: {e}")
+        
+        return self._parse_response(response, endpoint)
+    
+    @staticmethod
+    def _parse_response(response: requests.Response, endpoint: str) -> Dict[str, Any]:
+        if response.status_code == 401:
+            raise Exception("Coda API token is invalid or expired")
+        elif response.status_code == 429:
+            raise Exception("Coda API rate limit exceeded")
+        elif response.status_code == 404:
+            raise Exception(f"Coda resource not found: {endpoint}")
+        elif response.status_code >= 400:
+            raise Exception(f"Coda API error {response.status_code}: {response.text}")
+            
+        return response.json()
+    
+    def _make_write_request(self, doc_id: str, method: str, endpoint: str, **kwargs) -> Dict[str, Any]:
+        """
+        Make a write request, paced by the doc's write bucket and retried after 429s.
+        """
+        with self._counter_lock:
+            bucket = self._write_buckets.setdefault(doc_id, TokenBucket(self.writes_per_second, self.write_burst))
+        url = f"{self.base_url.rstrip('/')}/{endpoint.lstrip('/')}"
+        kwargs.setdefault('timeout', 30)
+        
+        for attempt in range(self.max_retries + 1):
+            bucket.acquire()
+            with self._counter_lock:
+                self.requests_made += 1
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except requests.exceptions.RequestException as e:
+                logger.error(f"Coda API request failed: {e}")
+                raise Exception(f"Failed to connect to Coda API: {e}")
+            
+            if response.status_code == 429:
+                retry_after = float(response.headers.get('Retry-After', 6))
+                with self._counter_lock:
+                    self.write_retries += 1
+                logger.warning(f"Coda write rate limited on {doc_id}; retrying in {retry_after:.1f}s "
+                               f"(attempt {attempt + 1}/{self.max_retries})")
+                bucket.drain(retry_after)
+                continue
+            return self._parse_response(response, endpoint)
+        
+        raise Exception(f"Coda write rate limit not cleared after {self.max_retries} retries on {doc_id}")
     
     def parse_coda_url(self, coda_url: str) -> Dict[str, str]:
         """
@@ -93,8 +164,14 @@ class CodaClient:
         response = self._make_request('GET', f'/docs/{doc_id}/tables/{table_id}/columns')
         return response.get('items', [])
     
+    def resolve_browser_link(self, coda_url: str) -> Dict[str, Any]:
+        """Resolve a browser URL to the API resource it points at (doc, table, row, ...)."""
+        logger.info(f"Resolving browser link {coda_url}")
+        response = self._make_request('GET', '/resolveBrowserLink', params={'url': coda_url})
+        return response.get('resource', {})
+    
     def get_table_rows(self, doc_id: str, table_id: str, limit: int = 100, 
-                      page_token: str = None) -> Dict[str, Any]:
+                      page_token: str = None, sort_by: str = None) -> Dict[str, Any]:
         """
         Get rows from a Coda table or view.
         
@@ -103,6 +180,7 @@ class CodaClient:
             table_id: The table ID or view ID
             limit: Maximum number of rows to return (default 100)
             page_token: Token for pagination
+            sort_by: 'natural', 'createdAt' or 'updatedAt' (newest first)
         
         Returns:
             Dictionary containing items, nextPageToken, and nextPageLink
@@ -116,6 +194,8 @@ class CodaClient:
         }
         if page_token:
             params['pageToken'] = page_token
+        if sort_by:
+            params['sortBy'] = sort_by
             
         response = self._make_request('GET', f'/docs/{doc_id}/tables/{table_id}/rows', 
                                     params=params)
@@ -146,6 +226,104 @@ class CodaClient:
         logger.info(f"Fetched {len(all_rows)} total rows from {table_id}")
         return all_rows
     
+    def get_rows_updated_since(self, doc_id: str, table_id: str, since: Optional[str],
+                               page_size: int = 50) -> List[Dict[str, Any]]:
+        """
+        Get rows whose updatedAt is at or after `since`, newest first.
+        
+        Pages through sortBy=updatedAt and stops at the first older row, so a
+        table with a handful of edits costs one small request.
+        
+        Args:
+            doc_id: The document ID
+            table_id: The table ID
+            since: ISO timestamp watermark (None returns every row)
+            page_size: Rows per request
+        """
+        changed = []
+        page_token = None
+        while True:
+            response = self.get_table_rows(doc_id, table_id, limit=page_size,
+                                           page_token=page_token, sort_by='updatedAt')
+            for row in response.get('items', []):
+                if since and row.get('updatedAt', '') < since:
+                    logger.info(f"{len(changed)} rows changed in {table_id} since {since}")
+                    return changed
+                changed.append(row)
+            
+            page_token = response.get('nextPageToken')
+            if not page_token:
+                return changed
+    
+    def upsert_rows(self, doc_id: str, table_id: str, rows: List[Dict[str, Any]],
+                    key_columns: Optional[List[str]] = None) -> List[str]:
+        """
+        Insert or update rows in bulk.
+        
+        Rows are batched up to MAX_UPSERT_ROWS / MAX_UPSERT_BYTES per request. With key
+        columns, rows whose key cells match an existing row update it; others are added.
+        Coda applies the mutations asynchronously; see wait_for_mutations.
+        
+        Args:
+            doc_id: The document ID
+            table_id: The table ID (views can't be written)
+            rows: Cells to write per row, column name or ID -> value
+            key_columns: Column names or IDs that identify a row
+        
+        Returns:
+            Request IDs of the queued mutations, one per batch
+        """
+        batches, batch, batch_bytes = [], [], 0
+        for row in rows:
+            payload = {'cells': [{'column': column, 'value': value} for column, value in row.items()]}
+            size = len(json.dumps(payload, default=str))
+            if batch and (len(batch) >= MAX_UPSERT_ROWS or batch_bytes + size > MAX_UPSERT_BYTES):
+                batches.append(batch)
+                batch, batch_bytes = [], 0
+            batch.append(payload)
+            batch_bytes += size
+        if batch:
+            batches.append(batch)
+        
+        request_ids = []
+        for number, batch in enumerate(batches, start=1):
+            body = {'rows': batch}
+            if key_columns:
+                body['keyColumns'] = key_columns
+            logger.info(f"Upserting {len(batch)} rows into {doc_id}/{table_id} (batch {number}/{len(batches)})")
+            response = self._make_write_request(doc_id, 'POST', f'/docs/{doc_id}/tables/{table_id}/rows',
+                                                data=json.dumps(body, default=str))
+            request_ids.append(response.get('requestId'))
+        return request_ids
+    
+    def get_mutation_status(self, request_id: str) -> Dict[str, Any]:
+        """Status of a queued mutation: {'completed': bool, 'warning': optional message}."""
+        return self._make_request('GET', f'/mutationStatus/{request_id}')
+    
+    def wait_for_mutations(self, request_ids: List[str], timeout: float = 60,
+                           poll_interval: float = 1.0) -> Dict[str, Dict[str, Any]]:
+        """
+        Poll mutation status until every request has completed or the timeout passes.
+        
+        Returns:
+            Request ID -> last status; incomplete ones have completed=False
+        """
+        statuses = {request_id: {'completed': False} for request_id in request_ids if request_id}
+        deadline = time.time() + timeout
+        while True:
+            for request_id in [r for r, status in statuses.items() if not status.get('completed')]:
+                statuses[request_id] = self.get_mutation_status(request_id)
+                if statuses[request_id].get('warning'):
+                    logger.warning(f"Coda mutation {request_id}: {statuses[request_id]['warning']}")
+            pending = [r for r, status in statuses.items() if not status.get('completed')]
+            if not pending or time.time() >= deadline:
+                break
+            time.sleep(poll_interval)
+        
+        if pending:
+            logger.warning(f"{len(pending)} Coda mutations still pending after {timeout}s")
+        return statuses
+    
     def find_table_by_name(self, doc_id: str, table_name: str) -> Optional[Dict[str, Any]]:
         """Find a table by its name in the document."""
         logger.info(f"Looking for table '{table_name}' in doc {doc_id}")
@@ -0,0 +1,276 @@
+import json
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+from integrations.coda_client import MAX_UPSERT_ROWS
+from utils.rate_limit import TokenBucket
+
+
+class MockCodaServer:
+    """
+    Local stand-in for the Coda API v1 (tables, columns, rows, row upserts, mutationStatus,
+    resolveBrowserLink) for offline tests.
+
+    Tables live in memory; every mutation bumps the row's updatedAt from a fake clock
+    that ticks forward, so sortBy=updatedAt ordering is deterministic. Every request
+    path is recorded in `requests` so tests can count API calls.
+
+    Upserts behave like Coda's: at most MAX_UPSERT_ROWS rows per request, writes limited
+    per doc (HTTP 429 with Retry-After beyond it), and mutations queued and applied
+    `mutation_delay` seconds later, reported through mutationStatus.
+
+    Usage:
+        with MockCodaServer() as coda:
+            coda.add_table('doc1', 'grid-1', 'Roadmap', ['Project Name', 'Project Status'])
+            client = CodaClient(api_key='test', base_url=coda.url)
+    """
+
+    def __init__(self, latency: float = 0.0, port: int = 0, writes_per_second: float = 10 / 6,
+                 write_burst: int = 10, mutation_delay: float = 0.0):
+        """
+        Args:
+            latency: Seconds each request takes, to model network round trips
+            port: Port to bind (0 picks a free one)
+            writes_per_second: Allowed write rate per doc
+            write_burst: Writes a doc may make at once before throttling
+            mutation_delay: Seconds before a queued mutation is applied
+        """
+        self.latency = latency
+        self.writes_per_second = writes_per_second
+        self.write_burst = write_burst
+        self.mutation_delay = mutation_delay
+        self.tables: Dict[tuple, Dict[str, Any]] = {}
+        self.requests: List[str] = []
+        self.upserts: List[Dict[str, Any]] = []  # accepted upsert bodies, in order
+        self.rate_limited = 0
+        self._pending: List[tuple] = []  # (due, request_id, doc_id, table_id, body)
+        self._applied = set()
+        self._added = 0
+        self._write_limits: Dict[str, TokenBucket] = {}
+        self._clock = datetime(2025, 1, 1)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(('127.0.0.1', port), self._handler())
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}/apis/v1'
+
+    def _tick(self) -> str:
+        self._clock += timedelta(milliseconds=1)
+        return self._clock.strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z'
+
+    # Test-side table setup -------------------------------------------------------
+
+    def add_table(self, doc_id: str, table_id: str, name: str, columns: List[str]):
+        """Create an empty table; columns get ids c-0, c-1, ... in order."""
+        with self._lock:
+            self.tables[(doc_id, table_id)] = {
+                'id': table_id, 'name': name,
+                'columns': [{'id': f'c-{i}', 'name': column} for i, column in enumerate(columns)],
+                'rows': {},
+            }
+
+    def upsert_row(self, doc_id: str, table_id: str, row_id: str, values: Dict[str, Any]) -> Dict[str, Any]:
+        """Create or update a row (values keyed by column name) and bump its updatedAt."""
+        with self._lock:
+            rows = self.tables[(doc_id, table_id)]['rows']
+            now = self._tick()
+            row = rows.setdefault(row_id, {'id': row_id, 'createdAt': now, 'values': {}})
+            row['values'].update(values)
+            row['updatedAt'] = now
+            return row
+
+    def delete_row(self, doc_id: str, table_id: str, row_id: str):
+        with self._lock:
+            del self.tables[(doc_id, table_id)]['rows'][row_id]
+
+    def table_rows(self, doc_id: str, table_id: str) -> Dict[str, Dict[str, Any]]:
+        """Current row values by row id."""
+        with self._lock:
+            self._apply_due()
+            return {row_id: dict(row['values']) for row_id, row in self.tables[(doc_id, table_id)]['rows'].items()}
+
+    # Mutations -------------------------------------------------------------------
+
+    def _upsert(self, doc_id: str, table_id: str, body: Dict[str, Any]):
+        table = self._table(doc_id, table_id)
+        names = {column['id']: column['name'] for column in table['columns']}
+        keys = [names.get(key, key) for key in body.get('keyColumns') or []]
+        for row in body['rows']:
+            values = {names.get(cell['column'], cell['column']): cell.get('value') for cell in row['cells']}
+            now = self._tick()
+            matches = [existing for existing in table['rows'].values()
+                       if keys and all(existing['values'].get(key) == values.get(key) for key in keys)]
+            if not matches:
+                self._added += 1
+                row_id = f"i-added-{self._added}"
+                matches = [table['rows'].setdefault(row_id, {'id': row_id, 'createdAt': now, 'values': {}})]
+            for existing in matches:
+                existing['values'].update(values)
+                existing['updatedAt'] = now
+
+    def _apply_due(self):
+        now = time.monotonic()
+        for item in [p for p in self._pending if p[0] <= now]:
+            _, request_id, doc_id, table_id, body = item
+            self._upsert(doc_id, table_id, body)
+            self._applied.add(request_id)
+            self._pending.remove(item)
+
+    def _write_wait(self, doc_id: str) -> float:
+        """0 if the doc may write now, otherwise seconds until it may."""
+        bucket = self._write_limits.setdefault(doc_id, TokenBucket(self.writes_per_second, self.write_burst))
+        with bucket.lock:
+            bucket._refill()
+            if bucket.tokens >= 1:
+                bucket.tokens -= 1
+                return 0.0
+            return (1 - bucket.tokens) / bucket.rate
+
+    def _post(self, path: str, body: Dict[str, Any]):
+        parts = [p for p in path.split('/') if p][2:]
+        if len(parts) != 5 or parts[0] != 'docs' or parts[2] != 'tables' or parts[4] != 'rows':
+            return 404, {'message': 'Not found'}, {}
+        doc_id, table = parts[1], self._table(parts[1], parts[3])
+        if table is None:
+            return 404, {'message': f'Table {parts[3]} not found'}, {}
+        rows = body.get('rows') or []
+        if not rows or len(rows) > MAX_UPSERT_ROWS:
+            return 400, {'message': f'rows must have between 1 and {MAX_UPSERT_ROWS} items'}, {}
+        wait = self._write_wait(doc_id)
+        if wait > 0:
+            self.rate_limited += 1
+            return 429, {'message': 'Too many requests'}, {'Retry-After': f'{wait:.3f}'}
+
+        request_id = f'mutate:{len(self.upserts)}'
+        self.upserts.append(body)
+        self._pending.append((time.monotonic() + self.mutation_delay, request_id, doc_id, table['id'], body))
+        self._apply_due()
+        return 202, {'requestId': request_id}, {}
+
+    # API -------------------------------------------------------------------------
+
+    def _table(self, doc_id: str, table_id: str) -> Optional[Dict[str, Any]]:
+        table = self.tables.get((doc_id, table_id))
+        if table is None:  # Tables can also be addressed by name
+            table = next((t for (d, _), t in self.tables.items() if d == doc_id and t['name'] == table_id), None)
+        return table
+
+    def _list_rows(self, table: Dict[str, Any], query: Dict[str, str]) -> Dict[str, Any]:
+        rows = list(table['rows'].values())
+        if query.get('sortBy') == 'updatedAt':
+            rows.sort(key=lambda row: row['updatedAt'], reverse=True)
+        elif query.get('sortBy') == 'createdAt':
+            rows.sort(key=lambda row: row['createdAt'])
+        offset = int(query.get('pageToken', 0))
+        limit = int(query.get('limit', 100))
+        page = rows[offset:offset + limit]
+
+        by_name = query.get('useColumnNames') in ('true', 'True')
+        ids = {column['name']: column['id'] for column in table['columns']}
+        items = [{
+            'id': row['id'], 'type': 'row', 'createdAt': row['createdAt'], 'updatedAt': row['updatedAt'],
+            'values': {(name if by_name else ids.get(name, name)): value for name, value in row['values'].items()},
+        } for row in page]
+        body = {'items': items}
+        if offset + limit < len(rows):
+            body['nextPageToken'] = str(offset + limit)
+        return body
+
+    def _get(self, path: str, query: Dict[str, str]):
+        parts = [p for p in path.split('/') if p][2:]  # drop 'apis', 'v1'
+        if len(parts) == 2 and parts[0] == 'mutationStatus':
+            known = parts[1] in self._applied or any(p[1] == parts[1] for p in self._pending)
+            if not known:
+                return 404, {'message': 'Unknown request'}
+            return 200, {'completed': parts[1] in self._applied}
+        if parts == ['resolveBrowserLink']:
+            url = query.get('url', '')
+            for (doc_id, table_id), table in self.tables.items():
+                if f'_d{doc_id}' in url or f'_{doc_id}' in url:
+                    if table_id in url:
+                        return 200, {'resource': {'type': 'table', 'id': table_id, 'name': table['name']}}
+            return 404, {'message': 'Could not resolve link'}
+
+        if len(parts) < 3 or parts[0] != 'docs' or parts[2] != 'tables':
+            return 404, {'message': 'Not found'}
+        doc_id = parts[1]
+        if len(parts) == 3:
+            return 200, {'items': [{'id': t['id'], 'name': t['name']}
+                                   for (d, _), t in self.tables.items() if d == doc_id]}
+
+        table = self._table(doc_id, parts[3])
+        if table is None:
+            return 404, {'message': f'Table {parts[3]} not found'}
+        if len(parts) == 4:
+            return 200, {'id': table['id'], 'name': table['name'], 'rowCount': len(table['rows'])}
+        if parts[4:] == ['columns']:
+            return 200, {'items': table['columns']}
+        if parts[4:] == ['rows']:
+            return 200, self._list_rows(table, query)
+        return 404, {'message': 'Not found'}
+
+    def _handler(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _reply(self, status: int, body: Dict[str, Any], headers: Dict[str, str] = None):
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                if mock.latency:
+                    time.sleep(mock.latency)
+                if not self.headers.get('Authorization', '').startswith('Bearer '):
+                    return self._reply(401, {'message': 'Unauthorized'})
+                parsed = urlparse(self.path)
+                query = {key: values[-1] for key, values in parse_qs(parsed.query).items()}
+                with mock._lock:
+                    mock.requests.append(parsed.path)
+                    mock._apply_due()
+                    status, body = mock._get(parsed.path, query)
+                self._reply(status, body)
+
+            def do_POST(self):
+                if mock.latency:
+                    time.sleep(mock.latency)
+                if not self.headers.get('Authorization', '').startswith('Bearer '):
+                    return self._reply(401, {'message': 'Unauthorized'})
+                body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+                with mock._lock:
+                    mock.requests.append(self.path)
+                    mock._apply_due()
+                    status, reply, headers = mock._post(urlparse(self.path).path, body)
+                self._reply(status, reply, headers)
+
+        return Handler
+
+    def start(self) -> 'MockCodaServer':
+        self._thread = threading.Thread(target=self._server.serve_forever, name='mock-coda', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> 'MockCodaServer':
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -0,0 +1,352 @@
+import asyncio
+import itertools
+import json
+import re
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from integrations.mcp_client import DEFAULT_MCP_URL, UNITY_EXPERIMENT_ID_PATTERN
+from utils.logger import logger
+
+try:
+    import aiohttp
+    AIOHTTP_AVAILABLE = True
+except ImportError:
+    AIOHTTP_AVAILABLE = False
+
+MCP_PROTOCOL_VERSION = '2025-03-26'
+CLIENT_INFO = {'name': 'nux-slack-bot', 'version': '1.0'}
+
+# Tool calls per JSON-RPC batch; batches are sent concurrently up to max_concurrency
+DEFAULT_BATCH_SIZE = 50
+DEFAULT_MAX_CONCURRENCY = 16
+
+
+class MCPError(Exception):
+    """Transport or protocol failure talking to the MCP server."""
+
+
+class _BatchRejected(Exception):
+    """The server doesn't accept JSON-RPC batches."""
+
+
+class AsyncExperimentationMCPClient:
+    """
+    asyncio client for the experimentation-mcp server.
+
+    The initialize handshake runs once per client and its Mcp-Session-Id is reused for
+    every call. Requests get unique JSON-RPC ids, independent tool calls go out together
+    as JSON-RPC batches (or concurrently, if the server rejects batches), and at most
+    max_concurrency HTTP requests are in flight.
+
+    Uses aiohttp when installed; otherwise requests on a keep-alive session in a thread pool.
+
+    Usage:
+        async with AsyncExperimentationMCPClient() as client:
+            infos = await client.get_comprehensive_experiment_info_bulk(unity_urls)
+    """
+
+    def __init__(self, mcp_url: str = DEFAULT_MCP_URL, max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+                 batch_size: int = DEFAULT_BATCH_SIZE, batching: bool = True, timeout: float = 30):
+        """
+        Args:
+            mcp_url: MCP endpoint
+            max_concurrency: HTTP requests in flight at once
+            batch_size: Tool calls per JSON-RPC batch
+            batching: Try JSON-RPC batches (turned off automatically if the server rejects them)
+            timeout: Seconds per HTTP request
+        """
+        self.mcp_url = mcp_url
+        self.max_concurrency = max_concurrency
+        self.batch_size = batch_size
+        self.batching = batching
+        self.timeout = timeout
+        self.session_id: Optional[str] = None
+        self.server_info: Dict[str, Any] = {}
+        self.round_trips = 0
+        self._ids = itertools.count(1)
+        self._initialized = False
+        self._init_lock: Optional[asyncio.Lock] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._http = None  # aiohttp.ClientSession
+        self._requests: Optional[requests.Session] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    async def __aenter__(self) -> 'AsyncExperimentationMCPClient':
+        await self.open()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def open(self):
+        """Create the HTTP session (asyncio primitives must be made inside the running loop)."""
+        self._init_lock = asyncio.Lock()
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        headers = {'Accept': 'application/json, text/event-stream', 'Content-Type': 'application/json',
+                   'User-Agent': 'nux-slack-bot/1.0'}
+        if AIOHTTP_AVAILABLE:
+            self._http = aiohttp.ClientSession(
+                headers=headers,
+                connector=aiohttp.TCPConnector(limit=self.max_concurrency),
+                timeout=aiohttp.ClientTimeout(total=self.timeout)
+            )
+        else:
+            self._requests = requests.Session()
+            self._requests.headers.update(headers)
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_concurrency)
+            self._requests.mount('http://', adapter)
+            self._requests.mount('https://', adapter)
+            self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix='mcp')
+
+    async def close(self):
+        if self._http is not None:
+            await self._http.close()
+            self._http = None
+        if self._requests is not None:
+            self._requests.close()
+            self._executor.shutdown(wait=False)
+            self._requests = None
+
+    # Transport -------------------------------------------------------------------
+
+    async def _send(self, payload: Any) -> Tuple[int, Any, str]:
+        """POST one JSON-RPC message or batch; returns (status, headers, body text)."""
+        headers = {'Mcp-Session-Id': self.session_id} if self.session_id else {}
+        data = json.dumps(payload)
+        self.round_trips += 1
+        try:
+            if self._http is not None:
+                async with self._http.post(self.mcp_url, data=data, headers=headers) as response:
+                    return response.status, response.headers, await response.text()
+
+            def post():
+                return self._requests.post(self.mcp_url, data=data, headers=headers, timeout=self.timeout)
+            response = await asyncio.get_running_loop().run_in_executor(self._executor, post)
+            return response.status_code, response.headers, response.text
+        except asyncio.TimeoutError:
+            raise MCPError("MCP server timeout")
+        except Exception as e:
+            if isinstance(e, requests.exceptions.RequestException) or \
+                    (AIOHTTP_AVAILABLE and isinstance(e, aiohttp.ClientError)):
+                raise MCPError(f"Failed to connect to MCP server: {e}")
+            raise
+
+    @staticmethod
+    def _parse_messages(headers: Any, text: str) -> List[Dict[str, Any]]:
+        """JSON-RPC messages from a JSON body (object or batch array) or an SSE stream."""
+        if not text.strip():
+            return []
+        if headers.get('Content-Type', '').startswith('text/event-stream'):
+            messages = []
+            for event in text.split('\n\n'):
+                data = '\n'.join(line[5:].lstrip() for line in event.splitlines() if line.startswith('data:'))
+                if data:
+                    parsed = json.loads(data)
+                    messages.extend(parsed if isinstance(parsed, list) else [parsed])
+            return messages
+        parsed = json.loads(text)
+        return parsed if isinstance(parsed, list) else [parsed]
+
+    async def _post(self, payload: Any) -> List[Dict[str, Any]]:
+        async with self._semaphore:
+            status, headers, text = await self._send(payload)
+        if status >= 400:
+            if isinstance(payload, list) and status in (400, 405, 415, 422):
+                raise _BatchRejected(text)
+            raise MCPError(f"MCP server error {status}: {text}")
+        if headers.get('Mcp-Session-Id'):
+            self.session_id = headers['Mcp-Session-Id']
+        return self._parse_messages(headers, text)
+
+    # Protocol --------------------------------------------------------------------
+
+    async def initialize(self):
+        """Run the initialize handshake once; later calls return immediately."""
+        if self._init_lock is None:
+            await self.open()
+        async with self._init_lock:
+            if self._initialized:
+                return
+            messages = await self._post({
+                'jsonrpc': '2.0', 'id': next(self._ids), 'method': 'initialize',
+                'params': {'protocolVersion': MCP_PROTOCOL_VERSION, 'capabilities': {}, 'clientInfo': CLIENT_INFO}
+            })
+            if not messages or 'error' in messages[0]:
+                raise MCPError(f"MCP initialize failed: {messages[0].get('error') if messages else 'no response'}")
+            self.server_info = messages[0].get('result', {})
+            await self._post({'jsonrpc': '2.0', 'method': 'notifications/initialized'})
+            self._initialized = True
+            logger.info(f"MCP session initialized with {self.server_info.get('serverInfo', {}).get('name', self.mcp_url)}")
+
+    @staticmethod
+    def _result(message: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """Tool result, or {'error': ...} like the sync client's callers expect."""
+        if message is None:
+            return {'error': 'No response from MCP server'}
+        if 'error' in message:
+            return {'error': message['error']}
+        return message.get('result', {})
+
+    async def call_tools(self, calls: List[Tuple[str, Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        """
+        Call several independent tools at once.
+
+        Args:
+            calls: (tool name, arguments) pairs
+
+        Returns:
+            One result per call, in order; failed calls are {'error': ...}
+        """
+        if not calls:
+            return []
+        await self.initialize()
+        messages = [{'jsonrpc': '2.0', 'id': next(self._ids), 'method': 'tools/call',
+                     'params': {'name': name, 'arguments': arguments}} for name, arguments in calls]
+        responses: Dict[Any, Dict[str, Any]] = {}
+
+        async def collect(payload):
+            try:
+                for response in await self._post(payload):
+                    if response.get('id') is not None:
+                        responses[response['id']] = response
+            except _BatchRejected:
+                raise
+            except MCPError as e:
+                logger.error(f"MCP call failed: {e}")
+                for message in (payload if isinstance(payload, list) else [payload]):
+                    responses[message['id']] = {'id': message['id'], 'error': str(e)}
+
+        if self.batching and len(messages) > 1:
+            chunks = [messages[i:i + self.batch_size] for i in range(0, len(messages), self.batch_size)]
+            results = await asyncio.gather(*(collect(chunk) for chunk in chunks), return_exceptions=True)
+            if any(isinstance(result, _BatchRejected) for result in results):
+                logger.info("MCP server rejected a JSON-RPC batch; sending calls individually")
+                self.batching = False
+
+        pending = [message for message in messages if message['id'] not in responses]
+        await asyncio.gather(*(collect(message) for message in pending))
+        return [self._result(responses.get(message['id'])) for message in messages]
+
+    async def call_tool(self, tool_name: str, parameters: Dict[str, Any]) -> Dict[str, Any]:
+        """Single tool call; raises MCPError on a tool error, like ExperimentationMCPClient._make_mcp_call."""
+        result = (await self.call_tools([(tool_name, parameters)]))[0]
+        if 'error' in result:
+            raise MCPError(f"MCP tool error: {result['error']}")
+        return result
+
+    # Experiments -----------------------------------------------------------------
+
+    async def get_comprehensive_experiment_info_bulk(self, unity_urls: List[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        Comprehensive experiment info for many Unity URLs.
+
+        Analyses and results for every experiment go out together; readout searches,
+        which need the experiment_name from the analysis, follow as a second wave.
+
+        Returns:
+            Unity URL -> the dictionary ExperimentationMCPClient.get_comprehensive_experiment_info returns
+        """
+        analysis_ids = {}
+        for url in unity_urls:
+            match = re.search(UNITY_EXPERIMENT_ID_PATTERN, url)
+            analysis_ids[url] = match.group(1) if match else None
+        unique_ids = list(dict.fromkeys(a for a in analysis_ids.values() if a))
+
+        try:
+            first = await self.call_tools([call for analysis_id in unique_ids for call in (
+                ('GetExperimentAnalysis', {'analysis_id': analysis_id}),
+                ('GetAnalysisResults', {'analysis_id': analysis_id}),
+            )])
+        except MCPError as e:
+            logger.error(f"Failed to get comprehensive experiment info: {e}")
+            return {url: {'success': False, 'error': str(e), 'unity_url': url} for url in unity_urls}
+        analyses = {analysis_id: first[2 * i] for i, analysis_id in enumerate(unique_ids)}
+        results = {analysis_id: first[2 * i + 1] for i, analysis_id in enumerate(unique_ids)}
+
+        names = {analysis_id: analysis.get('experiment_name') or analysis_id
+                 for analysis_id, analysis in analyses.items() if 'error' not in analysis}
+        unique_names = list(dict.fromkeys(names.values()))
+        searches = await self.call_tools([('searchExperimentReadouts', {'query': name}) for name in unique_names])
+        readouts = {}
+        for name, search in zip(unique_names, searches):
+            if 'error' in search:
+                logger.warning(f"Could not search readouts for {name}: {search['error']}")
+            readouts[name] = search.get('readouts', []) if 'error' not in search else []
+
+        scraped_at = datetime.now().isoformat()
+        infos = {}
+        for url, analysis_id in analysis_ids.items():
+            if not analysis_id:
+                infos[url] = {"error": "Could not extract experiment ID from URL"}
+            elif 'error' in analyses[analysis_id]:
+                infos[url] = {"error": f"Failed to get experiment analysis: {analyses[analysis_id]['error']}"}
+            else:
+                infos[url] = {
+                    "success": True,
+                    "unity_url": url,
+                    "analysis_id": analysis_id,
+                    "experiment_name": names[analysis_id],
+                    "experiment_analysis": analyses[analysis_id],
+                    "analysis_results": results[analysis_id],
+                    "experiment_readouts": readouts[names[analysis_id]],
+                    "data_source": "experimentation-mcp",
+                    "scraped_at": scraped_at
+                }
+        logger.info(f"Enriched {sum(1 for i in infos.values() if i.get('success'))}/{len(unity_urls)} experiments "
+                    f"in {self.round_trips} MCP round trips")
+        return infos
+
+    async def get_comprehensive_experiment_info(self, unity_url: str) -> Dict[str, Any]:
+        """Comprehensive info for one Unity URL (analysis and results fetched together)."""
+        return (await self.get_comprehensive_experiment_info_bulk([unity_url]))[unity_url]
+
+
+def test_bulk_enrichment():
+    """Enrich 50 experiments against the mock MCP server, batched and unbatched, versus the sync client"""
+    import time
+    import uuid
+    from integrations.mcp_client import ExperimentationMCPClient
+    from integrations.mcp_mock import MockMCPServer
+
+    latency = 0.05
+    urls = [f"https://unity.doordash.com/suites/data/x/experiments/{uuid.UUID(int=i + 1)}" for i in range(50)]
+    urls.append("https://unity.doordash.com/not-an-experiment")
+
+    with MockMCPServer(latency=latency) as mcp:
+        start = time.time()
+        infos = ExperimentationMCPClient(mcp.url).get_comprehensive_experiment_info_bulk(urls)
+        batched = time.time() - start
+        assert sum(1 for info in infos.values() if info.get('success')) == 50
+        assert infos[urls[-1]] == {"error": "Could not extract experiment ID from URL"}
+        assert infos[urls[3]]['experiment_name'] == MockMCPServer.experiment_name(str(uuid.UUID(int=4)))
+        assert mcp.initializations == 1 and mcp.tool_calls == 150
+        assert len(mcp.request_ids) == len(set(mcp.request_ids))  # no reused JSON-RPC ids
+        assert mcp.http_requests == 5  # initialize, initialized, 2 batches of analyses/results, 1 of searches
+
+        sync_info = ExperimentationMCPClient(mcp.url).get_comprehensive_experiment_info(urls[3])
+        assert {k: v for k, v in sync_info.items() if k != 'scraped_at'} == \
+               {k: v for k, v in infos[urls[3]].items() if k != 'scraped_at'}
+
+    with MockMCPServer(latency=latency, supports_batch=False) as mcp:
+        async def unbatched_run():
+            async with AsyncExperimentationMCPClient(mcp.url, max_concurrency=16) as client:
+                return await client.get_comprehensive_experiment_info_bulk(urls)
+        start = time.time()
+        infos = asyncio.run(unbatched_run())
+        unbatched = time.time() - start
+        assert sum(1 for info in infos.values() if info.get('success')) == 50
+        assert mcp.max_in_flight <= 16 and mcp.tool_calls == 150
+
+    sequential = 150 * latency
+    assert batched < sequential / 5 and unbatched < sequential / 3, (batched, unbatched)
+    print(f"✓ MCP enrichment of 50 experiments: {batched:.2f}s batched, {unbatched:.2f}s concurrent without "
+          f"batching, vs ≈{sequential:.1f}s for 150 sequential calls ({'aiohttp' if AIOHTTP_AVAILABLE else 'requests'} transport)")
+
+
+if __name__ == "__main__":
+    test_bulk_enrichment()
@@ -4,6 +4,8 @@ REAL MCP Client for DoorDash's experimentation-mcp server.
 This is the actual implementation - no placeholders!
 """
 
+import asyncio
+import itertools
 import json
 import requests
 import re
@@ -17,6 +19,9 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from utils.logger import logger
 
+DEFAULT_MCP_URL = "http://experimentation-mcp-web.service.prod.ddsd:8080/mcp"
+UNITY_EXPERIMENT_ID_PATTERN = r'/experiments/([a-f0-9-]{36})'
+
 
 class ExperimentationMCPClient:
     """
@@ -24,9 +29,10 @@ class ExperimentationMCPClient:
     Uses actual MCP protocol to get experiment data.
     """
     
-    def __init__(self, mcp_url: str = "http://experimentation-mcp-web.service.prod.ddsd:8080/mcp"):
+    def __init__(self, mcp_url: str = DEFAULT_MCP_URL):
         self.mcp_url = mcp_url
         self.session = requests.Session()
+        self._request_ids = itertools.count(1)
         
         # MCP protocol headers
         self.session.headers.update({
@@ -51,7 +57,7 @@ class ExperimentationMCPClient:
             # MCP protocol request structure
             mcp_request = {
                 "jsonrpc": "2.0",
-                "id": 1,
+                "id": next(self._request_ids),
                 "method": "tools/call",
                 "params": {
                     "name": tool_name,
@@ -95,8 +101,7 @@ class ExperimentationMCPClient:
             Experiment analysis ID (UUID)
         """
         try:
-            pattern = r'/experiments/([a-f0-9-]{36})'
-            match = re.search(pattern, unity_url)
+            match = re.search(UNITY_EXPERIMENT_ID_PATTERN, unity_url)
             
             if match:
                 experiment_id = match.group(1)
@@ -268,6 +273,29 @@ class ExperimentationMCPClient:
                 "error": str(e),
                 "unity_url": unity_url
             }
+    
+    def get_comprehensive_experiment_info_bulk(self, unity_urls: List[str],
+                                               max_concurrency: int = 16) -> Dict[str, Dict[str, Any]]:
+        """
+        Get comprehensive info for many Unity URLs at once.
+        
+        Runs AsyncExperimentationMCPClient: one session, tool calls batched or sent
+        concurrently, so the whole set costs a few round trips instead of three per URL.
+        
+        Args:
+            unity_urls: Unity experiment URLs
+            max_concurrency: Requests in flight at once
+            
+        Returns:
+            Unity URL -> the same dictionary get_comprehensive_experiment_info returns
+        """
+        from integrations.mcp_async_client import AsyncExperimentationMCPClient
+        
+        async def run():
+            async with AsyncExperimentationMCPClient(self.mcp_url, max_concurrency=max_concurrency) as client:
+                return await client.get_comprehensive_experiment_info_bulk(unity_urls)
+        
+        return asyncio.run(run())
 
 
 # Test function to verify experiment_name extraction
@@ -0,0 +1,156 @@
+import json
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+
+class MockMCPServer:
+    """
+    Local stand-in for the experimentation-mcp server (streamable HTTP JSON-RPC) for offline tests.
+
+    Answers initialize (issuing an Mcp-Session-Id), notifications/initialized and tools/call for
+    GetExperimentAnalysis, GetAnalysisResults and searchExperimentReadouts with deterministic
+    data derived from the analysis id. JSON-RPC batches are accepted unless supports_batch is off,
+    in which case they are rejected with HTTP 400 like servers on newer protocol revisions.
+
+    Usage:
+        with MockMCPServer(latency=0.05) as mcp:
+            client = ExperimentationMCPClient(mcp_url=mcp.url)
+    """
+
+    def __init__(self, latency: float = 0.0, supports_batch: bool = True, port: int = 0):
+        """
+        Args:
+            latency: Seconds each HTTP request takes, to model network round trips
+            supports_batch: Accept JSON-RPC batch arrays
+            port: Port to bind (0 picks a free one)
+        """
+        self.latency = latency
+        self.supports_batch = supports_batch
+        self.http_requests = 0
+        self.tool_calls = 0
+        self.initializations = 0
+        self.request_ids: List[Any] = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.sessions = set()
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(('127.0.0.1', port), self._handler())
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}/mcp'
+
+    @staticmethod
+    def experiment_name(analysis_id: str) -> str:
+        return f"experiment_{analysis_id.split('-')[-1]}"
+
+    def _tool(self, name: str, arguments: Dict[str, Any]) -> Dict[str, Any]:
+        if name == 'GetExperimentAnalysis':
+            analysis_id = arguments.get('analysis_id') or arguments.get('analysis_name')
+            return {'analysis_id': analysis_id, 'experiment_name': self.experiment_name(analysis_id),
+                    'status': 'running'}
+        if name == 'GetAnalysisResults':
+            return {'analysis_id': arguments['analysis_id'],
+                    'metrics': [{'metric_name': 'order_rate', 'lift': 0.012, 'p_value': 0.03}]}
+        if name == 'searchExperimentReadouts':
+            return {'readouts': [{'title': f"Readout: {arguments['query']}", 'url': 'https://docs/readout'}]}
+        raise KeyError(name)
+
+    def _answer(self, message: Dict[str, Any], session: Optional[str]) -> Optional[Dict[str, Any]]:
+        """Response for one JSON-RPC message (None for notifications)."""
+        method, message_id = message.get('method'), message.get('id')
+        if message_id is None:
+            return None
+        with self._lock:
+            self.request_ids.append(message_id)
+        if method == 'initialize':
+            return {'jsonrpc': '2.0', 'id': message_id, 'result': {
+                'protocolVersion': message['params'].get('protocolVersion'),
+                'capabilities': {'tools': {}}, 'serverInfo': {'name': 'mock-experimentation-mcp', 'version': '0'}}}
+        if method == 'tools/call':
+            with self._lock:
+                self.tool_calls += 1
+            try:
+                result = self._tool(message['params']['name'], message['params'].get('arguments', {}))
+            except KeyError as e:
+                return {'jsonrpc': '2.0', 'id': message_id, 'error': {'code': -32602, 'message': f'Unknown tool {e}'}}
+            return {'jsonrpc': '2.0', 'id': message_id, 'result': result}
+        return {'jsonrpc': '2.0', 'id': message_id, 'error': {'code': -32601, 'message': f'Unknown method {method}'}}
+
+    def _handler(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'  # keep-alive, like the real server
+
+            def log_message(self, *args):
+                pass
+
+            def _reply(self, status: int, body: Any = None, headers: Dict[str, str] = None):
+                data = json.dumps(body).encode() if body is not None else b''
+                self.send_response(status)
+                if body is not None:
+                    self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_POST(self):
+                with mock._lock:
+                    mock.http_requests += 1
+                    mock.in_flight += 1
+                    mock.max_in_flight = max(mock.max_in_flight, mock.in_flight)
+                try:
+                    if mock.latency:
+                        time.sleep(mock.latency)
+                    payload = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'null')
+                    session = self.headers.get('Mcp-Session-Id')
+                    if session is not None and session not in mock.sessions:
+                        return self._reply(404, {'jsonrpc': '2.0', 'id': None,
+                                                 'error': {'code': -32001, 'message': 'Session not found'}})
+
+                    if isinstance(payload, list):
+                        if not mock.supports_batch:
+                            return self._reply(400, {'jsonrpc': '2.0', 'id': None,
+                                                     'error': {'code': -32600, 'message': 'Batching not supported'}})
+                        answers = [a for a in (mock._answer(m, session) for m in payload) if a is not None]
+                        return self._reply(200, answers) if answers else self._reply(202)
+
+                    headers = {}
+                    if payload.get('method') == 'initialize':
+                        session = uuid.uuid4().hex
+                        with mock._lock:
+                            mock.sessions.add(session)
+                            mock.initializations += 1
+                        headers['Mcp-Session-Id'] = session
+                    answer = mock._answer(payload, session)
+                    if answer is None:
+                        return self._reply(202)
+                    self._reply(200, answer, headers)
+                finally:
+                    with mock._lock:
+                        mock.in_flight -= 1
+
+        return Handler
+
+    def start(self) -> 'MockMCPServer':
+        self._thread = threading.Thread(target=self._server.serve_forever, name='mock-mcp', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> 'MockMCPServer':
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
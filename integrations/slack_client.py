@@ -0,0 +1,102 @@
+import threading
+from typing import Any, Dict, List, Optional
+
+import requests
+
+from config.api_keys import SLACK_BOT_TOKEN
+from utils.logger import logger
+from utils.rate_limit import TokenBucket
+
+SLACK_API_URL = 'https://slack.com/api'
+
+# chat.postMessage allows about one message per second per channel, with short bursts
+DEFAULT_MESSAGES_PER_SECOND = 1.0
+DEFAULT_BURST = 3
+
+
+class SlackClient:
+    """
+    Slack Web API client for posting messages.
+    Rate limited per channel with token buckets; 429 responses are retried after Retry-After.
+    """
+
+    def __init__(self, token: str = None, base_url: str = SLACK_API_URL,
+                 messages_per_second: float = DEFAULT_MESSAGES_PER_SECOND, burst: int = DEFAULT_BURST,
+                 max_retries: int = 5):
+        self.token = token or SLACK_BOT_TOKEN
+        self.base_url = base_url.rstrip('/')
+        self.messages_per_second = messages_per_second
+        self.burst = burst
+        self.max_retries = max_retries
+        self.retries = 0  # 429s absorbed, for reporting
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._buckets_lock = threading.Lock()
+        self._local = threading.local()
+
+    @property
+    def session(self) -> requests.Session:
+        """One keep-alive session per thread (requests sessions aren't shared safely)."""
+        if not hasattr(self._local, 'session'):
+            session = requests.Session()
+            session.headers.update({
+                'Authorization': f'Bearer {self.token}',
+                'Content-Type': 'application/json; charset=utf-8'
+            })
+            self._local.session = session
+        return self._local.session
+
+    def _bucket(self, channel: str) -> TokenBucket:
+        with self._buckets_lock:
+            if channel not in self._buckets:
+                self._buckets[channel] = TokenBucket(self.messages_per_second, self.burst)
+            return self._buckets[channel]
+
+    def _call(self, method: str, payload: Dict[str, Any], channel: str) -> Dict[str, Any]:
+        """POST a Web API method, waiting for the channel's bucket and retrying on 429."""
+        bucket = self._bucket(channel)
+        for attempt in range(self.max_retries + 1):
+            bucket.acquire()
+            try:
+                response = self.session.post(f'{self.base_url}/{method}', json=payload, timeout=30)
+            except requests.exceptions.RequestException as e:
+                logger.error(f"Slack API request failed: {e}")
+                raise Exception(f"Failed to connect to Slack API: {e}")
+
+            if response.status_code == 429:
+                retry_after = float(response.headers.get('Retry-After', 1))
+                with self._buckets_lock:
+                    self.retries += 1
+                logger.warning(f"Slack rate limited on {channel}; retrying in {retry_after:.1f}s "
+                               f"(attempt {attempt + 1}/{self.max_retries})")
+                bucket.drain(retry_after)
+                continue
+            if response.status_code >= 400:
+                raise Exception(f"Slack API error {response.status_code}: {response.text}")
+
+            body = response.json()
+            if not body.get('ok'):
+                raise Exception(f"Slack API {method} failed: {body.get('error')}")
+            return body
+
+        raise Exception(f"Slack API rate limit not cleared after {self.max_retries} retries on {channel}")
+
+    def post_message(self, channel: str, text: str, blocks: Optional[List[Dict[str, Any]]] = None,
+                     thread_ts: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Post a message (or a thread reply when thread_ts is given).
+
+        Args:
+            channel: Channel name or ID
+            text: Fallback text shown in notifications
+            blocks: Block Kit blocks
+            thread_ts: Parent message timestamp to reply under
+
+        Returns:
+            Slack response, including 'ts' of the new message
+        """
+        payload = {'channel': channel, 'text': text, 'unfurl_links': False}
+        if blocks:
+            payload['blocks'] = blocks
+        if thread_ts:
+            payload['thread_ts'] = thread_ts
+        return self._call('chat.postMessage', payload, channel)
@@ -0,0 +1,113 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List
+
+from utils.rate_limit import TokenBucket
+
+
+class MockSlackServer:
+    """
+    Local stand-in for the Slack Web API (chat.postMessage) for offline tests.
+
+    Enforces a per-channel rate limit like Slack does: requests beyond it get
+    HTTP 429 with a Retry-After header. Accepted messages are recorded in order.
+
+    Usage:
+        with MockSlackServer(messages_per_second=5) as slack:
+            client = SlackClient(token='xoxb-test', base_url=slack.url)
+    """
+
+    def __init__(self, messages_per_second: float = 1.0, burst: int = 3, latency: float = 0.0,
+                 port: int = 0):
+        """
+        Args:
+            messages_per_second: Allowed rate per channel
+            burst: Messages a channel may send at once before throttling
+            latency: Seconds each request takes, to model network round trips
+            port: Port to bind (0 picks a free one)
+        """
+        self.messages_per_second = messages_per_second
+        self.burst = burst
+        self.latency = latency
+        self.messages: List[Dict[str, Any]] = []
+        self.rate_limited = 0
+        self._limits: Dict[str, TokenBucket] = {}
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(('127.0.0.1', port), self._handler())
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}/api'
+
+    def _allow(self, channel: str) -> float:
+        """0 if the channel may post now, otherwise seconds until it may."""
+        with self._lock:
+            bucket = self._limits.setdefault(channel, TokenBucket(self.messages_per_second, self.burst))
+        with bucket.lock:
+            bucket._refill()
+            if bucket.tokens >= 1:
+                bucket.tokens -= 1
+                return 0.0
+            return (1 - bucket.tokens) / bucket.rate
+
+    def _handler(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _reply(self, status: int, body: Dict[str, Any], headers: Dict[str, str] = None):
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_POST(self):
+                if mock.latency:
+                    time.sleep(mock.latency)
+                payload = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+                if not self.headers.get('Authorization', '').startswith('Bearer '):
+                    return self._reply(200, {'ok': False, 'error': 'not_authed'})
+                if self.path.rstrip('/') != '/api/chat.postMessage':
+                    return self._reply(200, {'ok': False, 'error': 'unknown_method'})
+
+                channel = payload.get('channel')
+                if not channel:
+                    return self._reply(200, {'ok': False, 'error': 'channel_not_found'})
+                wait = mock._allow(channel)
+                if wait > 0:
+                    with mock._lock:
+                        mock.rate_limited += 1
+                    return self._reply(429, {'ok': False, 'error': 'ratelimited'},
+                                       {'Retry-After': f'{wait:.3f}'})
+
+                with mock._lock:
+                    ts = f'{time.time():.6f}'
+                    mock.messages.append(dict(payload, ts=ts, received_at=time.monotonic()))
+                self._reply(200, {'ok': True, 'channel': channel, 'ts': ts})
+
+        return Handler
+
+    def start(self) -> 'MockSlackServer':
+        self._thread = threading.Thread(target=self._server.serve_forever, name='mock-slack', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> 'MockSlackServer':
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
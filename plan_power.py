@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Power Planning CLI
+
+For running experiments, reports current power and minimum detectable effect
+per metric and how many more days are needed to detect each target lift,
+using the latest control baselines in experiment_metrics_results.
+"""
+
+import argparse
+import sys
+
+import numpy as np
+
+from experiment_runner.power_planner import (
+    DEFAULT_ALPHA, DEFAULT_EFFECTS, DEFAULT_POWER, load_baselines, plan, power_curve
+)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Power and MDE planner for running experiments')
+    parser.add_argument('--experiment', action='append', dest='experiments',
+                        help='Experiment name (repeatable, default: all stored experiments)')
+    parser.add_argument('--metric', action='append', dest='metrics',
+                        help='Metric name (repeatable, default: all metrics)')
+    parser.add_argument('--effects', type=float, nargs='+', default=list(DEFAULT_EFFECTS),
+                        help='Target relative lifts (default: 0.01 0.02 0.05 0.10)')
+    parser.add_argument('--alpha', type=float, default=DEFAULT_ALPHA, help='Significance level (default: 0.05)')
+    parser.add_argument('--power', type=float, default=DEFAULT_POWER, help='Target power (default: 0.8)')
+    parser.add_argument('--curve-days', type=int, default=0,
+                        help='Also print power curves for the next N days at the current daily volume')
+    parser.add_argument('--output', help='Write the plan to this CSV file')
+    args = parser.parse_args(argv)
+
+    baselines = load_baselines(args.experiments, args.metrics)
+    if not baselines:
+        print("⚠️  No baselines found in experiment_metrics_results for the given filters")
+        return 1
+
+    frame = plan(baselines, args.effects, args.alpha, args.power)
+    print(f"📊 Power plan for {len(baselines)} metric baselines (alpha={args.alpha}, power={args.power})")
+    print(frame.to_string(index=False, float_format=lambda v: f"{v:.4f}"))
+
+    if args.curve_days > 0:
+        print(f"\n📈 Power curves over the next {args.curve_days} days")
+        for baseline in baselines:
+            days = np.arange(baseline.days_elapsed, baseline.days_elapsed + args.curve_days + 1)
+            curve = power_curve(baseline, days * baseline.daily_units, args.effects, args.alpha)
+            print(f"   {baseline.experiment_name} / {baseline.metric_name} / {baseline.treatment_arm}")
+            for day, row in zip(days, curve):
+                powers = '  '.join(f"{effect:.0%}: {p:.2f}" for effect, p in zip(args.effects, row))
+                print(f"      day {day:>3}  {powers}")
+
+    if args.output:
+        frame.to_csv(args.output, index=False)
+        print(f"\n✓ Wrote plan to {args.output}")
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
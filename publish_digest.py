@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+"""
+Slack Digest CLI
+
+Posts one readout digest per experiment from the local results mirror: a summary
+message in the channel with the full metric table paginated into its thread.
+Posting is rate limited per channel and channels are published concurrently.
+"""
+
+import argparse
+import json
+import sys
+
+from services.slack_digest import DigestPublisher, build_experiment_digest
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Publish experiment readout digests to Slack')
+    parser.add_argument('--experiment', action='append', dest='experiments',
+                        help='Experiment name (repeatable, default: every experiment in the mirror)')
+    parser.add_argument('--channel', help='Channel to post to (default: SLACK_CHANNEL)')
+    parser.add_argument('--dry-run', action='store_true',
+                        help='Print the Block Kit messages instead of posting them')
+    args = parser.parse_args(argv)
+
+    if args.dry_run:
+        from services.results_mirror import ResultsMirror
+        mirror = ResultsMirror()
+        for experiment_name in args.experiments or mirror.experiments():
+            print(json.dumps(build_experiment_digest(experiment_name, mirror.readout(experiment_name)), indent=2))
+        return 0
+
+    summary = DigestPublisher().publish(experiments=args.experiments, channel=args.channel)
+    for channel, error in summary['failures'].items():
+        print(f"❌ {channel}: {error}")
+    print(f"✓ Posted {summary['messages']} messages to {len(summary['channels'])} channel(s) "
+          f"in {summary['elapsed_seconds']:.1f}s ({summary['retries']} rate-limit retries)")
+    return 1 if summary['failures'] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""
+Stats Recompute CLI
+
+Re-derives p-values, confidence intervals, power and statsig labels from the raw
+arm values already stored in experiment_metrics_results (or a local snapshot of
+them) and writes them back, without re-running any template. Use after changing
+thresholds in analysis.py or desired directions in metrics_metadata.yaml.
+"""
+
+import argparse
+import sys
+
+from experiment_runner.recompute import run_recompute
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Recompute stored experiment statistics in bulk')
+    parser.add_argument('--experiment', action='append', dest='experiments',
+                        help='Experiment name (repeatable, default: all stored experiments)')
+    parser.add_argument('--snapshot',
+                        help='Read rows from this local snapshot (.csv or .parquet) instead of Snowflake')
+    parser.add_argument('--output',
+                        help='Snapshot mode: write recomputed rows here (default: overwrite the snapshot)')
+    parser.add_argument('--save-snapshot',
+                        help='Save the loaded rows to this local file before recomputing')
+    parser.add_argument('--dry-run', action='store_true',
+                        help='Report changed rows and label moves without writing anything')
+    args = parser.parse_args(argv)
+
+    print("🧮 Recomputing stored statistics...")
+    try:
+        summary = run_recompute(experiments=args.experiments, snapshot=args.snapshot, output=args.output,
+                                save_to=args.save_snapshot, dry_run=args.dry_run)
+    except Exception as e:
+        print(f"❌ Recompute failed: {e}")
+        return 1
+
+    print(f"\n✓ {summary['changed']:,} of {summary['rows']:,} rows changed "
+          f"({summary['label_moves']:,} statsig labels moved)")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
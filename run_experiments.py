@@ -20,11 +20,25 @@ from concurrent.futures import ThreadPoolExecutor, as_completed
 from threading import Lock
 import traceback
 
-from experiment_runner.experiment_config import load_experiment_config
-from experiment_runner.query_renderer import render_templates_for_experiment
-from experiment_runner.results_parser import parse_results
+from experiment_runner.experiment_config import get_templates_for_experiment, load_experiment_config
+from experiment_runner.query_renderer import (
+    has_manual_override, render_batch_template, render_templates_for_experiment, supports_batching
+)
+from experiment_runner.results_parser import parse_batch_results, parse_results
 from experiment_runner.analysis import ExperimentAnalysis
 from experiment_runner.metrics_storage import create_metrics_table, store_metrics
+from experiment_runner.bootstrap import apply_bootstrap_cis, compute_bootstrap_cis
+from experiment_runner.sql_stats import store_metrics_in_warehouse
+from experiment_runner.preflight import (
+    FLAG_SRM, create_preflight_table, print_preflight, record_completed_runs, run_preflight
+)
+from experiment_runner.preview import (
+    DEFAULT_SAMPLE_RATE, load_full_runtimes, observed_speedup, render_preview, run_accuracy_comparison
+)
+from experiment_runner.result_cache import (
+    default_as_of_date, deterministic_sql, execute_with_cache_status, render_deterministic
+)
+from experiment_runner.selection import Selection
 from utils.snowflake_connection import execute_snowflake_query
 
 # Thread-safe print lock
@@ -35,6 +49,40 @@ def thread_safe_print(*args, **kwargs):
     with print_lock:
         print(*args, **kwargs)
 
+def finalize_metrics(metrics: List, query_info: Dict, execution_time: float) -> List:
+    """Apply optional stats stores, execution metadata and statistics to parsed metrics"""
+    analyzer = ExperimentAnalysis()
+    
+    # Selective rerun: only the requested metrics are written back
+    metric_names = query_info.get('metric_names')
+    if metric_names:
+        metrics = [m for m in metrics if m.metric_name.lower() in metric_names]
+    
+    bootstrap_cis = query_info.get('bootstrap_cis')
+    if bootstrap_cis:
+        apply_bootstrap_cis(metrics, bootstrap_cis)
+    
+    # Add execution metadata to metrics
+    for metric in metrics:
+        metric.query_execution_timestamp = datetime.now().isoformat()
+        metric.query_runtime_seconds = execution_time
+        metric.sampling_rate = query_info.get('sample_rate')
+        metric.srm_p_value = query_info.get('srm_p_value')
+        
+        # Calculate statistics
+        analyzer.calculate_statistics(metric)
+        analyzer.apply_statsig_classification(metric)
+    
+    return metrics
+
+def split_batch_result(result: Dict, query_info: Dict, metrics_by_experiment: Dict = None) -> List[Dict]:
+    """Turn one batched query result into a result per member experiment"""
+    member_results = []
+    for experiment_name, member in query_info['batch'].items():
+        metrics = (metrics_by_experiment or {}).get(experiment_name, [])
+        member_results.append(dict(result, exp_key=member['exp_key'], metrics=metrics))
+    return member_results
+
 def execute_single_query(query_info: Dict) -> Dict:
     """
     Execute a single SQL query and return results with metadata
@@ -68,24 +116,50 @@ def execute_single_query(query_info: Dict) -> Dict:
         with open(query_path, 'r') as f:
             query = f.read()
         
-        # Execute with pandas-only mode to avoid Spark issues
-        results = execute_snowflake_query(query, method='pandas')
+        if query_info.get('sql_stats'):
+            # Statistics computed and inserted by Snowflake; nothing comes back to parse
+            store_metrics_in_warehouse(query, template_name, config,
+                                       metric_names=query_info.get('metric_names'),
+                                       srm_p_value=query_info.get('srm_p_value'))
+            execution_time = time.time() - start_time
+            thread_safe_print(f"   ✅ [{exp_key}] {template_name} stored in-warehouse in {execution_time:.2f}s")
+            result.update({'status': 'SUCCESS', 'execution_time': execution_time})
+            return result
+        
+        if query_info.get('as_of_date'):
+            # Deterministic text: report whether Snowflake served it from the result cache
+            results, cache_hit = execute_with_cache_status(query)
+            result['result_cache_hit'] = cache_hit
+        else:
+            # Execute with pandas-only mode to avoid Spark issues
+            results = execute_snowflake_query(query, method='pandas')
         execution_time = time.time() - start_time
         
-        thread_safe_print(f"   ✅ [{exp_key}] {template_name} completed in {execution_time:.2f}s - {len(results)} rows")
+        cache_note = {True: ' (result cache)', False: ' (warehouse)'}.get(result.get('result_cache_hit'), '')
+        thread_safe_print(f"   ✅ [{exp_key}] {template_name} completed in {execution_time:.2f}s - "
+                          f"{len(results)} rows{cache_note}")
         
-        # Parse results into metrics
-        analyzer = ExperimentAnalysis()
-        metrics = parse_results(results, template_name, config)
+        if query_info.get('batch'):
+            # One scan for several experiments: split rows back per experiment
+            batch = query_info['batch']
+            metrics_by_experiment = parse_batch_results(
+                results, template_name, {name: member['config'] for name, member in batch.items()}
+            )
+            for name, metrics in metrics_by_experiment.items():
+                metrics_by_experiment[name] = finalize_metrics(metrics, batch[name], execution_time)
+            result.update({
+                'status': 'SUCCESS',
+                'execution_time': execution_time,
+                'result_count': len(results)
+            })
+            result['batch_results'] = split_batch_result(result, query_info, metrics_by_experiment)
+            thread_safe_print(f"   📈 [{exp_key}] {template_name} generated "
+                              f"{sum(len(m) for m in metrics_by_experiment.values())} metrics "
+                              f"for {len(batch)} experiments")
+            return result
         
-        # Add execution metadata to metrics
-        for metric in metrics:
-            metric.query_execution_timestamp = datetime.now().isoformat()
-            metric.query_runtime_seconds = execution_time
-            
-            # Calculate statistics
-            analyzer.calculate_statistics(metric)
-            analyzer.apply_statsig_classification(metric)
+        # Parse results into metrics
+        metrics = finalize_metrics(parse_results(results, template_name, config), query_info, execution_time)
         
         result.update({
             'status': 'SUCCESS',
@@ -109,9 +183,72 @@ def execute_single_query(query_info: Dict) -> Dict:
             'execution_time': execution_time,
             'error': error_msg
         })
+        if query_info.get('batch'):
+            result['batch_results'] = split_batch_result(result, query_info)
     
     return result
 
+def prepare_batched_queries(prepared: Dict[str, Dict], as_of_date: str = None) -> tuple:
+    """
+    Group experiments sharing a template and bucket_key into one query per template
+    
+    Only templates that import the batch macros are batched, and experiments whose
+    rendered query was edited by hand keep running their own copy. Experiments whose
+    selection excludes a template are left out of its batch.
+    
+    Args:
+        prepared: exp_key -> {'config', 'bootstrap_cis', 'templates', ...}
+        as_of_date: Pin relative dates and canonicalize the batch SQL (deterministic mode)
+    
+    Returns:
+        (batched query infos, set of (exp_key, template_name) covered by a batch)
+    """
+    groups = {}
+    for exp_key, member in prepared.items():
+        config = member['config']
+        key = (config['template'], config['bucket_key'], bool(config.get('segment_cube')))
+        groups.setdefault(key, []).append(exp_key)
+    
+    batch_dir = os.path.join('experiment_runner', 'rendered_queries', '_batches')
+    query_infos = []
+    covered = set()
+    for (template_type, bucket_key, segment_cube), exp_keys in groups.items():
+        if len(exp_keys) < 2:
+            continue
+        templates = get_templates_for_experiment(prepared[exp_keys[0]]['config'])
+        for template_info in templates:
+            if not supports_batching(template_info['path']):
+                continue
+            members = [k for k in exp_keys
+                       if not has_manual_override(prepared[k]['config'], template_info)
+                       and (prepared[k].get('templates') is None
+                            or template_info['name'] in prepared[k]['templates'])]
+            if len(members) < 2:
+                continue
+            
+            configs = [dict(prepared[k]['config'], as_of_date=as_of_date) for k in members]
+            query = render_batch_template(template_info['path'], configs)
+            if as_of_date:
+                query = deterministic_sql(query, as_of_date)
+            os.makedirs(batch_dir, exist_ok=True)
+            query_path = os.path.join(batch_dir, f"{bucket_key}_{template_info['name']}"
+                                                 f"{'_cube' if segment_cube else ''}.sql")
+            with open(query_path, 'w') as f:
+                f.write(query)
+            
+            query_infos.append({
+                'exp_key': f"batch:{template_type}/{bucket_key}",
+                'template_name': template_info['name'],
+                'query_path': query_path,
+                'config': None,
+                'as_of_date': as_of_date,
+                'batch': {prepared[k]['config']['experiment_name']: dict(prepared[k], exp_key=k) for k in members}
+            })
+            covered.update((k, template_info['name']) for k in members)
+            print(f"   🧩 Batched {template_info['name']} ({bucket_key}) for {len(members)} experiments")
+    
+    return query_infos, covered
+
 def execute_queries_parallel(query_infos: List[Dict], max_workers: int = 4) -> List[Dict]:
     """
     Execute multiple queries in parallel using ThreadPoolExecutor
@@ -140,7 +277,7 @@ def execute_queries_parallel(query_infos: List[Dict], max_workers: int = 4) -> L
             
             try:
                 result = future.result()
-                results.append(result)
+                results.extend(result.get('batch_results') or [result])
                 
                 if result['status'] == 'SUCCESS':
                     completed_count += 1
@@ -156,7 +293,7 @@ def execute_queries_parallel(query_infos: List[Dict], max_workers: int = 4) -> L
                 thread_safe_print(f"❌ Unexpected error processing {query_info['template_name']}: {e}")
                 failed_count += 1
                 
-                results.append({
+                failed_result = {
                     'exp_key': query_info['exp_key'],
                     'template_name': query_info['template_name'],
                     'status': 'FAILED',
@@ -164,15 +301,42 @@ def execute_queries_parallel(query_infos: List[Dict], max_workers: int = 4) -> L
                     'execution_time': 0,
                     'error': str(e),
                     'result_count': 0
-                })
+                }
+                if query_info.get('batch'):
+                    results.extend(split_batch_result(failed_result, query_info))
+                else:
+                    results.append(failed_result)
     
     thread_safe_print(f"🏁 Parallel execution complete: {completed_count} success, {failed_count} failed")
     return results
 
-def run_all_experiments(max_workers: int = 4):
+def run_all_experiments(max_workers: int = 4,
+                        use_bootstrap: bool = False, use_sql_stats: bool = False, use_batching: bool = False,
+                        as_of_date: str = None, preview: bool = False,
+                        sample_rate: float = DEFAULT_SAMPLE_RATE, use_preflight: bool = False,
+                        selection: Selection = None):
     """
     Main function to run complete experiment analysis pipeline
+    
+    Args:
+        max_workers: Maximum number of concurrent query workers
+        use_bootstrap: Add Poisson-bootstrap relative-lift CIs for per-unit order metrics
+        use_sql_stats: Compute p-values and statsig labels in Snowflake and insert them
+            directly into experiment_metrics_results (low-count rate rows are re-tested in Python)
+        use_batching: Run templates shared by several experiments (same template and
+            bucket_key) as one query and split the rows per experiment
+        as_of_date: Deterministic mode: pin current_date to this 'YYYY-MM-DD' date and
+            canonicalize the SQL so same-day re-runs hit Snowflake's result cache
+        preview: Run templates on a hash sample of exposed units and store the rows
+            as readout_type 'preview'; statistics stores and batching are skipped
+        sample_rate: Fraction of units kept in preview mode
+        use_preflight: Probe per-arm exposures of all experiments in one query first; skip
+            empty experiments, defer closed unchanged windows, flag and store SRM
+        selection: Run only the experiments, templates and metrics it selects; the new
+            rows are appended and readers take the latest row per metric, so rows of
+            everything not rerun stay current
     """
+    selection = selection or Selection()
     
     print("=" * 80)
     print("🚀 COMPLETE EXPERIMENT ANALYSIS PIPELINE (PARALLELIZED)")
@@ -189,8 +353,25 @@ def run_all_experiments(max_workers: int = 4):
     
     print(f"   Found {len(experiments)} total experiments")
     print(f"   Active experiments: {len(active_experiments)}")
+    if selection.is_filtered:
+        active_experiments = selection.select_experiments(experiments)
+        print(f"   🎯 Selected ({selection.describe()}): {len(active_experiments)} experiments")
+    if not active_experiments:
+        print("   ⚠️  No experiments selected; nothing to run")
+        return True
     print(f"   Max concurrent workers: {max_workers}")
     
+    if preview:
+        # Full-window bootstrap and in-warehouse stats would mix full data into sampled readouts
+        print(f"   🔬 Preview mode: {sample_rate:.0%} unit sample; bootstrap, "
+              f"in-warehouse stats and batching are off")
+        use_bootstrap = use_sql_stats = use_batching = False
+    
+    if use_sql_stats and use_bootstrap:
+        # Rows are inserted by Snowflake and never pass through finalize_metrics
+        print("   ⚠️  Bootstrap CIs are not applied to in-warehouse stats; skipping them")
+        use_bootstrap = False
+    
     # Step 2: Create database table
     print("\n🗃️  Step 2: Setting up database table...")
     try:
@@ -200,12 +381,35 @@ def run_all_experiments(max_workers: int = 4):
         print(f"   ⚠️  Warning: Table setup issue: {e}")
         print("   Continuing with execution...")
     
+    preflight = {}
+    if use_preflight:
+        print("\n🛫 Pre-flight: probing exposures for all active experiments...")
+        try:
+            create_preflight_table()
+            preflight = run_preflight({k: load_experiment_config(k) for k in active_experiments})
+            print_preflight(preflight)
+        except Exception as e:
+            print(f"   ⚠️  Pre-flight failed, running every experiment: {e}")
+            preflight = {}
+    
     # Step 3: Prepare all queries for parallel execution
     print(f"\n🎨 Step 3: Preparing queries for parallel execution...")
-    all_query_infos = []
     experiment_configs = {}
+    prepared_experiments = {}
+    per_experiment_queries = []
+    unmatched = set()
+    
+    if use_batching and use_sql_stats:
+        print("   ⚠️  Batching is not combined with in-warehouse stats; running per experiment")
+        use_batching = False
     
     for exp_key, exp_data in active_experiments.items():
+        gate = preflight.get(exp_key)
+        if gate is not None and not gate.should_run:
+            print(f"   ⏭️  Skipping {exp_key} ({gate.decision}: {gate.reason})")
+            continue
+        srm_p_value = gate.srm_p_value if gate is not None else None
+        
         print(f"   📁 Preparing {exp_key}...")
         print(f"      Project: {exp_data.get('project_name', 'N/A')}")
         print(f"      Granularity: {exp_data['bucket_key']} | Template: {exp_data['template']}")
@@ -214,24 +418,68 @@ def run_all_experiments(max_workers: int = 4):
         try:
             # Load config and render templates
             config = load_experiment_config(exp_key)
+            templates = selection.templates_for(config)
+            if templates is not None and not templates:
+                print(f"      ⏭️  No templates match the selection")
+                unmatched.add(exp_key)
+                continue
             experiment_configs[exp_key] = config
-            rendered_queries = render_templates_for_experiment(config)
+            if preview:
+                rendered_queries = render_preview(config, sample_rate)
+            elif as_of_date:
+                rendered_queries = render_deterministic(config, as_of_date)
+            else:
+                rendered_queries = render_templates_for_experiment(config)
+            if templates is not None:
+                rendered_queries = {name: path for name, path in rendered_queries.items() if name in templates}
             print(f"      ✅ Prepared {len(rendered_queries)} templates for execution")
             
+            bootstrap_cis = None
+            if use_bootstrap:
+                try:
+                    bootstrap_cis = compute_bootstrap_cis(config)
+                    print(f"      ✅ Bootstrapped {len(bootstrap_cis)} lift intervals")
+                except Exception as e:
+                    print(f"      ⚠️  Bootstrap CIs unavailable: {e}")
+            
+            prepared_experiments[exp_key] = {
+                'config': config,
+                'bootstrap_cis': bootstrap_cis,
+                'srm_p_value': srm_p_value,
+                'templates': templates,
+                'metric_names': selection.metric_names
+            }
+            
             # Prepare query info for parallel execution
             for template_name, query_path in rendered_queries.items():
-                all_query_infos.append({
+                per_experiment_queries.append({
                     'exp_key': exp_key,
                     'template_name': template_name,
                     'query_path': query_path,
-                    'config': config
+                    'config': config,
+                    'bootstrap_cis': bootstrap_cis,
+                    'sql_stats': use_sql_stats,
+                    'as_of_date': as_of_date,
+                    'sample_rate': sample_rate if preview else None,
+                    'srm_p_value': srm_p_value,
+                    'metric_names': selection.metric_names
                 })
                 
         except Exception as e:
             print(f"      ❌ Failed to prepare {exp_key}: {e}")
             continue
     
-    print(f"\n📊 Total queries prepared for execution: {len(all_query_infos)}")
+    batched_queries = []
+    batched_pairs = set()
+    if use_batching:
+        batched_queries, batched_pairs = prepare_batched_queries(prepared_experiments, as_of_date)
+    all_query_infos = batched_queries + [
+        info for info in per_experiment_queries
+        if (info['exp_key'], info['template_name']) not in batched_pairs
+    ]
+    
+    print(f"\n📊 Total queries prepared for execution: {len(all_query_infos)}"
+          f"{f' ({len(batched_queries)} batched)' if batched_queries else ''}")
     
     # Step 4: Execute all queries in parallel
     print(f"\n⚡ Step 4: Executing queries in parallel...")
@@ -256,7 +504,10 @@ def run_all_experiments(max_workers: int = 4):
         results_by_experiment[exp_key].append(result)
     
     # Process each experiment's results
+    completed = []  # Full, fully successful runs; their preflight probes are stored after the metrics
     for exp_key in active_experiments.keys():
+        if exp_key in unmatched:
+            continue
         exp_results = results_by_experiment.get(exp_key, [])
         
         templates_executed = len([r for r in exp_results if r['status'] == 'SUCCESS'])
@@ -271,6 +522,15 @@ def run_all_experiments(max_workers: int = 4):
         
         # Summary
         status = 'SUCCESS' if templates_failed == 0 else f'PARTIAL ({templates_failed} failed)' if templates_executed > 0 else 'FAILED'
+        gate = preflight.get(exp_key)
+        if gate is not None and not gate.should_run:
+            status = gate.decision.upper()
+        elif gate is not None and gate.decision == FLAG_SRM:
+            status += ' [SRM]'
+        prepared = prepared_experiments.get(exp_key, {})
+        full_run = not preview and not as_of_date and prepared.get('templates') is None and not prepared.get('metric_names')
+        if gate is not None and gate.should_run and full_run and templates_executed > 0 and templates_failed == 0:
+            completed.append(exp_key)
         
         execution_summary.append({
             'experiment': exp_key,
@@ -293,9 +553,17 @@ def run_all_experiments(max_workers: int = 4):
         except Exception as e:
             print(f"   ❌ Storage failed: {e}")
             return False
+    elif use_sql_stats:
+        print("   ✅ Metrics were inserted in-warehouse by each template statement")
     else:
         print("   ⚠️  No metrics to store")
     
+    if completed:
+        try:
+            record_completed_runs(preflight, completed)
+        except Exception as e:
+            print(f"   ⚠️  Could not store preflight results: {e}")
+    
     # Step 7: Show final summary
     print("\n" + "=" * 90)
     print("📊 PARALLEL EXECUTION SUMMARY")
@@ -338,12 +606,33 @@ def run_all_experiments(max_workers: int = 4):
     print()
     print("⚡ PERFORMANCE SUMMARY:")
     print(f"   • Total execution time: {total_execution_time:.2f} seconds")
-    print(f"   • Queries executed: {total_templates_success + total_templates_failed}")
-    print(f"   • Success rate: {(total_templates_success/(total_templates_success + total_templates_failed)*100):.1f}%")
+    total_queries = total_templates_success + total_templates_failed
+    print(f"   • Queries executed: {total_queries}")
+    # Pre-flight can skip every experiment, leaving nothing to divide by
+    print(f"   • Success rate: "
+          f"{f'{total_templates_success / total_queries * 100:.1f}%' if total_queries else 'n/a (no queries ran)'}")
     print(f"   • Average query time: {avg_query_time:.2f} seconds")
     print(f"   • Parallel workers used: {max_workers}")
     
-    speedup_estimate = avg_query_time * (total_templates_success + total_templates_failed) / total_execution_time if total_execution_time > 0 else 1
+    if preview:
+        preview_runtimes = {
+            (experiment_configs[r['exp_key']]['experiment_name'], r['template_name']): r['execution_time']
+            for r in execution_results if r['status'] == 'SUCCESS' and r['exp_key'] in experiment_configs
+        }
+        try:
+            full_runtimes = load_full_runtimes({name for name, _ in preview_runtimes})
+            speedup = observed_speedup(preview_runtimes, full_runtimes)
+            print(f"   • Preview speedup vs latest full runs: "
+                  f"{f'{speedup:.1f}x' if speedup is not None else 'n/a (no stored full runtimes)'}")
+        except Exception as e:
+            print(f"   • Preview speedup unavailable: {e}")
+    
+    if as_of_date:
+        cache_hits = [r.get('result_cache_hit') for r in execution_results if r['status'] == 'SUCCESS']
+        print(f"   • Result cache (as of {as_of_date}): {cache_hits.count(True)} reused, "
+              f"{cache_hits.count(False)} computed, {cache_hits.count(None)} unknown")
+    
+    speedup_estimate = avg_query_time * total_queries / total_execution_time if total_execution_time > 0 else 1
     print(f"   • Estimated speedup vs sequential: {speedup_estimate:.1f}x")
     
     print("\n📈 RESULTS BREAKDOWN:")
@@ -380,6 +669,21 @@ def run_all_experiments(max_workers: int = 4):
     
     return True
 
+def compare_preview_accuracy(sample_rate: float = DEFAULT_SAMPLE_RATE):
+    """Run each active experiment in full and as a preview, and report how close the preview is"""
+    yaml_path = os.path.join('data_models', 'manual_experiments.yaml')
+    with open(yaml_path, 'r') as f:
+        experiments = yaml.safe_load(f)['experiments']
+    
+    for exp_key, exp_data in experiments.items():
+        if exp_data.get('expired', False):
+            continue
+        print(f"🔬 {exp_key}: full vs {sample_rate:.0%} preview")
+        try:
+            run_accuracy_comparison(load_experiment_config(exp_key), sample_rate)
+        except Exception as e:
+            print(f"   ❌ Comparison failed for {exp_key}: {e}")
+
 def show_table_query():
     """Show SQL query to examine results"""
     
@@ -415,15 +719,56 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='Run parallelized experiment analysis pipeline')
     parser.add_argument('--workers', type=int, default=4, 
                        help='Number of parallel workers (default: 4)')
+    parser.add_argument('--bootstrap', action='store_true',
+                       help='Compute bootstrap confidence intervals on relative lift')
+    parser.add_argument('--sql-stats', action='store_true',
+                       help='Compute statistics in Snowflake and insert results without fetching rows')
+    parser.add_argument('--batch', action='store_true',
+                       help='Run templates shared by several experiments as one query per template')
+    parser.add_argument('--deterministic', action='store_true',
+                       help="Pin current_date and canonicalize SQL so same-day re-runs hit the result cache")
+    parser.add_argument('--preview', action='store_true',
+                       help='Fast interim readout on a hash sample of exposed units (stored as preview rows)')
+    parser.add_argument('--sample-rate', type=float, default=DEFAULT_SAMPLE_RATE,
+                       help='Fraction of units sampled in preview mode (default: 0.05)')
+    parser.add_argument('--compare-preview', action='store_true',
+                       help='Run full and preview queries side by side and report preview accuracy, then exit')
+    parser.add_argument('--preflight', action='store_true',
+                       help='Probe exposures first: skip empty or unchanged experiments and flag SRM')
+    parser.add_argument('--experiment', action='append', dest='experiments', default=[],
+                       help='Run only this experiment key or name, even if expired (repeatable)')
+    parser.add_argument('--template', action='append', dest='templates', default=[],
+                       help='Run only this template, e.g. onboarding_topline (repeatable)')
+    parser.add_argument('--metric', action='append', dest='metrics', default=[],
+                       help='Run only the templates producing this metric and store only its rows (repeatable)')
+    parser.add_argument('--since',
+                       help='Run only experiments whose window ends on or after this date (YYYY-MM-DD)')
+    parser.add_argument('--as-of-date',
+                       help='Date pinned in deterministic mode (YYYY-MM-DD, default: today in America/Los_Angeles)')
     args = parser.parse_args()
     
     # Validate worker count
     max_workers = max(1, min(args.workers, 10))  # Between 1 and 10 workers
     
+    as_of_date = args.as_of_date or (default_as_of_date() if args.deterministic else None)
+    
     print(f"Starting parallelized experiment analysis pipeline with {max_workers} workers...")
     
+    if args.compare_preview:
+        compare_preview_accuracy(args.sample_rate)
+        raise SystemExit(0)
+    
     try:
-        success = run_all_experiments(max_workers=max_workers)
+        success = run_all_experiments(max_workers=max_workers,
+                                      use_bootstrap=args.bootstrap,
+                                      use_sql_stats=args.sql_stats,
+                                      use_batching=args.batch,
+                                      as_of_date=as_of_date,
+                                      preview=args.preview,
+                                      sample_rate=args.sample_rate,
+                                      use_preflight=args.preflight,
+                                      selection=Selection(args.experiments, args.templates,
+                                                          args.metrics, args.since))
         
         if success:
             show_table_query()
@@ -1,5 +1,9 @@
 """Service modules."""
 
 from . import coda_service
+from . import coda_sync
+from . import coda_writeback
+from . import results_mirror
+from . import slack_digest
 
-__all__ = ["coda_service"]
+__all__ = ["coda_service", "coda_sync", "coda_writeback", "results_mirror", "slack_digest"]
@@ -1,8 +1,13 @@
 from datetime import datetime
 from typing import Dict, List, Optional, Any
 from integrations.coda_client import CodaClient
+from services.coda_sync import CodaSync
+from services.coda_writeback import CodaWriteback, ROADMAP_KEY_COLUMNS, build_readout_updates
 from utils.logger import logger
 
+ROADMAP_URL = "https://coda.io/d/nux-product_dn6rnftKCGZ/Q3-2025_su5L-0_F#Q3-2025-Roadmap-overview_tuWR35uZ"
+ROADMAP_TABLE_NAME = 'Q3 2025 Roadmap overview'
+
 
 class CodaService:
     """
@@ -10,8 +15,10 @@ class CodaService:
     and transforming Coda data for the NUX experiment tracking system.
     """
     
-    def __init__(self, coda_client: CodaClient = None):
+    def __init__(self, coda_client: CodaClient = None, coda_sync: CodaSync = None):
         self.client = coda_client or CodaClient()
+        self.sync = coda_sync or CodaSync(self.client)
+        self.writer = CodaWriteback(self.sync)
         
         # Known experiment to project mappings (manual overrides)
         self.experiment_project_mappings = {
@@ -30,135 +37,36 @@ class CodaService:
             "App Clips": "app_clips"  # Future experiments
         }
     
-    def scrape_q3_roadmap(self, coda_url: str) -> Dict[str, Any]:
+    def scrape_q3_roadmap(self, coda_url: str, full_sync: bool = False) -> Dict[str, Any]:
         """
-        Scrape the Q3 2025 Roadmap overview from Coda using scoped token approach.
+        Scrape the Q3 2025 Roadmap overview from Coda.
+        
+        The table is synced incrementally into the local Coda snapshot (only rows changed
+        since the last sync are fetched) and the projects are built from the snapshot.
         
         Args:
             coda_url: Full Coda URL to the roadmap document
+            full_sync: Re-walk the whole table instead of fetching changed rows
             
         Returns:
             Dictionary containing scraped roadmap data with metadata
         """
-        logger.info("Starting Q3 2025 Roadmap scrape from Coda (scoped token mode)")
+        logger.info("Starting Q3 2025 Roadmap scrape from Coda")
         
         try:
-            # Parse URL to get doc_id and view_id
-            url_parts = self.client.parse_coda_url(coda_url)
-            doc_id = url_parts['doc_id']
-            
-            logger.info(f"Using doc_id: {doc_id}")
-            
-            # Try resolveBrowserLink first to get the correct resource
-            logger.info("Attempting to resolve browser link to get correct table/view ID")
-            try:
-                resolve_response = self.client._make_request(
-                    'GET', 
-                    '/resolveBrowserLink',
-                    params={'url': coda_url}
-                )
-                
-                resource = resolve_response.get('resource', {})
-                if resource.get('type') == 'table':
-                    table_id = resource.get('id')
-                    logger.info(f"✅ Resolved to table ID: {table_id}")
-                else:
-                    # Fallback to URL fragment
-                    table_id = url_parts.get('view_id', 'Q3-2025-Roadmap-overview_tuWR35uZ')
-                    logger.info(f"Using fallback view_id: {table_id}")
-                
-            except Exception as e:
-                logger.warning(f"resolveBrowserLink failed: {e}, using fallback")
-                table_id = url_parts.get('view_id', 'Q3-2025-Roadmap-overview_tuWR35uZ')
-            
-            # Skip doc info check for scoped tokens and go directly to table data
-            doc_info = {'id': doc_id, 'name': 'Q3 2025 NUX Roadmap'}
-            
-            # Use the exact API pattern from Coda documentation
-            logger.info(f"Accessing table rows directly using table_id: {table_id}")
-            
-            # Make the request exactly as shown in Coda API docs with additional debugging
-            import requests
-            headers = {
-                'Authorization': f'Bearer {self.client.api_key}',
-                'Content-Type': 'application/json',
-                'User-Agent': 'nux-slack-bot/1.0',
-                'X-Coda-Doc-Version': 'latest'  # Ensure up-to-date data per API docs
-            }
-            uri = f'https://coda.io/apis/v1/docs/{doc_id}/tables/{table_id}/rows'
-            params = {
-                'limit': 5,  # Start small for debugging
-                'useColumnNames': True,
-                'valueFormat': 'simple'
-            }
-            
-            logger.info(f"Making API request with headers: {dict(headers)}")
-            logger.info(f"URI: {uri}")
-            logger.info(f"Params: {params}")
-            
-            try:
-                response = requests.get(uri, headers=headers, params=params, timeout=30)
-                
-                logger.info(f"Response status: {response.status_code}")
-                logger.info(f"Response headers: {dict(response.headers)}")
-                
-                if response.status_code == 200:
-                    rows_response = response.json()
-                    logger.info(f"✅ SUCCESS! Got {len(rows_response.get('items', []))} rows")
-                elif response.status_code == 401:
-                    logger.error(f"401 Unauthorized - API token invalid: {response.text}")
-                    raise Exception(f"API token is invalid or expired: {response.text}")
-                elif response.status_code == 403:
-                    logger.error(f"403 Forbidden - No access: {response.text}")
-                    raise Exception(f"API token does not grant access to this resource: {response.text}")
-                elif response.status_code == 404:
-                    logger.error(f"404 Not Found - Table not found: {response.text}")
-                    
-                    # Try alternative approach: use the view_id directly from URL
-                    logger.info("Trying alternative approach with original view_id from URL...")
-                    alt_table_id = url_parts.get('view_id', 'Q3-2025-Roadmap-overview_tuWR35uZ')
-                    alt_uri = f'https://coda.io/apis/v1/docs/{doc_id}/tables/{alt_table_id}/rows'
-                    
-                    logger.info(f"Alternative URI: {alt_uri}")
-                    alt_response = requests.get(alt_uri, headers=headers, params=params, timeout=30)
-                    
-                    if alt_response.status_code == 200:
-                        rows_response = alt_response.json()
-                        logger.info(f"✅ Alternative approach SUCCESS! Got {len(rows_response.get('items', []))} rows")
-                    else:
-                        logger.error(f"Alternative also failed: {alt_response.status_code} - {alt_response.text}")
-                        raise Exception(f"Table access failed with both IDs: resolved={table_id}, original={alt_table_id}")
-                        
-                elif response.status_code == 429:
-                    raise Exception(f"Rate limit exceeded: {response.text}")
-                else:
-                    logger.error(f"Unexpected status {response.status_code}: {response.text}")
-                    raise Exception(f"API error {response.status_code}: {response.text}")
-                    
-            except requests.exceptions.RequestException as e:
-                logger.error(f"Network error: {e}")
-                raise Exception(f"Network error: {e}")
-            
-            # Process the successful response
-            rows = rows_response.get('items', [])
-            logger.info(f"✅ Successfully fetched {len(rows)} rows from table")
-            
-            # Transform rows to expected format
-            transformed_rows = []
-            for row in rows:
-                row_data = {'row_id': row.get('id')}
-                row_data.update(row.get('values', {}))
-                transformed_rows.append(row_data)
+            sync = self.sync.sync_table(coda_url, ROADMAP_TABLE_NAME, full=full_sync)
+            rows = self.sync.rows(sync['doc_id'], sync['table_id'])
             
             # Create raw_data structure
             raw_data = {
-                'doc_info': doc_info,
+                'doc_info': {'id': sync['doc_id'], 'name': 'Q3 2025 NUX Roadmap'},
                 'table_info': {
-                    'id': table_id,
-                    'name': 'Q3 2025 Roadmap overview',
-                    'row_count': len(transformed_rows)
+                    'id': sync['table_id'],
+                    'name': ROADMAP_TABLE_NAME,
+                    'row_count': len(rows)
                 },
-                'rows': transformed_rows,
+                'rows': rows,
+                'sync': sync,
                 'scraped_at': datetime.now().isoformat()
             }
             
@@ -178,7 +86,8 @@ class CodaService:
                 'raw_data': raw_data  # Keep for debugging
             }
             
-            logger.info(f"Successfully scraped {len(transformed_projects)} projects from Q3 roadmap")
+            logger.info(f"Successfully scraped {len(transformed_projects)} projects from Q3 roadmap "
+                        f"({sync['mode']} sync, {sync['changed']} rows fetched)")
             return result
             
         except Exception as e:
@@ -189,6 +98,35 @@ class CodaService:
                 'scraped_at': datetime.now().isoformat()
             }
     
+    def write_readouts(self, coda_url: str = ROADMAP_URL, mirror=None, experiments: List[str] = None,
+                       dry_run: bool = False) -> Dict[str, Any]:
+        """
+        Write readout status and headline lift from the results mirror back to the roadmap rows.
+        
+        Args:
+            coda_url: Full Coda URL to the roadmap table
+            mirror: ResultsMirror to read readouts from (default: the local mirror)
+            experiments: Only these experiments (default: every mapped project)
+            dry_run: Compute the changed cells without writing
+            
+        Returns:
+            CodaWriteback.write report, or {'success': False, 'error'} if the scrape failed
+        """
+        roadmap = self.scrape_q3_roadmap(coda_url)
+        if not roadmap.get('success'):
+            return roadmap
+        
+        if mirror is None:
+            from services.results_mirror import ResultsMirror
+            mirror = ResultsMirror()
+        projects = [p for p in roadmap['projects'] if not experiments or p.get('experiment_name') in experiments]
+        updates = build_readout_updates(projects, mirror)
+        # The scrape just synced the snapshot, so diff against it as is
+        report = self.writer.write(coda_url, updates, ROADMAP_KEY_COLUMNS, table_name=ROADMAP_TABLE_NAME,
+                                   refresh=False, dry_run=dry_run)
+        report['success'] = report['completed']
+        return report
+    
     def transform_roadmap_data(self, raw_rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         """
         Transform raw Coda data to match our project_experiment_states schema.
@@ -373,7 +311,7 @@ if __name__ == "__main__":
     service = CodaService()
     
     # Test scraping the Q3 roadmap
-    coda_url = "https://coda.io/d/nux-product_dn6rnftKCGZ/Q3-2025_su5L-0_F#Q3-2025-Roadmap-overview_tuWR35uZ"
+    coda_url = ROADMAP_URL
     
     try:
         result = service.scrape_q3_roadmap(coda_url)
@@ -0,0 +1,214 @@
+from typing import Any, Dict, List, Tuple
+
+from services.coda_sync import CodaSync
+from utils.logger import logger
+
+# Roadmap columns the bot owns
+READOUT_STATUS_COLUMN = 'Readout Status'
+HEADLINE_LIFT_COLUMN = 'Headline Lift'
+ROADMAP_KEY_COLUMNS = ['Project Name']
+
+
+def values_equal(left: Any, right: Any) -> bool:
+    """Compare a snapshot cell with a value to write, treating blanks alike and numbers numerically."""
+    if left in (None, '') or right in (None, ''):
+        return left in (None, '') and right in (None, '')
+    try:
+        return abs(float(left) - float(right)) < 1e-9
+    except (TypeError, ValueError):
+        return str(left).strip() == str(right).strip()
+
+
+def diff_rows(snapshot: Dict[str, Dict[str, Any]], updates: List[Dict[str, Any]], key_columns: List[str],
+              insert_missing: bool = False) -> Tuple[List[Dict[str, Any]], Dict[str, Dict[str, Any]], Dict[str, int]]:
+    """
+    Reduce desired row values to the cells that differ from the snapshot.
+
+    Args:
+        snapshot: Row id -> {'values'} from CodaSync.snapshot
+        updates: Desired cells per row, including the key columns
+        key_columns: Columns that identify a row
+        insert_missing: Send updates that match no snapshot row (they become new rows)
+
+    Returns:
+        (rows to upsert: key cells plus changed cells, changed cells by snapshot row id,
+         counts of 'changed', 'unchanged' and 'missing' updates)
+    """
+    index: Dict[tuple, List[Tuple[str, Dict[str, Any]]]] = {}
+    for row_id, row in snapshot.items():
+        key = tuple(str(row['values'].get(column)) for column in key_columns)
+        index.setdefault(key, []).append((row_id, row['values']))
+
+    rows, cells_by_row = [], {}
+    counts = {'changed': 0, 'unchanged': 0, 'missing': 0}
+    for update in updates:
+        matches = index.get(tuple(str(update.get(column)) for column in key_columns), [])
+        if not matches and not insert_missing:
+            counts['missing'] += 1
+            continue
+        changed = {column: value for column, value in update.items()
+                   if column not in key_columns
+                   and (not matches or any(not values_equal(values.get(column), value) for _, values in matches))}
+        if not changed:
+            counts['unchanged'] += 1
+            continue
+        counts['changed'] += 1
+        rows.append(dict({column: update.get(column) for column in key_columns}, **changed))
+        for row_id, _ in matches:
+            cells_by_row[row_id] = changed
+    return rows, cells_by_row, counts
+
+
+def readout_cells(rows: List[Dict[str, Any]]) -> Dict[str, str]:
+    """
+    Readout status and headline lift for one experiment.
+
+    Args:
+        rows: Readout rows in rank order (ResultsMirror.readout)
+    """
+    significant = [str(row.get('statsig_string') or '') for row in rows]
+    positive = sum(label == 'significant positive' for label in significant)
+    negative = sum(label == 'significant negative' for label in significant)
+    stamps = [str(row.get('analysis_timestamp') or row.get('created_at') or '')[:10] for row in rows]
+    status = (f"Readout ready ({max(stamps) or 'undated'}): {positive} significant positive, "
+              f"{negative} significant negative of {len(rows)} metrics")
+
+    headline = next((row for row in rows if not row.get('segments')), rows[0])
+    lift = f"{float(headline['lift']) * 100:+.2f}%" if headline.get('lift') is not None else 'n/a'
+    p_value = f", p={float(headline['p_value']):.3f}" if headline.get('p_value') is not None else ''
+    return {READOUT_STATUS_COLUMN: status, HEADLINE_LIFT_COLUMN: f"{headline['metric_name']} {lift}{p_value}"}
+
+
+def build_readout_updates(projects: List[Dict[str, Any]], mirror) -> List[Dict[str, Any]]:
+    """Roadmap row updates for every project mapped to an experiment with a readout in the mirror."""
+    updates = []
+    for project in projects:
+        if not project.get('experiment_name'):
+            continue
+        rows = mirror.readout(project['experiment_name'])
+        if not rows:
+            logger.info(f"No readout for {project['experiment_name']} yet; leaving {project['project_name']} alone")
+            continue
+        updates.append(dict({ROADMAP_KEY_COLUMNS[0]: project['project_name']}, **readout_cells(rows)))
+    return updates
+
+
+class CodaWriteback:
+    """
+    Bulk writes to Coda tables that send only changed cells.
+
+    Desired values are diffed against the CodaSync snapshot, the changed rows go out
+    through the rows upsert endpoint in as few requests as the API allows, and the
+    queued mutations are tracked until Coda reports them complete.
+    """
+
+    def __init__(self, sync: CodaSync = None, mutation_timeout: float = 60, poll_interval: float = 1.0):
+        """
+        Args:
+            sync: Snapshot to diff against (its client does the writes)
+            mutation_timeout: Seconds to wait for queued mutations to complete
+            poll_interval: Seconds between mutation status polls
+        """
+        self.sync = sync or CodaSync()
+        self.client = self.sync.client
+        self.mutation_timeout = mutation_timeout
+        self.poll_interval = poll_interval
+
+    def write(self, coda_url: str, updates: List[Dict[str, Any]], key_columns: List[str],
+              table_name: str = None, refresh: bool = True, insert_missing: bool = False,
+              dry_run: bool = False, wait: bool = True) -> Dict[str, Any]:
+        """
+        Write row values to a Coda table, sending only cells that changed.
+
+        Args:
+            coda_url: Browser link to the table
+            updates: Desired cells per row, including the key columns
+            key_columns: Columns that identify a row (sent as keyColumns)
+            table_name: Table name, used when the link doesn't resolve to a table
+            refresh: Sync the snapshot first so the diff is against current values
+            insert_missing: Add rows for updates that match no existing row
+            dry_run: Compute the diff without writing
+            wait: Poll mutation status until Coda has applied the writes
+
+        Returns:
+            Dictionary with the diff counts, rows and cells sent, request IDs,
+            mutation statuses and whether every mutation completed
+        """
+        doc_id, table_id = self.sync.resolve(coda_url, table_name)
+        if refresh:
+            self.sync.sync_table(coda_url, table_name)
+        rows, cells_by_row, counts = diff_rows(self.sync.snapshot(doc_id, table_id), updates, key_columns,
+                                               insert_missing=insert_missing)
+        report = dict(counts, doc_id=doc_id, table_id=table_id, rows=rows,
+                      cells_sent=sum(len(row) - len(key_columns) for row in rows),
+                      request_ids=[], statuses={}, completed=True)
+        logger.info(f"Coda write to {table_id}: {counts['changed']} rows changed, {counts['unchanged']} unchanged, "
+                    f"{counts['missing']} without a matching row")
+        if dry_run or not rows:
+            return report
+
+        report['request_ids'] = self.client.upsert_rows(doc_id, table_id, rows, key_columns=key_columns)
+        if wait:
+            report['statuses'] = self.client.wait_for_mutations(report['request_ids'], timeout=self.mutation_timeout,
+                                                                poll_interval=self.poll_interval)
+            report['completed'] = all(status.get('completed') for status in report['statuses'].values())
+            if report['completed']:
+                self.sync.apply_local(doc_id, table_id, cells_by_row)
+        else:
+            report['completed'] = False
+        return report
+
+
+def test_bulk_writeback():
+    """Write readout cells to a 600-row table on the mock Coda server: batching, diffing, 429s and mutation status"""
+    import os
+    import tempfile
+    from integrations.coda_client import CodaClient, MAX_UPSERT_ROWS
+    from integrations.coda_mock import MockCodaServer
+
+    url = 'https://coda.io/d/nux_docA/Roadmap#grid-roadmap'
+    columns = ['Project Name', 'Project Status', READOUT_STATUS_COLUMN, HEADLINE_LIFT_COLUMN]
+    with MockCodaServer(writes_per_second=20, write_burst=1, mutation_delay=0.05) as coda, \
+            tempfile.TemporaryDirectory() as tmp:
+        coda.add_table('docA', 'grid-roadmap', 'Roadmap', columns)
+        for i in range(600):
+            coda.upsert_row('docA', 'grid-roadmap', f'i-{i}', {'Project Name': f'Project {i}', 'Project Status': 'Planned'})
+
+        client = CodaClient(api_key='test', base_url=coda.url, writes_per_second=1000, write_burst=50)
+        writer = CodaWriteback(CodaSync(client, path=os.path.join(tmp, 'coda.sqlite')), poll_interval=0.02)
+        updates = [{'Project Name': f'Project {i}', READOUT_STATUS_COLUMN: 'Readout ready',
+                    HEADLINE_LIFT_COLUMN: f'order_rate {i / 100:+.2f}%'} for i in range(600)]
+
+        first = writer.write(url, updates + [{'Project Name': 'Unknown project', READOUT_STATUS_COLUMN: 'x'}],
+                             ROADMAP_KEY_COLUMNS)
+        assert first['completed'] and first['changed'] == 600 and first['missing'] == 1, first['changed']
+        assert len(coda.upserts) == 2 and max(len(body['rows']) for body in coda.upserts) == MAX_UPSERT_ROWS
+        assert coda.rate_limited >= 1 and client.write_retries == coda.rate_limited  # second batch was throttled
+        server_rows = coda.table_rows('docA', 'grid-roadmap')
+        assert len(server_rows) == 600 and server_rows['i-42'][HEADLINE_LIFT_COLUMN] == 'order_rate +0.42%'
+
+        # Only changed cells go out: 25 rows change one column, in a single request
+        for i in range(0, 600, 24):
+            updates[i][READOUT_STATUS_COLUMN] = 'Readout ready (refreshed)'
+        second = writer.write(url, updates, ROADMAP_KEY_COLUMNS)
+        assert second['changed'] == 25 and second['unchanged'] == 575 and second['cells_sent'] == 25
+        assert len(coda.upserts) == 3 and all(set(row) == {'Project Name', READOUT_STATUS_COLUMN} for row in second['rows'])
+        assert coda.table_rows('docA', 'grid-roadmap')['i-48'][READOUT_STATUS_COLUMN] == 'Readout ready (refreshed)'
+
+        # Without a refresh the snapshot already reflects our own writes, so nothing is resent
+        third = writer.write(url, updates, ROADMAP_KEY_COLUMNS, refresh=False)
+        assert third['changed'] == 0 and len(coda.upserts) == 3
+
+    rows = [{'metric_name': 'order_rate', 'segments': 'ios', 'lift': 0.05, 'p_value': 0.01,
+             'statsig_string': 'significant positive', 'analysis_timestamp': '2025-09-30 10:00:00'},
+            {'metric_name': 'order_rate', 'segments': None, 'lift': 0.021, 'p_value': 0.04,
+             'statsig_string': 'significant positive', 'analysis_timestamp': '2025-10-01 10:00:00'}]
+    cells = readout_cells(rows)
+    assert cells[HEADLINE_LIFT_COLUMN] == 'order_rate +2.10%, p=0.040' and '(2025-10-01)' in cells[READOUT_STATUS_COLUMN]
+
+    print(f"✓ Coda writeback: 600 rows in 2 upserts ({client.write_retries} 429s retried), "
+          f"then 25 changed cells in 1 upsert; a per-row writer would have sent 625 requests")
+
+
+if __name__ == "__main__":
+    test_bulk_writeback()
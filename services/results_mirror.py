@@ -0,0 +1,329 @@
+import os
+import sqlite3
+import threading
+import time
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Callable, Dict, List, Optional
+
+from config.api_keys import RESULTS_MIRROR_MAX_AGE_SECONDS, RESULTS_MIRROR_PATH
+from utils.logger import logger
+
+RESULTS_TABLE = 'proddb.fionafan.experiment_metrics_results'
+COMBINED_TABLE = 'proddb.fionafan.combined_experiment_metrics'
+
+# Local table -> (source table, watermark column, incremental mode)
+#   'append':  pull rows newer than the watermark and add them
+#   'replace': each pipeline run inserts a complete build; keep only the latest build
+MIRRORED_TABLES = {
+    'experiment_metrics_results': (RESULTS_TABLE, 'insert_timestamp', 'append'),
+    'combined_experiment_metrics': (COMBINED_TABLE, 'updated_at', 'replace'),
+}
+
+INDEXES = {
+    'experiment_metrics_results': [('experiment_name', 'metric_name', 'segments'), ('insert_timestamp',)],
+    'combined_experiment_metrics': [('experiment_name', 'metric_name', 'segments')],
+}
+
+
+class ResultsMirror:
+    """
+    Local SQLite mirror of experiment_metrics_results and combined_experiment_metrics
+    for the bot's lookups, so a question costs a local read instead of a warehouse query.
+
+    Reads are stale-while-revalidate: they always answer from the mirror, and when the
+    last sync is older than max_age_seconds a background sync is started for the next read.
+    """
+
+    def __init__(self, path: str = None, max_age_seconds: int = None,
+                 fetch: Callable[[str], List[Dict[str, Any]]] = None):
+        """
+        Args:
+            path: SQLite file (default: RESULTS_MIRROR_PATH)
+            max_age_seconds: Age after which reads trigger a background refresh
+            fetch: Runs a Snowflake query and returns rows as dictionaries (injectable for tests)
+        """
+        self.path = os.path.expanduser(path or RESULTS_MIRROR_PATH)
+        self.max_age_seconds = RESULTS_MIRROR_MAX_AGE_SECONDS if max_age_seconds is None else max_age_seconds
+        self.fetch = fetch or self._fetch_snowflake
+        self._sync_lock = threading.Lock()
+        self._refresh_thread: Optional[threading.Thread] = None
+
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS sync_state (
+                    table_name TEXT PRIMARY KEY,
+                    watermark TEXT,
+                    synced_at REAL,
+                    row_count INTEGER
+                )
+            """)
+
+    @staticmethod
+    def _fetch_snowflake(query: str) -> List[Dict[str, Any]]:
+        from utils.snowflake_connection import execute_snowflake_query
+        return execute_snowflake_query(query, method='pandas') or []
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    @staticmethod
+    def _to_sqlite(value: Any) -> Any:
+        """Timestamps/dates as ISO text, Decimals as floats, NaN/NaT as NULL."""
+        if value is None:
+            return None
+        if isinstance(value, float) and value != value:
+            return None
+        if isinstance(value, Decimal):
+            return float(value)
+        if isinstance(value, (datetime, date)):
+            return str(value)
+        if hasattr(value, 'item'):
+            return value.item()
+        if str(value) == 'NaT':
+            return None
+        return value
+
+    # ------------------------------------------------------------------
+    # Sync
+    # ------------------------------------------------------------------
+
+    def _state(self, conn: sqlite3.Connection, table: str) -> Optional[sqlite3.Row]:
+        return conn.execute('SELECT * FROM sync_state WHERE table_name = ?', (table,)).fetchone()
+
+    def _ensure_columns(self, conn: sqlite3.Connection, table: str, columns: List[str]):
+        """Create the mirror table on first sync and add columns the source gained since."""
+        existing = {row['name'] for row in conn.execute(f'PRAGMA table_info({table})')}
+        if not existing:
+            conn.execute(f"CREATE TABLE {table} ({', '.join(columns)})")
+            for index_columns in INDEXES.get(table, []):
+                conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_{'_'.join(index_columns)} "
+                             f"ON {table} ({', '.join(index_columns)})")
+            return
+        for column in columns:
+            if column not in existing:
+                conn.execute(f'ALTER TABLE {table} ADD COLUMN {column}')
+
+    def _insert(self, conn: sqlite3.Connection, table: str, rows: List[Dict[str, Any]]):
+        columns = sorted({key.lower() for row in rows for key in row})
+        self._ensure_columns(conn, table, columns)
+        placeholders = ', '.join('?' for _ in columns)
+        conn.executemany(
+            f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders})",
+            [tuple(self._to_sqlite({k.lower(): v for k, v in row.items()}.get(c)) for c in columns)
+             for row in rows]
+        )
+
+    def _sync_table(self, table: str, full: bool) -> int:
+        source, watermark_column, mode = MIRRORED_TABLES[table]
+        with self._connect() as conn:
+            state = self._state(conn, table)
+        watermark = None if full or state is None else state['watermark']
+
+        if mode == 'append':
+            where = f"WHERE {watermark_column} > '{watermark}'::timestamp" if watermark else ''
+            rows = self.fetch(f'SELECT * FROM {source} {where}')
+        else:
+            latest = self.fetch(f'SELECT MAX({watermark_column}) AS watermark FROM {source}')
+            latest_build = str(latest[0]['watermark']) if latest and latest[0]['watermark'] is not None else None
+            if latest_build is None or latest_build == watermark:
+                rows = []
+            else:
+                rows = self.fetch(f"SELECT * FROM {source} WHERE {watermark_column} = '{latest_build}'::timestamp")
+
+        with self._connect() as conn:
+            conn.execute('BEGIN IMMEDIATE')  # readers see the old or the new build, never neither
+            if rows:
+                if full or mode == 'replace':
+                    conn.execute(f'DROP TABLE IF EXISTS {table}')
+                self._insert(conn, table, rows)
+                watermark = max(str(self._to_sqlite(row[watermark_column])) for row in rows
+                                if row.get(watermark_column) is not None)
+            row_count = conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0] \
+                if conn.execute("SELECT 1 FROM sqlite_master WHERE name = ?", (table,)).fetchone() else 0
+            conn.execute(
+                'INSERT OR REPLACE INTO sync_state (table_name, watermark, synced_at, row_count) VALUES (?, ?, ?, ?)',
+                (table, watermark, time.time(), row_count)
+            )
+        return len(rows)
+
+    def sync(self, full: bool = False) -> Dict[str, int]:
+        """
+        Bring the mirror up to date.
+
+        Results rows are pulled incrementally by insert_timestamp. The combined table
+        gets a new complete build on every pipeline run, so only a changed build is pulled.
+        Use full=True after rows were updated in place (recompute-stats).
+
+        Args:
+            full: Re-pull everything instead of only new rows
+
+        Returns:
+            Dictionary mapping local table -> rows pulled
+        """
+        with self._sync_lock:
+            start = time.time()
+            pulled = {table: self._sync_table(table, full) for table in MIRRORED_TABLES}
+            logger.info(f"Results mirror synced in {time.time() - start:.2f}s: "
+                        + ', '.join(f"{table} +{count}" for table, count in pulled.items()))
+            return pulled
+
+    def refresh_async(self) -> bool:
+        """Start a background sync unless one is already running."""
+        if self._refresh_thread is not None and self._refresh_thread.is_alive():
+            return False
+
+        def refresh():
+            try:
+                self.sync()
+            except Exception as e:
+                logger.warning(f"Background results mirror refresh failed: {e}")
+
+        self._refresh_thread = threading.Thread(target=refresh, name='results-mirror-refresh', daemon=True)
+        self._refresh_thread.start()
+        return True
+
+    def age_seconds(self) -> Optional[float]:
+        """Seconds since the oldest table was last synced (None if never synced)."""
+        with self._connect() as conn:
+            states = [self._state(conn, table) for table in MIRRORED_TABLES]
+        if any(state is None for state in states):
+            return None
+        return time.time() - min(state['synced_at'] for state in states)
+
+    # ------------------------------------------------------------------
+    # Query API
+    # ------------------------------------------------------------------
+
+    def _read(self, query: str, params: tuple = ()) -> List[Dict[str, Any]]:
+        age = self.age_seconds()
+        if age is None:
+            self.sync()  # nothing to serve yet
+        elif age > self.max_age_seconds:
+            self.refresh_async()
+
+        with self._connect() as conn:
+            try:
+                return [dict(row) for row in conn.execute(query, params)]
+            except sqlite3.OperationalError as e:
+                if 'no such table' in str(e):
+                    return []
+                raise
+
+    def experiments(self) -> List[str]:
+        """Experiment names with a readout in the latest combined build."""
+        rows = self._read('SELECT DISTINCT experiment_name FROM combined_experiment_metrics ORDER BY 1')
+        return [row['experiment_name'] for row in rows]
+
+    def find_experiment(self, text: str) -> Optional[str]:
+        """
+        Resolve a name as typed in Slack ("cx ios reonboarding") to an experiment name.
+
+        Returns:
+            Exact match first, otherwise the shortest name containing the text
+        """
+        needle = text.strip().lower().replace(' ', '_').replace('-', '_')
+        names = self.experiments()
+        if needle in names:
+            return needle
+        matches = sorted((name for name in names if needle in name.lower()), key=len)
+        return matches[0] if matches else None
+
+    def readout(self, experiment_name: str, segments: str = None, source: str = None) -> List[Dict[str, Any]]:
+        """
+        Latest combined readout of one experiment, in template and metric rank order.
+
+        Args:
+            experiment_name: Experiment name
+            segments: Only this segment (e.g. 'ios'); all segments when omitted
+            source: Only 'mode' or 'curie' rows
+        """
+        filters, params = ['experiment_name = ?'], [experiment_name]
+        if segments is not None:
+            filters.append('segments = ?')
+            params.append(segments)
+        if source is not None:
+            filters.append('source = ?')
+            params.append(source)
+        return self._read(
+            f"SELECT * FROM combined_experiment_metrics WHERE {' AND '.join(filters)} "
+            f"ORDER BY template_rank IS NULL, template_rank, metric_rank IS NULL, metric_rank, metric_name",
+            tuple(params)
+        )
+
+    def metric_history(self, experiment_name: str, metric_name: str, segments: str = None) -> List[Dict[str, Any]]:
+        """Every stored full readout of one metric, oldest first (for trends)."""
+        filters, params = ['experiment_name = ?', 'metric_name = ?'], [experiment_name, metric_name]
+        if segments is not None:
+            filters.append('segments = ?')
+            params.append(segments)
+        return self._read(
+            f"SELECT * FROM experiment_metrics_results WHERE {' AND '.join(filters)} "
+            f"AND COALESCE(readout_type, 'full') = 'full' ORDER BY insert_timestamp",
+            tuple(params)
+        )
+
+
+def test_results_mirror():
+    """Check incremental pulls, build replacement and stale-while-revalidate reads against a fake source."""
+    import tempfile
+
+    source = {'experiment_metrics_results': [], 'combined_experiment_metrics': []}
+    queries = []
+
+    def fake_fetch(query: str) -> List[Dict[str, Any]]:
+        queries.append(query)
+        table = 'experiment_metrics_results' if RESULTS_TABLE in query else 'combined_experiment_metrics'
+        rows = source[table]
+        column = MIRRORED_TABLES[table][1]
+        if 'MAX(' in query:
+            return [{'watermark': max((row[column] for row in rows), default=None)}]
+        if "> '" in query:
+            since = query.split("> '")[1].split("'")[0]
+            return [row for row in rows if str(row[column]) > since]
+        if "= '" in query:
+            build = query.split("= '")[1].split("'")[0]
+            return [row for row in rows if str(row[column]) == build]
+        return list(rows)
+
+    def result(ts, metric, lift):
+        return {'experiment_name': 'cx_ios_reonboarding', 'metric_name': metric, 'segments': None,
+                'lift': lift, 'readout_type': 'full', 'insert_timestamp': datetime(2025, 10, ts, 8)}
+
+    def combined(ts, metric, rank):
+        return {'source': 'mode', 'experiment_name': 'cx_ios_reonboarding', 'metric_name': metric,
+                'segments': None, 'template_rank': 2, 'metric_rank': rank, 'updated_at': datetime(2025, 10, ts, 9)}
+
+    path = os.path.join(tempfile.mkdtemp(), 'mirror.sqlite')
+    mirror = ResultsMirror(path, max_age_seconds=3600, fetch=fake_fetch)
+
+    source['experiment_metrics_results'] = [result(1, 'order_rate', 0.01), result(1, 'mau_rate', 0.02)]
+    source['combined_experiment_metrics'] = [combined(1, 'mau_rate', 7), combined(1, 'order_rate', 1)]
+    assert [row['metric_name'] for row in mirror.readout('cx_ios_reonboarding')] == ['order_rate', 'mau_rate']
+
+    source['experiment_metrics_results'].append(dict(result(2, 'order_rate', 0.015), new_column=1.0))
+    source['combined_experiment_metrics'] += [combined(2, 'order_rate', 1)]
+    assert mirror.sync() == {'experiment_metrics_results': 1, 'combined_experiment_metrics': 1}
+    assert mirror.sync() == {'experiment_metrics_results': 0, 'combined_experiment_metrics': 0}
+    assert [row['lift'] for row in mirror.metric_history('cx_ios_reonboarding', 'order_rate')] == [0.01, 0.015]
+    assert len(mirror.readout('cx_ios_reonboarding')) == 1  # only the latest build
+    assert mirror.find_experiment('ios reonboarding') == 'cx_ios_reonboarding'
+
+    # Stale reads answer immediately and refresh in the background
+    mirror.max_age_seconds = 0
+    source['combined_experiment_metrics'] += [combined(3, 'order_rate', 1), combined(3, 'mau_rate', 7)]
+    start = time.time()
+    assert len(mirror.readout('cx_ios_reonboarding')) == 1
+    elapsed_ms = (time.time() - start) * 1000
+    mirror._refresh_thread.join()
+    mirror.max_age_seconds = 3600
+    assert len(mirror.readout('cx_ios_reonboarding')) == 2
+    print(f"✓ Results mirror: incremental pulls, latest-build replacement, stale read served in {elapsed_ms:.1f}ms")
+
+
+if __name__ == "__main__":
+    test_results_mirror()
@@ -0,0 +1,210 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from config.api_keys import SLACK_CHANNEL
+from integrations.slack_client import SlackClient
+from utils.logger import logger
+
+# Metric lines per thread reply; keeps each section well under Slack's 3000-character limit
+METRICS_PER_PAGE = 15
+SECTION_TEXT_LIMIT = 3000
+HIGHLIGHTS = 5
+
+STATSIG_EMOJI = {
+    'significant positive': ':large_green_circle:',
+    'significant negative': ':red_circle:',
+    'directional positive': ':small_green_triangle:',
+    'directional negative': ':small_red_triangle_down:',
+    'flat': ':white_circle:',
+}
+
+
+def format_metric_line(row: Dict[str, Any]) -> str:
+    """One metric as a mrkdwn line: emoji, metric, arm/segment, lift and p-value."""
+    lift = f"{float(row['lift']) * 100:+.2f}%" if row.get('lift') is not None else 'n/a'
+    p_value = f"p={float(row['p_value']):.3f}" if row.get('p_value') is not None else 'p=n/a'
+    scope = ' / '.join(str(row[k]) for k in ('treatment_arm', 'segments') if row.get(k))
+    emoji = STATSIG_EMOJI.get(row.get('statsig_string'), ':grey_question:')
+    return f"{emoji} `{row['metric_name']}` {f'({scope}) ' if scope else ''}*{lift}* {p_value}"
+
+
+def build_experiment_digest(experiment_name: str, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Block Kit messages for one experiment's readout.
+
+    Args:
+        experiment_name: Experiment name
+        rows: Readout rows (combined_experiment_metrics columns), in display order
+
+    Returns:
+        List of {'text', 'blocks'} messages: the channel summary first, then the
+        metric table split into pages that are posted as thread replies
+    """
+    counts: Dict[str, int] = {}
+    for row in rows:
+        counts[row.get('statsig_string') or 'unknown'] = counts.get(row.get('statsig_string') or 'unknown', 0) + 1
+    summary = ' · '.join(f"{STATSIG_EMOJI.get(label, ':grey_question:')} {count} {label}"
+                         for label, count in sorted(counts.items(), key=lambda item: -item[1]))
+
+    highlights = [row for row in rows if str(row.get('statsig_string', '')).startswith('significant')][:HIGHLIGHTS]
+    pages = [rows[i:i + METRICS_PER_PAGE] for i in range(0, len(rows), METRICS_PER_PAGE)]
+
+    blocks = [
+        {'type': 'header', 'text': {'type': 'plain_text', 'text': f"🧪 {experiment_name}"[:150]}},
+        {'type': 'section', 'text': {'type': 'mrkdwn', 'text': summary or 'No metrics yet'}},
+    ]
+    if highlights:
+        blocks.append({'type': 'section', 'text': {
+            'type': 'mrkdwn',
+            'text': ('*Significant movers*\n' + '\n'.join(format_metric_line(r) for r in highlights))[:SECTION_TEXT_LIMIT]
+        }})
+    blocks.append({'type': 'context', 'elements': [{
+        'type': 'mrkdwn',
+        'text': f"{len(rows)} metrics · full table in thread ({len(pages)} page{'s' if len(pages) != 1 else ''}) · "
+                f"{datetime.now().strftime('%Y-%m-%d %H:%M')}"
+    }]})
+
+    messages = [{'text': f"{experiment_name}: {summary or 'no metrics yet'}", 'blocks': blocks}]
+    for number, page in enumerate(pages, start=1):
+        table = '\n'.join(format_metric_line(row) for row in page)[:SECTION_TEXT_LIMIT]
+        messages.append({
+            'text': f"{experiment_name} metrics {number}/{len(pages)}",
+            'blocks': [
+                {'type': 'section', 'text': {'type': 'mrkdwn', 'text': table}},
+                {'type': 'context', 'elements': [{'type': 'mrkdwn', 'text': f"Page {number}/{len(pages)}"}]},
+            ]
+        })
+    return messages
+
+
+class DigestPublisher:
+    """
+    Publishes per-experiment readout digests to Slack: a summary message per experiment
+    with the metric table paginated into its thread. Channels are published concurrently;
+    within a channel messages go out in order through the client's rate limiter.
+    """
+
+    def __init__(self, client: SlackClient = None, mirror=None, max_workers: int = 4):
+        """
+        Args:
+            client: Slack client (default: SLACK_BOT_TOKEN against slack.com)
+            mirror: ResultsMirror to read readouts from (default: the local mirror)
+            max_workers: Channels published at the same time
+        """
+        self.client = client or SlackClient()
+        self.mirror = mirror
+        self.max_workers = max_workers
+
+    def _publish_channel(self, channel: str, digests: Dict[str, List[Dict[str, Any]]]) -> Dict[str, Any]:
+        posted = 0
+        for experiment_name, messages in digests.items():
+            parent = self.client.post_message(channel, messages[0]['text'], messages[0]['blocks'])
+            posted += 1
+            for message in messages[1:]:
+                self.client.post_message(channel, message['text'], message['blocks'], thread_ts=parent['ts'])
+                posted += 1
+            logger.info(f"Posted {experiment_name} digest to {channel} ({len(messages)} messages)")
+        return {'channel': channel, 'experiments': len(digests), 'messages': posted}
+
+    def publish_digests(self, digests_by_channel: Dict[str, Dict[str, List[Dict[str, Any]]]]) -> Dict[str, Any]:
+        """
+        Post prepared digests.
+
+        Args:
+            digests_by_channel: channel -> experiment name -> messages from build_experiment_digest
+
+        Returns:
+            Dictionary with per-channel results, failures, retries and elapsed seconds
+        """
+        start = time.time()
+        results, failures = [], {}
+        with ThreadPoolExecutor(max_workers=max(1, min(self.max_workers, len(digests_by_channel)))) as executor:
+            futures = {executor.submit(self._publish_channel, channel, digests): channel
+                       for channel, digests in digests_by_channel.items()}
+            for future in as_completed(futures):
+                channel = futures[future]
+                try:
+                    results.append(future.result())
+                except Exception as e:
+                    logger.error(f"Publishing to {channel} failed: {e}")
+                    failures[channel] = str(e)
+
+        elapsed = time.time() - start
+        messages = sum(r['messages'] for r in results)
+        logger.info(f"Published {messages} messages to {len(results)} channels in {elapsed:.2f}s "
+                    f"({self.client.retries} rate-limit retries)")
+        return {'channels': results, 'failures': failures, 'messages': messages,
+                'retries': self.client.retries, 'elapsed_seconds': elapsed}
+
+    def publish(self, experiments: Optional[List[str]] = None, routes: Optional[Dict[str, str]] = None,
+                channel: str = None) -> Dict[str, Any]:
+        """
+        Build digests from the results mirror and publish them.
+
+        Args:
+            experiments: Experiment names (default: every experiment in the mirror)
+            routes: experiment name -> channel overrides
+            channel: Channel for experiments without a route (default: SLACK_CHANNEL)
+        """
+        if self.mirror is None:
+            from services.results_mirror import ResultsMirror
+            self.mirror = ResultsMirror()
+
+        digests_by_channel: Dict[str, Dict[str, List[Dict[str, Any]]]] = {}
+        for experiment_name in experiments or self.mirror.experiments():
+            rows = self.mirror.readout(experiment_name)
+            if not rows:
+                logger.warning(f"No readout for {experiment_name}; skipping")
+                continue
+            target = (routes or {}).get(experiment_name, channel or SLACK_CHANNEL)
+            digests_by_channel.setdefault(target, {})[experiment_name] = build_experiment_digest(experiment_name, rows)
+        return self.publish_digests(digests_by_channel)
+
+
+def test_digest_publisher_offline():
+    """Publish synthetic digests to the mock Slack server: order, threading, rate limits and concurrency"""
+    from integrations.slack_mock import MockSlackServer
+
+    labels = list(STATSIG_EMOJI)
+    rows = [{'experiment_name': 'exp', 'metric_name': f'metric_{i}', 'treatment_arm': 'treatment',
+             'segments': None, 'lift': 0.01 * (i - 20), 'p_value': (i % 10) / 10, 'statsig_string': labels[i % 5]}
+            for i in range(40)]
+    digest = build_experiment_digest('exp', rows)
+    assert len(digest) == 1 + 3  # summary + 3 pages of 15
+    assert all(len(b['text']['text']) <= SECTION_TEXT_LIMIT for m in digest for b in m['blocks'] if b['type'] == 'section')
+
+    channels = ['#c1', '#c2', '#c3']
+    digests = {c: {f'exp_{c[-1]}_{n}': digest for n in range(2)} for c in channels}  # 8 messages per channel
+    rate, burst = 20.0, 2
+
+    with MockSlackServer(messages_per_second=rate, burst=burst, latency=0.01) as slack:
+        paced = DigestPublisher(SlackClient(token='xoxb-test', base_url=slack.url,
+                                            messages_per_second=rate, burst=burst))
+        summary = paced.publish_digests(digests)
+        assert summary['messages'] == 24 and not summary['failures'], summary
+        # Channels ran side by side: about one channel's worth of time, not three
+        one_channel = (8 - burst) / rate
+        assert summary['elapsed_seconds'] < 2 * one_channel + 0.2, summary['elapsed_seconds']
+
+        for channel in channels:
+            posted = [m for m in slack.messages if m['channel'] == channel]
+            parents = [m for m in posted if 'thread_ts' not in m]
+            assert len(parents) == 2
+            assert all(m['thread_ts'] in {p['ts'] for p in parents} for m in posted if 'thread_ts' in m)
+
+        # A client that ignores the limit gets 429s and still delivers everything via Retry-After
+        slack.messages.clear()
+        eager = DigestPublisher(SlackClient(token='xoxb-test', base_url=slack.url, messages_per_second=1000, burst=50))
+        eager_summary = eager.publish_digests(digests)
+        assert eager_summary['messages'] == 24 and len(slack.messages) == 24
+        assert eager_summary['retries'] > 0
+
+    print(f"✓ Slack digests: 24 messages over 3 channels in {summary['elapsed_seconds']:.2f}s "
+          f"(one channel alone ≥ {one_channel:.2f}s); unpaced client recovered from "
+          f"{eager_summary['retries']} 429s")
+
+
+if __name__ == "__main__":
+    test_digest_publisher_offline()
@@ -59,6 +59,11 @@ setup(
         "console_scripts": [
             "run-experiments=run_experiments:main",
             "create-metrics-table=create_combined_metrics_table:main",
+            "plan-power=plan_power:main",
+            "analyze-sql=analyze_sql:main",
+            "recompute-stats=recompute_stats:main",
+            "publish-digest=publish_digest:main",
+            "writeback-readouts=writeback_readouts:main",
         ]
     },
     
@@ -0,0 +1,76 @@
+--------------------- hash-bucketed aggregates for bootstrap confidence intervals
+{#
+Jinja2 Template Variables:
+- experiment_name: {{ experiment_name }}
+- start_date: {{ start_date }}
+- end_date: {{ end_date }}
+- version: {{ version }}
+- segments: {{ segments }}
+- n_buckets: {{ n_buckets }} (number of hash buckets units are spread over)
+
+Each exposed device lands in one bucket, so resampling buckets resamples
+independent groups of units while only shipping n_buckets rows per arm.
+#}
+WITH exposure AS
+(SELECT  ee.tag
+               , ee.result
+               , ee.bucket_key
+               , LOWER(ee.segment) AS segments
+               , replace(lower(CASE WHEN bucket_key like 'dx_%' then bucket_key
+                    else 'dx_'||bucket_key end), '-') AS dd_device_ID_filtered
+               , MIN(convert_timezone('UTC','America/Los_Angeles',ee.EXPOSURE_TIME)::date) AS day
+               , MIN(convert_timezone('UTC','America/Los_Angeles',ee.EXPOSURE_TIME)) EXPOSURE_TIME
+FROM proddb.public.fact_dedup_experiment_exposure ee
+WHERE experiment_name = '{{ experiment_name }}'
+{%- if version is not none %}
+AND experiment_version::INT = {{ version }}
+{%- endif %}
+{%- if segments %}
+AND segment IN ({% for segment in segments %}'{{ segment }}'{% if not loop.last %}, {% endif %}{% endfor %})
+{%- endif %}
+AND convert_timezone('UTC','America/Los_Angeles',EXPOSURE_TIME) BETWEEN '{{ start_date }}' AND '{{ end_date }}'
+GROUP BY 1,2,3,4,5
+)
+
+, orders AS
+(SELECT DISTINCT a.DD_DEVICE_ID
+        , replace(lower(CASE WHEN a.DD_device_id like 'dx_%' then a.DD_device_id
+                    else 'dx_'||a.DD_device_id end), '-') AS dd_device_ID_filtered
+        , convert_timezone('UTC','America/Los_Angeles',a.timestamp)::date as day
+        , dd.delivery_ID
+        , dd.variable_profit * 0.01 AS variable_profit
+        , dd.gov * 0.01 AS gov
+FROM segment_events_raw.consumer_production.order_cart_submit_received a
+    JOIN dimension_deliveries dd
+    ON a.order_cart_id = dd.order_cart_id
+    AND dd.is_filtered_core = 1
+    AND convert_timezone('UTC','America/Los_Angeles',dd.created_at) BETWEEN '{{ start_date }}' AND '{{ end_date }}'
+WHERE convert_timezone('UTC','America/Los_Angeles',a.timestamp) BETWEEN '{{ start_date }}' AND '{{ end_date }}'
+)
+
+, units AS
+(SELECT e.tag
+        , e.segments
+        , e.dd_device_ID_filtered AS unit_id
+        , MOD(ABS(HASH(e.dd_device_ID_filtered)), {{ n_buckets }}) AS bucket
+        , COUNT(DISTINCT o.delivery_ID) AS orders
+        , COALESCE(SUM(o.variable_profit), 0) AS variable_profit
+        , COALESCE(SUM(o.gov), 0) AS gov
+FROM exposure e
+LEFT JOIN orders o
+    ON e.dd_device_ID_filtered = o.dd_device_ID_filtered
+    AND e.day <= o.day
+WHERE TAG NOT IN ('internal_test','reserved')
+GROUP BY 1, 2, 3, 4
+)
+
+SELECT tag
+        , segments
+        , bucket
+        , COUNT(*) AS n_units
+        , SUM(orders) AS orders
+        , SUM(variable_profit) AS variable_profit
+        , SUM(gov) AS gov
+FROM units
+GROUP BY 1, 2, 3
+ORDER BY 1, 2, 3
@@ -201,10 +201,18 @@ mode_results AS (
         template_rank,
         metric_rank
     FROM proddb.fionafan.experiment_metrics_results 
-    WHERE insert_timestamp = (
-        SELECT MAX(insert_timestamp) 
-        FROM proddb.fionafan.experiment_metrics_results
-    )
+    WHERE experiment_name IN ({experiment_name_list})
+    AND COALESCE(readout_type, 'full') = 'full' -- sampled preview rows never mix with full readouts
+    -- Like dimension_name IS NULL on the Curie side: this table has no dimension column, so
+    -- horizon (d7, d14, ...) and other breakdown rows would read as duplicate metrics
+    AND (dimension IS NULL OR dimension = 'cumulative')
+    -- Latest row per metric of each experiment's current version, so partial reruns
+    -- (run_experiments.py --experiment/--template/--metric) don't hide the other rows
+    QUALIFY ROW_NUMBER() OVER (
+        PARTITION BY experiment_name, version, template_name, metric_name, treatment_arm, dimension, segments
+        ORDER BY insert_timestamp DESC
+    ) = 1
+    AND COALESCE(version, 0) = MAX(COALESCE(version, 0)) OVER (PARTITION BY experiment_name)
 )
 
 -- Combine both sources
@@ -5,7 +5,9 @@ Jinja2 Template Variables:
 - end_date: {{ end_date }}
 - version: {{ version }}
 - segments: {{ segments }}
+- sample_rate: {{ sample_rate }} (preview runs: deterministic hash sample of exposed units)
 #}
+{%- import 'macros/sampling.sql' as sample with context %}
 WITH exposure AS
 (
     SELECT  ee.tag
@@ -15,7 +17,7 @@ WITH exposure AS
                , MIN(convert_timezone('UTC','America/Los_Angeles',ee.EXPOSURE_TIME)::date) AS day
                , MIN(convert_timezone('UTC','America/Los_Angeles',ee.EXPOSURE_TIME)) EXPOSURE_TIME
 FROM proddb.public.fact_dedup_experiment_exposure ee
-WHERE experiment_name = '{{ experiment_name }}'
+WHERE experiment_name = '{{ experiment_name }}'{{ sample.unit_sample() }}
 {%- if version is not none %}
 AND experiment_version::INT = {{ version }}
 {%- endif %}
@@ -6,7 +6,9 @@ Jinja2 Template Variables:
 - end_date: {{ end_date }}
 - version: {{ version }}
 - segments: {{ segments }}
+- sample_rate: {{ sample_rate }} (preview runs: deterministic hash sample of exposed units)
 #}
+{%- import 'macros/sampling.sql' as sample with context %}
 WITH experiment AS (
     SELECT bucket_key,
         max(a.result) AS bucket,
@@ -15,7 +17,7 @@ WITH experiment AS (
         first_exposure_time::date AS first_exposure_date
     FROM proddb.public.fact_dedup_experiment_exposure a    
     WHERE 1=1
-    AND a.experiment_name = '{{ experiment_name }}'
+    AND a.experiment_name = '{{ experiment_name }}'{{ sample.unit_sample('a.bucket_key') }}
     AND convert_timezone('UTC', 'America/Los_Angeles', a.exposure_time)::date >= '{{ start_date }}'
     {%- if version is not none %}
     AND experiment_version = {{ version }}
@@ -12,7 +12,9 @@ Jinja2 Template Variables:
 - end_date: {{ end_date }}
 - version: {{ version }}
 - segments: {{ segments }}
+- sample_rate: {{ sample_rate }} (preview runs: deterministic hash sample of exposed units)
 #}
+{%- import 'macros/sampling.sql' as sample with context %}
 
 
 WITH exposure AS (
@@ -24,7 +26,7 @@ SELECT distinct ee.tag
               , case when cast(custom_attributes:consumer_id as varchar) not like 'dx_%' then cast(custom_attributes:consumer_id as varchar) else null end as consumer_id
               , MIN(convert_timezone('UTC','America/Los_Angeles',ee.EXPOSURE_TIME)::date) AS day
 FROM proddb.public.fact_dedup_experiment_exposure ee
-WHERE experiment_name = '{{ experiment_name }}'
+WHERE experiment_name = '{{ experiment_name }}'{{ sample.unit_sample() }}
 {%- if version is not none %}
 AND experiment_version = {{ version }}
 {%- endif %}
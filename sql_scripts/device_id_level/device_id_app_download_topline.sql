@@ -6,7 +6,10 @@ Jinja2 Template Variables:
 - end_date: {{ end_date }}
 - version: {{ version }}
 - segments: {{ segments }}
+- today: {{ today }} (current_date, or the pinned as_of_date in deterministic runs)
+- sample_rate: {{ sample_rate }} (preview runs: deterministic hash sample of exposed units)
 #}
+{%- import 'macros/sampling.sql' as sample with context %}
 
 WITH exposure AS (
 SELECT distinct ee.tag
@@ -17,7 +20,7 @@ SELECT distinct ee.tag
               , case when cast(custom_attributes:consumer_id as varchar) not like 'dx_%' then cast(custom_attributes:consumer_id as varchar) else null end as consumer_id
               , MIN(convert_timezone('UTC','America/Los_Angeles',ee.EXPOSURE_TIME)::date) AS day
 FROM proddb.public.fact_dedup_experiment_exposure ee
-WHERE experiment_name = '{{ experiment_name }}'
+WHERE experiment_name = '{{ experiment_name }}'{{ sample.unit_sample() }}
 {%- if version is not none %}
 AND experiment_version = {{ version }}
 {%- endif %}
@@ -334,7 +337,7 @@ ON e.dd_device_ID_filtered = ac.dd_device_ID_filtered
         ,CASE WHEN o.dd_device_ID_filtered IS NOT NULL THEN 1 ELSE 0 END AS app_is_mau
     FROM 
       exposure_with_both_ids e
-      LEFT JOIN app_orders o ON e.app_device_id = o.dd_device_ID_filtered AND (o.day BETWEEN DATEADD('day',-28,least('{{ end_date }}',current_date())) AND DATEADD('day',-1,least('{{ end_date }}',current_date()))) -- past 28 days orders
+      LEFT JOIN app_orders o ON e.app_device_id = o.dd_device_ID_filtered AND (o.day BETWEEN DATEADD('day',-28,least('{{ end_date }}',{{ today }})) AND DATEADD('day',-1,least('{{ end_date }}',{{ today }}))) -- past 28 days orders
     )p 
   GROUP BY 1,2,3
 )
@@ -355,7 +358,7 @@ ON e.dd_device_ID_filtered = ac.dd_device_ID_filtered
         ,CASE WHEN o.dd_device_ID_filtered IS NOT NULL THEN 1 ELSE 0 END AS mweb_is_mau
     FROM 
        exposure_with_both_ids e
-       LEFT JOIN mweb_orders o ON e.dd_device_ID_filtered = o.dd_device_ID_filtered AND o.day BETWEEN DATEADD('day',-28,least('{{ end_date }}',current_date())) AND DATEADD('day',-1,least('{{ end_date }}',current_date()))
+       LEFT JOIN mweb_orders o ON e.dd_device_ID_filtered = o.dd_device_ID_filtered AND o.day BETWEEN DATEADD('day',-28,least('{{ end_date }}',{{ today }})) AND DATEADD('day',-1,least('{{ end_date }}',{{ today }}))
     )p 
   GROUP BY 1,2,3
 )
@@ -5,6 +5,7 @@ Jinja2 Template Variables:
 - end_date: {{ end_date }}
 - version: {{ version }}
 - segments: {{ segments }}
+- today: {{ today }} (current_date, or the pinned as_of_date in deterministic runs)
 #}
 with exposure as (
 select tag
@@ -139,7 +140,7 @@ FROM full_consumer_id_list_w_app_downloads e
 LEFT JOIN all_orders o
 on (e.consumer_id = o.consumer_id
 or e.dd_device_ID_filtered = o.dd_device_ID_filtered)
- AND o.day BETWEEN DATEADD('day',-28,current_date) AND DATEADD('day',-1,current_date)
+ AND o.day BETWEEN DATEADD('day',-28,{{ today }}) AND DATEADD('day',-1,{{ today }})
 GROUP BY 1, 2
 ORDER BY 1, 2
 )
@@ -6,7 +6,11 @@ Jinja2 Template Variables:
 - end_date: {{ end_date }}
 - version: {{ version }}
 - segments: {{ segments }}
+- segment_cube: {{ segment_cube }} (overall + per-segment rows via GROUPING SETS)
+- sample_rate: {{ sample_rate }} (preview runs: deterministic hash sample of exposed units)
 #}
+{%- import 'macros/segment_cube.sql' as cube with context %}
+{%- import 'macros/sampling.sql' as sample with context %}
 WITH exposure AS
 (SELECT  ee.tag
                , ee.result
@@ -17,7 +21,7 @@ WITH exposure AS
                , MIN(convert_timezone('UTC','America/Los_Angeles',ee.EXPOSURE_TIME)::date) AS day
                , MIN(convert_timezone('UTC','America/Los_Angeles',ee.EXPOSURE_TIME)) EXPOSURE_TIME
 FROM proddb.public.fact_dedup_experiment_exposure ee
-WHERE experiment_name = '{{ experiment_name }}'
+WHERE experiment_name = '{{ experiment_name }}'{{ sample.unit_sample() }}
 {%- if version is not none %}
 AND experiment_version::INT = {{ version }}
 {%- endif %}
@@ -89,7 +93,7 @@ GROUP BY 1,2,3,4
 
 , explore_res AS
 (SELECT tag
-        , segments
+        , {{ cube.segment_column('segments') }}
         , count(distinct dd_device_ID_filtered) as exposure_onboard
         , SUM(explore_view) explore_view
         , SUM(explore_view) / COUNT(DISTINCT e.dd_device_ID_filtered||e.day) AS explore_rate
@@ -100,7 +104,7 @@ GROUP BY 1,2,3,4
         , SUM(checkout_view)  AS checkout_view
         , SUM(checkout_view) / nullif(SUM(cart_view),0) AS checkout_rate
 FROM explore e
-GROUP BY 1, 2
+{{ cube.segment_group_by('tag', 'segments') }}
 ORDER BY 1, 2)
 
 , res AS
@@ -6,7 +6,14 @@ Jinja2 Template Variables:
 - end_date: {{ end_date }}
 - version: {{ version }}
 - segments: {{ segments }}
+- batch_experiments: {{ batch_experiments }} (one scan for several experiments, rows keyed by experiment_name)
+- segment_cube: {{ segment_cube }} (overall + per-segment rows via GROUPING SETS)
+- today: {{ today }} (current_date, or the pinned as_of_date in deterministic runs)
+- sample_rate: {{ sample_rate }} (preview runs: deterministic hash sample of exposed units)
 #}
+{%- import 'macros/segment_cube.sql' as cube with context %}
+{%- import 'macros/batch.sql' as batch with context %}
+{%- import 'macros/sampling.sql' as sample with context %}
 WITH exposure AS
 (SELECT  ee.tag
                , ee.result
@@ -15,9 +22,12 @@ WITH exposure AS
                , replace(lower(CASE WHEN bucket_key like 'dx_%' then bucket_key
                     else 'dx_'||bucket_key end), '-') AS dd_device_ID_filtered
                , MIN(convert_timezone('UTC','America/Los_Angeles',ee.EXPOSURE_TIME)::date) AS day
-               , MIN(convert_timezone('UTC','America/Los_Angeles',ee.EXPOSURE_TIME)) EXPOSURE_TIME
+               , MIN(convert_timezone('UTC','America/Los_Angeles',ee.EXPOSURE_TIME)) EXPOSURE_TIME{{ batch.key('ee.experiment_name') }}
 FROM proddb.public.fact_dedup_experiment_exposure ee
-WHERE experiment_name = '{{ experiment_name }}'
+{%- if batch_experiments %}
+WHERE {{ batch.exposure_filter() }}{{ sample.unit_sample('ee.bucket_key') }}
+{%- else %}
+WHERE experiment_name = '{{ experiment_name }}'{{ sample.unit_sample() }}
 {%- if version is not none %}
 AND experiment_version::INT = {{ version }}
 {%- endif %}
@@ -25,7 +35,8 @@ AND experiment_version::INT = {{ version }}
 AND segment IN ({% for segment in segments %}'{{ segment }}'{% if not loop.last %}, {% endif %}{% endfor %})
 {%- endif %}
 AND convert_timezone('UTC','America/Los_Angeles',EXPOSURE_TIME) BETWEEN '{{ start_date }}' AND '{{ end_date }}'
-GROUP BY 1,2,3,4,5
+{%- endif %}
+GROUP BY 1,2,3,4,5{{ batch.key('ee.experiment_name') }}
 )
 
 , orders AS
@@ -47,49 +58,74 @@ WHERE convert_timezone('UTC','America/Los_Angeles',a.timestamp) BETWEEN '{{ star
 
 )
 
-, checkout AS
+, unit_totals AS
 (SELECT  e.tag
         , e.segments
-        , COUNT(distinct e.dd_device_ID_filtered) as exposure_onboard
-        , COUNT(DISTINCT CASE WHEN is_filtered_core = 1 THEN o.delivery_ID ELSE NULL END) orders
-        , COUNT(DISTINCT CASE WHEN is_first_ordercart_DD = 1 AND is_filtered_core = 1 THEN o.delivery_ID ELSE NULL END) new_Cx
-        , COUNT(DISTINCT CASE WHEN is_filtered_core = 1 THEN o.delivery_ID ELSE NULL END) /  COUNT(DISTINCT e.dd_device_ID_filtered) order_rate
-        , COUNT(DISTINCT CASE WHEN is_first_ordercart_DD = 1 AND is_filtered_core = 1 THEN o.delivery_ID ELSE NULL END) /  COUNT(DISTINCT e.dd_device_ID_filtered) new_cx_rate
+        , e.dd_device_ID_filtered
+        , COUNT(DISTINCT CASE WHEN is_filtered_core = 1 THEN o.delivery_ID ELSE NULL END) AS orders
+        , COUNT(DISTINCT CASE WHEN is_first_ordercart_DD = 1 AND is_filtered_core = 1 THEN o.delivery_ID ELSE NULL END) AS new_cx
         , SUM(variable_profit) AS variable_profit
-        , SUM(variable_profit) / COUNT(DISTINCT e.dd_device_ID_filtered) AS VP_per_device
         , SUM(gov) AS gov
-        , SUM(gov) / COUNT(DISTINCT e.dd_device_ID_filtered) AS gov_per_device
+        -- Order-level moments, merged per arm into the STDDEV_SAMP of order values
+        , COUNT(CASE WHEN is_filtered_core = 1 THEN o.delivery_ID END) AS order_rows
+        , COUNT(variable_profit) AS n_order_variable_profit
+        , COUNT(gov) AS n_order_gov
+        , SUM(variable_profit * variable_profit) AS order_sumsq_variable_profit
+        , SUM(gov * gov) AS order_sumsq_gov{{ batch.key('e.experiment_name') }}
+FROM exposure e
+LEFT JOIN orders o
+    ON e.dd_device_ID_filtered = o.dd_device_ID_filtered 
+    AND e.day <= o.day{{ batch.order_window('e', 'o') }}
+WHERE TAG NOT IN ('internal_test','reserved')
+GROUP BY 1, 2, 3{{ batch.key('e.experiment_name') }})
+
+-- Arm aggregates from the per-device totals, so exposure and orders are joined once
+, checkout AS
+(SELECT  tag
+        , {{ cube.segment_column('segments') }}
+        , COUNT(DISTINCT dd_device_ID_filtered) as exposure_onboard
+        , SUM(orders) AS orders
+        , SUM(new_cx) AS new_Cx
+        , SUM(orders) /  COUNT(DISTINCT dd_device_ID_filtered) order_rate
+        , SUM(new_cx) /  COUNT(DISTINCT dd_device_ID_filtered) new_cx_rate
+        , SUM(variable_profit) AS variable_profit
+        , SUM(variable_profit) / COUNT(DISTINCT dd_device_ID_filtered) AS VP_per_device
+        , SUM(gov) AS gov
+        , SUM(gov) / COUNT(DISTINCT dd_device_ID_filtered) AS gov_per_device
         
         -- Statistical variables for p-value calculation
-        -- For continuous variables: need std dev and sample size
-        , STDDEV_SAMP(variable_profit) AS std_variable_profit
-        , STDDEV_SAMP(gov) AS std_gov
-        , COUNT(CASE WHEN is_filtered_core = 1 THEN o.delivery_ID END) AS n_orders_for_stats  -- sample size for continuous vars
+        -- For continuous variables: need std dev and sample size (STDDEV_SAMP over order rows)
+        , SQRT(GREATEST((SUM(order_sumsq_variable_profit)
+                         - SUM(variable_profit) * SUM(variable_profit) / NULLIF(SUM(n_order_variable_profit), 0))
+                        / NULLIF(SUM(n_order_variable_profit) - 1, 0), 0)) AS std_variable_profit
+        , SQRT(GREATEST((SUM(order_sumsq_gov) - SUM(gov) * SUM(gov) / NULLIF(SUM(n_order_gov), 0))
+                        / NULLIF(SUM(n_order_gov) - 1, 0), 0)) AS std_gov{{ batch.key() }}
+        , SUM(order_rows) AS n_orders_for_stats  -- sample size for continuous vars
         
         -- Rate variables already have numerator/denominator:
         -- order_rate: orders/exposure_onboard
         -- new_cx_rate: new_cx/exposure_onboard
         
-FROM exposure e
-LEFT JOIN orders o
-    ON e.dd_device_ID_filtered = o.dd_device_ID_filtered 
-    AND e.day <= o.day
-WHERE TAG NOT IN ('internal_test','reserved')
-GROUP BY 1, 2
+        -- Unit-level sufficient statistics for the per-device ratio metrics (delta method)
+        , COUNT(*) AS n_units
+        , SUM(variable_profit * variable_profit) AS sumsq_variable_profit
+        , SUM(gov * gov) AS sumsq_gov
+FROM unit_totals
+{{ cube.segment_group_by('tag', 'segments', batch_column='experiment_name') }}
 ORDER BY 1, 2)
 
 ,  MAU AS (
 SELECT  e.tag
-        , e.segments
+        , {{ cube.segment_column('e.segments') }}
         , COUNT(DISTINCT o.dd_device_ID_filtered) as MAU
-        , COUNT(DISTINCT o.dd_device_ID_filtered) / COUNT(DISTINCT e.dd_device_ID_filtered) as MAU_rate
+        , COUNT(DISTINCT o.dd_device_ID_filtered) / COUNT(DISTINCT e.dd_device_ID_filtered) as MAU_rate{{ batch.key('e.experiment_name') }}
 FROM exposure e
 LEFT JOIN orders o
     ON e.dd_device_ID_filtered = o.dd_device_ID_filtered 
     --AND e.day <= o.day
-    AND o.day BETWEEN DATEADD('day',-28,current_date) AND DATEADD('day',-1,current_date) -- past 28 days orders
+    AND o.day BETWEEN DATEADD('day',-28,{{ today }}) AND DATEADD('day',-1,{{ today }}) -- past 28 days orders
 -- WHERE e.day <= DATEADD('day',-28,'{{ end_date }}') --- exposed at least 28 days ago
-GROUP BY 1, 2
+{{ cube.segment_group_by('e.tag', 'e.segments', batch_column='e.experiment_name') }}
 ORDER BY 1, 2
 )
 
@@ -99,12 +135,12 @@ ORDER BY 1, 2
         , m.mau_rate
 FROM checkout c
 JOIN MAU m 
-  on c.tag = m.tag AND c.segments = m.segments
+  on c.tag = m.tag AND c.segments = m.segments{{ batch.join_on('c', 'm') }}
 ORDER BY 1, 2
 )
 
 SELECT r1.tag 
-        , r1.segments
+        , r1.segments{{ batch.key('r1.experiment_name') }}
         , r1.exposure_onboard AS exposure
         , r1.orders
         , r1.order_rate
@@ -129,6 +165,9 @@ SELECT r1.tag
         -- Treatment group statistics (r1)
         , r1.std_variable_profit AS std_variable_profit
         , r1.std_gov AS std_gov
+        , r1.n_units
+        , r1.sumsq_variable_profit
+        , r1.sumsq_gov
         -- Control group statistics (r2) for rate variables
         , r2.order_rate AS control_order_rate
         , r2.new_cx_rate AS control_new_cx_rate
@@ -145,10 +184,13 @@ SELECT r1.tag
         , r2.orders AS control_orders
         , r2.new_cx AS control_new_cx
         , r2.mau AS control_mau
+        , r2.n_units AS control_n_units
+        , r2.sumsq_variable_profit AS control_sumsq_variable_profit
+        , r2.sumsq_gov AS control_sumsq_gov
         
 FROM res r1
 LEFT JOIN res r2
     ON r1.tag != r2.tag
     AND r2.tag = 'control'
-    AND r1.segments = r2.segments
+    AND r1.segments = r2.segments{{ batch.join_on('r1', 'r2') }}
 ORDER BY 1, 2 desc
\ No newline at end of file
@@ -0,0 +1,110 @@
+--------------------- daily HLL sketches for distinct device counts
+{#
+Jinja2 Template Variables:
+- experiment_name: {{ experiment_name }}
+- start_date: {{ start_date }}
+- end_date: {{ end_date }}
+- version: {{ version }}
+- segments: {{ segments }}
+- stats_start_date: {{ stats_start_date }} (first day to sketch)
+- stats_end_date: {{ stats_end_date }} (last day to sketch)
+- exact_window: {{ exact_window }} (true = exact COUNT(DISTINCT) over the whole
+  stats window instead of per-day sketches, used by the accuracy report)
+
+Metrics:
+- exposure: devices by first exposure day (matches exposure_onboard)
+- order_units: devices ordering on or after their exposure day
+- active_units: exposed devices ordering that day regardless of exposure day
+  (combine the trailing 28 days to get MAU)
+#}
+WITH exposure AS
+(SELECT  ee.tag
+               , ee.result
+               , ee.bucket_key
+               , LOWER(ee.segment) AS segments
+               , replace(lower(CASE WHEN bucket_key like 'dx_%' then bucket_key
+                    else 'dx_'||bucket_key end), '-') AS dd_device_ID_filtered
+               , MIN(convert_timezone('UTC','America/Los_Angeles',ee.EXPOSURE_TIME)::date) AS day
+               , MIN(convert_timezone('UTC','America/Los_Angeles',ee.EXPOSURE_TIME)) EXPOSURE_TIME
+FROM proddb.public.fact_dedup_experiment_exposure ee
+WHERE experiment_name = '{{ experiment_name }}'
+{%- if version is not none %}
+AND experiment_version::INT = {{ version }}
+{%- endif %}
+{%- if segments %}
+AND segment IN ({% for segment in segments %}'{{ segment }}'{% if not loop.last %}, {% endif %}{% endfor %})
+{%- endif %}
+AND convert_timezone('UTC','America/Los_Angeles',EXPOSURE_TIME) BETWEEN '{{ start_date }}' AND '{{ end_date }}'
+GROUP BY 1,2,3,4,5
+)
+
+, orders AS
+(SELECT DISTINCT replace(lower(CASE WHEN a.DD_device_id like 'dx_%' then a.DD_device_id
+                    else 'dx_'||a.DD_device_id end), '-') AS dd_device_ID_filtered
+        , convert_timezone('UTC','America/Los_Angeles',a.timestamp)::date as day
+FROM segment_events_raw.consumer_production.order_cart_submit_received a
+    JOIN dimension_deliveries dd
+    ON a.order_cart_id = dd.order_cart_id
+    AND dd.is_filtered_core = 1
+    AND convert_timezone('UTC','America/Los_Angeles',dd.created_at) BETWEEN '{{ start_date }}' AND '{{ end_date }}'
+WHERE convert_timezone('UTC','America/Los_Angeles',a.timestamp) BETWEEN '{{ start_date }}' AND '{{ end_date }}'
+AND convert_timezone('UTC','America/Los_Angeles',a.timestamp)::date BETWEEN '{{ stats_start_date }}' AND '{{ stats_end_date }}'
+)
+
+, unit_days AS
+(SELECT e.tag
+        , e.segments
+        , e.day
+        , 'exposure' AS metric_name
+        , e.dd_device_ID_filtered AS unit_id
+FROM exposure e
+WHERE TAG NOT IN ('internal_test','reserved')
+AND e.day BETWEEN '{{ stats_start_date }}' AND '{{ stats_end_date }}'
+
+UNION ALL
+
+SELECT e.tag
+        , e.segments
+        , o.day
+        , 'order_units' AS metric_name
+        , o.dd_device_ID_filtered AS unit_id
+FROM exposure e
+JOIN orders o
+    ON e.dd_device_ID_filtered = o.dd_device_ID_filtered
+    AND e.day <= o.day
+WHERE TAG NOT IN ('internal_test','reserved')
+
+UNION ALL
+
+SELECT e.tag
+        , e.segments
+        , o.day
+        , 'active_units' AS metric_name
+        , o.dd_device_ID_filtered AS unit_id
+FROM exposure e
+JOIN orders o
+    ON e.dd_device_ID_filtered = o.dd_device_ID_filtered
+WHERE TAG NOT IN ('internal_test','reserved')
+)
+
+{%- if exact_window %}
+
+SELECT tag
+        , segments
+        , metric_name
+        , COUNT(DISTINCT unit_id) AS exact_count
+FROM unit_days
+GROUP BY 1, 2, 3
+ORDER BY 1, 2, 3
+{%- else %}
+
+SELECT tag
+        , segments
+        , day
+        , metric_name
+        , HLL_EXPORT(HLL_ACCUMULATE(unit_id)) AS sketch
+        , COUNT(DISTINCT unit_id) AS exact_count
+FROM unit_days
+GROUP BY 1, 2, 3, 4
+ORDER BY 3, 1, 2, 4
+{%- endif %}
@@ -0,0 +1,88 @@
+--------------------- daily sufficient statistics for order-level continuous metrics
+{#
+Jinja2 Template Variables:
+- experiment_name: {{ experiment_name }}
+- start_date: {{ start_date }}
+- end_date: {{ end_date }}
+- version: {{ version }}
+- segments: {{ segments }}
+- stats_start_date: {{ stats_start_date }} (first order day to aggregate)
+- stats_end_date: {{ stats_end_date }} (last order day to aggregate)
+
+Emits one row per (tag, segments, order day, metric) with n, SUM(x) and SUM(x^2)
+over the same order rows the topline template feeds into STDDEV_SAMP, so the
+daily rows merge exactly into the full-window statistics.
+#}
+WITH exposure AS
+(SELECT  ee.tag
+               , ee.result
+               , ee.bucket_key
+               , LOWER(ee.segment) AS segments
+               , replace(lower(CASE WHEN bucket_key like 'dx_%' then bucket_key
+                    else 'dx_'||bucket_key end), '-') AS dd_device_ID_filtered
+               , MIN(convert_timezone('UTC','America/Los_Angeles',ee.EXPOSURE_TIME)::date) AS day
+               , MIN(convert_timezone('UTC','America/Los_Angeles',ee.EXPOSURE_TIME)) EXPOSURE_TIME
+FROM proddb.public.fact_dedup_experiment_exposure ee
+WHERE experiment_name = '{{ experiment_name }}'
+{%- if version is not none %}
+AND experiment_version::INT = {{ version }}
+{%- endif %}
+{%- if segments %}
+AND segment IN ({% for segment in segments %}'{{ segment }}'{% if not loop.last %}, {% endif %}{% endfor %})
+{%- endif %}
+AND convert_timezone('UTC','America/Los_Angeles',EXPOSURE_TIME) BETWEEN '{{ start_date }}' AND '{{ end_date }}'
+GROUP BY 1,2,3,4,5
+)
+
+, orders AS
+(SELECT DISTINCT a.DD_DEVICE_ID
+        , replace(lower(CASE WHEN a.DD_device_id like 'dx_%' then a.DD_device_id
+                    else 'dx_'||a.DD_device_id end), '-') AS dd_device_ID_filtered
+        , convert_timezone('UTC','America/Los_Angeles',a.timestamp)::date as day
+        , dd.delivery_ID
+        , dd.variable_profit * 0.01 AS variable_profit
+        , dd.gov * 0.01 AS gov
+FROM segment_events_raw.consumer_production.order_cart_submit_received a
+    JOIN dimension_deliveries dd
+    ON a.order_cart_id = dd.order_cart_id
+    AND dd.is_filtered_core = 1
+    AND convert_timezone('UTC','America/Los_Angeles',dd.created_at) BETWEEN '{{ start_date }}' AND '{{ end_date }}'
+WHERE convert_timezone('UTC','America/Los_Angeles',a.timestamp) BETWEEN '{{ start_date }}' AND '{{ end_date }}'
+AND convert_timezone('UTC','America/Los_Angeles',a.timestamp)::date BETWEEN '{{ stats_start_date }}' AND '{{ stats_end_date }}'
+)
+
+, order_facts AS
+(SELECT e.tag
+        , e.segments
+        , o.day
+        , o.variable_profit
+        , o.gov
+FROM exposure e
+JOIN orders o
+    ON e.dd_device_ID_filtered = o.dd_device_ID_filtered
+    AND e.day <= o.day
+WHERE TAG NOT IN ('internal_test','reserved')
+)
+
+SELECT tag
+        , segments
+        , day
+        , 'variable_profit' AS metric_name
+        , COUNT(variable_profit) AS n
+        , SUM(variable_profit) AS sum_value
+        , SUM(variable_profit * variable_profit) AS sum_sq_value
+FROM order_facts
+GROUP BY 1, 2, 3
+
+UNION ALL
+
+SELECT tag
+        , segments
+        , day
+        , 'gov' AS metric_name
+        , COUNT(gov) AS n
+        , SUM(gov) AS sum_value
+        , SUM(gov * gov) AS sum_sq_value
+FROM order_facts
+GROUP BY 1, 2, 3
+ORDER BY 3, 1, 2, 4
@@ -0,0 +1,40 @@
+{#
+Batch macros - run one template for several experiments that share a template and
+bucket_key in a single scan. The renderer sets batch_experiments to a list of
+{experiment_name, version, start_date, end_date, segments} and widens
+start_date/end_date to the union of the windows; every aggregate then carries
+experiment_name so the parser can split rows back per experiment.
+
+Import with context so batch_experiments is visible:
+    {% import 'macros/batch.sql' as batch with context %}
+
+Without batch_experiments every macro renders nothing.
+#}
+
+{% macro exposure_filter(time_column='EXPOSURE_TIME') -%}
+(
+{%- for exp in batch_experiments %}
+    {% if not loop.first %}OR {% endif %}(experiment_name = '{{ exp.experiment_name }}'
+    {%- if exp.version is not none %} AND experiment_version::INT = {{ exp.version }}{% endif %}
+    {%- if exp.segments %} AND segment IN ({% for segment in exp.segments %}'{{ segment }}'{% if not loop.last %}, {% endif %}{% endfor %}){% endif %}
+    AND convert_timezone('UTC','America/Los_Angeles',{{ time_column }}) BETWEEN '{{ exp.start_date }}' AND '{{ exp.end_date }}')
+{%- endfor %}
+)
+{%- endmacro %}
+
+{#- Appended to a select list or GROUP BY: ', <expression>' when batching -#}
+{% macro key(expression='experiment_name') -%}
+{%- if batch_experiments %}, {{ expression }}{% endif -%}
+{%- endmacro %}
+
+{% macro join_on(left, right) -%}
+{%- if batch_experiments %} AND {{ left }}.experiment_name = {{ right }}.experiment_name{% endif -%}
+{%- endmacro %}
+
+{#- Orders are scanned once over the union window; cap each exposure at its own experiment's end_date -#}
+{% macro order_window(exposure_alias, order_alias) -%}
+{%- if batch_experiments %}
+    AND {{ order_alias }}.day < CASE {{ exposure_alias }}.experiment_name
+    {%- for exp in batch_experiments %} WHEN '{{ exp.experiment_name }}' THEN '{{ exp.end_date }}'::date{% endfor %} END
+{%- endif -%}
+{%- endmacro %}
@@ -0,0 +1,10 @@
+{#
+Deterministic unit sampling for preview runs (sample_rate set by run_experiments.py --preview).
+A unit is kept when its hashed bucket_key falls below the rate, so every template and every
+re-run samples the same units. Renders nothing when sample_rate is unset.
+#}
+{%- macro unit_sample(column='bucket_key') -%}
+{%- if sample_rate %}
+AND MOD(ABS(HASH({{ column }})), 10000) < {{ (sample_rate * 10000) | round | int }}
+{%- endif -%}
+{%- endmacro %}
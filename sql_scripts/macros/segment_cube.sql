@@ -0,0 +1,38 @@
+{#
+Segment cube macros - compute overall and per-segment aggregates in one scan
+with GROUPING SETS when the experiment sets segment_cube.
+
+Used by the device_id topline and overall_funnel templates; other templates
+ignore segment_cube.
+
+Import with context so segment_cube is visible:
+    {% import 'macros/segment_cube.sql' as cube with context %}
+
+With segment_cube off the macros render the plain column / positional GROUP BY,
+so templates are unchanged for existing experiments.
+#}
+
+{% macro cube_label(column, alias, rolled_up_label) -%}
+{%- if segment_cube -%}
+CASE WHEN GROUPING({{ column }}) = 1 THEN '{{ rolled_up_label }}' ELSE {{ column }} END AS {{ alias }}
+{%- else -%}
+{{ column }}
+{%- endif -%}
+{%- endmacro %}
+
+{% macro segment_column(column) -%}
+{{ cube_label(column, 'segments', 'overall') }}
+{%- endmacro %}
+
+{#- batch_column is added to every grouping set (or appended to the positions) when batching -#}
+{% macro segment_group_by(tag_column, segment_column, positions='1, 2', batch_column=none) -%}
+{%- set batch_key = (', ' ~ batch_column) if (batch_experiments and batch_column) else '' -%}
+{%- if segment_cube -%}
+GROUP BY GROUPING SETS (
+    ({{ tag_column }}{{ batch_key }})
+    , ({{ tag_column }}{{ batch_key }}, {{ segment_column }})
+)
+{%- else -%}
+GROUP BY {{ positions }}{{ batch_key }}
+{%- endif -%}
+{%- endmacro %}
@@ -0,0 +1,14 @@
+{#
+Pre-flight exposure probe: per-arm exposure counts and the latest exposure time for
+every experiment in batch_experiments, in one scan of the exposure table.
+Rendered by experiment_runner/preflight.py through render_batch_template.
+#}
+{%- import 'macros/batch.sql' as batch with context %}
+SELECT  experiment_name
+        , tag
+        , COUNT(DISTINCT bucket_key) AS exposures
+        , MAX(EXPOSURE_TIME) AS max_exposure_time
+FROM proddb.public.fact_dedup_experiment_exposure
+WHERE {{ batch.exposure_filter() }}
+AND tag NOT IN ('internal_test', 'reserved', 'overridden')
+GROUP BY 1, 2
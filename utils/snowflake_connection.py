@@ -1,7 +1,10 @@
 
 import os
+import atexit
 import datetime
-from typing import Optional, Union
+import threading
+from functools import lru_cache
+from typing import Callable, Dict, Optional, Tuple, Union
 from pathlib import Path
 from dotenv import load_dotenv
 import pandas as pd
@@ -42,6 +45,95 @@ except ImportError:
     logger.warning("polars not available. Polars functionality will be disabled.")
     POLARS_AVAILABLE = False
 
+@lru_cache(maxsize=1)
+def _load_env_file():
+    """Load the project .env file once per process."""
+    env_file_path = Path(__file__).parent.parent / ".env"
+    load_dotenv(dotenv_path=env_file_path, override=True)
+
+
+class BackendRegistry:
+    """
+    Process-wide cache of query backends shared by all SnowflakeHook instances.
+
+    Each backend ('pandas', 'polars', 'spark') is created lazily the first time a
+    hook uses that method and is reused by every later hook with the same
+    connection parameters. Backends live until close() is called (or the process
+    exits), so constructing a hook never opens a connection or starts Spark.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._backends: Dict[Tuple[str, tuple], object] = {}
+
+    @staticmethod
+    def _key(method: str, params: Optional[dict]) -> Tuple[str, tuple]:
+        return method, tuple(sorted((params or {}).items()))
+
+    def get(self, method: str, params: Optional[dict], factory: Callable[[], object]):
+        """
+        Return the cached backend for (method, params), creating it with factory if needed.
+
+        Args:
+            method: Backend name ('pandas', 'polars' or 'spark')
+            params: Connection parameters the backend is bound to (None for process-wide backends)
+            factory: Zero-argument callable that builds the backend
+
+        Returns:
+            The shared backend object
+        """
+        key = self._key(method, params)
+        with self._lock:
+            backend = self._backends.get(key)
+            if backend is not None and not self._is_closed(method, backend):
+                return backend
+
+            logger.info(f"Creating shared '{method}' backend")
+            backend = factory()
+            self._backends[key] = backend
+            return backend
+
+    def peek(self, method: str, params: Optional[dict] = None):
+        """Return the cached backend for (method, params) without creating it."""
+        with self._lock:
+            return self._backends.get(self._key(method, params))
+
+    def close(self, method: Optional[str] = None):
+        """
+        Close and forget cached backends.
+
+        Args:
+            method: Only close backends of this method (default: close all)
+        """
+        with self._lock:
+            keys = [key for key in self._backends if method is None or key[0] == method]
+            backends = [(key[0], self._backends.pop(key)) for key in keys]
+
+        for backend_method, backend in backends:
+            try:
+                if backend_method == 'pandas':
+                    backend.close()
+                elif backend_method == 'polars':
+                    backend.dispose()
+                elif backend_method == 'spark':
+                    backend.stop()
+                    SnowflakeHook._persistent_spark_session = None
+                logger.info(f"Closed shared '{backend_method}' backend")
+            except Exception as e:
+                logger.warning(f"Error closing shared '{backend_method}' backend: {str(e)}")
+
+    @staticmethod
+    def _is_closed(method: str, backend) -> bool:
+        if method == 'pandas':
+            return backend.is_closed()
+        return False
+
+
+# Single registry per process; closed automatically at interpreter exit
+backend_registry = BackendRegistry()
+atexit.register(backend_registry.close)
+
+
 class SnowflakeHook:
     # Class-level variable to store persistent Spark session
     _persistent_spark_session = None
@@ -97,10 +189,15 @@ class SnowflakeHook:
         spark_config: Optional[dict] = None,
         use_persistent_spark: bool = False,
         insecure_mode: bool = True,
+        reuse_connection: bool = True,
     ):
         """
         Instantiate snowflake hook with connection parameters.
 
+        Construction is cheap: no connection is opened and no Spark session is
+        started here. Backends are taken from the shared backend_registry the first
+        time a method needs them.
+
         Args:
             spark: Spark session (optional)
             database: Database name (optional, defaults to SNOWFLAKE_DATABASE env var)
@@ -110,15 +207,15 @@ class SnowflakeHook:
             username: Username (optional, defaults to SNOWFLAKE_USER env var)
             password: Password (optional, defaults to SNOWFLAKE_PASSWORD env var or keychain)
             env_file: Path to .env file (optional, defaults to 'config/.env' relative to workspace root)
-            create_local_spark: Whether to create a Spark session in local mode with optimized settings
+            create_local_spark: Whether a lazily created Spark session runs in local mode with optimized settings
             spark_config: Additional Spark configuration parameters (optional)
-            use_persistent_spark: Whether to use a persistent Spark session (default: False)
+            use_persistent_spark: Kept for compatibility; lazily created Spark sessions are always shared
             insecure_mode: Whether to use insecure mode for certificate validation (default: True)
+            reuse_connection: Whether to share the Snowflake connection with other hooks (default: True)
         """
         # First check for environment variables from shell profile for username and password
         # These take highest priority
-        env_file_path = Path(__file__).parent.parent / ".env"
-        load_dotenv(dotenv_path=env_file_path, override=True)
+        _load_env_file()
         self.user = username or os.getenv("SNOWFLAKE_USER")
         self.database = database or os.getenv("SNOWFLAKE_DATABASE", "proddb")
         self.schema = schema or os.getenv("SNOWFLAKE_SCHEMA", "public")
@@ -127,6 +224,7 @@ class SnowflakeHook:
         self.account = os.getenv("SNOWFLAKE_ACCOUNT", "doordash")
         self.use_persistent_spark = use_persistent_spark
         self.password = password or os.getenv("SNOWFLAKE_PASSWORD")
+        self.reuse_connection = reuse_connection
 
         # Validate required parameters
         self._validate_params()
@@ -150,49 +248,73 @@ class SnowflakeHook:
         self.conn = None
         self.cursor = None
 
-        # Setup Spark parameters if Spark is available
-        if PYSPARK_AVAILABLE:
-            # Use provided spark session or existing persistent session if requested
-            if spark is not None:
-                self.spark = spark
-                logger.info("Using provided Spark session")
-            elif use_persistent_spark:
-                # Use or create a persistent Spark session
-                self.spark = self.get_or_create_spark_session(
+        # Spark is only created when a 'spark' method is first used
+        self._spark = spark
+        self._spark_local_mode = create_local_spark
+        self._spark_config = spark_config
+        if spark is not None:
+            logger.info("Using provided Spark session")
+
+        # Snowflake connection parameters for the Spark connector
+        # Handle account URL properly - avoid double .snowflakecomputing.com
+        account_url = self.account
+        if not account_url.endswith('.snowflakecomputing.com'):
+            account_url = f"{account_url}.snowflakecomputing.com"
+
+        self.sfparams = dict(
+            sfUrl=account_url,
+            sfAccount=normalized_account,  # Use normalized account name
+            sfUser=self.user,
+            sfPassword=self.password,
+            sfDatabase=self.database,
+            sfSchema=self.schema,
+            sfWarehouse=self.warehouse,
+            sfRole=self.role
+        )
+
+    @property
+    def spark(self):
+        """
+        Spark session for this hook, created on first access.
+
+        Returns the session passed to the constructor if any, otherwise the shared
+        session from the backend registry. Returns None when PySpark is unavailable
+        or the session could not be created.
+        """
+        if self._spark is not None or not PYSPARK_AVAILABLE:
+            return self._spark
+
+        try:
+            self._spark = backend_registry.get(
+                'spark', None,
+                lambda: self.get_or_create_spark_session(
                     app_name="SnowflakeHook",
-                    local_mode=create_local_spark,
-                    additional_configs=spark_config
+                    local_mode=self._spark_local_mode,
+                    additional_configs=self._spark_config
                 )
-            else:
-                try:
-                    self.spark = self.create_optimized_spark_session(
-                        app_name="SnowflakeHook",
-                        local_mode=create_local_spark,
-                        additional_configs=spark_config
-                    )
-                except Exception as e:
-                    logger.error(f"Failed to create Spark session: {str(e)}")
-                    self.spark = None
-
-            # Setup Snowflake connection parameters for Spark
-            if self.spark is not None:
-                # Handle account URL properly - avoid double .snowflakecomputing.com
-                account_url = self.account
-                if not account_url.endswith('.snowflakecomputing.com'):
-                    account_url = f"{account_url}.snowflakecomputing.com"
-                
-                self.sfparams = dict(
-                    sfUrl=account_url,
-                    sfAccount=normalized_account,  # Use normalized account name
-                    sfUser=self.user,
-                    sfPassword=self.password,
-                    sfDatabase=self.database,
-                    sfSchema=self.schema,
-                    sfWarehouse=self.warehouse,
-                    sfRole=self.role
-                )
-        else:
-            self.spark = None
+            )
+        except Exception as e:
+            logger.error(f"Failed to create Spark session: {str(e)}")
+            self._spark = None
+        return self._spark
+
+    @spark.setter
+    def spark(self, session):
+        self._spark = session
+
+    def _polars_engine(self):
+        """Return the shared SQLAlchemy engine used by the polars method."""
+        return backend_registry.get('polars', self.params, lambda: create_engine(URL(**self.params)))
+
+    @classmethod
+    def shutdown_backends(cls, method: Optional[str] = None):
+        """
+        Close the shared backends used by all hooks in this process.
+
+        Args:
+            method: Only close this backend ('pandas', 'polars' or 'spark'); default closes all
+        """
+        backend_registry.close(method)
 
     def _validate_params(self):
         """
@@ -225,7 +347,12 @@ class SnowflakeHook:
             Exception: If connection fails.
         """
         try:
-            self.conn = snowflake.connector.connect(**self.params)
+            if self.reuse_connection:
+                self.conn = backend_registry.get(
+                    'pandas', self.params, lambda: snowflake.connector.connect(**self.params)
+                )
+            else:
+                self.conn = snowflake.connector.connect(**self.params)
             logger.info("Successfully connected to Snowflake")
             return self.conn
         except Exception as e:
@@ -233,15 +360,21 @@ class SnowflakeHook:
             raise
 
     def close(self):
-        """Close the Snowflake connection."""
+        """
+        Close the Snowflake connection.
+
+        A shared connection is only released by this hook; it stays open for other
+        hooks until shutdown_backends() is called.
+        """
         if self.cursor:
             self.cursor.close()
             self.cursor = None
 
         if self.conn:
-            self.conn.close()
+            if not self.reuse_connection:
+                self.conn.close()
+                logger.info("Snowflake connection closed")
             self.conn = None
-            logger.info("Snowflake connection closed")
 
     @staticmethod
     def create_optimized_spark_session(app_name: str = "SnowflakeHook",
@@ -327,7 +460,7 @@ class SnowflakeHook:
             # Polars method (only if available)
             try:
                 logger.info(f"Executing query (polars): {query[:100]}...")
-                with create_engine(URL(**self.params)).connect() as ctx:
+                with self._polars_engine().connect() as ctx:
                     df = pl.read_database(sql.text(query), ctx)
                     df = df.rename({col: col.lower() for col in df.columns})
                     return df
@@ -398,10 +531,10 @@ class SnowflakeHook:
         # Close Snowflake connection
         self.close()
 
-        # Don't stop spark session if it's persistent
-        if PYSPARK_AVAILABLE and self.spark is not None and not self.use_persistent_spark:
-            if self.spark is not SnowflakeHook._persistent_spark_session:
-                self.spark.stop()
+        # Shared sessions belong to the registry; only stop a session passed in by the caller
+        if PYSPARK_AVAILABLE and self._spark is not None and not self.use_persistent_spark:
+            if self._spark is not backend_registry.peek('spark') and self._spark is not SnowflakeHook._persistent_spark_session:
+                self._spark.stop()
 
         return False  # Re-raise any exceptions that occurred
 
@@ -719,9 +852,10 @@ def execute_snowflake_query(query: str, method: str = 'pandas'):
     method = 'pandas'
     
     # Use optimized SnowflakeHook configuration for parallel execution
+    # The hook shares one Snowflake connection per process and never starts Spark for pandas queries
     hook_config = {
-        'create_local_spark': False,  # Disable Spark entirely
-        'use_persistent_spark': False,  # No Spark session needed
+        'create_local_spark': False,
+        'use_persistent_spark': False,
     }
     
     with SnowflakeHook(**hook_config) as hook:
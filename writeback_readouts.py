@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+"""
+Coda Readout Writeback CLI
+
+Writes each mapped experiment's readout status and headline lift from the local
+results mirror back to its row in the Coda roadmap. The roadmap is synced
+incrementally first and only cells that changed are sent, in bulk upserts.
+"""
+
+import argparse
+import json
+import sys
+
+from services.coda_service import ROADMAP_URL, CodaService
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Write readout status and headline lifts to the Coda roadmap')
+    parser.add_argument('--url', default=ROADMAP_URL, help='Coda roadmap URL (default: the Q3 2025 roadmap)')
+    parser.add_argument('--experiment', action='append', dest='experiments',
+                        help='Experiment name (repeatable, default: every mapped project)')
+    parser.add_argument('--dry-run', action='store_true',
+                        help='Print the changed cells instead of writing them')
+    args = parser.parse_args(argv)
+
+    report = CodaService().write_readouts(args.url, experiments=args.experiments, dry_run=args.dry_run)
+    if 'error' in report:
+        print(f"❌ {report['error']}")
+        return 1
+    if args.dry_run:
+        print(json.dumps(report['rows'], indent=2, default=str))
+
+    print(f"✓ {report['changed']} rows changed ({report['cells_sent']} cells), {report['unchanged']} unchanged, "
+          f"{report['missing']} without a roadmap row; {len(report['request_ids'])} upsert request(s)")
+    if not report['completed']:
+        print("⚠️  Some Coda mutations had not completed when polling stopped")
+    return 0 if report['completed'] else 1
+
+if __name__ == "__main__":
+    sys.exit(main())